@@ -121,10 +121,12 @@ This is how the artifact_path is returned. This hook can be removed, by running
 ``unregister_hook_callback`` with the name of the hook callback.
 
 """
+import hashlib
 import logging
 import os
 import re
 import sys
+import tempfile
 
 from py.path import local
 from riggerlib import Rigger, RiggerBasePlugin, RiggerClient
@@ -132,6 +134,8 @@ from riggerlib import Rigger, RiggerBasePlugin, RiggerClient
 from cfme.utils.net import random_port
 from cfme.utils.path import log_path
 
+SPOOL_DIRNAME = '.spool'
+
 
 class Artifactor(Rigger):
     """A sub from Rigger"""
@@ -149,6 +153,7 @@ class Artifactor(Rigger):
         self.log_dir.ensure(dir=True)
         self.artifact_dir = local(self.config.get('artifact_dir', log_path.join('artifacts')))
         self.artifact_dir.ensure(dir=True)
+        self.artifact_dir.join(SPOOL_DIRNAME).ensure(dir=True)
         self.logger = create_logger('artifactor', self.log_dir.join('artifactor.log').strpath)
         self.squash_exceptions = self.config.get('squash_exceptions', False)
         if not self.log_dir:
@@ -272,6 +277,28 @@ def setup_artifact_dir(root_dir=None, test_name=None, test_location=None,
     return path
 
 
+def spool_artifact(artifact_dir, contents):
+    """
+    Writes the contents of an artifact to the spool dir inside the artifact dir.
+
+    Returns the path of the spooled file and the sha1 of the contents, to be sent as the ``path``
+    and ``content_hash`` of a ``filedump`` hook instead of the contents. The spool dir is on the
+    same filesystem as the artifacts, so the server only renames the file to its place.
+    """
+    if not isinstance(contents, bytes):
+        contents = contents.encode('utf-8')
+    spool_dir = os.path.join(artifact_dir, SPOOL_DIRNAME)
+    try:
+        os.makedirs(spool_dir)
+    except OSError as e:
+        if e.errno != 17:
+            raise
+    fd, path = tempfile.mkstemp(dir=spool_dir, prefix='artifact-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(contents)
+    return path, hashlib.sha1(contents).hexdigest()
+
+
 def create_logger(logger_name, filename):
     """Creates and returns the named logger
 
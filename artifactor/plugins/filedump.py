@@ -9,15 +9,85 @@ artifactor:
         filedump:
             enabled: True
             plugin: filedump
+
+Artifacts can be sent either inline, as ``contents``, or as a ``path`` to a file the client has
+already written to the spool dir with :py:func:`artifactor.spool_artifact`. Spooled files are
+renamed to their place, and when a ``content_hash`` is sent along, files with the same contents
+are hardlinked to the first one instead of being stored again.
 """
 
 from artifactor import ArtifactorBasePlugin
 import base64
 import os
 import re
+import six
+import tempfile
 
 from cfme.utils import normalize_text, safe_string
 
+# Size of the pieces the files are sanitized in
+SANITIZE_CHUNK_SIZE = 64 * 1024
+
+
+def replacement_pattern(words):
+    """Compiles the words into a single pattern matching any of them, the longest first
+
+    Returns the pattern and the overlap :py:func:`sanitize_stream` needs for it.
+    """
+    words = {word if isinstance(word, six.string_types) else str(word) for word in words}
+    words = sorted((word for word in words if word), key=len, reverse=True)
+    if not words:
+        return None, 0
+    return re.compile("|".join(re.escape(word) for word in words)), len(words[0]) - 1
+
+
+def _mask(match):
+    return "*" * len(match.group(0))
+
+
+def sanitize_stream(source, target, pattern, overlap, chunk_size=SANITIZE_CHUNK_SIZE):
+    """Copies source to target with every match of the pattern replaced by asterisks
+
+    The source is read in chunks and the last ``overlap`` characters of every chunk are kept for
+    the next one, so words split between two chunks are masked as well. ``overlap`` has to be one
+    less than the length of the longest word.
+    """
+    carry = ""
+    while True:
+        chunk = source.read(chunk_size)
+        data = carry + chunk
+        if not chunk:
+            target.write(pattern.sub(_mask, data))
+            return
+        # Matches starting before the boundary are complete, the rest waits for more data
+        boundary = len(data) - overlap
+        pieces = []
+        pos = 0
+        for match in pattern.finditer(data):
+            if match.start() >= boundary:
+                break
+            pieces.append(data[pos:match.start()])
+            pieces.append(_mask(match))
+            pos = match.end()
+        end = max(boundary, pos)
+        pieces.append(data[pos:end])
+        target.write("".join(pieces))
+        carry = data[end:]
+
+
+def sanitize_file(filename, pattern, overlap):
+    """Sanitizes the file into a temporary one that then replaces it"""
+    fd, sanitized = tempfile.mkstemp(dir=os.path.dirname(filename),
+                                     prefix=os.path.basename(filename))
+    try:
+        with open(filename) as source, os.fdopen(fd, "w") as target:
+            sanitize_stream(source, target, pattern, overlap)
+        os.rename(sanitized, filename)
+    except Exception:
+        if os.path.exists(sanitized):
+            os.remove(sanitized)
+        raise
+
 
 class Filedump(ArtifactorBasePlugin):
 
@@ -28,6 +98,10 @@ class Filedump(ArtifactorBasePlugin):
         self.register_plugin_hook('finish_test', self.finish_test)
 
     def configure(self):
+        # content hash: stored file, and back
+        self.digests = {}
+        self.digested_files = {}
+        self.patterns = {}
         self.configured = True
 
     def start_test(self, artifact_path, test_name, test_location, slaveid):
@@ -44,10 +118,10 @@ class Filedump(ArtifactorBasePlugin):
             slaveid = "Master"
 
     @ArtifactorBasePlugin.check_configured
-    def filedump(self, description, contents, slaveid=None, mode="w", contents_base64=False,
+    def filedump(self, description, contents=None, slaveid=None, mode="w", contents_base64=False,
                  display_type="primary", display_glyph=None, file_type=None,
                  dont_write=False, os_filename=None, group_id=None, test_name=None,
-                 test_location=None):
+                 test_location=None, path=None, content_hash=None):
         if not slaveid:
             slaveid = "Master"
         test_ident = "{}/{}".format(self.store[slaveid]['test_location'],
@@ -76,9 +150,10 @@ class Filedump(ArtifactorBasePlugin):
             "os_filename": os_filename,
             "group_id": group_id,
         })
-        if not dont_write:
-            if os.path.isfile(os_filename):
-                os.remove(os_filename)
+        if path is not None:
+            self.store_spooled(path, os_filename, content_hash)
+        elif not dont_write:
+            self.remove_stored(os_filename)
             with open(os_filename, mode) as f:
                 if contents_base64:
                     contents = base64.b64decode(contents)
@@ -86,24 +161,49 @@ class Filedump(ArtifactorBasePlugin):
 
         return None, {'artifacts': {test_ident: {'files': artifacts}}}
 
+    def remove_stored(self, os_filename):
+        """Removes a stored file before it is replaced, it no longer holds its hashed contents"""
+        content_hash = self.digested_files.pop(os_filename, None)
+        if content_hash is not None and self.digests.get(content_hash) == os_filename:
+            del self.digests[content_hash]
+        if os.path.isfile(os_filename):
+            os.remove(os_filename)
+
+    def store_spooled(self, path, os_filename, content_hash=None):
+        """Moves a spooled file to its place, or links it to an already stored copy"""
+        self.remove_stored(os_filename)
+        stored = self.digests.get(content_hash)
+        if stored is not None and os.path.isfile(stored):
+            try:
+                os.link(stored, os_filename)
+            except OSError:
+                pass
+            else:
+                os.remove(path)
+                return
+        os.rename(path, os_filename)
+        if content_hash is not None:
+            self.digests[content_hash] = os_filename
+            self.digested_files[os_filename] = content_hash
+
+    def replacement_pattern(self, words):
+        key = tuple(words)
+        if key not in self.patterns:
+            self.patterns[key] = replacement_pattern(words)
+        return self.patterns[key]
+
     @ArtifactorBasePlugin.check_configured
     def sanitize(self, test_location, test_name, artifacts, words):
         test_ident = "{}/{}".format(test_location, test_name)
-        filename = None
+        pattern, overlap = self.replacement_pattern(words)
+        if pattern is None:
+            return
         try:
             for f in artifacts[test_ident]['files']:
                 if f["file_type"] not in {
                         "traceback", "short_tb", "rbac", "soft_traceback",
                         "soft_short_tb"}:
                     continue
-                filename = f["os_filename"]
-                with open(filename) as f:
-                    data = f.read()
-                for word in words:
-                    if not isinstance(word, basestring):
-                        word = str(word)
-                    data = data.replace(word, "*" * len(word))
-                with open(filename, "w") as f:
-                    f.write(data)
+                sanitize_file(f["os_filename"], pattern, overlap)
         except KeyError:
             pass
@@ -29,6 +29,7 @@ class Logger(ArtifactorBasePlugin):
         self.register_plugin_hook('start_test', self.start_test)
         self.register_plugin_hook('finish_test', self.finish_test)
         self.register_plugin_hook('log_message', self.log_message)
+        self.register_plugin_hook('log_messages', self.log_messages)
 
     def configure(self):
         self.configured = True
@@ -67,13 +68,22 @@ class Logger(ArtifactorBasePlugin):
 
     @ArtifactorBasePlugin.check_configured
     def log_message(self, log_record, slaveid):
+        self._handle(log_record, slaveid)
+
+    @ArtifactorBasePlugin.check_configured
+    def log_messages(self, log_records, slaveid):
+        """Batches of records sent by :py:class:`cfme.utils.log.ArtifactorHandler`"""
+        for log_record in log_records:
+            self._handle(log_record, slaveid)
+
+    def _handle(self, log_record, slaveid):
+        if not slaveid:
+            slaveid = "Master"
+        test = self.store.get(slaveid)
+        handler = test.handler if test is not None else None
+        if not handler or log_record['levelno'] < handler.level:
+            return
         # json transport fallout: args must be a dict or a tuple, json makes a tuple into a list
         args = log_record['args']
         log_record['args'] = tuple(args) if isinstance(args, list) else args
-        record = makeLogRecord(log_record)
-        if not slaveid:
-            slaveid = "Master"
-        if slaveid in self.store:
-            handler = self.store[slaveid].handler
-            if handler and record.levelno >= handler.level:
-                handler.handle(record)
+        handler.handle(makeLogRecord(log_record))
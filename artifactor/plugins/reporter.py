@@ -11,13 +11,20 @@ artifactor:
             enabled: True
             plugin: reporter
             only_failed: False #Only show faled tests in the report
+            incremental: False #Build the report as the tests finish, for big runs
+            page_size: 500 #Tests per page of the incremental report
+            index_interval: 60 #Seconds between writes of the incremental report page
 """
 import csv
 import datetime
-import difflib
+import hashlib
+import io
+import json
 import math
 import shutil
+import tempfile
 import time
+from collections import OrderedDict
 from copy import deepcopy
 
 import os
@@ -29,6 +36,7 @@ from artifactor import ArtifactorBasePlugin
 from cfme.utils import process_pytest_path
 from cfme.utils.conf import cfme_data  # Only for the provider specific reports
 from cfme.utils.path import template_path
+from cfme.utils.tb_clustering import TracebackClusterer
 
 _tests_tpl = {
     '_sub': {},
@@ -47,6 +55,29 @@ _tests_tpl = {
 # Does not cover all the cases, but rather only those we can
 URL = re.compile(r"https?://[^/\s]+(?:/[^/\s?]+)*/?(?:\?(?:[^&\s=]+(?:=[^&\s]+)?&?)*)?")
 
+_colors = {
+    'passed': 'success',
+    'failed': 'warning',
+    'error': 'danger',
+    'xpassed': 'danger',
+    'xfailed': 'success',
+    'skipped': 'info'}
+
+_module_label = '<span name="mod_lev" class="label label-primary">M</span>'
+
+# Bootstrap label classes of the outcomes in the test tree
+_label_classes = {
+    'passed': 'success',
+    'failed': 'warning',
+    'error': 'danger',
+    'skipped': 'primary',
+    'xpassed': 'danger',
+    'xfailed': 'success'}
+
+
+def pretty_duration(seconds):
+    return str(datetime.timedelta(seconds=math.ceil(seconds)))
+
 
 def overall_test_status(statuses):
     # Handle some logic for when to count certain tests as which state
@@ -82,14 +113,39 @@ class ReporterBase(object):
             self.render_report(template_data, "report_{}".format(mgmt), artifact_dir,
                 'test_report_provider.html')
 
+    @property
+    def template_env(self):
+        if not hasattr(self, '_template_env'):
+            self._template_env = Environment(
+                loader=FileSystemLoader(template_path.strpath)
+            )
+        return self._template_env
+
     def render_report(self, report, filename, log_dir, template):
-        template_env = Environment(
-            loader=FileSystemLoader(template_path.strpath)
-        )
-        data = template_env.get_template(template).render(**report)
+        data = self.template_env.get_template(template).render(**report)
 
         with open(os.path.join(log_dir, '{}.html'.format(filename)), "w") as f:
             f.write(data)
+        self.copy_dist(log_dir)
+
+    def stream_report(self, report, filename, log_dir, template):
+        """Like render_report, but writes the page as it is rendered instead of all at once
+
+        The page is written to a temporary file that replaces the report when complete.
+        """
+        path = os.path.join(log_dir, '{}.html'.format(filename))
+        fd, tmp_path = tempfile.mkstemp(dir=log_dir, prefix='.{}'.format(filename))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                self.template_env.get_template(template).stream(**report).dump(f, 'utf-8')
+            os.chmod(tmp_path, 0o644)
+            os.rename(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        self.copy_dist(log_dir)
+
+    def copy_dist(self, log_dir):
         try:
             shutil.copytree(template_path.join('dist').strpath, os.path.join(log_dir, 'dist'))
         except OSError:
@@ -117,97 +173,22 @@ class ReporterBase(object):
             'error': 0,
             'xfailed': 0,
             'xpassed': 0}
-        colors = {
-            'passed': 'success',
-            'failed': 'warning',
-            'error': 'danger',
-            'xpassed': 'danger',
-            'xfailed': 'success',
-            'skipped': 'info'}
         # Iterate through the tests and process the counts and durations
         for test_name, test in artifacts.items():
-            if not test.get('statuses'):
+            test_data = self.process_test(test_name, test, log_dir, template_data['qa'])
+            if test_data is None:
                 continue
-            overall_status = overall_test_status(test['statuses'])
+            overall_status = test_data['outcomes']['overall']
             counts[overall_status] += 1
             if not test.get('old', False):
                 current_counts[overall_status] += 1
-            color = colors[overall_status]
-            # This was removed previously but is needed as the overall is not generated
-            # until the test finishes. So this is here as a shim.
-            test['statuses']['overall'] = overall_status
-            test_data = {'name': test_name, 'outcomes': test['statuses'],
-                         'slaveid': test.get('slaveid', "Unknown"), 'color': color}
-            if 'composite' in test:
-                test_data['composite'] = test['composite']
-
-            if 'skipped' in test:
-                if test['skipped'].get('type') == 'provider':
-                    provider_skip_count += 1
-                    test_data['skip_provider'] = test['skipped'].get('reason')
-                if test['skipped'].get('type') == 'blocker':
-                    blocker_skip_count += 1
-                    test_data['skip_blocker'] = test['skipped'].get('reason')
-
+            if 'skip_provider' in test_data:
+                provider_skip_count += 1
             if 'skip_blocker' in test_data:
-                # Fix the inconveniently long list of repeated blockers until we sort out sets
-                # in riggerlib somehow.
-                test_data['skip_blocker'] = sorted(set(test_data['skip_blocker']))
-
-            if test.get('old', False):
-                test_data['old'] = True
-
-            if test.get('start_time'):
-                if test.get('finish_time'):
-                    test_data['in_progress'] = False
-                    test_data['duration'] = test['finish_time'] - test['start_time']
-                else:
-                    test_data['duration'] = time.time() - test['start_time']
-                    test_data['in_progress'] = True
-
-            # Set up destinations for the files
-            test_data["file_groups"] = []
-            test_data['qa_contact'] = []
-            processed_groups = {}
-            order = 0
-            for file_dict in test.get('files', []):
-                group = file_dict["group_id"]
-                if group not in processed_groups:
-                    processed_groups[group] = (order, [])
-                    order += 1
-                processed_groups[group][-1].append(file_dict)
-            # Current structure:
-            # {groupid: (group_order, [{filedict1}, {filedict2}])}
-            # Sorting by group_order
-            processed_groups = sorted(processed_groups.items(), key=lambda kv: kv[1][0])
-            # And now make it [(groupid, [{filedict1}, {filedict2}, ...])]
-            processed_groups = [(group_name, files) for group_name, (_, files) in processed_groups]
-            for group_name, file_dicts in processed_groups:
-                group_file_list = []
-                for file_dict in file_dicts:
-                    if file_dict["file_type"] == "qa_contact":
-                        with open(file_dict["os_filename"], 'rb') as qafile:
-                            qareader = csv.reader(qafile, delimiter=',', quotechar='"')
-                            for qacontact in qareader:
-                                test_data['qa_contact'].append(qacontact)
-                                if qacontact[0] not in template_data['qa']:
-                                    template_data['qa'].append(qacontact[0])
-                        continue  # Do not store, handled a different way :)
-                    elif file_dict["file_type"] == "short_tb":
-                        with open(file_dict["os_filename"], 'r') as short_tb:
-                            test_data["short_tb"] = short_tb.read()
-                        continue
-                    file_dict["filename"] = file_dict["os_filename"].replace(log_dir, "")
-                    group_file_list.append(file_dict)
-
-                test_data["file_groups"].append((group_name, group_file_list))
-            # Snd remove groups that are left empty because of eg. traceback or qa contact
-            test_data["file_groups"] = filter(
-                lambda group: len(group[1]) > 0, test_data["file_groups"])
-            if "short_tb" in test_data and test_data["short_tb"]:
-                urls = [url for url in URL.findall(test_data["short_tb"])]
-                if urls:
-                    test_data["urls"] = urls
+                blocker_skip_count += 1
+            traceback = self.failure_traceback(test, test_data)
+            if traceback:
+                tb_errors.append((traceback, test_name))
             template_data['tests'].append(test_data)
         template_data['top10'] = self.top10(tb_errors)
         template_data['counts'] = counts
@@ -231,24 +212,106 @@ class ReporterBase(object):
 
         for test in template_data['tests']:
             if test.get('duration'):
-                test['duration'] = str(datetime.timedelta(
-                    seconds=math.ceil(test['duration'])))
+                test['duration'] = pretty_duration(test['duration'])
 
         return template_data
 
-    def top10(self, tb_errors):
-        sets = []
-        for entry in tb_errors:
-            for tset in sets:
-                if difflib.SequenceMatcher(a=entry[0][:10], b=tset[0][0][:10]).ratio() > .8:
-                    if difflib.SequenceMatcher(a=entry[0][:20], b=tset[0][0][:20]).ratio() > .75:
-                        if difflib.SequenceMatcher(a=entry[0][:30], b=tset[0][0][:30]).ratio() > .7:
-                            tset.append(entry)
-                            break
+    def process_test(self, test_name, test, log_dir, qa):
+        """
+        Prepares the data of a single test for the report template, or returns None if the test
+        has no results yet. QA contacts of the test are added to ``qa`` as well.
+        """
+        if not test.get('statuses'):
+            return None
+        overall_status = overall_test_status(test['statuses'])
+        color = _colors[overall_status]
+        # This was removed previously but is needed as the overall is not generated
+        # until the test finishes. So this is here as a shim.
+        test['statuses']['overall'] = overall_status
+        test_data = {'name': test_name, 'outcomes': test['statuses'],
+                     'slaveid': test.get('slaveid', "Unknown"), 'color': color}
+        if 'composite' in test:
+            test_data['composite'] = test['composite']
+
+        if 'skipped' in test:
+            if test['skipped'].get('type') == 'provider':
+                test_data['skip_provider'] = test['skipped'].get('reason')
+            if test['skipped'].get('type') == 'blocker':
+                test_data['skip_blocker'] = test['skipped'].get('reason')
+
+        if 'skip_blocker' in test_data:
+            # Fix the inconveniently long list of repeated blockers until we sort out sets
+            # in riggerlib somehow.
+            test_data['skip_blocker'] = sorted(set(test_data['skip_blocker']))
+
+        if test.get('old', False):
+            test_data['old'] = True
+
+        if test.get('start_time'):
+            if test.get('finish_time'):
+                test_data['in_progress'] = False
+                test_data['duration'] = test['finish_time'] - test['start_time']
             else:
-                sets.append([entry])
+                test_data['duration'] = time.time() - test['start_time']
+                test_data['in_progress'] = True
+
+        # Set up destinations for the files
+        test_data["file_groups"] = []
+        test_data['qa_contact'] = []
+        processed_groups = {}
+        order = 0
+        for file_dict in test.get('files', []):
+            group = file_dict["group_id"]
+            if group not in processed_groups:
+                processed_groups[group] = (order, [])
+                order += 1
+            processed_groups[group][-1].append(file_dict)
+        # Current structure:
+        # {groupid: (group_order, [{filedict1}, {filedict2}])}
+        # Sorting by group_order
+        processed_groups = sorted(processed_groups.items(), key=lambda kv: kv[1][0])
+        # And now make it [(groupid, [{filedict1}, {filedict2}, ...])]
+        processed_groups = [(group_name, files) for group_name, (_, files) in processed_groups]
+        for group_name, file_dicts in processed_groups:
+            group_file_list = []
+            for file_dict in file_dicts:
+                if file_dict["file_type"] == "qa_contact":
+                    with open(file_dict["os_filename"], 'rb') as qafile:
+                        qareader = csv.reader(qafile, delimiter=',', quotechar='"')
+                        for qacontact in qareader:
+                            test_data['qa_contact'].append(qacontact)
+                            if qacontact[0] not in qa:
+                                qa.append(qacontact[0])
+                    continue  # Do not store, handled a different way :)
+                elif file_dict["file_type"] == "short_tb":
+                    with open(file_dict["os_filename"], 'r') as short_tb:
+                        test_data["short_tb"] = short_tb.read()
+                    continue
+                file_dict["filename"] = file_dict["os_filename"].replace(log_dir, "")
+                group_file_list.append(file_dict)
+
+            test_data["file_groups"].append((group_name, group_file_list))
+        # Snd remove groups that are left empty because of eg. traceback or qa contact
+        test_data["file_groups"] = filter(
+            lambda group: len(group[1]) > 0, test_data["file_groups"])
+        if "short_tb" in test_data and test_data["short_tb"]:
+            urls = [url for url in URL.findall(test_data["short_tb"])]
+            if urls:
+                test_data["urls"] = urls
+        return test_data
+
+    def failure_traceback(self, test, test_data):
+        """The short traceback of a failed test, for the top failures"""
+        if test_data['outcomes']['overall'] not in ('failed', 'error'):
+            return None
+        return test.get('exception', {}).get('short_tb') or test_data.get('short_tb')
 
-        return sorted(sets, lambda p, q: cmp(len(p), len(q)), reverse=True)[:10]
+    def top10(self, tb_errors):
+        """The ten largest clusters of similar tracebacks of the (traceback, test name) pairs"""
+        clusterer = TracebackClusterer()
+        for traceback, test_name in tb_errors:
+            clusterer.add(traceback, test_name)
+        return clusterer.top(10)
 
     def build_dict(self, path, container, contents):
         """
@@ -282,66 +345,218 @@ class ReporterBase(object):
         """
         Build up the actual HTML tree from the dict from build_dict
         """
-        bimdict = {'passed': 'success',
-                   'failed': 'warning',
-                   'error': 'danger',
-                   'skipped': 'primary',
-                   'xpassed': 'danger',
-                   'xfailed': 'success'}
         list_string = '<ul>\n'
         for k, v in lev['_sub'].items():
 
             # If 'name' is an attribute then we are looking at a test (leaf).
             if 'name' in v:
-                pretty_time = str(datetime.timedelta(seconds=math.ceil(v['duration'])))
-                teststring = '<span name="mod_lev" class="label label-primary">T</span>'
-                label = '<span class="label label-{}">{}</span>'.format(
-                    bimdict[v['outcomes']['overall']], v['outcomes']['overall'].upper())
-                proc_name = process_pytest_path(v['name'])[-1]
-                link = (
-                    '<a href="#{}">{} {} {} <span style="color:#888888"><em>[{}]</em></span></a>'
-                    .format(v['name'], proc_name, teststring, label, pretty_time))
                 # Do we really need the os.path.split (now process_pytest_path) here?
                 # For me it seems the name is always the leaf
-                list_string += '<li>{}</li>\n'.format(link)
+                list_string += '<li><a href="#{}">{}</a></li>\n'.format(
+                    v['name'], self.test_label(v))
 
             # If there is a '_sub' attribute then we know we have other modules to go.
             elif '_sub' in v:
-                percenstring = ""
-                bmax = 0
-                for _, val in v['_stats'].items():
-                    bmax += val
-                # If there were any NON skipped tests, we now calculate the percentage which
-                # passed.
-                if bmax:
-                    percen = "{:.2f}".format((float(v['_stats']['passed']) +
-                                              float(v['_stats']['xfailed'])) / float(bmax) * 100)
-                    if float(percen) == 100.0:
-                        level = 'passed'
-                    elif float(percen) > 80.0:
-                        level = 'failed'
-                    else:
-                        level = 'error'
-                    percenstring = '<span name="blab" class="label label-{}">{}%</span>'.format(
-                        bimdict[level], percen)
-                modstring = '<span name="mod_lev" class="label label-primary">M</span>'
-                pretty_time = str(datetime.timedelta(seconds=math.ceil(v['_duration'])))
                 list_string += ('<li>{} {}<span>&nbsp;</span>'
                                 '{}{}<span style="color:#888888">&nbsp;<em>[{}]'
                                 '</em></span></li>\n').format(k,
-                                                              modstring,
-                                                              str(percenstring),
+                                                              _module_label,
+                                                              self.module_percentage(v),
                                                               self.build_li(v),
-                                                              pretty_time)
+                                                              pretty_duration(v['_duration']))
         list_string += '</ul>\n'
         return list_string
 
+    def build_tree_data(self, lev):
+        """
+        Build the same tree as build_li, but as the node data of jstree, so that the browser only
+        renders the nodes that are opened.
+        """
+        nodes = []
+        for k, v in lev['_sub'].items():
+            if 'name' in v:
+                nodes.append({
+                    'text': self.test_label(v), 'a_attr': {'href': '#{}'.format(v['name'])}})
+            elif '_sub' in v:
+                nodes.append({
+                    'text': '{} {}<span>&nbsp;</span>{}<span style="color:#888888">&nbsp;'
+                            '<em>[{}]</em></span>'.format(
+                                k, _module_label, self.module_percentage(v),
+                                pretty_duration(v['_duration'])),
+                    'children': self.build_tree_data(v)})
+        return nodes
+
+    def test_label(self, v):
+        """The label of a test in the tree"""
+        teststring = '<span name="mod_lev" class="label label-primary">T</span>'
+        label = '<span class="label label-{}">{}</span>'.format(
+            _label_classes[v['outcomes']['overall']], v['outcomes']['overall'].upper())
+        proc_name = process_pytest_path(v['name'])[-1]
+        return '{} {} {} <span style="color:#888888"><em>[{}]</em></span>'.format(
+            proc_name, teststring, label, pretty_duration(v['duration']))
+
+    def module_percentage(self, v):
+        """The label with the percentage of passed tests of a module in the tree"""
+        percenstring = ""
+        bmax = 0
+        for _, val in v['_stats'].items():
+            bmax += val
+        # If there were any NON skipped tests, we now calculate the percentage which
+        # passed.
+        if bmax:
+            percen = "{:.2f}".format((float(v['_stats']['passed']) +
+                                      float(v['_stats']['xfailed'])) / float(bmax) * 100)
+            if float(percen) == 100.0:
+                level = 'passed'
+            elif float(percen) > 80.0:
+                level = 'failed'
+            else:
+                level = 'error'
+            percenstring = '<span name="blab" class="label label-{}">{}%</span>'.format(
+                _label_classes[level], percen)
+        return percenstring
+
+
+class IncrementalReport(object):
+    """
+    Builds the report as the tests change instead of all at once at the end.
+
+    The panel of a test is rendered to a fragment file whenever the test is updated and only a
+    short summary of it is kept, along with the running counts. The report page is assembled by
+    streaming the fragments into it, split into pages of ``page_size`` tests. The test tree is
+    embedded as data that the browser renders as the nodes are opened.
+    """
+
+    def __init__(self, reporter, artifact_dir, page_size=500, only_failed=False):
+        self.reporter = reporter
+        self.artifact_dir = artifact_dir
+        self.log_dir = local(artifact_dir).strpath + "/"
+        self.fragment_dir = os.path.join(artifact_dir, 'report_fragments')
+        if not os.path.isdir(self.fragment_dir):
+            os.makedirs(self.fragment_dir)
+        self.page_size = page_size
+        self.only_failed = only_failed
+        self.summaries = OrderedDict()
+        self.signatures = {}
+        self.qa = []
+        self.tb_errors = {}
+        self.counts = dict.fromkeys(_colors, 0)
+        self.current_counts = dict.fromkeys(_colors, 0)
+        self.blocker_skip_count = 0
+        self.provider_skip_count = 0
+
+    @staticmethod
+    def signature(test):
+        """What the panel of a test depends on, to tell whether it has to be rendered again"""
+        statuses = sorted(
+            (when, tuple(status)) for when, status in test.get('statuses', {}).items()
+            if when != 'overall')
+        return (tuple(statuses), len(test.get('files', [])), test.get('finish_time'),
+                bool(test.get('skipped')), test.get('old', False))
+
+    def fragment_path(self, test_name):
+        digest = hashlib.sha1(test_name.encode('utf-8')).hexdigest()
+        return os.path.join(self.fragment_dir, '{}.html'.format(digest))
+
+    def _account(self, summary, change):
+        if summary is None:
+            return
+        self.counts[summary['outcomes']['overall']] += change
+        if not summary.get('old'):
+            self.current_counts[summary['outcomes']['overall']] += change
+        if 'skip_provider' in summary:
+            self.provider_skip_count += change
+        if 'skip_blocker' in summary:
+            self.blocker_skip_count += change
+
+    def update(self, test_name, test):
+        """Renders the panel of the test and updates the counts"""
+        test_data = self.reporter.process_test(test_name, test, self.log_dir, self.qa)
+        if test_data is None:
+            return
+        summary = {
+            'name': test_name,
+            'outcomes': {'overall': test_data['outcomes']['overall']},
+            'duration': test_data.get('duration', 0),
+            'old': test_data.get('old', False)}
+        for key in ('skip_blocker', 'skip_provider'):
+            if key in test_data:
+                summary[key] = test_data[key]
+        self._account(self.summaries.get(test_name), -1)
+        self._account(summary, 1)
+        self.summaries[test_name] = summary
+        self.signatures[test_name] = self.signature(test)
+        traceback = self.reporter.failure_traceback(test, test_data)
+        if traceback:
+            self.tb_errors[test_name] = traceback
+        else:
+            self.tb_errors.pop(test_name, None)
+
+        if test_data.get('duration'):
+            test_data['duration'] = pretty_duration(test_data['duration'])
+        fragment = self.reporter.template_env.get_template('test_report_panel.html').render(
+            test=test_data)
+        with io.open(self.fragment_path(test_name), 'w', encoding='utf-8') as f:
+            f.write(fragment)
+
+    def update_tests(self, artifacts, test_names):
+        for test_name in test_names:
+            if test_name in artifacts:
+                self.update(test_name, artifacts[test_name])
+
+    def sync(self, artifacts):
+        """Updates the tests that changed since their panel was rendered, eg. the old tests"""
+        for test_name, test in artifacts.items():
+            if self.signatures.get(test_name) != self.signature(test):
+                self.update(test_name, test)
+
+    def fragments(self, test_names):
+        for test_name in test_names:
+            with io.open(self.fragment_path(test_name), encoding='utf-8') as f:
+                yield f.read()
+
+    def pages(self, test_names):
+        for start in range(0, len(test_names), self.page_size):
+            yield (start // self.page_size + 1,
+                   self.fragments(test_names[start:start + self.page_size]))
+
+    def write(self, version=None, fw_version=None):
+        """Assembles the report page from the fragments"""
+        test_names = [
+            test_name for test_name, summary in self.summaries.items()
+            if not (self.only_failed and summary['outcomes']['overall'] == 'passed')]
+        tree = deepcopy(_tests_tpl)
+        tree['_sub']['tests'] = deepcopy(_tests_tpl)
+        for test_name in test_names:
+            self.reporter.build_dict(
+                test_name.replace('cfme/', ''), tree, self.summaries[test_name])
+        # Closing tags in the names must not end the script the tree is embedded in
+        tree_data = json.dumps(self.reporter.build_tree_data(tree)).replace('</', '<\\/')
+        template_data = {
+            'version': version,
+            'fw_version': fw_version,
+            'counts': self.counts,
+            'current_counts': self.current_counts,
+            'blocker_skip_count': self.blocker_skip_count,
+            'provider_skip_count': self.provider_skip_count,
+            'qa': self.qa,
+            # Only the skip tables go through the tests, the panels are in the pages
+            'tests': [self.summaries[test_name] for test_name in test_names
+                      if {'skip_blocker', 'skip_provider'} & set(self.summaries[test_name])],
+            'top10': self.reporter.top10(
+                (self.tb_errors[test_name], test_name) for test_name in test_names
+                if test_name in self.tb_errors),
+            'tree_data': tree_data,
+            'pages': self.pages(test_names),
+            'page_count': int(math.ceil(len(test_names) / float(self.page_size))),
+        }
+        self.reporter.stream_report(template_data, 'report', self.artifact_dir, 'test_report.html')
+
 
 class Reporter(ArtifactorBasePlugin, ReporterBase):
     def plugin_initialize(self):
         self.register_plugin_hook('report_test', self.report_test)
-        self.register_plugin_hook('finish_session', self.run_report)
-        self.register_plugin_hook('finish_session', self.run_provider_report)
+        self.register_plugin_hook('finish_session', self.finish_session)
         self.register_plugin_hook('build_report', self.run_report)
         self.register_plugin_hook('start_test', self.start_test)
         self.register_plugin_hook('skip_test', self.skip_test)
@@ -352,8 +567,18 @@ class Reporter(ArtifactorBasePlugin, ReporterBase):
 
     def configure(self):
         self.only_failed = self.data.get('only_failed', False)
+        self.incremental = self.data.get('incremental', False)
+        self.page_size = self.data.get('page_size', 500)
+        self.index_interval = self.data.get('index_interval', 60)
+        self.incremental_report = None
+        self.changed_tests = set()
+        self.index_written = 0
         self.configured = True
 
+    def test_changed(self, test_ident):
+        if self.incremental:
+            self.changed_tests.add(test_ident)
+
     @ArtifactorBasePlugin.check_configured
     def composite_pump(self, old_artifacts):
         return None, {'old_artifacts': old_artifacts}
@@ -361,6 +586,7 @@ class Reporter(ArtifactorBasePlugin, ReporterBase):
     @ArtifactorBasePlugin.check_configured
     def skip_test(self, test_location, test_name, skip_data):
         test_ident = "{}/{}".format(test_location, test_name)
+        self.test_changed(test_ident)
         return None, {'artifacts': {test_ident: {'skipped': skip_data}}}
 
     @ArtifactorBasePlugin.check_configured
@@ -380,6 +606,7 @@ class Reporter(ArtifactorBasePlugin, ReporterBase):
     @ArtifactorBasePlugin.check_configured
     def finish_test(self, artifacts, test_location, test_name, slaveid):
         test_ident = "{}/{}".format(test_location, test_name)
+        self.test_changed(test_ident)
         overall_status = overall_test_status(artifacts[test_ident]['statuses'])
         return None, {'artifacts': {test_ident: {
             'finish_time': time.time(), 'slaveid': slaveid,
@@ -390,6 +617,7 @@ class Reporter(ArtifactorBasePlugin, ReporterBase):
     def report_test(self, artifacts, test_location, test_name, test_xfail, test_when, test_outcome,
                     test_phase_duration):
         test_ident = "{}/{}".format(test_location, test_name)
+        self.test_changed(test_ident)
         ret_dict = {
             'artifacts': {
                 test_ident: {
@@ -416,7 +644,33 @@ class Reporter(ArtifactorBasePlugin, ReporterBase):
 
     @ArtifactorBasePlugin.check_configured
     def run_report(self, old_artifacts, artifact_dir, version=None, fw_version=None):
-        self._run_report(old_artifacts, artifact_dir, version, fw_version)
+        if self.incremental:
+            self.update_report(old_artifacts, artifact_dir, version, fw_version)
+        else:
+            self._run_report(old_artifacts, artifact_dir, version, fw_version)
+
+    def update_report(self, old_artifacts, artifact_dir, version=None, fw_version=None,
+                      final=False):
+        """Renders the tests changed since the last update and writes the report now and then"""
+        if self.incremental_report is None:
+            self.incremental_report = IncrementalReport(
+                self, artifact_dir, page_size=self.page_size, only_failed=self.only_failed)
+            # The old tests of a composite run only come with the artifacts
+            final = True
+        changed_tests, self.changed_tests = self.changed_tests, set()
+        if final:
+            self.incremental_report.sync(old_artifacts)
+        else:
+            self.incremental_report.update_tests(old_artifacts, changed_tests)
+        if final or time.time() - self.index_written >= self.index_interval:
+            self.incremental_report.write(version, fw_version)
+            self.index_written = time.time()
+
+    @ArtifactorBasePlugin.check_configured
+    def finish_session(self, old_artifacts, artifact_dir, version=None, fw_version=None):
+        if self.incremental:
+            self.update_report(old_artifacts, artifact_dir, version, fw_version, final=True)
+        self._run_provider_report(old_artifacts, artifact_dir, version, fw_version)
 
     @ArtifactorBasePlugin.check_configured
     def run_provider_report(self, old_artifacts, artifact_dir, version=None, fw_version=None):
@@ -21,6 +21,7 @@ already been used, it will die
 
 """
 import atexit
+import base64
 import subprocess
 from threading import RLock
 
@@ -28,11 +29,12 @@ import diaper
 import os
 import pytest
 
-from artifactor import ArtifactorClient
+from artifactor import ArtifactorClient, spool_artifact
 from cfme.utils.blockers import BZ, Blocker
 from cfme.utils.conf import env, credentials
-from cfme.utils.log import logger
+from cfme.utils.log import artifactor_handler, logger
 from cfme.utils.net import random_port, net_check
+from cfme.utils.path import log_path
 from cfme.utils.wait import wait_for
 from cfme.fixtures.pytest_store import write_line, store
 from cfme.markers.polarion import extract_polarion_ids
@@ -133,7 +135,6 @@ def pytest_configure(config):
         art_client.ready = True
     else:
         config._art_proc = None
-    from cfme.utils.log import artifactor_handler
     artifactor_handler.artifactor = art_client
     if store.slave_manager:
         artifactor_handler.slaveid = store.slaveid
@@ -162,6 +163,25 @@ def fire_art_test_hook(node, hook, **hook_args):
         **hook_args)
 
 
+def fire_art_test_filedump(node, contents, contents_base64=False, mode="w", **hook_args):
+    """Dumps an artifact of the test through the spool dir instead of the artifactor socket
+
+    The contents are written to the spool dir shared with the artifactor server and only the path
+    and hash of the file are sent with the ``filedump`` hook. Other arguments go to the hook.
+    """
+    client = getattr(node.config, '_art_client', None)
+    if not client:
+        fire_art_test_hook(
+            node, 'filedump', contents=contents, contents_base64=contents_base64, mode=mode,
+            **hook_args)
+        return
+    if contents_base64:
+        contents = base64.b64decode(contents)
+    artifact_dir = env.get('artifactor', {}).get('artifact_dir', log_path.join('artifacts').strpath)
+    path, content_hash = spool_artifact(artifact_dir, contents)
+    fire_art_test_hook(node, 'filedump', path=path, content_hash=content_hash, **hook_args)
+
+
 @pytest.mark.hookwrapper
 def pytest_runtest_protocol(item):
     global session_ver
@@ -217,6 +237,8 @@ def pytest_runtest_protocol(item):
                 blockers.append(Blocker.parse(blocker).url)
     else:
         blockers = []
+    # Records logged until now belong to the previous test
+    artifactor_handler.flush()
     fire_art_test_hook(
         item, 'pre_start_test',
         slaveid=store.slaveid, ip=ip)
@@ -231,6 +253,8 @@ def pytest_runtest_teardown(item, nextitem):
     name, location = get_test_idents(item)
     app = find_appliance(item)
     ip = app.hostname
+    # Records of this test must make it into its log before it is finished
+    artifactor_handler.flush()
     fire_art_test_hook(
         item, 'finish_test',
         slaveid=store.slaveid, ip=ip, wait_for_task=True)
@@ -300,6 +324,7 @@ def shutdown(config):
         with lock:
             proc = config._art_proc
             if proc:
+                artifactor_handler.flush()
                 if not store.slave_manager:
                     write_line('collecting artifacts')
                     fire_art_hook(config, 'finish_session')
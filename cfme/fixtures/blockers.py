@@ -33,15 +33,7 @@ def blockers(uses_blockers, meta):
     Returns:
         List of :py:class:`utils.blockers.Blocker` instances.
     """
-    result = []
-    for blocker in meta.get("blockers", []):
-        if isinstance(blocker, int):
-            result.append(Blocker.parse("BZ#{}".format(blocker)))
-        elif isinstance(blocker, Blocker):
-            result.append(blocker)
-        else:
-            result.append(Blocker.parse(blocker))
-    return result
+    return [Blocker.parse(blocker) for blocker in meta.get("blockers", [])]
 
 
 @pytest.fixture(scope="function")
@@ -73,11 +65,7 @@ def pytest_collection_modifyitems(session, config, items):
         if "blockers" not in item._metadata:
             continue
         for blocker in item._metadata["blockers"]:
-            if isinstance(blocker, int):
-                # TODO: DRY
-                blocker_object = Blocker.parse("BZ#{}".format(blocker))
-            else:
-                blocker_object = Blocker.parse(blocker)
+            blocker_object = Blocker.parse(blocker)
             if blocker_object.blocks:
                 blocking.add(blocker_object)
     if blocking:
@@ -92,9 +80,8 @@ def pytest_collection_modifyitems(session, config, items):
                 store.terminalreporter.write(
                     "  https://bugzilla.redhat.com/show_bug.cgi?id={}\n\n".format(bug.id))
             elif isinstance(blocker, GH):
-                bug = blocker.data
-                store.terminalreporter.write("- {}\n".format(str(bug)))
-                store.terminalreporter.write("  {}\n".format(bug.title))
+                store.terminalreporter.write("- {}\n".format(str(blocker)))
+                store.terminalreporter.write("  {}\n".format(blocker.issue_data["title"]))
             else:
                 store.terminalreporter.write("- {}\n".format(str(blocker.data)))
     else:
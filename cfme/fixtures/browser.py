@@ -9,7 +9,7 @@ from cfme.utils.browser import take_screenshot
 from cfme.utils.datafile import template_env
 from cfme.utils.log import logger
 from cfme.utils.path import log_path, project_path
-from cfme.fixtures.artifactor_plugin import fire_art_test_hook
+from cfme.fixtures.artifactor_plugin import fire_art_test_filedump, fire_art_test_hook
 from cfme.utils.appliance import find_appliance
 browser_fixtures = {'browser'}
 
@@ -50,13 +50,13 @@ def pytest_exception_interact(node, call, report):
         last_lines, call.excinfo.type.__name__,
         val.encode('ascii', 'xmlcharrefreplace')
     )
-    fire_art_test_hook(
-        node, 'filedump',
+    fire_art_test_filedump(
+        node,
         description="Traceback", contents=report.longreprtext, file_type="traceback",
         display_type="danger", display_glyph="align-justify", group_id="pytest-exception",
         slaveid=store.slaveid)
-    fire_art_test_hook(
-        node, 'filedump',
+    fire_art_test_filedump(
+        node,
         description="Short traceback", contents=short_tb, file_type="short_tb",
         display_type="danger", display_glyph="align-justify", group_id="pytest-exception",
         slaveid=store.slaveid)
@@ -97,14 +97,14 @@ def pytest_exception_interact(node, call, report):
     template_data['screenshot'] = screenshot.png
     template_data['screenshot_error'] = screenshot.error
     if screenshot.png:
-        fire_art_test_hook(
-            node, 'filedump',
+        fire_art_test_filedump(
+            node,
             description="Exception screenshot", file_type="screenshot", mode="wb",
             contents_base64=True, contents=template_data['screenshot'], display_glyph="camera",
             group_id="pytest-exception", slaveid=store.slaveid)
     if screenshot.error:
-        fire_art_test_hook(
-            node, 'filedump',
+        fire_art_test_filedump(
+            node,
             description="Screenshot error", mode="w", contents_base64=False,
             contents=template_data['screenshot_error'], display_type="danger",
             group_id="pytest-exception", slaveid=store.slaveid)
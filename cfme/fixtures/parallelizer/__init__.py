@@ -25,16 +25,25 @@ The Workflow
 - After all slaves are shut down, the master will do its end-of-session reporting as usual, and
   shut down
 
+Slaves can be added and retired while the session runs:
+
+- With ``--parallel-control``, the master listens on a control socket, which
+  ``scripts/parallelizer_ctl.py`` uses to add appliances, retire slaves and list them
+- With ``--sprout-min-appliances``, testing starts as soon as that many Sprout appliances are ready
+  and the master polls the Sprout pool to add the rest as they are delivered
+- A retired slave gets no more tests, finishes the group it is running and shuts down; groups
+  already planned for it by the ``duration`` and ``provider`` schedulers are replanned onto the
+  other slaves, and new slaves take over queued groups from the busiest ones
+
 """
 from itertools import groupby
 
 
 import difflib
-import json
 import os
 import signal
 import subprocess
-from collections import defaultdict, deque, namedtuple
+from collections import deque, namedtuple
 from datetime import datetime
 from itertools import count
 
@@ -49,11 +58,17 @@ from _pytest import runner
 
 from cfme.fixtures import terminalreporter
 from cfme.fixtures.parallelizer import remote
+from cfme.fixtures.parallelizer.allocator import ProviderAllocator, ProviderSetupCosts
+from cfme.fixtures.parallelizer.transport import TRANSPORTS, master_transport
+from cfme.fixtures.parallelizer.scheduler import (
+    DEFAULT_PROVIDER_SWITCH_COST, DurationRecorder, DurationScheduler, ScheduledGroup,
+    providers_of_tests, split_by_param_id)
 from cfme.fixtures.pytest_store import store
 from cfme.utils import at_exit, conf
 from cfme.utils.log import create_sublogger
-from cfme.utils.path import conf_path
-from cfme.test_framework.appliance import PLUGIN_KEY as APPLIANCE_PLUGIN
+from cfme.utils.path import conf_path, log_path
+from cfme.utils.providers import save_provider_parametrization
+from cfme.test_framework.appliance import PLUGIN_KEY as APPLIANCE_PLUGIN, appliances_from_cli
 
 # Initialize slaveid to None, indicating this as the master process
 # slaves will set this to a unique string when they're initialized
@@ -63,12 +78,43 @@ if not conf.runtime['env'].get('ts'):
     ts = str(time())
     conf.runtime['env']['ts'] = ts
 
+#: pytest cache key under which the master publishes its control socket endpoint
+CONTROL_ENDPOINT_CACHE_KEY = 'parallelizer/control_endpoint'
+#: seconds between polls of the Sprout pool for appliances that became ready
+SPROUT_POLL_INTERVAL = 60
+
 
 def pytest_addhooks(pluginmanager):
     from . import hooks
     pluginmanager.add_hookspecs(hooks)
 
 
+def pytest_addoption(parser):
+    group = parser.getgroup('cfme')
+    group.addoption(
+        '--parallel-scheduler', dest='parallel_scheduler', default='module',
+        choices=('module', 'duration', 'provider'),
+        help='How the parallelizer distributes tests to slaves. "module" sends tests grouped '
+             'by module in collection order, "duration" uses recorded test durations to pack '
+             'groups longest-first and lets idle slaves steal queued groups, "provider" plans '
+             'provider-to-slave assignments up front weighing provider setup cost against '
+             'idle time.')
+    group.addoption(
+        '--parallel-provider-switch-cost', dest='parallel_provider_switch_cost', type=float,
+        default=DEFAULT_PROVIDER_SWITCH_COST,
+        help='Estimated seconds it takes to set up a provider on a slave, used by the '
+             '"duration" and "provider" parallel schedulers until real setup times are known.')
+    group.addoption(
+        '--parallel-transport', dest='parallel_transport', default='json', choices=TRANSPORTS,
+        help='How the parallelizer slaves send events to the master. "json" sends and '
+             'acknowledges every event on its own, "msgpack" batches test reports in a compact '
+             'binary format and acknowledges them cumulatively.')
+    group.addoption(
+        '--parallel-control', dest='parallel_control', action='store_true', default=False,
+        help='Open a control socket on the parallelizer master so appliances can be added '
+             'and slaves retired during the run, see scripts/parallelizer_ctl.py.')
+
+
 @pytest.mark.trylast
 def pytest_configure(config):
     """Configures the parallel session, then fires pytest_parallel_configured."""
@@ -76,8 +122,10 @@ def pytest_configure(config):
     holder = config.pluginmanager.get_plugin(APPLIANCE_PLUGIN)
 
     appliances = holder.appliances
+    # an elastic session starts parallel even with one appliance, more are going to join
+    elastic = config.getoption('parallel_control') or config.getoption('sprout_min_appliances')
 
-    if len(appliances) > 1:
+    if len(appliances) > 1 or elastic:
         session = ParallelSession(config, appliances)
         config.pluginmanager.register(session, "parallel_session")
         store.parallelizer_role = 'master'
@@ -109,6 +157,7 @@ class SlaveDetail(object):
     id = attr.ib(default=attr.Factory(
         lambda: next(SlaveDetail.slaveid_generator)))
     forbid_restart = attr.ib(default=False, init=False)
+    retiring = attr.ib(default=False, init=False)
     tests = attr.ib(default=attr.Factory(set), repr=False)
     process = attr.ib(default=None, repr=False)
 
@@ -145,11 +194,18 @@ class ParallelSession(object):
         self.trdist = None
         self.slaves = {}
         self.test_groups = self._test_item_generator()
+        self.durations = DurationRecorder(config.cache)
+        self.scheduler = None
 
         self._pool = []
         from cfme.utils.conf import cfme_data
         self.provs = sorted(set(cfme_data['management_systems'].keys()),
                             key=len, reverse=True)
+        self.setup_costs = ProviderSetupCosts(
+            config.cache,
+            provider_types={key: data.get('type')
+                            for key, data in cfme_data['management_systems'].items()},
+            default=config.getoption('parallel_provider_switch_cost'))
         self.used_prov = set()
 
         self.failed_slave_test_groups = deque()
@@ -163,6 +219,17 @@ class ParallelSession(object):
         ctx = zmq.Context.instance()
         self.sock = ctx.socket(zmq.ROUTER)
         self.sock.bind(zmq_endpoint)
+        self.transport = master_transport(config.getoption('parallel_transport'), self.sock)
+
+        self.control = None
+        if config.getoption('parallel_control'):
+            control_endpoint = 'ipc://{}'.format(
+                config.cache.makedir('parallelize').join('{}-control'.format(os.getpid())))
+            self.control = ctx.socket(zmq.REP)
+            self.control.bind(control_endpoint)
+            config.cache.set(CONTROL_ENDPOINT_CACHE_KEY, control_endpoint)
+        self.runtest_loop_started = False
+        self._sprout_last_poll = time()
 
         # clean out old slave config if it exists
         slave_config = conf_path.join('slave_config.yaml')
@@ -188,12 +255,88 @@ class ParallelSession(object):
         for slave in sorted(self.slaves):
             self.print_message("using appliance {}".format(self.slaves[slave].appliance.url),
                 slave, green=True)
+        if self.control is not None:
+            self.print_message('listening for slave control commands on {}'.format(
+                control_endpoint))
+
+    def add_slave(self, appliance):
+        """Add a slave for an appliance, starting it right away if tests are already running"""
+        slave = SlaveDetail(appliance=appliance)
+        self.slaves[slave.id] = slave
+        self.appliances.append(appliance)
+        self.print_message("using appliance {}".format(appliance.url), slave, green=True)
+        if self.scheduler is not None:
+            self.scheduler.add_slave(slave.id)
+        if self.runtest_loop_started:
+            slave.start()
+        return slave
+
+    def retire_slave(self, slave):
+        """Let a slave finish the tests it has, then shut it down and replan its queued tests"""
+        slave.retiring = True
+        self.print_message('retiring after its current tests', slave, yellow=True)
+        self._forget_slave(slave)
+
+    def _forget_slave(self, slave):
+        # replan the groups a scheduler still had queued for the slave
+        if self.scheduler is not None and slave.id in self.scheduler.slave_ids:
+            moved = self.scheduler.remove_slave(slave.id)
+            if moved:
+                self.print_message('replanned {} queued test groups of {}'.format(
+                    moved, slave.id))
+
+    def _control_audit(self):
+        # handle one pending control command, if any
+        if self.control is None or not self.control.poll(0):
+            return
+        command = self.control.recv_json()
+        try:
+            reply = self._control_command(**command)
+        except Exception as e:
+            self.log.exception(e)
+            reply = {'error': '{}: {}'.format(type(e).__name__, e)}
+        self.control.send_json(reply)
+
+    def _control_command(self, command, **kwargs):
+        if command == 'add':
+            added = []
+            for appliance in appliances_from_cli([{'hostname': kwargs['appliance']}]):
+                added.append(self.add_slave(appliance).id)
+            return {'added': added}
+        elif command == 'retire':
+            slave = self.slaves[kwargs['slave']]
+            self.retire_slave(slave)
+            return {'retired': slave.id}
+        elif command == 'list':
+            return {'slaves': [
+                {'id': slave.id, 'appliance': slave.appliance.url, 'tests': len(slave.tests),
+                 'retiring': slave.retiring}
+                for slave in sorted(self.slaves.values(), key=lambda slave: slave.id)]}
+        raise ValueError('Unknown command {!r}'.format(command))
+
+    def _sprout_audit(self):
+        # add appliances that Sprout delivered after the session started
+        mgr = getattr(self.config, '_sprout_mgr', None)
+        if (mgr is None or not self.config.getoption('sprout_min_appliances') or
+                time() - self._sprout_last_poll < SPROUT_POLL_INTERVAL):
+            return
+        self._sprout_last_poll = time()
+        from cfme.test_framework.sprout.plugin import sprout_appliance_args
+        try:
+            pool = mgr.request_check()
+        except Exception as e:
+            self.log.exception(e)
+            return
+        known_hosts = {appliance.hostname for appliance in self.appliances}
+        for sprout_appliance in mgr.ready_appliances(pool):
+            for appliance in appliances_from_cli([sprout_appliance_args(sprout_appliance)]):
+                if appliance.hostname not in known_hosts:
+                    self.add_slave(appliance)
+        if pool['fulfilled']:
+            # everything was delivered, no need to poll any further
+            self.config.option.sprout_min_appliances = 0
 
     def _slave_audit(self):
-        # XXX: There is currently no mechanism to add or remove slave_urls, short of
-        #      firing up the debugger and doing it manually. This is making room for
-        #      planned future abilities to dynamically add and remove slaves via automation
-
         # check for unexpected slave shutdowns and redistribute tests
         for slave in self.slaves.values():
             returncode = slave.poll()
@@ -220,6 +363,7 @@ class ParallelSession(object):
                     self.config.hook.pytest_miq_node_shutdown(
                         config=self.config, nodeinfo=slave.appliance.url)
                     del self.slaves[slave.id]
+                    self._forget_slave(slave)
                 else:
                     # no hook call here, a future audit will handle the fallout
                     self.print_message(
@@ -233,20 +377,17 @@ class ParallelSession(object):
     def send(self, slave, event_data):
         """Send data to slave.
 
-        ``event_data`` will be serialized as JSON, and so must be JSON serializable
+        ``event_data`` will be serialized by the session's transport (JSON by default),
+        and so must be JSON serializable
 
         """
-        event_json = json.dumps(event_data)
-        self.sock.send_multipart([slave.id, '', event_json])
+        self.transport.send(slave.id, event_data)
 
     def recv(self):
-        # poll the zmq socket, populate the recv queue deque with responses
-
-        events = zmq.zmq_poll([(self.sock, zmq.POLLIN)], 50)
-        if not events:
+        # poll the transport, which may hand out several buffered events per poll
+        slaveid, event_data = self.transport.recv()
+        if event_data is None:
             return None, None, None
-        slaveid, _, event_json = self.sock.recv_multipart(flags=zmq.NOBLOCK)
-        event_data = json.loads(event_json)
         event_name = event_data.pop('_event_name')
         if slaveid not in self.slaves:
             self.log.error("message from terminated worker %s %s %s",
@@ -275,7 +416,7 @@ class ParallelSession(object):
 
     def ack(self, slave, event_name):
         """Acknowledge a slave's message"""
-        self.send(slave, 'ack {}'.format(event_name))
+        self.transport.ack(slave.id, event_name)
 
     def monitor_shutdown(self, slave):
         # non-daemon so slaves get every opportunity to shut down cleanly
@@ -389,12 +530,15 @@ class ParallelSession(object):
         """
         # Build master collection for slave diffing and distribution
         self.collection = [item.nodeid for item in self.session.items]
+        # Slaves use the providers the master filtered instead of filtering them again
+        save_provider_parametrization(self.config.cache, conf.runtime['env']['ts'])
 
         # Fire up the workers after master collection is complete
         # master and the first slave share an appliance, this is a workaround to prevent a slave
         # from altering an appliance while master collection is still taking place
         for slave in self.slaves.values():
             slave.start()
+        self.runtest_loop_started = True
 
         try:
             self.print_message("Waiting for {} slave collections".format(len(self.slaves)),
@@ -404,7 +548,9 @@ class ParallelSession(object):
             terminalreporter.disable()
 
             while True:
-                # spawn/kill/replace slaves if needed
+                # add/retire slaves on request, spawn/kill/replace slaves if needed
+                self._control_audit()
+                self._sprout_audit()
                 self._slave_audit()
 
                 if not self.slaves:
@@ -439,7 +585,11 @@ class ParallelSession(object):
                     else:
                         self.ack(slave, event_name)
                 elif event_name == 'need_tests':
-                    self.send_tests(slave)
+                    if slave.retiring:
+                        # an empty group makes the slave shut down after its current test
+                        self.send(slave, [])
+                    else:
+                        self.send_tests(slave)
                     self.log.info('starting master test distribution')
                 elif event_name == 'runtest_logstart':
                     self.ack(slave, event_name)
@@ -450,9 +600,13 @@ class ParallelSession(object):
                 elif event_name == 'runtest_logreport':
                     self.ack(slave, event_name)
                     report = unserialize_report(event_data['report'])
+                    self.durations.record(report.nodeid, report.duration)
                     if report.when in ('call', 'teardown'):
                         slave.tests.discard(report.nodeid)
                     self.trdist.runtest_logreport(slave.id, report)
+                elif event_name == 'provider_setup':
+                    self.ack(slave, event_name)
+                    self.setup_costs.record(event_data['provider_type'], event_data['duration'])
                 elif event_name == 'internalerror':
                     self.ack(slave, event_name)
                     self.print_message(event_data['message'], slave, purple=True)
@@ -462,6 +616,7 @@ class ParallelSession(object):
                         config=self.config, nodeinfo=slave.appliance.url)
                     self.ack(slave, event_name)
                     del self.slaves[slave.id]
+                    self._forget_slave(slave)
                     self.monitor_shutdown(slave)
 
                 # total slave spawn count * 3, to allow for each slave's initial spawn
@@ -482,6 +637,11 @@ class ParallelSession(object):
         # Suppress other runtestloop calls
         return True
 
+    def pytest_sessionfinish(self):
+        # keep the measured durations for the next session's schedulers
+        self.durations.save()
+        self.setup_costs.save()
+
     def _test_item_generator(self):
         for tests in self._modscope_item_generator():
             yield tests
@@ -504,30 +664,67 @@ class ParallelSession(object):
 
     def _modscope_id_splitter(self, module_items):
         # given a list of item ids from one test module, break up tests into groups with the same id
-        parametrized_ids = defaultdict(list)
-        for item in module_items:
-            if '[' in item:
-                # split on the leftmost bracket, then strip everything after the rightmight bracket
-                # so 'test_module.py::test_name[parametrized_id]' becomes 'parametrized_id'
-                parametrized_id = item.split('[')[1].rstrip(']')
-            else:
-                # splits failed, item has no parametrized id
-                parametrized_id = 'no params'
-            parametrized_ids[parametrized_id].append(item)
-
-        for id, tests in parametrized_ids.items():
+        for id, tests in split_by_param_id(module_items).items():
             if tests:
                 self.log.info('sent tests with param {} {!r}'.format(id, tests))
                 yield tests
 
+    def _scheduled_groups(self):
+        groups = []
+        for test_group in self.test_groups:
+            provs = providers_of_tests(test_group, self.provs)
+            groups.append(ScheduledGroup(
+                tests=test_group,
+                provider=provs[0] if provs else None,
+                duration=self.durations.estimate_group(test_group)))
+        return groups
+
+    def _create_scheduler(self):
+        groups = self._scheduled_groups()
+        if self.config.getoption('parallel_scheduler') == 'provider':
+            self.scheduler = ProviderAllocator(
+                groups, sorted(self.slaves), self.setup_costs,
+                provider_limit=self.config.getoption('provider_limit'))
+            report = self.scheduler.report()
+            with log_path.join('provider_allocation.log').open('w') as f:
+                f.write('\n'.join(report) + '\n')
+            for line in report[:2]:
+                self.print_message(line)
+        else:
+            self.scheduler = DurationScheduler(
+                groups, sorted(self.slaves),
+                provider_switch_cost=self.config.getoption('parallel_provider_switch_cost'))
+            self.print_message('planned {} test groups, estimated slave loads: {}'.format(
+                len(groups), ', '.join(
+                    '{} {:.0f}s'.format(slave_id, load)
+                    for slave_id, load in sorted(self.scheduler.queued_load.items()))))
+
+    def _get_scheduled(self, slave):
+        if self.scheduler is None:
+            self._create_scheduler()
+        stolen = self.scheduler.stolen
+        group = self.scheduler.next_group(slave.id)
+        if group is None:
+            return []
+        if self.scheduler.stolen > stolen:
+            self.print_message('{} stole {} queued tests (~{:.0f}s)'.format(
+                slave.id, len(group.tests), group.duration), slave)
+        # forget the providers the slave has nothing left for, the list would only ever grow
+        queued = self.scheduler.queued_providers(slave.id)
+        slave.provider_allocation = [
+            provider for provider in slave.provider_allocation
+            if provider == group.provider or provider in queued]
+        if group.provider is not None and group.provider not in slave.provider_allocation:
+            slave.provider_allocation.append(group.provider)
+        return group.tests
+
     def get(self, slave):
+        if self.config.getoption('parallel_scheduler') in ('duration', 'provider'):
+            # planned schedulers, no appliance cleansing needed
+            return self._get_scheduled(slave)
 
         def provs_of_tests(test_group):
-            found = set()
-            for test in test_group:
-                found.update(pv for pv in self.provs
-                             if '[' in test and pv in test)
-            return sorted(found)
+            return providers_of_tests(test_group, self.provs)
 
         if not self._pool:
             for test_group in self.test_groups:
@@ -0,0 +1,310 @@
+"""Provider-affinity allocation for the parallelizer
+
+Setting up a provider on an appliance (adding it and waiting for the refresh) takes minutes, and
+the default scheduling falls back to cleansing an appliance of all its providers whenever no test
+group fits the providers a slave already has. On large runs that means the same providers get
+torn down and re-added many times.
+
+The :py:class:`ProviderAllocator`, enabled with ``--parallel-scheduler provider``, plans the
+whole collection before any test is sent:
+
+- the tests of every provider are kept together on as few slaves as possible, a provider is
+  only spread over more slaves when its tests would otherwise take longer than the whole run
+  should take, counting the setup cost of each extra copy
+- a slave may host several providers, up to ``--provider-limit``; beyond that each additional
+  provider evicts one, which is counted in the plan
+- the setup cost of each provider type is measured by the slaves and stored in the pytest cache,
+  so the plan gets more accurate from run to run
+- a slave that runs out of planned work only takes over tests of a provider it does not have yet
+  when the remaining work is worth more than setting the provider up
+
+The plan is summarized on the terminal and written in full to ``log/provider_allocation.log``.
+
+"""
+from collections import OrderedDict, defaultdict, deque
+
+import attr
+
+from cfme.fixtures.parallelizer.scheduler import DEFAULT_PROVIDER_SWITCH_COST
+
+#: pytest cache key under which provider setup durations per provider type are stored
+SETUP_COSTS_CACHE_KEY = 'parallelizer/provider_setup'
+
+
+class ProviderSetupCosts(object):
+    """Measured provider setup durations, per provider type
+
+    Args:
+        cache: a pytest ``config.cache`` instance or ``None`` to keep the data in memory only
+        provider_types: mapping of provider key to provider type
+        default: setup cost to assume for provider types that were never measured
+    """
+    def __init__(self, cache=None, provider_types=None, default=DEFAULT_PROVIDER_SWITCH_COST):
+        self.cache = cache
+        self.provider_types = provider_types or {}
+        self.default = default
+        self.known = dict(cache.get(SETUP_COSTS_CACHE_KEY, {})) if cache is not None else {}
+        self.current = defaultdict(list)
+
+    def record(self, provider_type, duration):
+        self.current[provider_type].append(duration)
+
+    def cost(self, provider_key):
+        """Return the expected setup duration of a provider in seconds"""
+        provider_type = self.provider_types.get(provider_key, provider_key)
+        measured = self.current.get(provider_type)
+        if measured:
+            return sum(measured) / len(measured)
+        return self.known.get(provider_type, self.default)
+
+    def save(self):
+        if self.cache is None or not self.current:
+            return
+        costs = dict(self.known)
+        for provider_type, measured in self.current.items():
+            costs[provider_type] = sum(measured) / len(measured)
+        self.cache.set(SETUP_COSTS_CACHE_KEY, costs)
+
+
+@attr.s(hash=False)
+class SlavePlan(object):
+    id = attr.ib()
+    queue = attr.ib(default=attr.Factory(deque), repr=False)
+    providers = attr.ib(default=attr.Factory(list))
+    planned_providers = attr.ib(default=attr.Factory(list))
+    load = attr.ib(default=0.0)
+    setup_time = attr.ib(default=0.0)
+    setups = attr.ib(default=0)
+    evictions = attr.ib(default=0)
+
+
+class ProviderAllocator(object):
+    """Plans provider-to-slave assignments for the whole collection and hands out test groups
+
+    Args:
+        groups: iterable of :py:class:`ScheduledGroup` with estimated durations
+        slave_ids: ids of the slaves to plan for
+        setup_costs: :py:class:`ProviderSetupCosts` instance
+        provider_limit: number of providers an appliance may host at once, ``0`` for no limit
+    """
+    def __init__(self, groups, slave_ids, setup_costs, provider_limit=1):
+        self.setup_costs = setup_costs
+        self.provider_limit = provider_limit
+        self.slaves = OrderedDict((slave_id, SlavePlan(slave_id)) for slave_id in slave_ids)
+        self.provider_work = OrderedDict()
+        self.copies = {}
+        self.stolen = 0
+        self.late_setups = 0
+        self._plan(list(groups))
+
+    def _target_makespan(self, provider_groups, free_groups):
+        total = sum(group.duration for group in free_groups)
+        for provider, groups in provider_groups.items():
+            total += sum(group.duration for group in groups) + self.setup_costs.cost(provider)
+        return total / max(len(self.slaves), 1)
+
+    def _copies(self, provider, work, target):
+        # spread a provider over more slaves only when its work alone exceeds the target,
+        # every extra copy costs another setup so take that into account
+        setup = self.setup_costs.cost(provider)
+        copies = 1
+        while copies < len(self.slaves) and work / copies + setup > target:
+            copies += 1
+        return copies
+
+    def _plan(self, groups):
+        if not self.slaves:
+            return
+        provider_groups = OrderedDict()
+        free_groups = []
+        for group in groups:
+            if group.provider is None:
+                free_groups.append(group)
+            else:
+                provider_groups.setdefault(group.provider, []).append(group)
+        target = self._target_makespan(provider_groups, free_groups)
+
+        chunks = []
+        for provider, provider_group_list in provider_groups.items():
+            work = sum(group.duration for group in provider_group_list)
+            self.provider_work[provider] = work
+            copies = self.copies[provider] = self._copies(provider, work, target)
+            bins = [[0.0, []] for _ in range(copies)]
+            for group in sorted(provider_group_list, key=lambda group: -group.duration):
+                bin_ = min(bins, key=lambda bin_: bin_[0])
+                bin_[0] += group.duration
+                bin_[1].append(group)
+            chunks.extend((provider, work, chunk) for work, chunk in bins if chunk)
+
+        # biggest provider chunks first, each onto the slave that finishes it earliest
+        for provider, work, chunk in sorted(chunks, key=lambda chunk: -chunk[1]):
+            slave = min(self.slaves.values(), key=lambda slave: self._finish(slave, provider, work))
+            self._assign(slave, provider, work, chunk)
+
+        # tests without providers fill up whatever is left
+        for group in sorted(free_groups, key=lambda group: -group.duration):
+            slave = min(self.slaves.values(), key=lambda slave: slave.load)
+            slave.queue.append(group)
+            slave.load += group.duration
+
+    def _finish(self, slave, provider, work):
+        if provider in slave.providers:
+            return slave.load + work
+        return slave.load + work + self.setup_costs.cost(provider)
+
+    def _add_provider(self, slave, provider):
+        setup = self.setup_costs.cost(provider)
+        if self.provider_limit and len(slave.providers) >= self.provider_limit:
+            slave.evictions += 1
+            slave.providers.pop(0)
+        slave.providers.append(provider)
+        slave.planned_providers.append(provider)
+        slave.setups += 1
+        slave.setup_time += setup
+        slave.load += setup
+
+    def _assign(self, slave, provider, work, chunk):
+        if provider not in slave.providers:
+            self._add_provider(slave, provider)
+        slave.queue.extend(chunk)
+        slave.load += work
+
+    @property
+    def slave_ids(self):
+        return list(self.slaves)
+
+    def queued_providers(self, slave_id):
+        """Return the providers of the groups still queued for a slave"""
+        slave = self.slaves.get(slave_id)
+        return {group.provider for group in slave.queue} if slave is not None else set()
+
+    def add_slave(self, slave_id):
+        """Start planning for a new slave, moving queued groups to it to even out the load"""
+        self.slaves.setdefault(slave_id, SlavePlan(slave_id))
+        self.rebalance()
+
+    def remove_slave(self, slave_id):
+        """Stop planning for a slave, its queued groups are planned onto the remaining slaves"""
+        slave = self.slaves.pop(slave_id, None)
+        if slave is None or not self.slaves:
+            return 0
+        groups = list(slave.queue)
+        provider_groups = OrderedDict()
+        for group in groups:
+            provider_groups.setdefault(group.provider, []).append(group)
+        chunks = [(provider, sum(group.duration for group in chunk), chunk)
+                  for provider, chunk in provider_groups.items()]
+        for provider, work, chunk in sorted(chunks, key=lambda chunk: -chunk[1]):
+            if provider is None:
+                target = min(self.slaves.values(), key=lambda slave: slave.load)
+                target.queue.extend(chunk)
+                target.load += work
+            else:
+                target = min(self.slaves.values(),
+                             key=lambda slave: self._finish(slave, provider, work))
+                self._assign(target, provider, work, chunk)
+        return len(groups)
+
+    def rebalance(self):
+        """Move tail groups from the busiest slave to the least busy one while it helps
+
+        Groups keep to slaves that have their provider unless moving them pays for the setup.
+        """
+        moved = 0
+        remaining = sum(len(slave.queue) for slave in self.slaves.values())
+        while len(self.slaves) > 1 and moved < remaining:
+            busiest = max(self.slaves.values(), key=lambda slave: slave.load)
+            idlest = min(self.slaves.values(), key=lambda slave: slave.load)
+            if not busiest.queue:
+                break
+            group = busiest.queue[-1]
+            if group.provider is None:
+                finish = idlest.load + group.duration
+            else:
+                finish = self._finish(idlest, group.provider, group.duration)
+            if finish >= busiest.load:
+                break
+            busiest.queue.pop()
+            busiest.load = max(busiest.load - group.duration, 0.0)
+            if group.provider is None:
+                idlest.queue.append(group)
+                idlest.load += group.duration
+            else:
+                self._assign(idlest, group.provider, group.duration, [group])
+            moved += 1
+        return moved
+
+    @property
+    def setups(self):
+        return sum(slave.setups for slave in self.slaves.values())
+
+    @property
+    def evictions(self):
+        return sum(slave.evictions for slave in self.slaves.values())
+
+    @property
+    def makespan(self):
+        return max([slave.load for slave in self.slaves.values()] or [0.0])
+
+    def report(self):
+        """Return the plan as a list of lines"""
+        lines = [
+            'provider allocation plan for {} slaves and {} providers'.format(
+                len(self.slaves), len(self.provider_work)),
+            'estimated makespan {:.0f}s, {} provider setups, {} of them on extra slaves, '
+            '{} evictions'.format(
+                self.makespan, self.setups, self.setups - len(self.provider_work),
+                self.evictions),
+        ]
+        for slave in self.slaves.values():
+            lines.append(
+                '  {}: {} groups, load {:.0f}s, setup {:.0f}s, providers {}'.format(
+                    slave.id, len(slave.queue), slave.load, slave.setup_time,
+                    ', '.join(slave.planned_providers) or '-'))
+        for provider, work in self.provider_work.items():
+            lines.append('  {}: {:.0f}s of tests on {} slave(s), setup {:.0f}s'.format(
+                provider, work, self.copies[provider], self.setup_costs.cost(provider)))
+        return lines
+
+    def _steal(self, slave):
+        best = None
+        for victim in self.slaves.values():
+            if victim is slave:
+                continue
+            for group in victim.queue:
+                if group.provider is None or group.provider in slave.providers:
+                    benefit = group.duration
+                else:
+                    # only worth it when the victim has more of that provider queued
+                    # than it costs to set the provider up here
+                    remaining = sum(g.duration for g in victim.queue
+                                    if g.provider == group.provider)
+                    benefit = remaining - self.setup_costs.cost(group.provider)
+                    if benefit <= 0:
+                        continue
+                if best is None or benefit > best[0]:
+                    best = benefit, victim, group
+        if best is None:
+            return None
+        benefit, victim, group = best
+        victim.queue.remove(group)
+        victim.load = max(victim.load - group.duration, 0.0)
+        self.stolen += 1
+        return group
+
+    def next_group(self, slave_id):
+        """Return the next :py:class:`ScheduledGroup` for a slave, or ``None`` when done"""
+        slave = self.slaves.setdefault(slave_id, SlavePlan(slave_id))
+        if slave.queue:
+            group = slave.queue.popleft()
+            slave.load = max(slave.load - group.duration, 0.0)
+        else:
+            group = self._steal(slave)
+            if group is None:
+                return None
+        if group.provider is not None and group.provider not in slave.providers:
+            self.late_setups += 1
+            slave.providers.append(group.provider)
+            if self.provider_limit and len(slave.providers) > self.provider_limit:
+                slave.providers.pop(0)
+        return group
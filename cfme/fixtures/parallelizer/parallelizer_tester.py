@@ -5,11 +5,21 @@ Useful to make sure tests are being parallelized properly, and then reported cor
 This file is named specially to prevent being picked up by py.test's default collector, and should
 not be run during a normal test run.
 
+Run directly, it benchmarks the master side of the parallelizer transports with fake slaves::
+
+    python cfme/fixtures/parallelizer/parallelizer_tester.py --slaves 16 --transport msgpack
+
 """
+import multiprocessing
+import os
 import random
-from time import sleep
+import tempfile
+from time import sleep, time
 
 import pytest
+import zmq
+
+from cfme.fixtures.parallelizer.transport import TRANSPORTS, master_transport, slave_transport
 
 # uncommment this to slow things down, if desired
 # pytestmark= pytest.mark.usefixtures("wait")
@@ -18,7 +28,7 @@ num_copies = 20
 
 
 @pytest.fixture(
-    params=xrange(10, 10 * num_copies),
+    params=range(10, 10 * num_copies),
     autouse=True,
     scope='module',
 )
@@ -72,3 +82,85 @@ def test_fails_teardown(teardown_fail):
 @pytest.mark.skipif('True')
 def test_skipped():
     pass
+
+
+def _fake_report(slaveid, num, when):
+    nodeid = 'cfme/tests/test_fake.py::test_fake[{}-{}]'.format(slaveid, num)
+    return {
+        'nodeid': nodeid,
+        'location': ['cfme/tests/test_fake.py', num, 'test_fake[{}-{}]'.format(slaveid, num)],
+        'keywords': {'test_fake': 1, 'cfme/tests/test_fake.py': 1, 'parametrize': 1},
+        'outcome': 'passed',
+        'longrepr': None,
+        'when': when,
+        'sections': [['Captured log {}'.format(when), 'nothing to see here\n' * 5]],
+        'duration': random.random(),
+        'user_properties': [],
+    }
+
+
+def _fake_slave(transport_name, zmq_endpoint, slaveid, num_tests):
+    # sends what a slave sends for passing tests, as fast as possible
+    transport = slave_transport(transport_name, zmq_endpoint, slaveid)
+
+    def send(event_data, flush=False):
+        if transport.batched:
+            transport.buffer(event_data, flush=flush)
+        else:
+            transport.request(event_data)
+
+    for num in range(num_tests):
+        send({'_event_name': 'runtest_logstart', 'nodeid': 'test_fake[{}]'.format(num),
+              'location': ['cfme/tests/test_fake.py', num, 'test_fake']})
+        for when in ('setup', 'call', 'teardown'):
+            send({'_event_name': 'runtest_logreport',
+                  'report': _fake_report(slaveid, num, when)}, flush=when == 'teardown')
+    transport.request({'_event_name': 'shutdown'})
+
+
+def benchmark(transport_name, num_slaves=16, num_tests=500):
+    """Return how many slave messages per second the master handles with the given transport"""
+    zmq_endpoint = 'ipc://{}'.format(os.path.join(
+        tempfile.mkdtemp(prefix='parallelizer-bench-'), 'master'))
+    sock = zmq.Context.instance().socket(zmq.ROUTER)
+    sock.bind(zmq_endpoint)
+    master = master_transport(transport_name, sock)
+    slaves = [
+        multiprocessing.Process(
+            target=_fake_slave,
+            args=(transport_name, zmq_endpoint, 'slave{:02d}'.format(i), num_tests))
+        for i in range(num_slaves)]
+    start = time()
+    for slave in slaves:
+        slave.start()
+
+    received, running = 0, num_slaves
+    while running:
+        # mirror what ParallelSession.pytest_runtestloop does with each event
+        slaveid, event_data = master.recv()
+        if event_data is None:
+            continue
+        received += 1
+        event_name = event_data.pop('_event_name')
+        master.ack(slaveid, event_name)
+        if event_name == 'shutdown':
+            running -= 1
+    elapsed = time() - start
+    for slave in slaves:
+        slave.join()
+    sock.close(linger=0)
+    return received / elapsed
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark parallelizer master throughput')
+    parser.add_argument('--slaves', type=int, default=16, help='Number of fake slaves')
+    parser.add_argument('--tests', type=int, default=500, help='Number of tests per slave')
+    parser.add_argument('--transport', dest='transports', action='append', choices=TRANSPORTS,
+                        help='Transport to benchmark, all of them by default')
+    args = parser.parse_args()
+    for transport_name in args.transports or TRANSPORTS:
+        rate = benchmark(transport_name, args.slaves, args.tests)
+        print('{:>8}: {:.0f} messages/sec with {} slaves'.format(
+            transport_name, rate, args.slaves))
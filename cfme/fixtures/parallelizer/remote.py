@@ -1,13 +1,14 @@
 import json
 import signal
 
-import zmq
 from py.path import local
 
 import cfme.utils
 from cfme.utils import log
 from cfme.utils.appliance import find_appliance
 from cfme.fixtures.log import _test_status, _format_nodeid
+from cfme.fixtures.parallelizer.transport import BUFFERED_EVENTS, slave_transport
+from cfme.utils.providers import load_provider_parametrization
 
 SLAVEID = None
 
@@ -24,11 +25,8 @@ class SlaveManager(object):
         conf.clear()
         # Override the logger in utils.log
 
-        ctx = zmq.Context.instance()
-        self.sock = ctx.socket(zmq.REQ)
-        self.sock.set_hwm(1)
-        self.sock.setsockopt_string(zmq.IDENTITY, u'{}'.format(self.slaveid))
-        self.sock.connect(zmq_endpoint)
+        self.transport = slave_transport(
+            config.option.get('parallel_transport', 'json'), zmq_endpoint, self.slaveid)
 
         self.messages = {}
 
@@ -37,8 +35,14 @@ class SlaveManager(object):
     def send_event(self, name, **kwargs):
         kwargs['_event_name'] = name
         self.log.trace("sending {} {!r}".format(name, kwargs))
-        self.sock.send_json(kwargs)
-        recv = self.sock.recv_json()
+        if self.transport.batched and name in BUFFERED_EVENTS:
+            # no answer needed, send it along with the next batch
+            # the start and end of each test flush the batch so the master knows what runs
+            report = kwargs.get('report') or {}
+            self.transport.buffer(
+                kwargs, flush=name == 'runtest_logstart' or report.get('when') == 'teardown')
+            return
+        recv = self.transport.request(kwargs)
         if recv == 'die':
             self.log.info('Slave instructed to die by master; shutting down')
             raise SystemExit()
@@ -51,6 +55,10 @@ class SlaveManager(object):
         """Send a message to the master, which should get printed to the console"""
         self.send_event('message', message=message, markup=kwargs)  # message!
 
+    def pytest_sessionstart(self, session):
+        if not load_provider_parametrization(self.config.cache, conf.runtime['env']['ts']):
+            self.log.warning('provider parametrization of the master not found, filtering again')
+
     def pytest_collection_finish(self, session):
         """pytest collection hook
 
@@ -0,0 +1,291 @@
+"""Duration-aware test scheduling for the parallelizer
+
+The default parallelizer scheduling hands out test groups in collection order, which works well
+enough until one module takes far longer than everything else. This module adds an alternative,
+enabled with ``--parallel-scheduler duration``, which:
+
+- records the duration of every test node id in the pytest cache at the end of a session
+- estimates the length of every test group from the recorded durations
+- plans all groups up front, packing them longest-first onto the slave that will be free first,
+  while preferring slaves that already have the group's provider set up
+- lets a slave that ran out of planned groups steal not-yet-sent groups from the slave with the
+  most queued work
+
+There is also a small simulation harness (:py:func:`simulate`) that replays recorded durations
+against both strategies, see ``scripts/parallelizer_sim.py``.
+
+"""
+from collections import OrderedDict, defaultdict, deque
+import heapq
+
+import attr
+
+#: pytest cache key under which per-nodeid durations are stored
+DURATIONS_CACHE_KEY = 'parallelizer/durations'
+#: weight of the newest measurement when merging it with the recorded duration
+DURATION_SMOOTHING = 0.5
+#: estimate used for tests that have never been recorded, if nothing else is known
+DEFAULT_TEST_DURATION = 30.0
+#: default estimate (seconds) of setting up a provider on a slave that does not have it yet
+DEFAULT_PROVIDER_SWITCH_COST = 300.0
+
+
+def split_by_param_id(module_items):
+    """Split the node ids of a single test module into groups sharing a parametrized id
+
+    Returns an :py:class:`OrderedDict` mapping the parametrized id to the node ids,
+    tests without any parametrization end up under ``'no params'``.
+    """
+    parametrized_ids = OrderedDict()
+    for item in module_items:
+        if '[' in item:
+            # split on the leftmost bracket, then strip everything after the rightmight bracket
+            # so 'test_module.py::test_name[parametrized_id]' becomes 'parametrized_id'
+            parametrized_id = item.split('[')[1].rstrip(']')
+        else:
+            # splits failed, item has no parametrized id
+            parametrized_id = 'no params'
+        parametrized_ids.setdefault(parametrized_id, []).append(item)
+    return parametrized_ids
+
+
+def providers_of_tests(test_group, provider_keys):
+    """Return sorted provider keys that appear in the parametrized ids of ``test_group``
+
+    ``provider_keys`` should be sorted longest first so that the more specific keys win.
+    """
+    found = set()
+    for test in test_group:
+        found.update(pv for pv in provider_keys if '[' in test and pv in test)
+    return sorted(found)
+
+
+class DurationRecorder(object):
+    """Keeps track of how long tests take, persisting the result in the pytest cache
+
+    Args:
+        cache: a pytest ``config.cache`` instance or ``None`` to keep the data in memory only
+        default: estimate to use for unknown tests, the median of the recorded
+            durations is used when not given
+    """
+    def __init__(self, cache=None, default=None):
+        self.cache = cache
+        self.known = dict(cache.get(DURATIONS_CACHE_KEY, {})) if cache is not None else {}
+        self.current = defaultdict(float)
+        if default is None:
+            default = self._median() or DEFAULT_TEST_DURATION
+        self.default = default
+
+    def _median(self):
+        values = sorted(self.known.values())
+        if not values:
+            return None
+        return values[len(values) // 2]
+
+    def record(self, nodeid, duration):
+        """Add the duration of one test phase (setup, call or teardown) for a node id"""
+        self.current[nodeid] += duration
+
+    def estimate(self, nodeid):
+        """Return the expected duration of a node id in seconds"""
+        if nodeid in self.known:
+            return self.known[nodeid]
+        return self.default
+
+    def estimate_group(self, test_group):
+        return sum(self.estimate(nodeid) for nodeid in test_group)
+
+    def merged(self):
+        """Return the recorded durations merged with the ones measured in this session"""
+        durations = dict(self.known)
+        for nodeid, duration in self.current.items():
+            if nodeid in durations:
+                previous = durations[nodeid]
+                duration = previous + DURATION_SMOOTHING * (duration - previous)
+            durations[nodeid] = duration
+        return durations
+
+    def save(self):
+        if self.cache is not None and self.current:
+            self.cache.set(DURATIONS_CACHE_KEY, self.merged())
+
+
+@attr.s(hash=False)
+class ScheduledGroup(object):
+    tests = attr.ib()
+    provider = attr.ib(default=None)
+    duration = attr.ib(default=0.0)
+
+
+class DurationScheduler(object):
+    """Plans test groups onto slaves by their expected duration and hands them out on request
+
+    Args:
+        groups: iterable of :py:class:`ScheduledGroup`
+        slave_ids: ids of the slaves the groups should be planned for
+        provider_switch_cost: extra seconds a group costs on a slave that already has
+            a different provider set up
+    """
+    def __init__(self, groups, slave_ids, provider_switch_cost=DEFAULT_PROVIDER_SWITCH_COST):
+        self.provider_switch_cost = provider_switch_cost
+        self.queues = OrderedDict((slave_id, deque()) for slave_id in slave_ids)
+        self.queued_load = defaultdict(float)
+        self.providers = defaultdict(set)
+        self.stolen = 0
+        self._plan(groups)
+
+    def _cost(self, slave_id, group):
+        # what the group would cost on the slave, including a provider switch if needed
+        cost = group.duration
+        providers = self.providers[slave_id]
+        if group.provider is not None and providers and group.provider not in providers:
+            cost += self.provider_switch_cost
+        return cost
+
+    def _plan(self, groups):
+        if not self.queues:
+            return
+        # longest processing time first, keeping collection order for ties
+        for group in sorted(groups, key=lambda group: -group.duration):
+            slave_id = min(
+                self.queues,
+                key=lambda slave_id: self.queued_load[slave_id] + self._cost(slave_id, group))
+            self._enqueue(slave_id, group)
+
+    def _enqueue(self, slave_id, group):
+        self.queued_load[slave_id] += self._cost(slave_id, group)
+        if group.provider is not None:
+            self.providers[slave_id].add(group.provider)
+        self.queues.setdefault(slave_id, deque()).append(group)
+
+    @property
+    def remaining(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    @property
+    def slave_ids(self):
+        return list(self.queues)
+
+    def queued_providers(self, slave_id):
+        """Return the providers of the groups still queued for a slave"""
+        return {group.provider for group in self.queues.get(slave_id, ())}
+
+    def add_slave(self, slave_id):
+        """Start planning for a new slave, moving queued groups to it to even out the load"""
+        self.queues.setdefault(slave_id, deque())
+        self.rebalance()
+
+    def remove_slave(self, slave_id):
+        """Stop planning for a slave, its queued groups are planned onto the remaining slaves"""
+        queue = self.queues.pop(slave_id, deque())
+        self.queued_load.pop(slave_id, None)
+        self.providers.pop(slave_id, None)
+        self._plan(queue)
+        return len(queue)
+
+    def rebalance(self):
+        """Move groups from the tail of the busiest queue to the least busy slave while it helps"""
+        moved = 0
+        # every group moves at most about once, the bound just guards against ping-pong
+        while len(self.queues) > 1 and moved < self.remaining:
+            busiest = max(self.queues, key=lambda slave_id: self.queued_load[slave_id])
+            idlest = min(self.queues, key=lambda slave_id: self.queued_load[slave_id])
+            if not self.queues[busiest]:
+                break
+            group = self.queues[busiest][-1]
+            if self.queued_load[idlest] + self._cost(idlest, group) >= self.queued_load[busiest]:
+                break
+            self.queues[busiest].pop()
+            self.queued_load[busiest] = max(
+                self.queued_load[busiest] - self._cost(busiest, group), 0.0)
+            self._enqueue(idlest, group)
+            moved += 1
+        return moved
+
+    def _steal(self, slave_id):
+        victims = [victim for victim, queue in self.queues.items()
+                   if victim != slave_id and queue]
+        if not victims:
+            return None
+        victim = max(victims, key=lambda victim: self.queued_load[victim])
+        queue = self.queues[victim]
+        # Prefer the shortest queued group using a provider the thief already has,
+        # the longest groups at the head of the queue are the ones the victim starts next
+        candidates = [group for group in queue if group.provider in self.providers[slave_id]]
+        group = min(candidates, key=lambda group: group.duration) if candidates else queue[-1]
+        queue.remove(group)
+        self.queued_load[victim] = max(
+            self.queued_load[victim] - self._cost(victim, group), 0.0)
+        self.stolen += 1
+        return group
+
+    def next_group(self, slave_id):
+        """Return the next :py:class:`ScheduledGroup` for a slave, or ``None`` when done"""
+        queue = self.queues.setdefault(slave_id, deque())
+        if queue:
+            group = queue.popleft()
+            self.queued_load[slave_id] = max(
+                self.queued_load[slave_id] - self._cost(slave_id, group), 0.0)
+        else:
+            group = self._steal(slave_id)
+            if group is None:
+                return None
+        if group.provider is not None:
+            self.providers[slave_id].add(group.provider)
+        return group
+
+
+def simulate(groups, num_slaves, mode='duration',
+             provider_switch_cost=DEFAULT_PROVIDER_SWITCH_COST, stats=None):
+    """Simulate a parallel session and return its makespan in seconds
+
+    Every slave asks for a new group as soon as it finished the previous one. A provider setup
+    is charged every time a slave runs a group for a provider other than the ones it has.
+
+    Args:
+        groups: list of :py:class:`ScheduledGroup` in collection order, with ``duration``
+            set to the real (recorded) duration of the group
+        num_slaves: number of slaves to simulate
+        mode: ``'module'`` hands out groups in collection order, ``'duration'`` uses
+            :py:class:`DurationScheduler` and ``'provider'`` uses
+            :py:class:`~cfme.fixtures.parallelizer.allocator.ProviderAllocator`
+        stats: optional dict, filled with the number of provider ``setups``
+    """
+    slave_ids = ['slave{:02d}'.format(i) for i in range(num_slaves)]
+    if mode == 'module':
+        pending = deque(groups)
+
+        def next_group(slave_id):
+            return pending.popleft() if pending else None
+    elif mode == 'duration':
+        scheduler = DurationScheduler(groups, slave_ids, provider_switch_cost)
+        next_group = scheduler.next_group
+    elif mode == 'provider':
+        from cfme.fixtures.parallelizer.allocator import ProviderAllocator, ProviderSetupCosts
+        scheduler = ProviderAllocator(
+            groups, slave_ids, ProviderSetupCosts(default=provider_switch_cost))
+        next_group = scheduler.next_group
+    else:
+        raise ValueError('Unknown scheduling mode {!r}'.format(mode))
+
+    current_provider = {}
+    setups = 0
+    makespan = 0.0
+    # (time the slave becomes idle, slave id)
+    idle = [(0.0, slave_id) for slave_id in slave_ids]
+    heapq.heapify(idle)
+    while idle:
+        now, slave_id = heapq.heappop(idle)
+        group = next_group(slave_id)
+        if group is None:
+            makespan = max(makespan, now)
+            continue
+        finish = now + group.duration
+        if group.provider is not None and current_provider.get(slave_id) != group.provider:
+            finish += provider_switch_cost
+            current_provider[slave_id] = group.provider
+            setups += 1
+        heapq.heappush(idle, (finish, slave_id))
+    if stats is not None:
+        stats['setups'] = setups
+    return makespan
@@ -0,0 +1,238 @@
+"""Message transports between the parallelizer master and its slaves
+
+Two transports are available, selected with ``--parallel-transport``:
+
+``json`` (default)
+    Every event is sent as its own JSON document over a REQ socket, and the master answers each
+    one before the slave continues.
+
+``msgpack``
+    Events are serialized with msgpack and the ones a slave doesn't need an answer for (test
+    reports, log starts and messages) are batched. A batch is sent when it is full, when it gets
+    too old, at the start and end of every test and whenever the slave asks the master for
+    something. Slaves use a DEALER socket so they don't wait for the master after every batch;
+    the master acknowledges batches cumulatively, and a slave only blocks when too many of its
+    batches haven't been acknowledged yet.
+
+Both transports use the same interface, the master uses :py:func:`master_transport` and the
+slaves :py:func:`slave_transport`.
+
+"""
+import json
+from collections import deque
+from time import time
+
+import zmq
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+TRANSPORTS = ('json', 'msgpack')
+
+#: slave events that don't need an answer from the master, these are batched
+BUFFERED_EVENTS = ('message', 'runtest_logstart', 'runtest_logreport', 'provider_setup')
+
+#: number of events in a full batch
+BATCH_SIZE = 64
+#: seconds after which buffered events are sent even if the batch isn't full
+FLUSH_INTERVAL = 1.0
+#: number of unacknowledged batches a slave may have in flight before it blocks
+ACK_WINDOW = 16
+#: maximum number of messages the master reads per poll
+DRAIN_LIMIT = 1000
+
+
+def _packb(data):
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def _unpackb(payload):
+    return msgpack.unpackb(payload, raw=False)
+
+
+def _check_transport(name):
+    if name not in TRANSPORTS:
+        raise ValueError('Unknown parallelizer transport {!r}'.format(name))
+    if name == 'msgpack' and msgpack is None:
+        raise ImportError('The msgpack parallelizer transport needs the msgpack package')
+
+
+class MasterJsonTransport(object):
+    """One JSON message per event, answered one by one"""
+    def __init__(self, sock):
+        self.sock = sock
+
+    def recv(self, timeout=50):
+        """Return a ``(slaveid, event_data)`` tuple, or ``(None, None)`` if nothing arrived"""
+        events = zmq.zmq_poll([(self.sock, zmq.POLLIN)], timeout)
+        if not events:
+            return None, None
+        slaveid, _, event_json = self.sock.recv_multipart(flags=zmq.NOBLOCK)
+        return slaveid.decode('utf-8'), json.loads(event_json)
+
+    def send(self, slaveid, event_data):
+        """Send data to slave, ``event_data`` must be JSON serializable"""
+        self.sock.send_multipart(
+            [slaveid.encode('utf-8'), b'', json.dumps(event_data).encode('utf-8')])
+
+    def ack(self, slaveid, event_name):
+        self.send(slaveid, 'ack {}'.format(event_name))
+
+
+class MasterBatchTransport(object):
+    """msgpack batches from the slaves, answered with cumulative acknowledgements"""
+    def __init__(self, sock):
+        self.sock = sock
+        # (slaveid, event_data, batch sequence number if this is the last event of its batch,
+        #  whether the slave asked for an acknowledgement)
+        self.pending = deque()
+        self.last_seq = {}
+
+    def _drain(self):
+        for _ in range(DRAIN_LIMIT):
+            try:
+                slaveid, _, payload = self.sock.recv_multipart(flags=zmq.NOBLOCK)
+            except zmq.Again:
+                break
+            slaveid = slaveid.decode('utf-8')
+            batch = _unpackb(payload)
+            events = batch['events']
+            last = len(events) - 1
+            for index, event_data in enumerate(events):
+                if index == last:
+                    self.pending.append((slaveid, event_data, batch['seq'], batch['ack']))
+                else:
+                    self.pending.append((slaveid, event_data, None, False))
+
+    def recv(self, timeout=50):
+        """Return a ``(slaveid, event_data)`` tuple, or ``(None, None)`` if nothing arrived"""
+        if not self.pending:
+            if not zmq.zmq_poll([(self.sock, zmq.POLLIN)], timeout):
+                return None, None
+            self._drain()
+            if not self.pending:
+                return None, None
+        slaveid, event_data, seq, wants_ack = self.pending.popleft()
+        if seq is not None:
+            self.last_seq[slaveid] = seq
+            # events that need an answer are acknowledged by that answer
+            if wants_ack and event_data['_event_name'] in BUFFERED_EVENTS:
+                self._send(slaveid, {'ack': seq})
+        return slaveid, event_data
+
+    def _send(self, slaveid, data):
+        self.sock.send_multipart([slaveid.encode('utf-8'), b'', _packb(data)])
+
+    def send(self, slaveid, event_data):
+        """Answer the last request of a slave, acknowledging everything it sent so far"""
+        self._send(slaveid, {'ack': self.last_seq.get(slaveid, 0), 'reply': event_data})
+
+    def ack(self, slaveid, event_name):
+        # buffered events are acknowledged per batch in recv
+        if event_name not in BUFFERED_EVENTS:
+            self.send(slaveid, 'ack')
+
+
+def master_transport(name, sock):
+    _check_transport(name)
+    if name == 'msgpack':
+        return MasterBatchTransport(sock)
+    return MasterJsonTransport(sock)
+
+
+class SlaveJsonTransport(object):
+    batched = False
+
+    def __init__(self, zmq_endpoint, slaveid):
+        ctx = zmq.Context.instance()
+        self.sock = ctx.socket(zmq.REQ)
+        self.sock.set_hwm(1)
+        self.sock.setsockopt_string(zmq.IDENTITY, u'{}'.format(slaveid))
+        self.sock.connect(zmq_endpoint)
+
+    def request(self, event_data):
+        """Send an event and return the master's answer"""
+        self.sock.send_json(event_data)
+        return self.sock.recv_json()
+
+    def buffer(self, event_data, flush=False):
+        return self.request(event_data)
+
+    def flush(self):
+        pass
+
+
+class SlaveBatchTransport(object):
+    batched = True
+
+    def __init__(self, zmq_endpoint, slaveid, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, window=ACK_WINDOW):
+        ctx = zmq.Context.instance()
+        self.sock = ctx.socket(zmq.DEALER)
+        self.sock.setsockopt_string(zmq.IDENTITY, u'{}'.format(slaveid))
+        self.sock.connect(zmq_endpoint)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.window = window
+        self.events = []
+        self.first_buffered = None
+        self.seq = 0
+        self.acked = 0
+
+    def _recv(self, flags=0):
+        _, payload = self.sock.recv_multipart(flags=flags)
+        reply = _unpackb(payload)
+        self.acked = max(self.acked, reply['ack'])
+        return reply
+
+    def _collect_acks(self):
+        while True:
+            try:
+                self._recv(flags=zmq.NOBLOCK)
+            except zmq.Again:
+                return
+
+    def _send_batch(self, request):
+        self.seq += 1
+        # ask for acknowledgements well before the window is full so we rarely have to wait
+        wants_ack = request or self.seq % max(self.window // 2, 1) == 0
+        self.sock.send_multipart([b'', _packb(
+            {'seq': self.seq, 'ack': wants_ack, 'events': self.events})])
+        self.events = []
+        self.first_buffered = None
+
+    def flush(self):
+        """Send buffered events, blocking only if the master is too far behind"""
+        if not self.events:
+            return
+        self._collect_acks()
+        while self.seq - self.acked >= self.window:
+            self._recv()
+        self._send_batch(request=False)
+
+    def buffer(self, event_data, flush=False):
+        """Queue an event that doesn't need an answer"""
+        self.events.append(event_data)
+        if self.first_buffered is None:
+            self.first_buffered = time()
+        if (flush or len(self.events) >= self.batch_size or
+                time() - self.first_buffered >= self.flush_interval):
+            self.flush()
+
+    def request(self, event_data):
+        """Send an event along with everything buffered and return the master's answer"""
+        self.events.append(event_data)
+        self._send_batch(request=True)
+        while True:
+            reply = self._recv()
+            if 'reply' in reply and reply['ack'] >= self.seq:
+                return reply['reply']
+
+
+def slave_transport(name, zmq_endpoint, slaveid):
+    _check_transport(name)
+    if name == 'msgpack':
+        return SlaveBatchTransport(zmq_endpoint, slaveid)
+    return SlaveJsonTransport(zmq_endpoint, slaveid)
@@ -39,6 +39,7 @@ to set it up will be made.
 import pytest
 import random
 import six
+import time
 from collections import defaultdict
 
 from cfme.common.provider import BaseProvider, all_types
@@ -114,7 +115,12 @@ def _setup_provider_verbose(request, provider, appliance=None):
         store.terminalreporter.write_line(
             "Trying to set up provider {}\n".format(provider.key), green=True)
         enable_provider_regions(provider)
+        setup_start = time.time()
         provider.setup()
+        if store.slave_manager:
+            # lets the parallelizer master learn how long each provider type takes to set up
+            store.slave_manager.send_event(
+                'provider_setup', provider_type=provider.type, duration=time.time() - setup_start)
         return True
     except Exception as e:
         logger.exception(e)
@@ -99,7 +99,7 @@ from cfme.utils.appliance import current_appliance
 from cfme.utils.browser import browser, ensure_browser_open
 from cfme.utils.browser import take_screenshot
 from cfme.utils.log import logger
-from cfme.fixtures.artifactor_plugin import fire_art_test_hook
+from cfme.fixtures.artifactor_plugin import fire_art_test_filedump
 from cfme.fixtures.pytest_store import store
 
 enable_rbac = False
@@ -115,22 +115,22 @@ def save_traceback_file(node, contents):
         node: A pytest node
         contents: The contents of the traceback file
     """
-    fire_art_test_hook(
-        node, 'filedump',
+    fire_art_test_filedump(
+        node,
         description="RBAC Traceback",
         contents=contents, file_type="rbac", group_id="RBAC", slaveid=store.slaveid)
 
 
 def save_screenshot(node, ss, sse):
     if ss:
-        fire_art_test_hook(
-            node, 'filedump',
+        fire_art_test_filedump(
+            node,
             description="RBAC Screenshot", file_type="rbac_screenshot", mode="wb",
             contents_base64=True, contents=ss, display_glyph="camera", group_id="RBAC",
             slaveid=store.slaveid)
     if sse:
-        fire_art_test_hook(
-            node, 'filedump',
+        fire_art_test_filedump(
+            node,
             description="RBAC Screenshot error", file_type="rbac_screenshot_error", mode="w",
             contents_base64=False, contents=sse, display_type="danger", group_id="RBAC",
             slaveid=store.slaveid)
@@ -16,7 +16,7 @@ import pytest
 
 from cfme.utils.browser import take_screenshot as take_browser_screenshot
 from cfme.utils.log import logger
-from cfme.fixtures.artifactor_plugin import fire_art_test_hook
+from cfme.fixtures.artifactor_plugin import fire_art_test_filedump
 from cfme.fixtures.pytest_store import store
 
 
@@ -29,14 +29,14 @@ def take_screenshot(request):
         ss, ss_error = take_browser_screenshot()
         g_id = fauxfactory.gen_alpha(length=6)
         if ss:
-            fire_art_test_hook(
-                item, 'filedump',
+            fire_art_test_filedump(
+                item,
                 description="Screenshot {}".format(name), file_type="screenshot", mode="wb",
                 contents_base64=True, contents=ss, display_glyph="camera",
                 group_id="fix-screenshot-{}".format(g_id), slaveid=store.slaveid)
         if ss_error:
-            fire_art_test_hook(
-                item, 'filedump',
+            fire_art_test_filedump(
+                item,
                 description="Screenshot error {}".format(name), mode="w", contents_base64=False,
                 contents=ss_error, display_type="danger",
                 group_id="fix-screenshot-{}".format(g_id), slaveid=store.slaveid)
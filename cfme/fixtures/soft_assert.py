@@ -27,7 +27,7 @@ from functools import partial
 import fauxfactory
 import pytest
 
-from cfme.fixtures.artifactor_plugin import fire_art_test_hook
+from cfme.fixtures.artifactor_plugin import fire_art_test_filedump
 from cfme.utils.log import nth_frame_info
 from cfme.utils.path import get_rel_path
 import sys
@@ -128,25 +128,25 @@ def handle_assert_artifacts(request, fail_message=None):
     from cfme.fixtures.pytest_store import store
     node = request.node
 
-    fire_art_test_hook(
-        node, 'filedump',
+    fire_art_test_filedump(
+        node,
         description="Soft Assert Traceback", contents=full_tb,
         file_type="soft_traceback", display_type="danger", display_glyph="align-justify",
         contents_base64=True, group_id=sa_id, slaveid=store.slaveid)
-    fire_art_test_hook(
-        node, 'filedump',
+    fire_art_test_filedump(
+        node,
         description="Soft Assert Short Traceback", contents=short_tb,
         file_type="soft_short_tb", display_type="danger", display_glyph="align-justify",
         contents_base64=True, group_id=sa_id, slaveid=store.slaveid)
     if ss is not None:
-        fire_art_test_hook(
-            node, 'filedump',
+        fire_art_test_filedump(
+            node,
             description="Soft Assert Exception screenshot",
             file_type="screenshot", mode="wb", contents_base64=True, contents=ss,
             display_glyph="camera", group_id=sa_id, slaveid=store.slaveid)
     if ss_error is not None:
-        fire_art_test_hook(
-            node, 'filedump',
+        fire_art_test_filedump(
+            node,
             description="Soft Assert Screenshot error", mode="w",
             contents_base64=True, contents=ss_error, display_type="danger", group_id=sa_id,
             slaveid=store.slaveid)
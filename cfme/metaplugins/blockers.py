@@ -35,6 +35,10 @@ Example comes:
 If the blocker does not block, the ``unblock`` is not called. There is also a ``custom_action`` that
 will get called if the blocker blocks. if the action does nothing, then it continues with next
 actions etc., until it gets to the point that it skips the test because there are blockers.
+
+The data of the blockers of all collected tests is fetched at once after the collection (by the
+master when running parallelized) and kept in the :py:mod:`cfme.utils.issue_cache`, so the tests
+and the parallelizer slaves do not have to fetch it one by one.
 """
 import pytest
 
@@ -42,7 +46,8 @@ from kwargify import kwargify as _kwargify
 
 from cfme.fixtures.artifactor_plugin import fire_art_test_hook
 from cfme.markers.meta import plugin
-from cfme.utils.blockers import Blocker
+from cfme.fixtures.pytest_store import store
+from cfme.utils.blockers import Blocker, prefetch_blockers
 from cfme.utils.pytest_shortcuts import extract_fixtures_values
 from cfme.utils.appliance import find_appliance
 
@@ -63,6 +68,23 @@ def kwargify(f):
     return _kwargify(f)
 
 
+@pytest.mark.tryfirst
+def pytest_collection_modifyitems(session, config, items):
+    # Before the uncollect markers evaluate their blockers, slaves use what the master fetched
+    if store.parallelizer_role == 'slave':
+        return
+    blockers = []
+    for item in items:
+        for blocker in getattr(item, '_metadata', {}).get('blockers', []):
+            try:
+                blockers.append(Blocker.parse(blocker))
+            except ValueError:
+                # Reported when the test runs
+                continue
+    if blockers:
+        prefetch_blockers(blockers)
+
+
 @plugin("blockers", ["blockers"])
 def resolve_blockers(item, blockers):
     if not isinstance(blockers, (list, tuple, set)):
@@ -86,8 +108,6 @@ def resolve_blockers(item, blockers):
 
     # Check blockers
     use_blockers = []
-    # Bugzilla shortcut
-    blockers = map(lambda b: "BZ#{}".format(b) if isinstance(b, int) else b, blockers)
     for blocker in map(Blocker.parse, blockers):
         if blocker.blocks:
             use_blockers.append(blocker)
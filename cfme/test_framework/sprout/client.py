@@ -2,6 +2,7 @@
 import json
 import os
 import requests
+from contextlib import contextmanager
 
 import attr
 
@@ -30,6 +31,55 @@ class APIMethodCall(object):
         return self._client.call_method(self._method_name, *args, **kwargs)
 
 
+@attr.s
+class BatchCall(object):
+    """A call queued in a :py:class:`SproutBatch`, its result is available after the batch ran"""
+    _client = attr.ib()
+    method_name = attr.ib()
+    data = attr.ib(repr=False)
+    response = attr.ib(default=None, repr=False)
+
+    @property
+    def result(self):
+        if self.response is None:
+            raise SproutException("The batch with {} did not run yet!".format(self.method_name))
+        return self._client._process_response(self.response)
+
+
+@attr.s
+class SproutBatch(object):
+    """Collects API calls to send them to Sprout in one request.
+
+    Calling an API method on the batch queues the call and returns a :py:class:`BatchCall`.
+    """
+    _client = attr.ib()
+    calls = attr.ib(default=attr.Factory(list))
+
+    def call_method(self, name, *args, **kwargs):
+        call = BatchCall(self._client, name, self._client._call_data(name, *args, **kwargs))
+        self.calls.append(call)
+        return call
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return APIMethodCall(self, attr)
+
+    def run(self):
+        """Send the queued calls and store their responses"""
+        calls, self.calls = self.calls, []
+        if not calls:
+            return
+        responses = self._client._call_post([call.data for call in calls])
+        if not isinstance(responses, list):
+            # Sprout does not know batches, call one by one
+            logger.info("SPROUT: Batches not supported, sending {} calls one by one".format(
+                len(calls)))
+            responses = [self._client._call_post(call.data) for call in calls]
+        for call, response in zip(calls, responses):
+            call.response = response
+
+
 @attr.s
 class SproutClient(object):
     _proto = attr.ib(default="http")
@@ -37,25 +87,27 @@ class SproutClient(object):
     _port = attr.ib(default=8000)
     _entry = attr.ib(default="appliances/api")
     _auth = attr.ib(default=None)
+    # Keeps the connection to Sprout alive between the calls
+    _session = attr.ib(default=attr.Factory(requests.Session), repr=False, cmp=False)
 
     @property
     def api_entry(self):
         return "{}://{}:{}/{}".format(self._proto, self._host, self._port, self._entry)
 
-    def _post(self, **data):
-        return requests.post(self.api_entry, data=json.dumps(data))
+    def _post(self, data):
+        return self._session.post(self.api_entry, data=json.dumps(data))
 
-    def _call_post(self, **data):
+    def _call_post(self, data):
         """Protect from the Sprout being updated (error 502,503)"""
         result = wait_for(
-            lambda: self._post(**data),
+            lambda: self._post(data),
             num_sec=60,
             fail_condition=lambda r: r.status_code in {502, 503},
             delay=2,
         )
         return result.out.json()
 
-    def call_method(self, name, *args, **kwargs):
+    def _call_data(self, name, *args, **kwargs):
         req_data = {
             "method": name,
             "args": args,
@@ -64,7 +116,28 @@ class SproutClient(object):
         logger.info("SPROUT: Called {} with {} {}".format(name, args, kwargs))
         if self._auth is not None:
             req_data["auth"] = self._auth
-        result = self._call_post(**req_data)
+        return req_data
+
+    def call_method(self, name, *args, **kwargs):
+        return self._process_response(self._call_post(self._call_data(name, *args, **kwargs)))
+
+    @contextmanager
+    def batch(self):
+        """Send the API calls made on the yielded :py:class:`SproutBatch` in one request.
+
+        The calls are sent when the block ends, their results are available after that.
+
+        Usage:
+
+            with client.batch() as batch:
+                descriptions = [batch.get_pool_description(pool) for pool in pools]
+            descriptions = [call.result for call in descriptions]
+        """
+        batch = SproutBatch(self)
+        yield batch
+        batch.run()
+
+    def _process_response(self, result):
         try:
             if result["status"] == "exception":
                 raise SproutException(
@@ -50,6 +50,9 @@ def pytest_addoption(parser):
     group._addoption('--sprout-ignore-preconfigured', dest='sprout_template_preconfigured',
                      default=True, action="store_false",
                      help="Allows to use not preconfigured templates")
+    group._addoption('--sprout-min-appliances', dest='sprout_min_appliances', type=int,
+        default=0, help="Start testing as soon as this many Sprout appliances are ready, the "
+                        "parallelizer adds the rest as they arrive. 0 means wait for all.")
 
 
 def dump_pool_info(log, pool_data):
@@ -65,6 +68,31 @@ def dump_pool_info(log, pool_data):
             log.info("\t\t%s: %s", key, appliance[key])
 
 
+def sprout_appliance_args(appliance):
+    """Turn a Sprout appliance description into ``--appliance`` style arguments"""
+    appliance_args = {'hostname': appliance['url']}
+    provider_data = conf.cfme_data['management_systems'].get(appliance['provider'])
+    if provider_data and provider_data['type'] == 'openshift':
+        ocp_creds = conf.credentials[provider_data['credentials']]
+        ssh_creds = conf.credentials[provider_data['ssh_creds']]
+        extra_args = {
+            'container': appliance['container'],
+            'db_host': appliance['db_host'],
+            'project': appliance['project'],
+            'openshift_creds': {
+                'hostname': provider_data['hostname'],
+                'username': ocp_creds['username'],
+                'password': ocp_creds['password'],
+                'ssh': {
+                    'username': ssh_creds['username'],
+                    'password': ssh_creds['password'],
+                }
+            }
+        }
+        appliance_args.update(extra_args)
+    return appliance_args
+
+
 def mangle_in_sprout_appliances(config):
     """
     this helper function resets the appliances option of the config and mangles in
@@ -80,28 +108,7 @@ def mangle_in_sprout_appliances(config):
     appliances = config.option.appliances
     log.info("Appliances were provided:")
     for appliance in requested_appliances:
-
-        appliance_args = {'hostname': appliance['url']}
-        provider_data = conf.cfme_data['management_systems'].get(appliance['provider'])
-        if provider_data and provider_data['type'] == 'openshift':
-            ocp_creds = conf.credentials[provider_data['credentials']]
-            ssh_creds = conf.credentials[provider_data['ssh_creds']]
-            extra_args = {
-                'container': appliance['container'],
-                'db_host': appliance['db_host'],
-                'project': appliance['project'],
-                'openshift_creds': {
-                    'hostname': provider_data['hostname'],
-                    'username': ocp_creds['username'],
-                    'password': ocp_creds['password'],
-                    'ssh': {
-                        'username': ssh_creds['username'],
-                        'password': ssh_creds['password'],
-                    }
-                }
-            }
-            appliance_args.update(extra_args)
-        appliances.append(appliance_args)
+        appliances.append(sprout_appliance_args(appliance))
         log.info("- %s is %s", appliance['url'], appliance['name'])
 
     mgr.reset_timer()
@@ -133,6 +140,7 @@ class SproutProvisioningRequest(object):
 
     cpu = attr.ib()
     ram = attr.ib()
+    min_count = attr.ib(default=0)
 
     @classmethod
     def from_config(cls, config):
@@ -150,6 +158,7 @@ class SproutProvisioningRequest(object):
             provision_timeout=config.option.sprout_provision_timeout,
             cpu=config.option.sprout_override_cpu or None,
             ram=config.option.sprout_override_ram or None,
+            min_count=config.option.sprout_min_appliances,
         )
 
 
@@ -159,15 +168,23 @@ class SproutManager(object):
     pool = attr.ib(init=False, default=None)
     lease_time = attr.ib(init=False, default=None, repr=False)
     timer = attr.ib(init=False, default=None, repr=False)
+    # Last seen pool status and its version, for waiting on the pool to change
+    pool_status = attr.ib(init=False, default=None, repr=False)
+    pool_version = attr.ib(init=False, default=None, repr=False)
+    long_poll = attr.ib(init=False, default=True, repr=False)
 
     def request_appliances(self, provision_request):
         self.request_pool(provision_request)
+        min_count = provision_request.min_count
 
         try:
+            # The first check tells whether Sprout can wait for changes, otherwise keep polling
+            # at a pace that does not hammer it
+            fulfilled = self.check_fullfilled(min_count=min_count)
             result = wait_for(
-                self.check_fullfilled,
+                lambda: fulfilled or self.check_fullfilled(min_count=min_count),
                 num_sec=provision_request.provision_timeout * 60,
-                delay=5,
+                delay=1 if self.long_poll else 5,
                 message="requesting appliances was fulfilled"
             )
         except Exception:
@@ -182,8 +199,17 @@ class SproutManager(object):
             dump_pool_info(log, pool)
 
         log.info("Provisioning took %.1f seconds", result.duration)
+        if not pool["fulfilled"]:
+            log.info("Starting with the %d ready appliances, the rest will join later",
+                     len(self.ready_appliances(pool)))
+            return self.ready_appliances(pool)
         return pool["appliances"]
 
+    @staticmethod
+    def ready_appliances(pool):
+        return [appliance for appliance in pool["appliances"]
+                if appliance["ready"] and appliance["url"]]
+
     def request_pool(self, provision_request):
         log.info("Requesting %s appliances from Sprout at %s",
                  provision_request.count, self.client.api_entry)
@@ -224,9 +250,29 @@ class SproutManager(object):
     def request_check(self):
         return self.client.request_check(self.pool)
 
-    def check_fullfilled(self):
+    def wait_pool_change(self, timeout=5):
+        """Return the pool status once it differs from the one seen last, or after ``timeout``.
+
+        Falls back to :py:meth:`request_check` on Sprouts that cannot wait for pool changes.
+        """
+        if self.long_poll:
+            try:
+                result = self.client.wait_pool_change(self.pool, self.pool_version, timeout)
+            except SproutException as e:
+                if 'NameError' not in str(e):
+                    raise
+                log.info("Sprout cannot wait for pool changes, polling the pool instead")
+                self.long_poll = False
+            else:
+                self.pool_version = result['version']
+                if result['changed']:
+                    self.pool_status = result['pool']
+                return self.pool_status
+        return self.request_check()
+
+    def check_fullfilled(self, min_count=0):
         try:
-            result = self.request_check()
+            result = self.wait_pool_change()
         except SproutException as e:
             # TODO: ensure we only exit this way on sprout usage
             self.destroy_pool()
@@ -234,6 +280,8 @@ class SproutManager(object):
             pytest.exit(1)
 
         log.debug("fulfilled at %f %%", result['progress'])
+        if min_count and not result["fulfilled"]:
+            return len(self.ready_appliances(result)) >= min_count
         return result["fulfilled"]
 
     def clean_jenkins_job(self, jenkins_job):
@@ -241,17 +289,24 @@ class SproutManager(object):
             log.info(
                 "Check if pool already exists for this %r Jenkins job", jenkins_job[0])
             jenkins_job_pools = self.client.find_pools_by_description(jenkins_job[0], partial=True)
-            for pool in jenkins_job_pools:
-                # Some jobs have overlapping descriptions, sprout API doesn't support regex
-                # job-name-12345 vs job-name-master-12345
-                # the partial match alone will catch both of these, use regex to confirm pool
-                # description is an accurate match
-                if self.client.get_pool_description(pool) == '{}{}'.format(jenkins_job[0], pool):
-                    log.info("Destroying the old pool %s for %r job.", pool, jenkins_job[0])
-                    self.client.destroy_pool(pool)
-                else:
-                    log.info('Skipped pool destroy due to potential pool description overlap: %r',
-                             jenkins_job[0])
+            with self.client.batch() as batch:
+                descriptions = [batch.get_pool_description(pool) for pool in jenkins_job_pools]
+            destroyed = []
+            with self.client.batch() as batch:
+                for pool, description in zip(jenkins_job_pools, descriptions):
+                    # Some jobs have overlapping descriptions, sprout API doesn't support regex
+                    # job-name-12345 vs job-name-master-12345
+                    # the partial match alone will catch both of these, use regex to confirm pool
+                    # description is an accurate match
+                    if description.result == '{}{}'.format(jenkins_job[0], pool):
+                        log.info("Destroying the old pool %s for %r job.", pool, jenkins_job[0])
+                        destroyed.append(batch.destroy_pool(pool))
+                    else:
+                        log.info(
+                            'Skipped pool destroy due to potential pool description overlap: %r',
+                            jenkins_job[0])
+            for call in destroyed:
+                call.result  # raises if destroying failed
         except Exception:
             log.exception(
                 "Exception occurred during old pool deletion, this can be ignored"
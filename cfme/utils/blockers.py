@@ -2,12 +2,15 @@
 import re
 import six
 import six.moves.xmlrpc_client
+from collections import defaultdict
 from github import Github
+from multiprocessing.pool import ThreadPool
 from six.moves.urllib.parse import urlparse
 
 from cfme.fixtures.pytest_store import store
 from cfme.utils import classproperty, conf, version
 from cfme.utils.bz import Bugzilla
+from cfme.utils.issue_cache import chunks, issue_cache
 from cfme.utils.log import logger
 
 
@@ -42,11 +45,22 @@ class Blocker(object):
             'JIRA': JIRA,
         }
 
+    @classmethod
+    def prefetch(cls, blockers):
+        """Fetch the data of the blockers of this engine at once, ahead of their evaluation.
+
+        Engines that can fetch more issues at a time than one by one override this.
+        """
+        pass
+
     @classmethod
     def parse(cls, blocker, **kwargs):
         """Create a blocker object from some representation"""
         if isinstance(blocker, cls):
             return blocker
+        elif isinstance(blocker, six.integer_types):
+            # Plain numbers are Bugzilla bugs
+            return BZ(blocker, **kwargs)
         elif isinstance(blocker, six.string_types):
             if "#" in blocker:
                 # Generic blocker
@@ -68,9 +82,29 @@ class Blocker(object):
             raise ValueError("Wrong specification of the blockers!")
 
 
+def prefetch_blockers(blockers):
+    """Fetch the data of all the blockers at once, grouped by the engines.
+
+    Errors are only logged, the blockers then fetch their data on their own.
+    """
+    by_engine = defaultdict(list)
+    for blocker in blockers:
+        by_engine[type(blocker)].append(blocker)
+    for engine, engine_blockers in by_engine.items():
+        try:
+            engine.prefetch(engine_blockers)
+        except Exception as e:
+            logger.warning(
+                "Could not prefetch %d %s blockers: %s: %s",
+                len(engine_blockers), engine.__name__, type(e).__name__, str(e))
+
+
 class GH(Blocker):
     DEFAULT_REPOSITORY = conf.env.get("github", {}).get("default_repo")
+    # Number of issues fetched at once, there is no batch lookup of issues in the API
+    PREFETCH_THREADS = 8
     _issue_cache = {}
+    _issue_data_cache = {}
 
     @classproperty
     def github(cls):
@@ -113,18 +147,65 @@ class GH(Blocker):
         else:
             raise ValueError("GH issue specified wrong")
 
+    @classmethod
+    def prefetch(cls, blockers):
+        identifiers = {blocker.identifier: blocker for blocker in blockers}
+        missing = set(identifiers) - set(cls._issue_data_cache)
+        cached = issue_cache().get_many("gh", missing)
+        cls._issue_data_cache.update(cached)
+        missing = [identifiers[identifier] for identifier in missing - set(cached)]
+        if not missing:
+            return
+
+        def fetch(blocker):
+            try:
+                return blocker.identifier, blocker.fetch_issue_data()
+            except Exception as e:
+                logger.warning("Could not fetch %s: %s: %s", blocker, type(e).__name__, str(e))
+                return blocker.identifier, None
+
+        cls.github  # Set it up before the threads do
+        pool = ThreadPool(min(cls.PREFETCH_THREADS, len(missing)))
+        try:
+            fetched = {
+                identifier: data
+                for identifier, data in pool.map(fetch, missing) if data is not None}
+        finally:
+            pool.close()
+            pool.join()
+        cls._issue_data_cache.update(fetched)
+        issue_cache().set_many("gh", fetched)
+
+    @property
+    def identifier(self):
+        return "{}:{}".format(self.repo, self.issue)
+
     @property
     def data(self):
-        identifier = "{}:{}".format(self.repo, self.issue)
-        if identifier not in self._issue_cache:
-            self._issue_cache[identifier] = self.github.get_repo(self.repo).get_issue(self.issue)
-        return self._issue_cache[identifier]
+        if self.identifier not in self._issue_cache:
+            self._issue_cache[self.identifier] = self.github.get_repo(
+                self.repo).get_issue(self.issue)
+        return self._issue_cache[self.identifier]
+
+    def fetch_issue_data(self):
+        return {"state": self.data.state, "title": self.data.title}
+
+    @property
+    def issue_data(self):
+        """State and title of the issue, from the issue cache when it is there"""
+        if self.identifier not in self._issue_data_cache:
+            data = issue_cache().get("gh", self.identifier)
+            if data is None:
+                data = self.fetch_issue_data()
+                issue_cache().set("gh", self.identifier, data)
+            self._issue_data_cache[self.identifier] = data
+        return self._issue_data_cache[self.identifier]
 
     @property
     def blocks(self):
         if self.upstream_only and version.appliance_is_downstream():
             return False
-        if self.data.state == "closed":
+        if self.issue_data["state"] == "closed":
             return False
         # Now let's check versions
         if self.since is None and self.until is None:
@@ -168,6 +249,12 @@ class BZ(Blocker):
         super(BZ, self).__init__(**kwargs)
         self.bug_id = int(bug_id)
 
+    @classmethod
+    def prefetch(cls, blockers):
+        if cls.bugzilla is None:
+            return
+        cls.bugzilla.prefetch(blocker.bug_id for blocker in blockers)
+
     @property
     def data(self):
         return self.bugzilla.resolve_blocker(
@@ -227,10 +314,44 @@ class JIRA(Blocker):
                 return None
         return cls._jira
 
+    # Number of issues looked up by one search
+    PREFETCH_CHUNK_SIZE = 100
+    _status_cache = {}
+
     def __init__(self, jira_id, **kwargs):
         super(JIRA, self).__init__(**kwargs)
         self.jira_id = jira_id
 
+    @classmethod
+    def prefetch(cls, blockers):
+        jira = cls.jira
+        if jira is None:
+            return
+        missing = {blocker.jira_id for blocker in blockers} - set(cls._status_cache)
+        cached = issue_cache().get_many("jira", missing)
+        cls._status_cache.update(cached)
+        fetched = {}
+        for chunk in chunks(sorted(missing - set(cached)), cls.PREFETCH_CHUNK_SIZE):
+            issues = jira.search_issues(
+                "key in ({})".format(", ".join(chunk)), fields="status",
+                maxResults=len(chunk))
+            for issue in issues:
+                fetched[issue.key] = issue.fields.status.name
+        cls._status_cache.update(fetched)
+        issue_cache().set_many("jira", fetched)
+
+    @property
+    def status(self):
+        """Name of the status of the card, from the issue cache when it is there"""
+        if self.jira_id not in self._status_cache:
+            status = issue_cache().get("jira", self.jira_id)
+            if status is None:
+                issue = self.jira.issue(self.jira_id, fields='status')
+                status = issue.fields.status.name
+                issue_cache().set("jira", self.jira_id, status)
+            self._status_cache[self.jira_id] = status
+        return self._status_cache[self.jira_id]
+
     @property
     def url(self):
         try:
@@ -245,8 +366,7 @@ class JIRA(Blocker):
         if jira is None:
             # JIRA unspecified, shut up and don't block
             return False
-        issue = jira.issue(self.jira_id, fields='status')
-        return issue.fields.status.name.lower() != 'done'
+        return self.status.lower() != 'done'
 
     def __str__(self):
         return 'Jira card {}'.format(self.url)
@@ -1,15 +1,19 @@
 # -*- coding: utf-8 -*-
 import re
 from bugzilla import Bugzilla as _Bugzilla
+from bugzilla.bug import Bug as _Bug
 from collections import Sequence
 
 from cached_property import cached_property
 from cfme.utils.conf import cfme_data, credentials
+from cfme.utils.issue_cache import chunks, issue_cache
 from cfme.utils.log import logger
 from cfme.utils.version import (
     LATEST, Version, current_version, appliance_build_datetime, appliance_is_downstream)
 
 NONE_FIELDS = {"---", "undefined", "unspecified"}
+# Number of bugs fetched by one getbugs call
+GETBUGS_CHUNK_SIZE = 200
 
 
 class Product(object):
@@ -107,12 +111,73 @@ class Bugzilla(object):
         else:
             return Version(cfme_data.get("bugzilla", {}).get("upstream_version", "9.9"))
 
+    @cached_property
+    def cache_tracker(self):
+        """Name of this Bugzilla in the :py:mod:`cfme.utils.issue_cache`"""
+        return "bz:{}".format(self.__kwargs.get("url"))
+
+    def _restore_bug(self, data):
+        bug = _Bug.__new__(_Bug)
+        bug.__setstate__(data)
+        bug.bugzilla = self.bugzilla
+        return bug
+
+    def get_bugs(self, ids):
+        """Fetches the bugs that were not fetched yet, from the issue cache or by batched getbugs.
+
+        Bugs that cannot be fetched are left out, :py:meth:`get_bug` then raises the error.
+        """
+        ids = set(map(int, ids)) - set(self.__bug_cache)
+        if not ids:
+            return
+        for id, data in issue_cache().get_many(self.cache_tracker, ids).items():
+            self.__bug_cache[id] = BugWrapper(self, self._restore_bug(data))
+        missing = sorted(ids - set(self.__bug_cache))
+        fetched = {}
+        for chunk in chunks(missing, GETBUGS_CHUNK_SIZE):
+            for bug in self.bugzilla.getbugs(chunk):
+                if bug is None:
+                    # No such bug or no permissions for it
+                    continue
+                self.__bug_cache[int(bug.id)] = BugWrapper(self, bug)
+                fetched[int(bug.id)] = bug.__getstate__()
+        if missing:
+            logger.info("Fetched %d of %d bugs from Bugzilla", len(fetched), len(missing))
+        issue_cache().set_many(self.cache_tracker, fetched)
+
     def get_bug(self, id):
         id = int(id)
         if id not in self.__bug_cache:
+            self.get_bugs([id])
+        if id not in self.__bug_cache:
+            # Let getbug raise what made getbugs leave the bug out
             self.__bug_cache[id] = BugWrapper(self, self.bugzilla.getbug(id))
         return self.__bug_cache[id]
 
+    def prefetch(self, ids):
+        """Fetches the bugs and all the bugs :py:meth:`get_bug_variants` looks at for them.
+
+        The variants are looked up level by level, each level fetched with batched getbugs
+        instead of a bug at a time.
+        """
+        variants = set(map(int, ids))
+        expanded = set()
+        while variants - expanded:
+            todo = variants - expanded
+            self.get_bugs(todo)
+            bugs = [self.__bug_cache[id] for id in todo if id in self.__bug_cache]
+            self.get_bugs(set().union(*(bug.related_ids for bug in bugs)))
+            expanded.update(todo)
+            for bug in bugs:
+                blocks = set(map(int, bug.blocks))
+                for related in bug.related_ids:
+                    related_bug = self.__bug_cache.get(related)
+                    if related_bug is None:
+                        continue
+                    # The bugs it blocks are variants only if they are its copies
+                    if related not in blocks or related_bug.copy_of == bug.id:
+                        variants.add(related)
+
     def get_bug_variants(self, id):
         if isinstance(id, BugWrapper):
             bug = id
@@ -279,6 +344,16 @@ class BugWrapper(object):
         else:
             return None
 
+    @property
+    def related_ids(self):
+        """Ids of the bugs that can be variants of this one: the bugs it blocks (copies are among
+        them), the one it is a copy of and the one it duplicates."""
+        result = set(map(int, self._bug.blocks))
+        for bug_id in (getattr(self._bug, "dupe_of", None), self.copy_of):
+            if bug_id is not None:
+                result.add(int(bug_id))
+        return result
+
     @property
     def copies(self):
         """Returns list of copies of this bug."""
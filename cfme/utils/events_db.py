@@ -8,10 +8,10 @@ from contextlib import contextmanager
 from collections import Iterable
 from datetime import datetime
 from numbers import Number
-from sqlalchemy.sql.expression import func
-from time import sleep
+from sqlalchemy.sql.expression import and_, func, or_, true
 from threading import Thread, Event as ThreadEvent
 
+from cfme.utils import conf
 from cfme.utils.log import create_sublogger
 
 logger = create_sublogger('events')
@@ -208,8 +208,8 @@ class Event(object):
         for attr_name, attr_type in self._tool.event_streams_attributes:
             self._default_attrs[attr_name] = EventAttr(**{attr_name: None, 'attr_type': attr_type})
 
-    def _parse_raw_event(self, evt):
-        for attr in self._default_attrs:
+    def _parse_raw_event(self, evt, attrs=None):
+        for attr in attrs or self._default_attrs:
             default_type = self._default_attrs[attr].type
             evt_value = getattr(evt, attr)
             evt_type = type(evt_value)
@@ -226,14 +226,10 @@ class Event(object):
     def _is_raw_event(self, evt):
         return evt.__tablename__ == 'event_streams'
 
-    def matches(self, evt):
+    def _resolve_target(self):
         """
-        compares current event with passed event.
+        turns target_name into target_id. returns False if the target isn't in db yet.
         """
-        if not isinstance(evt, type(self)):
-            raise ValueError("passed event doesn't belong to {}".format(type(self)))
-
-        # checking only common attributes
         if 'target_name' in self.event_attrs and 'target_id' not in self.event_attrs:
             try:
                 target_id = self._tool.process_id(self.event_attrs['target_type'].value,
@@ -242,6 +238,18 @@ class Event(object):
             except ValueError:
                 # vm or host name isn't added to db yet. need to wait
                 return False
+        return True
+
+    def matches(self, evt):
+        """
+        compares current event with passed event.
+        """
+        if not isinstance(evt, type(self)):
+            raise ValueError("passed event doesn't belong to {}".format(type(self)))
+
+        # checking only common attributes
+        if not self._resolve_target():
+            return False
 
         common_attrs = set(self.event_attrs).intersection(set(evt.event_attrs))
         for attr in common_attrs:
@@ -271,6 +279,35 @@ class Event(object):
             raise ValueError("incorrect parameters are passed {}".format(attrs))
         return self
 
+    @property
+    def db_attrs(self):
+        """
+        names of the event_streams columns this event is compared by
+        """
+        return [name for name in self.event_attrs if name in self._default_attrs]
+
+    def sql_criteria(self):
+        """
+        conditions on event_streams columns that db events matching this event meet.
+
+        only the attributes compared by equality are turned into conditions, the ones with
+        cmp_func are left to :py:meth:`matches`. returns None if the event can't match yet
+        because its target isn't in db.
+        """
+        if not self._resolve_target():
+            return None
+        criteria = []
+        for name in self.db_attrs:
+            attr = self.event_attrs[name]
+            if attr.cmp_func:
+                continue
+            column = getattr(self._tool.event_streams, name)
+            if attr.value is None:
+                criteria.append(column.is_(None))
+            elif attr.value:
+                criteria.append(column == attr.value)
+        return criteria
+
     def build_from_raw_event(self, evt):
         """
         helper method which takes raw event from event_streams and prepares event object
@@ -280,16 +317,36 @@ class Event(object):
             self._parse_raw_event(evt)
         return self
 
+    def build_from_row(self, row):
+        """
+        like build_from_raw_event, but for a query row of some of the event_streams columns
+        """
+        self._parse_raw_event(row, row.keys())
+        return self
+
 
 class DbEventListener(Thread):
     """
      accepts "expected" events, listens to db events and compares showed up events with expected
      events. Runs callback function if expected events have it.
+
+     with match_in_db, the expected events are turned into conditions of the query, so that only
+     the db events which can match and only the columns they are compared by are fetched. it
+     defaults to ``match_in_db`` of the ``event_listener`` section of env.yaml.
+
+     the db is polled every MIN_POLL_DELAY seconds while events keep coming, the delay doubles up
+     to MAX_POLL_DELAY while there are none.
     """
-    def __init__(self, appliance):
+    MIN_POLL_DELAY = 0.2
+    MAX_POLL_DELAY = 2.0
+
+    def __init__(self, appliance, match_in_db=None):
         super(DbEventListener, self).__init__()
         self._appliance = appliance
         self._tool = EventTool(self._appliance)
+        if match_in_db is None:
+            match_in_db = conf.env.get('event_listener', {}).get('match_in_db', False)
+        self.match_in_db = match_in_db
 
         self._events_to_listen = []
         # last_id is used to ignore already arrived messages the database
@@ -302,12 +359,11 @@ class DbEventListener(Thread):
         if evt:
             self._last_processed_id = evt.event_attrs['id'].value
         else:
-            try:
-                self._last_processed_id = self._tool.query(
-                    func.max(self._tool.event_streams.id)).one()
-            except IndexError:
-                # No events yet, so do nothing
-                pass
+            self._last_processed_id = self._last_db_id()
+
+    def _last_db_id(self):
+        # 0 when there are no events yet
+        return self._tool.query(func.max(self._tool.event_streams.id)).scalar() or 0
 
     def new_event(self, *attrs, **kwattrs):
         """
@@ -387,26 +443,111 @@ class DbEventListener(Thread):
         processes all new db events and compares them with expected events.
         processed events are ignored next time
         """
+        delay = self.MIN_POLL_DELAY
         while not self._stop_event.is_set():
-            events = self.get_next_portion()
-            if len(events) == 0:
-                sleep(0.2)
+            if self.match_in_db:
+                arrived = self.process_candidate_events()
+            else:
+                arrived = self.process_new_events()
+            if arrived:
+                delay = self.MIN_POLL_DELAY
+            else:
+                self._stop_event.wait(delay)
+                delay = min(delay * 2, self.MAX_POLL_DELAY)
+
+    def _expected_events(self):
+        """
+        expected events which still have to be compared with the new db events
+        """
+        return [exp_event for exp_event in self._events_to_listen
+                if not (exp_event['first_event'] and len(exp_event['matched_events']) > 0)]
+
+    def _match(self, got_event, expected_events, full_event=None):
+        """
+        compares got_event with expected events. full_event gives the event passed to callbacks
+        and stored in matched events, when got_event has only some of the attributes.
+        """
+        for exp_event in expected_events:
+            if exp_event['first_event'] and len(exp_event['matched_events']) > 0:
+                continue
+
+            if exp_event['event'].matches(got_event):
+                if full_event is not None:
+                    got_event = full_event()
+                if exp_event['callback']:
+                    exp_event['callback'](exp_event=exp_event['event'], got_event=got_event)
+                exp_event['matched_events'].append(got_event)
+
+    def process_new_events(self):
+        """
+        fetches all the new db events and compares them with the expected events.
+        returns whether there were any.
+        """
+        events = self.get_next_portion()
+        for got_event in events:
+            logger.debug("processing event id {}".format(got_event.id))
+            got_event = Event(event_tool=self._tool).build_from_raw_event(got_event)
+            self._match(got_event, self._events_to_listen)
+            self.set_last_record(got_event)
+
+            if self._stop_event.is_set():
+                break
+        return len(events) > 0
+
+    def process_candidate_events(self):
+        """
+        fetches only the new db events that can match an expected event, and only the columns
+        they are compared by. returns whether there were any new db events.
+        """
+        last_id = self._last_db_id()
+        if last_id <= self._last_processed_id:
+            return False
+        expected_events = self._expected_events()
+        candidates = self.get_candidates(expected_events, last_id)
+        for row in candidates:
+            logger.debug("processing event id {}".format(row.id))
+            got_event = Event(event_tool=self._tool).build_from_row(row)
+            self._match(got_event, expected_events, full_event=self._full_event_loader(row.id))
+            self._last_processed_id = row.id
+
+            if self._stop_event.is_set():
+                return True
+        # the other events up to last_id can't match any of the expected events
+        self._last_processed_id = last_id
+        return True
+
+    def _full_event_loader(self, event_id):
+        cache = []
+
+        def _load():
+            if not cache:
+                evt = self._tool.query(self._tool.event_streams).filter(
+                    self._tool.event_streams.id == event_id).one()
+                cache.append(Event(event_tool=self._tool).build_from_raw_event(evt))
+            return cache[0]
+        return _load
+
+    def get_candidates(self, expected_events, last_id):
+        """
+        queries the db events up to last_id that meet the conditions of any of the expected
+        events, with only the columns these compare.
+        """
+        table = self._tool.event_streams
+        alternatives = []
+        columns = {'id'}
+        for exp_event in expected_events:
+            criteria = exp_event['event'].sql_criteria()
+            if criteria is None:
+                # its target is not in db yet, so no event can match it
                 continue
-            for got_event in events:
-                logger.debug("processing event id {}".format(got_event.id))
-                got_event = Event(event_tool=self._tool).build_from_raw_event(got_event)
-                for exp_event in self._events_to_listen:
-                    if exp_event['first_event'] and len(exp_event['matched_events']) > 0:
-                        continue
-
-                    if exp_event['event'].matches(got_event):
-                        if exp_event['callback']:
-                            exp_event['callback'](exp_event=exp_event['event'], got_event=got_event)
-                        exp_event['matched_events'].append(got_event)
-                self.set_last_record(got_event)
-
-                if self._stop_event.is_set():
-                    break
+            alternatives.append(and_(*criteria) if criteria else true())
+            columns.update(exp_event['event'].db_attrs)
+        if not alternatives:
+            return []
+        logger.debug("obtaining next portion of candidate events")
+        return self._tool.query(*[getattr(table, column) for column in sorted(columns)])\
+            .filter(table.id > self._last_processed_id, table.id <= last_id, or_(*alternatives))\
+            .order_by(table.id).all()
 
     @property
     def got_events(self):
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Cache of the data fetched from the issue trackers, shared among processes.
+
+Bugs and issues referenced by the blockers are looked up during the collection by the master and
+again by every parallelizer slave. This keeps what was fetched in a sqlite database in the log
+directory, so the slaves (and the next runs within the TTL) do not fetch it again.
+
+The TTL in seconds can be set in ``env.yaml``:
+
+.. code-block:: yaml
+
+    issue_cache:
+        ttl: 3600
+
+Setting it to 0 disables the cache.
+"""
+import os
+import sqlite3
+import time
+
+from six.moves import cPickle
+
+from cfme.utils import conf
+from cfme.utils.log import logger
+from cfme.utils.path import log_path
+
+DEFAULT_TTL = 3600
+# SQLite limits the number of parameters of a query
+QUERY_CHUNK_SIZE = 500
+
+
+def chunks(items, size=QUERY_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class IssueCache(object):
+    """Values fetched from issue trackers, stored by tracker and key for ``ttl`` seconds.
+
+    Failing to read or write the database is logged and handled as a cache miss, the cache must
+    never break the tests.
+
+    Args:
+        path: Path to the sqlite database.
+        ttl: Seconds the values are valid for, 0 disables the cache.
+    """
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.path = str(path)
+        self.ttl = ttl
+        self._connection = None
+        self._pid = None
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    @property
+    def connection(self):
+        # Forked processes must not share the connection
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=30)
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS issues ('
+                'tracker TEXT NOT NULL, key TEXT NOT NULL, fetched REAL NOT NULL, '
+                'data BLOB NOT NULL, PRIMARY KEY (tracker, key))')
+            self._connection.commit()
+            self._pid = os.getpid()
+        return self._connection
+
+    def get_many(self, tracker, keys):
+        """Returns a :py:class:`dict` of the keys found in the cache to their values"""
+        if not self.enabled:
+            return {}
+        keys = {str(key): key for key in keys}
+        result = {}
+        try:
+            for chunk in chunks(keys):
+                rows = self.connection.execute(
+                    'SELECT key, data FROM issues WHERE tracker = ? AND fetched >= ? '
+                    'AND key IN ({})'.format(', '.join('?' * len(chunk))),
+                    [tracker, time.time() - self.ttl] + chunk)
+                for key, data in rows:
+                    result[keys[key]] = cPickle.loads(bytes(data))
+        except (sqlite3.Error, cPickle.UnpicklingError) as e:
+            logger.warning('Could not read the issue cache %s: %s', self.path, e)
+        return result
+
+    def get(self, tracker, key):
+        """Returns the cached value or ``None``"""
+        return self.get_many(tracker, [key]).get(key)
+
+    def set_many(self, tracker, values):
+        """Stores the values of a :py:class:`dict` of keys to values"""
+        if not self.enabled or not values:
+            return
+        now = time.time()
+        rows = [
+            (tracker, str(key), now, sqlite3.Binary(cPickle.dumps(value, 2)))
+            for key, value in values.items()]
+        try:
+            with self.connection:
+                self.connection.executemany(
+                    'INSERT OR REPLACE INTO issues (tracker, key, fetched, data) '
+                    'VALUES (?, ?, ?, ?)', rows)
+        except sqlite3.Error as e:
+            logger.warning('Could not write the issue cache %s: %s', self.path, e)
+
+    def set(self, tracker, key, value):
+        self.set_many(tracker, {key: value})
+
+    def clear(self):
+        try:
+            with self.connection:
+                self.connection.execute('DELETE FROM issues')
+        except sqlite3.Error as e:
+            logger.warning('Could not clear the issue cache %s: %s', self.path, e)
+
+
+_issue_cache = None
+
+
+def issue_cache():
+    """The :py:class:`IssueCache` configured in ``env.yaml``, in the log directory"""
+    global _issue_cache
+    if _issue_cache is None:
+        ttl = conf.env.get('issue_cache', {}).get('ttl', DEFAULT_TTL)
+        _issue_cache = IssueCache(log_path.join('issue_cache.sqlite'), ttl)
+    return _issue_cache
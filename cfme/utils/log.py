@@ -133,9 +133,11 @@ Members
 import inspect
 import logging
 import sys
+import threading
 import warnings
+from collections import deque
 from time import time
-from traceback import extract_tb, format_tb
+from traceback import extract_tb, format_tb, print_exc
 
 from cfme.utils import conf, safe_string
 from cfme.utils.path import get_rel_path, log_path, project_path
@@ -432,21 +434,94 @@ def nth_frame_info(n):
 
 
 class ArtifactorHandler(logging.Handler):
-    """Logger handler that hands messages off to the artifactor"""
+    """Logger handler that hands messages off to the artifactor
+
+    The records are queued and a background thread sends them in batches as one ``log_messages``
+    hook, when ``batch_size`` records are queued, after ``flush_interval`` seconds, or when
+    :py:meth:`flush` is called (the artifactor plugin does at the test boundaries). When
+    ``max_queued`` records are waiting, logging blocks until the thread catches up.
+    """
 
     slaveid = artifactor = None
+    batch_size = 500
+    flush_interval = 0.5
+    max_queued = 10000
+
+    def __init__(self, level=logging.NOTSET):
+        logging.Handler.__init__(self, level)
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._in_flight = 0
+        self._flushing = False
 
     def createLock(self):  # NOQA: false positive, base class override
-        # opt out of locking since artifactor hook calling is threadsave
+        # opt out of locking, the queue has its own
         self.lock = None
 
+    def prepare(self, record):
+        """Turns the record into a dict that is safe to send later
+
+        The message is formatted right away, the arguments may change after it was logged.
+        """
+        data = dict(record.__dict__)
+        data['msg'] = record.getMessage()
+        data['args'] = None
+        if record.exc_info:
+            data['exc_text'] = record.exc_text or logging.Formatter().formatException(
+                record.exc_info)
+            data['exc_info'] = None
+        return data
+
     def emit(self, record):
-        if self.artifactor:
-            self.artifactor.fire_hook(
-                'log_message',
-                log_record=record.__dict__,
-                slaveid=self.slaveid,
-            )
+        if not self.artifactor:
+            return
+        data = self.prepare(record)
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._send_batches, name='artifactor-log')
+                self._thread.daemon = True
+                self._thread.start()
+            if threading.current_thread() is not self._thread:
+                while len(self._queue) >= self.max_queued:
+                    self._condition.wait()
+            self._queue.append(data)
+            if len(self._queue) >= self.batch_size:
+                self._condition.notify_all()
+
+    def _send_batches(self):
+        while True:
+            with self._condition:
+                if len(self._queue) < self.batch_size and not self._flushing:
+                    self._condition.wait(self.flush_interval)
+                batch = [
+                    self._queue.popleft()
+                    for _ in range(min(len(self._queue), self.batch_size))]
+                self._in_flight = len(batch)
+                # Wake up the loggers waiting for room in the queue
+                self._condition.notify_all()
+            if batch:
+                try:
+                    self.artifactor.fire_hook(
+                        'log_messages', log_records=batch, slaveid=self.slaveid)
+                except Exception:
+                    # The thread must go on, the loggers would wait for it forever
+                    print_exc()
+            with self._condition:
+                self._in_flight = 0
+                self._condition.notify_all()
+
+    def flush(self, timeout=10):
+        """Waits until the queued records were sent, at most ``timeout`` seconds"""
+        with self._condition:
+            if self._thread is None or threading.current_thread() is self._thread:
+                return
+            self._flushing = True
+            self._condition.notify_all()
+            deadline = time() + timeout
+            while (self._queue or self._in_flight) and time() < deadline:
+                self._condition.wait(deadline - time())
+            self._flushing = False
 
 
 logger = setup_logger(logging.getLogger('cfme'))
@@ -1,9 +1,63 @@
 import re
 import pytest
 
-from ssh import SSHTail
+from cfme.utils.ssh import SSHTail
 from cfme.utils.log import logger
 
+# numbered backreferences and global inline flags change meaning in a combined regex
+_UNCOMBINABLE = re.compile(r'\\\d|\(\?[aiLmsux]+\)')
+# a pattern that is just a literal, optionally with .* around it
+_LITERAL = re.compile(r'\^?(?:\.\*)?([^.^$*+?{}\[\]\\|()]+)(?:\.\*)?\$?$')
+
+
+class PatternSet(object):
+    """A list of regex patterns matched against lines all at once
+
+    The patterns are combined into one alternation, so a line that matches none of them, which is
+    almost every line of a log, is rejected in a single regex call. When all the patterns are plain
+    strings like ``.*ERROR.*`` lines are first checked with substring searches, which is faster
+    still. Like :py:func:`re.match` the patterns are anchored at the start of the line. Patterns
+    that can't be combined, e.g. because they use numbered backreferences or inline flags, are
+    matched one by one.
+    """
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._compiled = [re.compile(pattern) for pattern in self.patterns]
+        literals = [_LITERAL.match(pattern) for pattern in self.patterns]
+        self._literals = None
+        if self.patterns and all(literals):
+            self._literals = [literal.group(1) for literal in literals]
+        self._combined = None
+        if self.patterns and not any(_UNCOMBINABLE.search(pattern) for pattern in self.patterns):
+            try:
+                self._combined = re.compile(
+                    '|'.join('(?:{})'.format(pattern) for pattern in self.patterns))
+            except re.error:
+                # e.g. the same group name used in two patterns
+                pass
+
+    def _may_match(self, line):
+        if self._literals is not None and not any(
+                literal in line for literal in self._literals):
+            return False
+        return self._combined is None or self._combined.match(line) is not None
+
+    def first_match(self, line):
+        """Return the first pattern matching line, or ``None``"""
+        if not self._may_match(line):
+            return None
+        for pattern, compiled in zip(self.patterns, self._compiled):
+            if compiled.match(line):
+                return pattern
+        return None
+
+    def all_matches(self, line):
+        """Return all patterns matching line"""
+        if not self._may_match(line):
+            return []
+        return [pattern for pattern, compiled in zip(self.patterns, self._compiled)
+                if compiled.match(line)]
+
 
 class LogValidator(object):
     """
@@ -36,45 +90,71 @@ class LogValidator(object):
                                   matched_patterns=['PARTICULAR_INFO'])
           evm_tail.fix_before_start()
           evm_tail.validate_logs()
+
+    The SFTP session of the tail is only open during :py:meth:`fix_before_start` and
+    :py:meth:`validate_logs`, :py:meth:`close` (or using the validator as a context manager)
+    closes its connection as well.
     """
 
     def __init__(self, remote_filename, **kwargs):
         self.skip_patterns = kwargs.pop('skip_patterns', [])
         self.failure_patterns = kwargs.pop('failure_patterns', [])
         self.matched_patterns = kwargs.pop('matched_patterns', [])
+        self._skip = PatternSet(self.skip_patterns)
+        self._failure = PatternSet(self.failure_patterns)
+        self._unmatched = PatternSet(self.matched_patterns)
 
         self._remote_file_tail = SSHTail(remote_filename, **kwargs)
         self.matches = {}
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    def close(self):
+        self._remote_file_tail.close()
+
     def fix_before_start(self):
-        self._remote_file_tail.set_initial_file_end()
+        with self._remote_file_tail:
+            self._remote_file_tail.set_initial_file_end()
 
     def validate_logs(self):
-        for line in self._remote_file_tail:
+        with self._remote_file_tail:
+            self.validate_lines(self._remote_file_tail)
+        self._verify_match_logs()
+
+    def validate_lines(self, lines):
+        """Check lines against the patterns, without verifying the expected ones matched"""
+        for line in lines:
             if self._check_skip_logs(line):
                 continue
             self._check_fail_logs(line)
             self._check_match_logs(line)
-        self._verify_match_logs()
 
     def _check_skip_logs(self, line):
-        for pattern in self.skip_patterns:
-            if re.match(pattern, line):
-                logger.info('Skip pattern {} was matched on line {},\
-                            so skipping this line'.format(pattern, line))
-                return True
+        pattern = self._skip.first_match(line)
+        if pattern is not None:
+            logger.info('Skip pattern {} was matched on line {},\
+                        so skipping this line'.format(pattern, line))
+            return True
         return False
 
     def _check_fail_logs(self, line):
-        for pattern in self.failure_patterns:
-            if re.match(pattern, line):
-                pytest.fail('Failure pattern {} was matched on line {}'.format(pattern, line))
+        pattern = self._failure.first_match(line)
+        if pattern is not None:
+            pytest.fail('Failure pattern {} was matched on line {}'.format(pattern, line))
 
     def _check_match_logs(self, line):
-        for pattern in self.matched_patterns:
-            if re.match(pattern, line):
-                logger.info('Expected pattern {} was matched on line {}'.format(pattern, line))
-                self.matches[pattern] = True
+        matched = self._unmatched.all_matches(line)
+        for pattern in matched:
+            logger.info('Expected pattern {} was matched on line {}'.format(pattern, line))
+            self.matches[pattern] = True
+        if matched:
+            # stop looking for the patterns that were found already
+            self._unmatched = PatternSet(
+                [pattern for pattern in self._unmatched.patterns if pattern not in self.matches])
 
     def _verify_match_logs(self):
         for pattern in self.matched_patterns:
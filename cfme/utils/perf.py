@@ -3,7 +3,7 @@ import time
 
 from cfme.fixtures.pytest_store import store
 from cfme.utils.log import logger
-from cfme.utils.ssh import SSHClient, SSHTail
+from cfme.utils.ssh import RUNCMD_TIMEOUT, SSHClient, SSHTail
 
 
 def collect_log(ssh_client, log_prefix, local_file_name, strip_whitespace=False):
@@ -16,27 +16,30 @@ def collect_log(ssh_client, log_prefix, local_file_name, strip_whitespace=False)
     dest_file = '{}{}.perf.log'.format(log_dir, log_prefix)
     dest_file_gz = '{}{}.perf.log.gz'.format(log_dir, log_prefix)
 
-    ssh_client.run_command('rm -f {}'.format(dest_file_gz))
-
-    result = ssh_client.run_command('ls -1 {}-*'.format(log_file))
-    if result.success:
-        files = result.output.strip().split('\n')
-        for lfile in sorted(files):
-            ssh_client.run_command('cp {} {}-2.gz'.format(lfile, lfile))
-            ssh_client.run_command('gunzip {}-2.gz'.format(lfile))
-            if strip_whitespace:
-                ssh_client.run_command('sed -i  \'s/^ *//; s/ *$//; /^$/d; /^\s*$/d\' '
-                    '{}-2'.format(lfile))
-            ssh_client.run_command('cat {}-2 >> {}'.format(lfile, dest_file))
-            ssh_client.run_command('rm {}-2'.format(lfile))
-
-    ssh_client.run_command('cp {} {}-2'.format(log_file, log_file))
-    if strip_whitespace:
-        ssh_client.run_command('sed -i  \'s/^ *//; s/ *$//; /^$/d; /^\s*$/d\' '
-            '{}-2'.format(log_file))
-    ssh_client.run_command('cat {}-2 >> {}'.format(log_file, dest_file))
-    ssh_client.run_command('rm {}-2'.format(log_file))
-    ssh_client.run_command('gzip {}{}.perf.log'.format(log_dir, log_prefix))
+    result = ssh_client.run_commands(
+        ['rm -f {}'.format(dest_file_gz), 'ls -1 {}-*'.format(log_file)])[1]
+    rotated_files = sorted(result.output.strip().split('\n')) if result.success else []
+
+    # The files are appended one after another, so the commands depend on each other. They are
+    # chained into a single command to save a round trip per command, which gets the time every
+    # step got on its own, the logs may be several GB.
+    commands = []
+
+    def append_copy(copy_name):
+        if strip_whitespace:
+            commands.append('sed -i  \'s/^ *//; s/ *$//; /^$/d; /^\s*$/d\' '
+                '{}'.format(copy_name))
+        commands.append('cat {} >> {}'.format(copy_name, dest_file))
+        commands.append('rm {}'.format(copy_name))
+
+    for lfile in rotated_files:
+        commands.append('cp {} {}-2.gz'.format(lfile, lfile))
+        commands.append('gunzip {}-2.gz'.format(lfile))
+        append_copy('{}-2'.format(lfile))
+    commands.append('cp {} {}-2'.format(log_file, log_file))
+    append_copy('{}-2'.format(log_file))
+    commands.append('gzip {}{}.perf.log'.format(log_dir, log_prefix))
+    ssh_client.run_command('; '.join(commands), timeout=RUNCMD_TIMEOUT * len(commands))
 
     ssh_client.get_file(dest_file_gz, local_file_name)
     ssh_client.run_command('rm -f {}'.format(dest_file_gz))
@@ -3,6 +3,7 @@
 appliance.
 """
 import csv
+import multiprocessing
 import subprocess
 from datetime import datetime
 from datetime import timedelta
@@ -60,96 +61,254 @@ miq_top = re.compile(r'([0-9]+)\s+[0-9]+\s+[A-Za-z0-9]+\s+[0-9]+\s+[0-9\-]+\s+([
     r'([0-9\.mg]+)\s+([0-9\.mg]+)\s+[SRDZ]\s+([0-9\.]+)\s+([0-9\.]+)')
 
 
-def evm_to_messages(evm_file, filters):
+# Lines that don't contain this are skipped without running any regex on them
+miqmsg_literal = b'MIQ('
+miqqueue_literal = b'MIQ(MiqQueue.'
+# Messages are parsed from the lines of these MiqQueue methods
+miqqueue_events = ('MiqQueue.put', 'MiqQueue.get_via_drb', 'MiqQueue.delivered')
+# evm.log is split in chunks of at least this size to be parsed in parallel
+evm_chunk_min_size = 64 * 1024 * 1024
+# and read in blocks of this size
+evm_read_size = 8 * 1024 * 1024
+
+# Messages are parsed into lists of the MiqMsgStat fields, these are their positions
+(MSG_ID, MSG_CMD, MSG_ARGS, PID_PUT, PID_GET, PUTTIME, GETTIME, DEQ_TIME, DEL_TIME,
+    TOTAL_TIME) = range(10)
+
+
+if str is bytes:
+    def _decode_line(line):
+        return line
+else:
+    def _decode_line(line):
+        return line.decode('utf-8', 'replace')
+
+
+def evm_file_chunks(evm_file, chunk_count):
+    """Splits a file into up to chunk_count (start, end) byte ranges that end on line ends"""
+    size = os.path.getsize(evm_file)
+    starts = [0]
+    with open(evm_file, 'rb') as f:
+        for index in range(1, chunk_count):
+            # A line starting right at the split point belongs to the chunk, so look for the end
+            # of the line from the byte before it
+            f.seek(size * index // chunk_count - 1)
+            f.readline()
+            start = f.tell()
+            if starts[-1] < start < size:
+                starts.append(start)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+class EvmChunkReader(object):
+    """Finds the lines containing a literal in a part of a file
+
+    The part is read in large blocks and searched for the literal without splitting it into
+    lines, so lines that don't contain it cost next to nothing. The literal may be changed while
+    iterating, it applies from the next line on.
+    """
+    def __init__(self, evm_file, start, end):
+        self.evm_file = evm_file
+        self.start = start
+        self.end = end
+        self.literal = None
+        self.line_count = 0
+
+    def blocks(self):
+        """Yields blocks of whole lines"""
+        with open(self.evm_file, 'rb') as f:
+            f.seek(self.start)
+            remaining = self.end - self.start
+            rest = b''
+            while remaining > 0:
+                data = f.read(min(evm_read_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                block = rest + data
+                if remaining > 0:
+                    cut = block.rfind(b'\n') + 1
+                    block, rest = block[:cut], block[cut:]
+                else:
+                    rest = b''
+                if block:
+                    yield block
+            if rest:
+                yield rest
+
+    def lines_containing(self, literal):
+        """Yields (line number, line) for the lines containing the literal, counting from 1"""
+        self.literal = literal
+        for block in self.blocks():
+            counted = 0
+            index = block.find(self.literal)
+            while index != -1:
+                line_start = block.rfind(b'\n', 0, index) + 1
+                line_end = block.find(b'\n', index)
+                if line_end == -1:
+                    line_end = len(block)
+                self.line_count += block.count(b'\n', counted, line_start)
+                counted = line_start
+                yield self.line_count + 1, block[line_start:line_end]
+                index = block.find(self.literal, line_end)
+            self.line_count += block.count(b'\n', counted)
+            if not block.endswith(b'\n'):
+                # the last line of the file has no line end
+                self.line_count += 1
+
+
+def parse_evm_chunk(chunk):
+    """Parses the messages out of a part of evm.log
+
+    Args:
+        chunk: tuple of the evm.log path, the start and end offsets of the part and the filters
+    Returns:
+        A dict with:
+
+        * ``messages``: lists of message fields by message id for the messages put on the queue
+          in this part, with the gets and deliveries that followed applied
+        * ``orphans``: gets and deliveries of messages not put on the queue in this part, in order
+          as tuples of (line number, event, message id, pid, timestamp, dequeue/delivery time)
+        * ``errors``: tuples of (line number, log message) for lines that could not be parsed
+        * ``test_start``: timestamp of the first MIQ() line, ``None`` if there is none
+        * ``test_end``: (line number, timestamp) of the last message line, or ``None``
+        * ``line_count``: number of lines in the part
+
+        Line numbers count from the start of the part.
+    """
+    evm_file, start, end, filters = chunk
+    messages = {}
+    orphans = []
+    errors = []
+    test_start = None
+    test_end = None
+
+    reader = EvmChunkReader(evm_file, start, end)
+    for line_no, evm_log_line in reader.lines_containing(miqmsg_literal):
+        evm_log_line = _decode_line(evm_log_line).strip()
+
+        miqmsg_result = miqmsg.search(evm_log_line)
+        if not miqmsg_result:
+            continue
+        # Obtains the first timestamp in the log file, only message lines are needed after it
+        if test_start is None:
+            test_start, pid = get_msg_timestamp_pid(evm_log_line)
+            reader.literal = miqqueue_literal
+        event = miqmsg_result.group(1)
+        if event not in miqqueue_events:
+            continue
+        msg_id = get_msg_id(evm_log_line)
+        if not msg_id:
+            errors.append((line_no, 'Could not obtain message id'))
+            continue
+        ts, pid = get_msg_timestamp_pid(evm_log_line)
+
+        # A message was first put on the queue, this starts its queuing time
+        if event == 'MiqQueue.put':
+            test_end = line_no, ts
+            msg_cmd = get_msg_cmd(evm_log_line)
+            msg_args = get_msg_args(evm_log_line)
+            if msg_args is False:
+                logger.debug('Could not obtain message args line #: %s', line_no)
+                msg_args = ''
+            # By filtering over messages, we can better display what is occuring under the
+            # covers, as a daily rollup is picked up off the queue different than a hourly
+            # rollup, etc
+            for p_filter in filters:
+                if filters[p_filter].search(msg_args.strip()):
+                    msg_cmd = '{}{}'.format(msg_cmd, p_filter)
+                    break
+            messages[msg_id] = [
+                '\'' + msg_id + '\'', msg_cmd, msg_args, pid, '', ts, '', 0.0, 0.0, 0.0]
+        elif event == 'MiqQueue.get_via_drb':
+            deq_time = get_msg_deq(evm_log_line)
+            if msg_id in messages:
+                test_end = line_no, ts
+                apply_msg_get(messages[msg_id], pid, ts, deq_time)
+            else:
+                orphans.append((line_no, event, msg_id, pid, ts, deq_time))
+        else:
+            test_end = line_no, ts
+            del_time = get_msg_del(evm_log_line)
+            if msg_id in messages:
+                apply_msg_delivered(messages[msg_id], del_time)
+            else:
+                orphans.append((line_no, event, msg_id, pid, ts, del_time))
+
+    return {'messages': messages, 'orphans': orphans, 'errors': errors,
+            'test_start': test_start, 'test_end': test_end, 'line_count': reader.line_count}
+
+
+def apply_msg_get(msg, pid, ts, deq_time):
+    msg[PID_GET] = pid
+    msg[GETTIME] = ts
+    msg[DEQ_TIME] = deq_time
+
+
+def apply_msg_delivered(msg, del_time):
+    msg[DEL_TIME] = del_time
+    msg[TOTAL_TIME] = msg[DEQ_TIME] + del_time
+
+
+def evm_to_messages(evm_file, filters, processes=None):
+    """Parses the queue messages out of evm.log
+
+    The file is split into chunks on line boundaries which are parsed in parallel by a pool of
+    ``processes`` worker processes (one per CPU by default). The chunk results are merged in file
+    order: gets and deliveries of messages put on the queue in an earlier chunk are applied to
+    them, and a message put again in a later chunk replaces the earlier one.
+    """
+    processes = processes or multiprocessing.cpu_count()
+    size = os.path.getsize(evm_file)
+    chunk_count = max(1, min(processes * 4, size // evm_chunk_min_size))
+    chunks = [(evm_file, start, end, filters)
+              for start, end in evm_file_chunks(evm_file, chunk_count)]
+    if processes > 1 and len(chunks) > 1:
+        pool = multiprocessing.Pool(processes)
+        results = pool.imap(parse_evm_chunk, chunks)
+    else:
+        pool = None
+        results = (parse_evm_chunk(chunk) for chunk in chunks)
+
     test_start = ''
     test_end = ''
     line_count = 0
     messages = {}
     msg_cmds = {}
-
-    runningtime = time()
-    evmlogfile = open(evm_file, 'r')
-    evm_log_line = evmlogfile.readline()
-    while evm_log_line:
-        line_count += 1
-        evm_log_line = evm_log_line.strip()
-
-        miqmsg_result = miqmsg.search(evm_log_line)
-        if miqmsg_result:
-
-            # Obtains the first timestamp in the log file
-            if test_start == '':
-                ts, pid = get_msg_timestamp_pid(evm_log_line)
-                test_start = ts
-
-            # A message was first put on the queue, this starts its queuing time
-            if (miqmsg_result.group(1) == 'MiqQueue.put'):
-
-                msg_cmd = get_msg_cmd(evm_log_line)
-                msg_id = get_msg_id(evm_log_line)
-                if msg_id:
-                    ts, pid = get_msg_timestamp_pid(evm_log_line)
-                    test_end = ts
-                    messages[msg_id] = MiqMsgStat()
-                    messages[msg_id].msg_id = msg_id
-                    messages[msg_id].msg_id = '\'' + msg_id + '\''
-                    messages[msg_id].msg_cmd = msg_cmd
-                    messages[msg_id].pid_put = pid
-                    messages[msg_id].puttime = ts
-                    msg_args = get_msg_args(evm_log_line)
-                    if msg_args is False:
-                        logger.debug('Could not obtain message args line #: %s', line_count)
-                    else:
-                        messages[msg_id].msg_args = msg_args
-                else:
-                    logger.error('Could not obtain message id, line #: %s', line_count)
-
-            elif (miqmsg_result.group(1) == 'MiqQueue.get_via_drb'):
-                msg_id = get_msg_id(evm_log_line)
-                if msg_id:
-                    if msg_id in messages:
-                        ts, pid = get_msg_timestamp_pid(evm_log_line)
-                        test_end = ts
-                        messages[msg_id].pid_get = pid
-                        messages[msg_id].gettime = ts
-                        messages[msg_id].deq_time = get_msg_deq(evm_log_line)
-                    else:
-                        logger.error('Message ID not in dictionary: %s', msg_id)
-                else:
-                    logger.error('Could not obtain message id, line #: %s', line_count)
-
-            elif (miqmsg_result.group(1) == 'MiqQueue.delivered'):
-                msg_id = get_msg_id(evm_log_line)
-                if msg_id:
-                    ts, pid = get_msg_timestamp_pid(evm_log_line)
-                    test_end = ts
-                    if msg_id in messages:
-                        messages[msg_id].del_time = get_msg_del(evm_log_line)
-                        messages[msg_id].total_time = messages[msg_id].deq_time + \
-                            messages[msg_id].del_time
-                    else:
-                        logger.error('Message ID not in dictionary: %s', msg_id)
+    try:
+        runningtime = time()
+        for index, result in enumerate(results):
+            if test_start == '' and result['test_start'] is not None:
+                test_start = result['test_start']
+            chunk_end = result['test_end']
+            for line, event, msg_id, pid, ts, event_time in result['orphans']:
+                if msg_id not in messages:
+                    logger.error('Message ID not in dictionary: %s', msg_id)
+                elif event == 'MiqQueue.get_via_drb':
+                    # only gets of known messages count for the end of the test
+                    if chunk_end is None or chunk_end[0] < line:
+                        chunk_end = line, ts
+                    apply_msg_get(messages[msg_id], pid, ts, event_time)
                 else:
-                    logger.error('Could not obtain message id, line #: %s', line_count)
-
-        if (line_count % 100000) == 0:
+                    apply_msg_delivered(messages[msg_id], event_time)
+            if chunk_end is not None:
+                test_end = chunk_end[1]
+            messages.update(result['messages'])
+            for line, error in result['errors']:
+                logger.error('%s, line #: %s', error, line_count + line)
+            line_count += result['line_count']
             timediff = time() - runningtime
             runningtime = time()
-            logger.info('Count {} : Parsed 100000 lines in %s', line_count, timediff)
-
-        evm_log_line = evmlogfile.readline()
+            logger.info('Chunk %s/%s : Parsed %s lines in %s', index + 1, len(chunks),
+                result['line_count'], timediff)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
 
-    # I tried to avoid two loops but this reduced the complexity of filtering on messages.
-    # By filtering over messages, we can better display what is occuring under the covers, as a
-    # daily rollup is picked up off the queue different than a hourly rollup, etc
+    for msg_id in messages:
+        messages[msg_id] = MiqMsgStat(*messages[msg_id])
     for msg in sorted(messages.keys()):
-        msg_args = messages[msg].msg_args
-        # Determine if the pattern matches and append to the command if it does
-        for p_filter in filters:
-            results = filters[p_filter].search(msg_args.strip())
-            if results:
-                messages[msg].msg_cmd = '{}{}'.format(messages[msg].msg_cmd, p_filter)
-                break
         msg_cmd = messages[msg].msg_cmd
         if msg_cmd not in msg_cmds:
             msg_cmds[msg_cmd] = {}
@@ -1033,20 +1192,23 @@ def perf_process_evm(evm_file, top_file):
 
 
 class MiqMsgStat(object):
-
-    def __init__(self):
-        self.headers = ['msg_id', 'msg_cmd', 'msg_args', 'pid_put', 'pid_get', 'puttime', 'gettime',
-            'deq_time', 'del_time', 'total_time']
-        self.msg_id = ''
-        self.msg_cmd = ''
-        self.msg_args = ''
-        self.pid_put = ''
-        self.pid_get = ''
-        self.puttime = ''
-        self.gettime = ''
-        self.deq_time = 0.0
-        self.del_time = 0.0
-        self.total_time = 0.0
+    headers = ['msg_id', 'msg_cmd', 'msg_args', 'pid_put', 'pid_get', 'puttime', 'gettime',
+        'deq_time', 'del_time', 'total_time']
+    # There is one of these for every message of a log, which can be millions
+    __slots__ = headers
+
+    def __init__(self, msg_id='', msg_cmd='', msg_args='', pid_put='', pid_get='', puttime='',
+            gettime='', deq_time=0.0, del_time=0.0, total_time=0.0):
+        self.msg_id = msg_id
+        self.msg_cmd = msg_cmd
+        self.msg_args = msg_args
+        self.pid_put = pid_put
+        self.pid_get = pid_get
+        self.puttime = puttime
+        self.gettime = gettime
+        self.deq_time = deq_time
+        self.del_time = del_time
+        self.total_time = total_time
 
     def __iter__(self):
         for header in self.headers:
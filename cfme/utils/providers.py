@@ -7,6 +7,11 @@ The rest of the functions, such as get_mgmt, get_crud, get_provider_keys etc ign
 dict and will provide you with whatever you ask for with no limitations.
 
 The main clue to know what is limited by the filters and what isn't is the 'filters' parameter.
+
+Test generation lists the providers for every test function, so list_providers keeps a
+:py:class:`ProviderRegistry` per appliance. It builds the provider crud objects once and remembers
+which providers passed which filters. When running parallelized, the master saves what it filtered
+during its collection and the slaves load it instead of filtering again.
 """
 import operator
 import six
@@ -22,6 +27,13 @@ from cfme.utils.log import logger
 providers_data = conf.cfme_data.get("management_systems", {})
 # Dict of active provider filters {name: ProviderFilter}
 global_filters = {}
+# Dict of provider registries {appliance: ProviderRegistry}
+_registries = {}
+# Dict of appliance versions resolved for the version restriction {appliance: version}
+_appliance_versions = {}
+# Provider keys passing the filters, as filtered by the master {filters signature: [key, ...]}
+_loaded_parametrization = {}
+PARAMETRIZATION_CACHE_KEY = 'providers/parametrization'
 
 
 def load_setuptools_entrypoints():
@@ -39,6 +51,36 @@ def load_setuptools_entrypoints():
                 "Plugin {} could not be loaded: {}!".format(ep.name, e))
 
 
+def _signature(value):
+    """Converts filter arguments to a value whose repr is the same in every process"""
+    if isinstance(value, type):
+        return '{}.{}'.format(value.__module__, value.__name__)
+    elif isinstance(value, Mapping):
+        return sorted((key, _signature(item)) for key, item in value.items())
+    elif isinstance(value, (set, frozenset)):
+        return sorted(_signature(item) for item in value)
+    elif isinstance(value, list):
+        return [_signature(item) for item in value]
+    elif isinstance(value, tuple):
+        # Tuples and lists of required fields mean different things
+        return tuple(_signature(item) for item in value)
+    return value
+
+
+def appliance_version(appliance):
+    """ Returns the version of the appliance, resolved only once
+
+    Returns: The version or `None` if it could not be resolved.
+    """
+    if appliance not in _appliance_versions:
+        try:
+            _appliance_versions[appliance] = appliance.version
+        except Exception:
+            logger.exception('Could not resolve the appliance version to filter providers')
+            _appliance_versions[appliance] = None
+    return _appliance_versions[appliance]
+
+
 class ProviderFilter(object):
     """ Filter used to obtain only providers matching given requirements
 
@@ -71,6 +113,13 @@ class ProviderFilter(object):
         self.inverted = inverted
         self.conjunctive = conjunctive
 
+    @property
+    def signature(self):
+        """ Representation of the filter, equal for filters that filter the same """
+        return _signature((
+            type(self), self.keys, self.classes, self.required_fields, self.required_tags,
+            self.required_flags, self.restrict_version, self.inverted, self.conjunctive))
+
     def _filter_keys(self, provider):
         """ Filters by provider keys """
         if self.keys is None:
@@ -169,8 +218,10 @@ class ProviderFilter(object):
                     if not ver:  # This means that the operator was not found
                         continue
                     try:
-                        curr_ver = provider.appliance.version
+                        curr_ver = appliance_version(provider.appliance)
                     except:
+                        curr_ver = None
+                    if curr_ver is None:
                         return True
                     ver = type(curr_ver)(ver)
                     if not comparator(curr_ver, ver):
@@ -230,6 +281,87 @@ global_filters['enabled_only'] = ProviderFilter(required_tags=['disabled'], inve
 global_filters['restrict_version'] = ProviderFilter(restrict_version=True)
 
 
+def filters_signature(filters):
+    """ Returns a string identifying the filters regardless of their order
+
+    Returns: The signature or `None` if any of the filters is not a :py:class:`ProviderFilter`.
+    """
+    if not all(isinstance(prov_filter, ProviderFilter) for prov_filter in filters):
+        return None
+    return '|'.join(sorted({repr(prov_filter.signature) for prov_filter in filters}))
+
+
+class ProviderRegistry(object):
+    """ Provider crud objects of an appliance and the keys of the providers passing filters
+
+    Both are computed once per appliance. The crud objects are only used for the filtering,
+    :py:func:`list_providers` hands out new ones, as tests change them and their endpoints.
+    """
+    def __init__(self, appliance):
+        self.appliance = appliance
+        self._cruds = {}
+        self._filtered = {}
+
+    def get_crud(self, provider_key):
+        if provider_key not in self._cruds:
+            self._cruds[provider_key] = get_crud(provider_key)
+        return self._cruds[provider_key]
+
+    def filtered_keys(self, filters):
+        """ Returns the keys of the providers passing all the filters """
+        signature = filters_signature(filters)
+        if signature is not None and signature in self._filtered:
+            return self._filtered[signature]
+        if signature in _loaded_parametrization:
+            keys = _loaded_parametrization[signature]
+        else:
+            providers = [self.get_crud(prov_key) for prov_key in providers_data]
+            for prov_filter in filters:
+                providers = filter(prov_filter, providers)
+            keys = [prov.key for prov in providers]
+        if signature is not None:
+            self._filtered[signature] = keys
+        return keys
+
+    @property
+    def parametrization(self):
+        """ Keys of the providers passing the filters used so far, by the filters signature """
+        return dict(self._filtered)
+
+
+def provider_registry():
+    """ Returns the :py:class:`ProviderRegistry` of the current appliance """
+    from cfme.utils.appliance import get_or_create_current_appliance
+    appliance = get_or_create_current_appliance()
+    if appliance not in _registries:
+        _registries[appliance] = ProviderRegistry(appliance)
+    return _registries[appliance]
+
+
+def save_provider_parametrization(cache, run_id):
+    """ Saves the provider filtering done so far into the pytest cache for the slaves
+
+    Args:
+        cache: The pytest ``config.cache``
+        run_id: Identifies the test run, slaves only load the parametrization of their run
+    """
+    cache.set(PARAMETRIZATION_CACHE_KEY, {
+        'run_id': run_id, 'filtered': provider_registry().parametrization})
+
+
+def load_provider_parametrization(cache, run_id):
+    """ Loads the provider filtering saved by :py:func:`save_provider_parametrization`
+
+    Returns: `True` if the parametrization of the run was found, `False` otherwise.
+    """
+    saved = cache.get(PARAMETRIZATION_CACHE_KEY, None)
+    if not saved or saved.get('run_id') != run_id:
+        return False
+    _loaded_parametrization.clear()
+    _loaded_parametrization.update(saved['filtered'])
+    return True
+
+
 def list_providers(filters=None, use_global_filters=True):
     """ Lists provider crud objects, global filter optional
 
@@ -248,10 +380,8 @@ def list_providers(filters=None, use_global_filters=True):
     filters = filters or []
     if use_global_filters:
         filters = filters + list(global_filters.values())
-    providers = [get_crud(prov_key) for prov_key in providers_data]
-    for prov_filter in filters:
-        providers = filter(prov_filter, providers)
-    return providers
+    registry = provider_registry()
+    return [get_crud(prov_key) for prov_key in registry.filtered_keys(filters)]
 
 
 def list_providers_by_class(prov_class, use_global_filters=True):
@@ -1,9 +1,19 @@
-"""Monitor Memory on a CFME/Miq appliance and builds report&graphs displaying usage per process."""
+"""Monitor Memory on a CFME/Miq appliance and builds report&graphs displaying usage per process.
+
+Samples are kept in a :py:class:`MemoryStore`, one array of floats per measurement, and spilled
+to CSV files every few samples while the workload runs, so a long run neither grows a deep
+structure of dicts nor loses all its samples when the test dies before the report is created.
+"""
+import csv
 import json
+import shutil
+import tempfile
 import time
 import traceback
+from array import array
+from bisect import bisect_left
 from collections import OrderedDict
-from datetime import datetime
+from datetime import datetime, timedelta
 from threading import Thread
 
 import os
@@ -14,7 +24,7 @@ from yaycl import AttrDict
 
 from cfme.utils.conf import cfme_performance
 from cfme.utils.log import logger
-from cfme.utils.path import results_path
+from cfme.utils.path import results_path, scripts_data_path
 from cfme.utils.version import current_version
 from cfme.utils.version import get_version
 
@@ -135,72 +145,271 @@ test_ts = time.strftime('%Y%m%d%H%M%S')
 # 10s sample interval (occasionally sampling can take almost 4s on an appliance doing a lot of work)
 SAMPLE_INTERVAL = 10
 
+# Samples are appended to the spill files every SPILL_SAMPLES samples (5 minutes)
+SPILL_SAMPLES = 30
+
+APPLIANCE_MEASUREMENTS = ('total', 'free', 'used', 'buffers', 'cached', 'slab', 'swap_total',
+    'swap_free')
+PROCESS_MEASUREMENTS = ('rss', 'pss', 'uss', 'vss', 'swap')
+
+# Sampling overhead reported in the summary, measurement and label
+SAMPLING_MEASUREMENTS = (
+    ('duration', 'Sample Duration (s)'),
+    ('cpu', 'Sampler CPU Time (s)'),
+    ('lag', 'Sample Start Jitter (s)'),
+)
+
+# Started on the appliance to stream samples over a single channel
+SAMPLER_SCRIPT = scripts_data_path.join('smem_sampler.py')
+REMOTE_SAMPLER_SCRIPT = '/tmp/smem_sampler.py'
+
+APPLIANCE_SPILL_FILE = 'appliance-samples.csv'
+PROCESS_SPILL_FILE = 'process-samples.csv'
+
+# Timestamps are stored as seconds since EPOCH, plottime is a naive local datetime
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_seconds(timestamp):
+    return (timestamp - EPOCH).total_seconds()
+
+
+def to_datetime(seconds):
+    return EPOCH + timedelta(seconds=seconds)
+
+
+def to_datenums(times):
+    """Convert an array of stored timestamps to matplotlib date numbers in one go"""
+    import matplotlib.dates as mdates
+    import numpy
+    return numpy.frombuffer(times, dtype=numpy.float64) / 86400.0 + mdates.date2num(EPOCH)
+
+
+class ProcessSeries(object):
+    """Samples of a single process, one array per measurement"""
+    def __init__(self, name, pid):
+        self.name = name
+        self.pid = pid
+        self.times = array('d')
+        self.columns = OrderedDict((m, array('d')) for m in PROCESS_MEASUREMENTS)
+        self.spilled = 0
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, seconds, values):
+        self.times.append(seconds)
+        for measurement, column in self.columns.items():
+            column.append(values[measurement])
+
+    def index(self, seconds):
+        """Return the index of the sample taken at ``seconds``, or None if there is none"""
+        index = bisect_left(self.times, seconds)
+        if index < len(self.times) and self.times[index] == seconds:
+            return index
+
+    @property
+    def start(self):
+        return to_datetime(self.times[0])
+
+    @property
+    def end(self):
+        return to_datetime(self.times[-1])
+
+    def first(self, measurement):
+        return self.columns[measurement][0]
+
+    def last(self, measurement):
+        return self.columns[measurement][-1]
+
+
+class MemoryStore(object):
+    """Columnar store of appliance and per process memory samples
+
+    Appliance measurements are one array per measurement sharing the ``times`` array, processes
+    are kept as a :py:class:`ProcessSeries` per process name and pid. Process names and pids are
+    interned, every sample only adds a float per measurement.
+
+    With a ``spill_path`` the samples added since the last spill are appended to
+    ``appliance-samples.csv`` and ``process-samples.csv`` there every ``spill_samples`` samples,
+    :py:meth:`load` reads them back.
+    """
+    def __init__(self, spill_path=None, spill_samples=SPILL_SAMPLES):
+        self.spill_path = spill_path
+        self.spill_samples = spill_samples
+        self.times = array('d')
+        self.appliance = OrderedDict((m, array('d')) for m in APPLIANCE_MEASUREMENTS)
+        self.processes = OrderedDict()
+        self.sampling = OrderedDict((m, array('d')) for m, _ in SAMPLING_MEASUREMENTS)
+        self._names = {}
+        self._spilled = 0
+        self._unspilled_samples = 0
+        if spill_path is not None:
+            if not os.path.exists(spill_path):
+                os.makedirs(spill_path)
+            for file_name, header in ((APPLIANCE_SPILL_FILE, APPLIANCE_MEASUREMENTS),
+                                      (PROCESS_SPILL_FILE, ('name', 'pid') + PROCESS_MEASUREMENTS)):
+                with open(os.path.join(spill_path, file_name), 'w') as spill_file:
+                    csv.writer(spill_file).writerow(('timestamp', ) + header)
+
+    def __len__(self):
+        return len(self.times)
+
+    def add_appliance_sample(self, timestamp, values):
+        self.times.append(to_seconds(timestamp))
+        for measurement, column in self.appliance.items():
+            column.append(values[measurement])
+
+    def series(self, name, pid):
+        """Return the :py:class:`ProcessSeries` of a process, creating it on first use"""
+        name = self._names.setdefault(name, name)
+        pids = self.processes.setdefault(name, OrderedDict())
+        if pid not in pids:
+            pids[pid] = ProcessSeries(name, pid)
+        return pids[pid]
+
+    def add_process_sample(self, name, pid, timestamp, values):
+        self.series(name, pid).append(to_seconds(timestamp), values)
+
+    def add_sampling(self, **values):
+        """Record the overhead of a sampling round, see SAMPLING_MEASUREMENTS"""
+        for measurement, value in values.items():
+            self.sampling[measurement].append(value)
+
+    def end_sample(self):
+        """Mark a sampling round as complete, spilling to disk when enough samples piled up"""
+        self._unspilled_samples += 1
+        if self.spill_path is not None and self._unspilled_samples >= self.spill_samples:
+            self.spill()
+
+    def spill(self):
+        """Append every sample not yet spilled to the spill files"""
+        if self.spill_path is None:
+            return
+        with open(os.path.join(self.spill_path, APPLIANCE_SPILL_FILE), 'a') as spill_file:
+            writer = csv.writer(spill_file)
+            columns = list(self.appliance.values())
+            for index in range(self._spilled, len(self.times)):
+                writer.writerow([repr(self.times[index])] +
+                    [repr(column[index]) for column in columns])
+        self._spilled = len(self.times)
+        with open(os.path.join(self.spill_path, PROCESS_SPILL_FILE), 'a') as spill_file:
+            writer = csv.writer(spill_file)
+            for series in self.all_series():
+                columns = list(series.columns.values())
+                for index in range(series.spilled, len(series)):
+                    writer.writerow([repr(series.times[index]), series.name, series.pid] +
+                        [repr(column[index]) for column in columns])
+                series.spilled = len(series)
+        self._unspilled_samples = 0
+
+    def move_spill_files(self, directory):
+        """Spill what is left and move the spill files to ``directory``"""
+        if self.spill_path is None:
+            return
+        self.spill()
+        for file_name in (APPLIANCE_SPILL_FILE, PROCESS_SPILL_FILE):
+            shutil.move(os.path.join(self.spill_path, file_name), str(directory.join(file_name)))
+        os.rmdir(self.spill_path)
+        self.spill_path = None
+
+    @classmethod
+    def load(cls, spill_path):
+        """Create a store from the spill files of a previous run"""
+        store = cls()
+        with open(os.path.join(spill_path, APPLIANCE_SPILL_FILE)) as spill_file:
+            reader = csv.reader(spill_file)
+            next(reader)
+            for row in reader:
+                store.times.append(float(row[0]))
+                for column, value in zip(store.appliance.values(), row[1:]):
+                    column.append(float(value))
+        with open(os.path.join(spill_path, PROCESS_SPILL_FILE)) as spill_file:
+            reader = csv.reader(spill_file)
+            next(reader)
+            for row in reader:
+                series = store.series(row[1], row[2])
+                series.times.append(float(row[0]))
+                for column, value in zip(series.columns.values(), row[3:]):
+                    column.append(float(value))
+        store._spilled = len(store.times)
+        for series in store.all_series():
+            series.spilled = len(series)
+        return store
+
+    def all_series(self):
+        for pids in self.processes.values():
+            for series in pids.values():
+                yield series
+
+    @property
+    def start(self):
+        return to_datetime(self.times[0])
+
+    @property
+    def end(self):
+        return to_datetime(self.times[-1])
+
+    def first(self, measurement):
+        return self.appliance[measurement][0]
+
+    def last(self, measurement):
+        return self.appliance[measurement][-1]
+
 
 class SmemMemoryMonitor(Thread):
-    def __init__(self, ssh_client, scenario_data):
+    def __init__(self, ssh_client, scenario_data, use_sampler=True):
         super(SmemMemoryMonitor, self).__init__()
         self.ssh_client = ssh_client
         self.scenario_data = scenario_data
+        self.use_sampler = use_sampler
         self.grafana_urls = {}
         self.miq_server_id = ''
         self.use_slab = False
         self.signal = True
 
-    def create_process_result(self, process_results, starttime, process_pid, process_name,
-            memory_by_pid):
-        if process_pid in memory_by_pid.keys():
-            if process_name not in process_results:
-                process_results[process_name] = OrderedDict()
-                process_results[process_name][process_pid] = OrderedDict()
-            if process_pid not in process_results[process_name]:
-                process_results[process_name][process_pid] = OrderedDict()
-            process_results[process_name][process_pid][starttime] = {}
-            rss_mem = memory_by_pid[process_pid]['rss']
-            pss_mem = memory_by_pid[process_pid]['pss']
-            uss_mem = memory_by_pid[process_pid]['uss']
-            vss_mem = memory_by_pid[process_pid]['vss']
-            swap_mem = memory_by_pid[process_pid]['swap']
-            process_results[process_name][process_pid][starttime]['rss'] = rss_mem
-            process_results[process_name][process_pid][starttime]['pss'] = pss_mem
-            process_results[process_name][process_pid][starttime]['uss'] = uss_mem
-            process_results[process_name][process_pid][starttime]['vss'] = vss_mem
-            process_results[process_name][process_pid][starttime]['swap'] = swap_mem
+    def create_process_result(self, store, plottime, process_pid, process_name, memory_by_pid):
+        if process_pid in memory_by_pid:
+            store.add_process_sample(process_name, process_pid, plottime,
+                memory_by_pid[process_pid])
             del memory_by_pid[process_pid]
         else:
             logger.warn('Process {} PID, not found: {}'.format(process_name, process_pid))
 
-    def get_appliance_memory(self, appliance_results, plottime):
+    def get_appliance_memory(self, store, plottime):
         # 5.5/5.6 - RHEL 7 / Centos 7
         # Application Memory Used : MemTotal - (MemFree + Slab + Cached)
         # 5.4 - RHEL 6 / Centos 6
         # Application Memory Used : MemTotal - (MemFree + Buffers + Cached)
         # Available memory could potentially be better metric
-        appliance_results[plottime] = {}
-
         result = self.ssh_client.run_command('cat /proc/meminfo')
         if result.failed:
             logger.error('Exit_status nonzero in get_appliance_memory: {}, {}'
                          .format(result.rc, result.output))
-            del appliance_results[plottime]
         else:
             meminfo_raw = result.output.replace('kB', '').strip()
             meminfo = OrderedDict((k.strip(), v.strip()) for k, v in
                 (value.strip().split(':') for value in meminfo_raw.split('\n')))
-            appliance_results[plottime]['total'] = float(meminfo['MemTotal']) / 1024
-            appliance_results[plottime]['free'] = float(meminfo['MemFree']) / 1024
-            if 'MemAvailable' in meminfo:  # 5.5, RHEL 7/Centos 7
-                self.use_slab = True
-                mem_used = (float(meminfo['MemTotal']) - (float(meminfo['MemFree']) + float(
-                    meminfo['Slab']) + float(meminfo['Cached']))) / 1024
-            else:  # 5.4, RHEL 6/Centos 6
-                mem_used = (float(meminfo['MemTotal']) - (float(meminfo['MemFree']) + float(
-                    meminfo['Buffers']) + float(meminfo['Cached']))) / 1024
-            appliance_results[plottime]['used'] = mem_used
-            appliance_results[plottime]['buffers'] = float(meminfo['Buffers']) / 1024
-            appliance_results[plottime]['cached'] = float(meminfo['Cached']) / 1024
-            appliance_results[plottime]['slab'] = float(meminfo['Slab']) / 1024
-            appliance_results[plottime]['swap_total'] = float(meminfo['SwapTotal']) / 1024
-            appliance_results[plottime]['swap_free'] = float(meminfo['SwapFree']) / 1024
+            self.add_appliance_memory(store, plottime, meminfo)
+
+    def add_appliance_memory(self, store, plottime, meminfo):
+        memory = {}
+        memory['total'] = float(meminfo['MemTotal']) / 1024
+        memory['free'] = float(meminfo['MemFree']) / 1024
+        if 'MemAvailable' in meminfo:  # 5.5, RHEL 7/Centos 7
+            self.use_slab = True
+            mem_used = (float(meminfo['MemTotal']) - (float(meminfo['MemFree']) + float(
+                meminfo['Slab']) + float(meminfo['Cached']))) / 1024
+        else:  # 5.4, RHEL 6/Centos 6
+            mem_used = (float(meminfo['MemTotal']) - (float(meminfo['MemFree']) + float(
+                meminfo['Buffers']) + float(meminfo['Cached']))) / 1024
+        memory['used'] = mem_used
+        memory['buffers'] = float(meminfo['Buffers']) / 1024
+        memory['cached'] = float(meminfo['Cached']) / 1024
+        memory['slab'] = float(meminfo['Slab']) / 1024
+        memory['swap_total'] = float(meminfo['SwapTotal']) / 1024
+        memory['swap_free'] = float(meminfo['SwapFree']) / 1024
+        store.add_appliance_sample(plottime, memory)
 
     def get_evm_workers(self):
         result = self.ssh_client.run_command(
@@ -271,88 +480,138 @@ class SmemMemoryMonitor(Thread):
                     logger.error('Complete smem output: {}'.format(result.output))
         return memory_by_pid
 
-    def _real_run(self):
-        """ Result dictionaries:
-        appliance_results[timestamp][measurement] = value
-        appliance_results[timestamp]['total'] = value
-        appliance_results[timestamp]['free'] = value
-        appliance_results[timestamp]['used'] = value
-        appliance_results[timestamp]['buffers'] = value
-        appliance_results[timestamp]['cached'] = value
-        appliance_results[timestamp]['slab'] = value
-        appliance_results[timestamp]['swap_total'] = value
-        appliance_results[timestamp]['swap_free'] = value
-        appliance measurements: total/free/used/buffers/cached/slab/swap_total/swap_free
-        process_results[name][pid][timestamp][measurement] = value
-        process_results[name][pid][timestamp]['rss'] = value
-        process_results[name][pid][timestamp]['pss'] = value
-        process_results[name][pid][timestamp]['uss'] = value
-        process_results[name][pid][timestamp]['vss'] = value
-        process_results[name][pid][timestamp]['swap'] = value
+    def create_store(self):
+        spill_root = str(results_path.join('smem-samples'))
+        if not os.path.exists(spill_root):
+            os.makedirs(spill_root)
+        spill_path = tempfile.mkdtemp(prefix='{}-{}-'.format(test_ts,
+            self.scenario_data['scenario']['name']), dir=spill_root)
+        logger.info('Spilling memory samples to: {}'.format(spill_path))
+        return MemoryStore(spill_path)
+
+    def add_process_results(self, store, plottime, workers, memory_by_pid):
+        for worker_pid in workers:
+            self.create_process_result(store, plottime, worker_pid,
+                workers[worker_pid], memory_by_pid)
+
+        for pid in sorted(memory_by_pid.keys()):
+            if memory_by_pid[pid]['name'] == 'httpd':
+                self.create_process_result(store, plottime, pid, 'httpd',
+                    memory_by_pid)
+            elif memory_by_pid[pid]['name'] == 'postgres':
+                self.create_process_result(store, plottime, pid, 'postgres',
+                    memory_by_pid)
+            elif memory_by_pid[pid]['name'] == 'postmaster':
+                self.create_process_result(store, plottime, pid, 'postgres',
+                    memory_by_pid)
+            elif memory_by_pid[pid]['name'] == 'memcached':
+                self.create_process_result(store, plottime, pid, 'memcached',
+                    memory_by_pid)
+            elif memory_by_pid[pid]['name'] == 'collectd':
+                self.create_process_result(store, plottime, pid, 'collectd',
+                    memory_by_pid)
+            elif memory_by_pid[pid]['name'] == 'ruby':
+                if 'evm_server.rb' in memory_by_pid[pid]['cmd']:
+                    self.create_process_result(store, plottime, pid,
+                        'MIQ Server (evm_server.rb)', memory_by_pid)
+                elif 'MIQ Server' in memory_by_pid[pid]['cmd']:
+                    self.create_process_result(store, plottime, pid,
+                        'MIQ Server (evm_server.rb)', memory_by_pid)
+                elif 'evm_watchdog.rb' in memory_by_pid[pid]['cmd']:
+                    self.create_process_result(store, plottime, pid,
+                        'evm_watchdog.rb', memory_by_pid)
+                elif 'appliance_console.rb' in memory_by_pid[pid]['cmd']:
+                    self.create_process_result(store, plottime, pid,
+                        'appliance_console.rb', memory_by_pid)
+                elif 'evm:dbsync:replicate' in memory_by_pid[pid]['cmd']:
+                    self.create_process_result(store, plottime, pid,
+                        'evm:dbsync:replicate', memory_by_pid)
+                else:
+                    logger.debug('Unaccounted for ruby pid: {}'.format(pid))
+
+    def add_sample(self, store, sample):
+        """Add a sample streamed by the sampler, see scripts/data/smem_sampler.py"""
+        plottime = datetime.fromtimestamp(sample['timestamp'])
+        self.add_appliance_memory(store, plottime, sample['meminfo'])
+        memory_by_pid = {}
+        for pid, (name, cmd, rss, pss, uss, vss, swap) in sample['processes'].items():
+            memory_by_pid[pid] = {'name': name, 'cmd': cmd, 'rss': rss / 1024.0,
+                'pss': pss / 1024.0, 'uss': uss / 1024.0, 'vss': vss / 1024.0,
+                'swap': swap / 1024.0}
+        self.add_process_results(store, plottime, sample['workers'], memory_by_pid)
+        store.end_sample()
+        store.add_sampling(duration=sample['duration'], cpu=sample['cpu'], lag=sample['lag'])
+        logger.debug('Monitoring sampled in {}s'.format(round(sample['duration'], 4)))
+
+    def sample_with_sampler(self, store):
+        """Stream samples from the sampler on the appliance until signalled to stop
+
+        The sampler reads /proc and the worker table on the appliance and sends a JSON line per
+        sample over one channel, which costs no round trips per sample.
         """
-        appliance_results = OrderedDict()
-        process_results = OrderedDict()
+        try:
+            self.ssh_client.put_file(SAMPLER_SCRIPT.strpath, REMOTE_SAMPLER_SCRIPT)
+            lines = self.ssh_client.stream_command(
+                '"$(command -v python || command -v python3)" {} --interval {} '
+                '--server-id={}'.format(REMOTE_SAMPLER_SCRIPT, SAMPLE_INTERVAL, self.miq_server_id))
+            try:
+                for line in lines:
+                    if not self.signal:
+                        break
+                    if not line:
+                        continue
+                    try:
+                        sample = json.loads(line)
+                    except ValueError:
+                        logger.error('Unexpected output from the sampler: {}'.format(line))
+                        continue
+                    self.add_sample(store, sample)
+            finally:
+                lines.close()
+        except Exception:
+            logger.exception('Error streaming samples from the sampler')
+
+    def sample_with_smem(self, store):
+        """Sample with cat /proc/meminfo, psql and smem every SAMPLE_INTERVAL until signalled"""
         install_smem(self.ssh_client)
-        self.get_miq_server_id()
-        logger.info('Starting Monitoring Thread.')
+        scheduled = time.time()
         while self.signal:
             starttime = time.time()
             plottime = datetime.now()
 
-            self.get_appliance_memory(appliance_results, plottime)
+            self.get_appliance_memory(store, plottime)
             workers = self.get_evm_workers()
             memory_by_pid = self.get_pids_memory()
-
-            for worker_pid in workers:
-                self.create_process_result(process_results, plottime, worker_pid,
-                    workers[worker_pid], memory_by_pid)
-
-            for pid in sorted(memory_by_pid.keys()):
-                if memory_by_pid[pid]['name'] == 'httpd':
-                    self.create_process_result(process_results, plottime, pid, 'httpd',
-                        memory_by_pid)
-                elif memory_by_pid[pid]['name'] == 'postgres':
-                    self.create_process_result(process_results, plottime, pid, 'postgres',
-                        memory_by_pid)
-                elif memory_by_pid[pid]['name'] == 'postmaster':
-                    self.create_process_result(process_results, plottime, pid, 'postgres',
-                        memory_by_pid)
-                elif memory_by_pid[pid]['name'] == 'memcached':
-                    self.create_process_result(process_results, plottime, pid, 'memcached',
-                        memory_by_pid)
-                elif memory_by_pid[pid]['name'] == 'collectd':
-                    self.create_process_result(process_results, plottime, pid, 'collectd',
-                        memory_by_pid)
-                elif memory_by_pid[pid]['name'] == 'ruby':
-                    if 'evm_server.rb' in memory_by_pid[pid]['cmd']:
-                        self.create_process_result(process_results, plottime, pid,
-                            'MIQ Server (evm_server.rb)', memory_by_pid)
-                    elif 'MIQ Server' in memory_by_pid[pid]['cmd']:
-                        self.create_process_result(process_results, plottime, pid,
-                            'MIQ Server (evm_server.rb)', memory_by_pid)
-                    elif 'evm_watchdog.rb' in memory_by_pid[pid]['cmd']:
-                        self.create_process_result(process_results, plottime, pid,
-                            'evm_watchdog.rb', memory_by_pid)
-                    elif 'appliance_console.rb' in memory_by_pid[pid]['cmd']:
-                        self.create_process_result(process_results, plottime, pid,
-                            'appliance_console.rb', memory_by_pid)
-                    elif 'evm:dbsync:replicate' in memory_by_pid[pid]['cmd']:
-                        self.create_process_result(process_results, plottime, pid,
-                            'evm:dbsync:replicate', memory_by_pid)
-                    else:
-                        logger.debug('Unaccounted for ruby pid: {}'.format(pid))
+            self.add_process_results(store, plottime, workers, memory_by_pid)
+            store.end_sample()
 
             timediff = time.time() - starttime
+            store.add_sampling(duration=timediff, lag=starttime - scheduled)
             logger.debug('Monitoring sampled in {}s'.format(round(timediff, 4)))
 
             # Sleep Monitoring interval
             # Roughly 10s samples, accounts for collection of memory measurements
             time_to_sleep = abs(SAMPLE_INTERVAL - timediff)
             time.sleep(time_to_sleep)
+            scheduled = starttime + SAMPLE_INTERVAL
+
+    def _real_run(self):
+        """ Samples are added to a MemoryStore:
+        appliance measurements: total/free/used/buffers/cached/slab/swap_total/swap_free
+        process measurements per process name and pid: rss/pss/uss/vss/swap
+        """
+        store = self.create_store()
+        self.get_miq_server_id()
+        logger.info('Starting Monitoring Thread.')
+        if self.use_sampler:
+            self.sample_with_sampler(store)
+            if self.signal:
+                logger.warning('Sampler stopped early, continuing to sample with smem')
+        if self.signal:
+            self.sample_with_smem(store)
         logger.info('Monitoring CFME Memory Terminating')
 
-        create_report(self.scenario_data, appliance_results, process_results, self.use_slab,
-            self.grafana_urls)
+        create_report(self.scenario_data, store, self.use_slab, self.grafana_urls)
 
     def run(self):
         try:
@@ -374,7 +633,7 @@ def install_smem(ssh_client):
     ssh_client.run_command('sed -i s/\.27s/\.200s/g /usr/bin/smem')
 
 
-def create_report(scenario_data, appliance_results, process_results, use_slab, grafana_urls):
+def create_report(scenario_data, store, use_slab, grafana_urls):
     logger.info('Creating Memory Monitoring Report.')
     ver = current_version()
 
@@ -402,26 +661,28 @@ def create_report(scenario_data, appliance_results, process_results, use_slab, g
     if not os.path.exists(str(mem_rawdata_path)):
         os.mkdir(str(mem_rawdata_path))
 
-    graph_appliance_measurements(mem_graphs_path, ver, appliance_results, use_slab, provider_names)
-    graph_individual_process_measurements(mem_graphs_path, process_results, provider_names)
-    graph_same_miq_workers(mem_graphs_path, process_results, provider_names)
-    graph_all_miq_workers(mem_graphs_path, process_results, provider_names)
+    store.move_spill_files(mem_rawdata_path)
+
+    graph_appliance_measurements(mem_graphs_path, ver, store, use_slab, provider_names)
+    graph_individual_process_measurements(mem_graphs_path, store, provider_names)
+    graph_same_miq_workers(mem_graphs_path, store, provider_names)
+    graph_all_miq_workers(mem_graphs_path, store, provider_names)
 
     # Dump scenario Yaml:
     with open(str(scenario_path.join('scenario.yml')), 'w') as scenario_file:
         yaml.dump(dict(scenario_data['scenario']), scenario_file, default_flow_style=False)
 
-    generate_summary_csv(scenario_path.join('{}-summary.csv'.format(ver)), appliance_results,
-        process_results, provider_names, ver)
-    generate_raw_data_csv(mem_rawdata_path, appliance_results, process_results)
-    generate_summary_html(scenario_path, ver, appliance_results, process_results, scenario_data,
+    generate_summary_csv(scenario_path.join('{}-summary.csv'.format(ver)), store,
+        provider_names, ver)
+    generate_raw_data_csv(mem_rawdata_path, store)
+    generate_summary_html(scenario_path, ver, store, scenario_data,
         provider_names, grafana_urls)
     generate_workload_html(scenario_path, ver, scenario_data, provider_names, grafana_urls)
 
     logger.info('Finished Creating Report')
 
 
-def compile_per_process_results(procs_to_compile, process_results, ts_end):
+def compile_per_process_results(procs_to_compile, store, ts_end):
     alive_pids = 0
     recycled_pids = 0
     total_running_rss = 0
@@ -429,91 +690,84 @@ def compile_per_process_results(procs_to_compile, process_results, ts_end):
     total_running_uss = 0
     total_running_vss = 0
     total_running_swap = 0
+    seconds_end = to_seconds(ts_end)
     for process in procs_to_compile:
-        if process in process_results:
-            for pid in process_results[process]:
-                if ts_end in process_results[process][pid]:
+        if process in store.processes:
+            for series in store.processes[process].values():
+                index = series.index(seconds_end)
+                if index is not None:
                     alive_pids += 1
-                    total_running_rss += process_results[process][pid][ts_end]['rss']
-                    total_running_pss += process_results[process][pid][ts_end]['pss']
-                    total_running_uss += process_results[process][pid][ts_end]['uss']
-                    total_running_vss += process_results[process][pid][ts_end]['vss']
-                    total_running_swap += process_results[process][pid][ts_end]['swap']
+                    total_running_rss += series.columns['rss'][index]
+                    total_running_pss += series.columns['pss'][index]
+                    total_running_uss += series.columns['uss'][index]
+                    total_running_vss += series.columns['vss'][index]
+                    total_running_swap += series.columns['swap'][index]
                 else:
                     recycled_pids += 1
     return alive_pids, recycled_pids, total_running_rss, total_running_pss, total_running_uss, \
         total_running_vss, total_running_swap
 
 
-def generate_raw_data_csv(directory, appliance_results, process_results):
+def generate_raw_data_csv(directory, store):
     starttime = time.time()
     file_name = str(directory.join('appliance.csv'))
     with open(file_name, 'w') as csv_file:
         csv_file.write('TimeStamp,Total,Free,Used,Buffers,Cached,Slab,Swap_Total,Swap_Free\n')
-        for ts in appliance_results:
-            csv_file.write('{},{},{},{},{},{},{},{},{}\n'.format(ts,
-                appliance_results[ts]['total'], appliance_results[ts]['free'],
-                appliance_results[ts]['used'], appliance_results[ts]['buffers'],
-                appliance_results[ts]['cached'], appliance_results[ts]['slab'],
-                appliance_results[ts]['swap_total'], appliance_results[ts]['swap_free']))
-    for process_name in process_results:
-        for process_pid in process_results[process_name]:
-            file_name = str(directory.join('{}-{}.csv'.format(process_pid, process_name)))
-            with open(file_name, 'w') as csv_file:
-                csv_file.write('TimeStamp,RSS,PSS,USS,VSS,SWAP\n')
-                for ts in process_results[process_name][process_pid]:
-                    csv_file.write('{},{},{},{},{},{}\n'.format(ts,
-                        process_results[process_name][process_pid][ts]['rss'],
-                        process_results[process_name][process_pid][ts]['pss'],
-                        process_results[process_name][process_pid][ts]['uss'],
-                        process_results[process_name][process_pid][ts]['vss'],
-                        process_results[process_name][process_pid][ts]['swap']))
+        for row in zip(store.times, *store.appliance.values()):
+            csv_file.write('{},{},{},{},{},{},{},{},{}\n'.format(to_datetime(row[0]), *row[1:]))
+    for series in store.all_series():
+        file_name = str(directory.join('{}-{}.csv'.format(series.pid, series.name)))
+        with open(file_name, 'w') as csv_file:
+            csv_file.write('TimeStamp,RSS,PSS,USS,VSS,SWAP\n')
+            for row in zip(series.times, *series.columns.values()):
+                csv_file.write('{},{},{},{},{},{}\n'.format(to_datetime(row[0]), *row[1:]))
     timediff = time.time() - starttime
     logger.info('Generated Raw Data CSVs in: {}'.format(timediff))
 
 
-def generate_summary_csv(file_name, appliance_results, process_results, provider_names,
-        version_string):
+def generate_summary_csv(file_name, store, provider_names, version_string):
     starttime = time.time()
     with open(str(file_name), 'w') as csv_file:
         csv_file.write('Version: {}, Provider(s): {}\n'.format(version_string, provider_names))
         csv_file.write('Measurement,Start of test,End of test\n')
-        start = appliance_results.keys()[0]
-        end = appliance_results.keys()[-1]
-        csv_file.write('Appliance Total Memory,{},{}\n'.format(
-            round(appliance_results[start]['total'], 2), round(appliance_results[end]['total'], 2)))
-        csv_file.write('Appliance Free Memory,{},{}\n'.format(
-            round(appliance_results[start]['free'], 2), round(appliance_results[end]['free'], 2)))
-        csv_file.write('Appliance Used Memory,{},{}\n'.format(
-            round(appliance_results[start]['used'], 2), round(appliance_results[end]['used'], 2)))
-        csv_file.write('Appliance Buffers,{},{}\n'.format(
-            round(appliance_results[start]['buffers'], 2),
-            round(appliance_results[end]['buffers'], 2)))
-        csv_file.write('Appliance Cached,{},{}\n'.format(
-            round(appliance_results[start]['cached'], 2),
-            round(appliance_results[end]['cached'], 2)))
-        csv_file.write('Appliance Slab,{},{}\n'.format(
-            round(appliance_results[start]['slab'], 2),
-            round(appliance_results[end]['slab'], 2)))
-        csv_file.write('Appliance Total Swap,{},{}\n'.format(
-            round(appliance_results[start]['swap_total'], 2),
-            round(appliance_results[end]['swap_total'], 2)))
-        csv_file.write('Appliance Free Swap,{},{}\n'.format(
-            round(appliance_results[start]['swap_free'], 2),
-            round(appliance_results[end]['swap_free'], 2)))
-
-        summary_csv_measurement_dump(csv_file, process_results, 'rss')
-        summary_csv_measurement_dump(csv_file, process_results, 'pss')
-        summary_csv_measurement_dump(csv_file, process_results, 'uss')
-        summary_csv_measurement_dump(csv_file, process_results, 'vss')
-        summary_csv_measurement_dump(csv_file, process_results, 'swap')
+        for label, measurement in (('Appliance Total Memory', 'total'),
+                                   ('Appliance Free Memory', 'free'),
+                                   ('Appliance Used Memory', 'used'),
+                                   ('Appliance Buffers', 'buffers'),
+                                   ('Appliance Cached', 'cached'),
+                                   ('Appliance Slab', 'slab'),
+                                   ('Appliance Total Swap', 'swap_total'),
+                                   ('Appliance Free Swap', 'swap_free')):
+            csv_file.write('{},{},{}\n'.format(label, round(store.first(measurement), 2),
+                round(store.last(measurement), 2)))
+
+        csv_file.write('---------------------------------------------\n')
+        csv_file.write('Sampling Overhead\n')
+        csv_file.write('---------------------------------------------\n')
+        csv_file.write('Measurement,Samples,Average,Max\n')
+        for label, samples, average, maximum in sampling_summary(store):
+            csv_file.write('{},{},{},{}\n'.format(label, samples, average, maximum))
+
+        for measurement in PROCESS_MEASUREMENTS:
+            summary_csv_measurement_dump(csv_file, store, measurement)
 
     timediff = time.time() - starttime
     logger.info('Generated Summary CSV in: {}'.format(timediff))
 
 
-def generate_summary_html(directory, version_string, appliance_results, process_results,
-        scenario_data, provider_names, grafana_urls):
+def sampling_summary(store):
+    """Return (label, samples, average, max) of every sampling measurement that was recorded"""
+    summary = []
+    for measurement, label in SAMPLING_MEASUREMENTS:
+        column = store.sampling[measurement]
+        if column:
+            summary.append((label, len(column), round(sum(column) / len(column), 4),
+                round(max(column), 4)))
+    return summary
+
+
+def generate_summary_html(directory, version_string, store, scenario_data, provider_names,
+        grafana_urls):
     starttime = time.time()
     file_name = str(directory.join('index.html'))
     with open(file_name, 'w') as html_file:
@@ -539,17 +793,12 @@ def generate_summary_html(directory, version_string, appliance_results, process_
         html_file.write(' : <b><a href=\'workload.html\'>Workload Info</a></b>')
         html_file.write(' : <b><a href=\'graphs/\'>Graphs directory</a></b>\n')
         html_file.write(' : <b><a href=\'rawdata/\'>CSVs directory</a></b><br>\n')
-        start = appliance_results.keys()[0]
-        end = appliance_results.keys()[-1]
+        start = store.start
+        end = store.end
         timediff = end - start
-        total_proc_count = 0
-        for proc_name in process_results:
-            total_proc_count += len(process_results[proc_name].keys())
-        growth = appliance_results[end]['used'] - appliance_results[start]['used']
-        max_used_memory = 0
-        for ts in appliance_results:
-            if appliance_results[ts]['used'] > max_used_memory:
-                max_used_memory = appliance_results[ts]['used']
+        total_proc_count = sum(len(pids) for pids in store.processes.values())
+        growth = store.last('used') - store.first('used')
+        max_used_memory = max(store.appliance['used'])
         html_file.write('<table border="1">\n')
         html_file.write('<tr><td>\n')
         # Appliance Wide Results
@@ -571,14 +820,31 @@ def generate_summary_html(directory, version_string, appliance_results, process_
         html_file.write('<td>{}</td>\n'.format(start.replace(microsecond=0)))
         html_file.write('<td>{}</td>\n'.format(end.replace(microsecond=0)))
         html_file.write('<td>{}</td>\n'.format(unicode(timediff).partition('.')[0]))
-        html_file.write('<td>{}</td>\n'.format(round(appliance_results[end]['total'], 2)))
-        html_file.write('<td>{}</td>\n'.format(round(appliance_results[start]['used'], 2)))
-        html_file.write('<td>{}</td>\n'.format(round(appliance_results[end]['used'], 2)))
+        html_file.write('<td>{}</td>\n'.format(round(store.last('total'), 2)))
+        html_file.write('<td>{}</td>\n'.format(round(store.first('used'), 2)))
+        html_file.write('<td>{}</td>\n'.format(round(store.last('used'), 2)))
         html_file.write('<td>{}</td>\n'.format(round(growth, 2)))
         html_file.write('<td>{}</td>\n'.format(round(max_used_memory, 2)))
         html_file.write('<td>{}</td>\n'.format(total_proc_count))
         html_file.write('</table>\n')
 
+        # Sampling Overhead
+        html_file.write('<table style="width:100%" border="1">\n')
+        html_file.write('<tr>\n')
+        html_file.write('<td><b>Sampling Overhead</b></td>\n')
+        html_file.write('<td><b>Samples</b></td>\n')
+        html_file.write('<td><b>Average</b></td>\n')
+        html_file.write('<td><b>Max</b></td>\n')
+        html_file.write('</tr>\n')
+        for label, samples, average, maximum in sampling_summary(store):
+            html_file.write('<tr>\n')
+            html_file.write('<td>{}</td>\n'.format(label))
+            html_file.write('<td>{}</td>\n'.format(samples))
+            html_file.write('<td>{}</td>\n'.format(average))
+            html_file.write('<td>{}</td>\n'.format(maximum))
+            html_file.write('</tr>\n')
+        html_file.write('</table>\n')
+
         # CFME/Miq Worker Results
         html_file.write('<table style="width:100%" border="1">\n')
         html_file.write('<tr>\n')
@@ -593,7 +859,7 @@ def generate_summary_html(directory, version_string, appliance_results, process_
         html_file.write('</tr>\n')
 
         a_pids, r_pids, t_rss, t_pss, t_uss, t_vss, t_swap = compile_per_process_results(
-            miq_workers, process_results, end)
+            miq_workers, store, end)
 
         html_file.write('<tr>\n')
         html_file.write('<td>{}</td>\n'.format(a_pids + r_pids))
@@ -622,7 +888,7 @@ def generate_summary_html(directory, version_string, appliance_results, process_
         html_file.write('</tr>\n')
 
         a_pids, r_pids, t_rss, t_pss, t_uss, t_vss, t_swap = compile_per_process_results(
-            ruby_processes, process_results, end)
+            ruby_processes, store, end)
         t_a_pids = a_pids
         t_r_pids = r_pids
         tt_rss = t_rss
@@ -644,7 +910,7 @@ def generate_summary_html(directory, version_string, appliance_results, process_
 
         # memcached Summary
         a_pids, r_pids, t_rss, t_pss, t_uss, t_vss, t_swap = compile_per_process_results(
-            ['memcached'], process_results, end)
+            ['memcached'], store, end)
         t_a_pids += a_pids
         t_r_pids += r_pids
         tt_rss += t_rss
@@ -666,7 +932,7 @@ def generate_summary_html(directory, version_string, appliance_results, process_
 
         # Postgres Summary
         a_pids, r_pids, t_rss, t_pss, t_uss, t_vss, t_swap = compile_per_process_results(
-            ['postgres'], process_results, end)
+            ['postgres'], store, end)
         t_a_pids += a_pids
         t_r_pids += r_pids
         tt_rss += t_rss
@@ -688,7 +954,7 @@ def generate_summary_html(directory, version_string, appliance_results, process_
 
         # httpd Summary
         a_pids, r_pids, t_rss, t_pss, t_uss, t_vss, t_swap = compile_per_process_results(['httpd'],
-            process_results, end)
+            store, end)
         t_a_pids += a_pids
         t_r_pids += r_pids
         tt_rss += t_rss
@@ -710,7 +976,7 @@ def generate_summary_html(directory, version_string, appliance_results, process_
 
         # collectd Summary
         a_pids, r_pids, t_rss, t_pss, t_uss, t_vss, t_swap = compile_per_process_results(
-            ['collectd'], process_results, end)
+            ['collectd'], store, end)
         t_a_pids += a_pids
         t_r_pids += r_pids
         tt_rss += t_rss
@@ -749,11 +1015,8 @@ def generate_summary_html(directory, version_string, appliance_results, process_
         html_file.write('<img src=\'graphs/{}\'>\n'.format(file_name))
         file_name = '{}-appliance_swap.png'.format(version_string)
         # Check for swap usage through out time frame:
-        max_swap_used = 0
-        for ts in appliance_results:
-            swap_used = appliance_results[ts]['swap_total'] - appliance_results[ts]['swap_free']
-            if swap_used > max_swap_used:
-                max_swap_used = swap_used
+        max_swap_used = max(total - free for total, free in zip(
+            store.appliance['swap_total'], store.appliance['swap_free']))
         if max_swap_used < 10:  # Less than 10MiB Max, then hide graph
             html_file.write('<br><a href=\'graphs/{}\'>Swap Graph '.format(file_name))
             html_file.write('(Hidden, max_swap_used < 10 MiB)</a>\n')
@@ -777,13 +1040,13 @@ def generate_summary_html(directory, version_string, appliance_results, process_
         html_file.write('</tr>\n')
         # By Worker Type Memory Used
         for ordered_name in process_order:
-            if ordered_name in process_results:
-                for pid in process_results[ordered_name]:
-                    start = process_results[ordered_name][pid].keys()[0]
-                    end = process_results[ordered_name][pid].keys()[-1]
+            if ordered_name in store.processes:
+                for pid, series in store.processes[ordered_name].items():
+                    start = series.start
+                    end = series.end
                     timediff = end - start
                     html_file.write('<tr>\n')
-                    if len(process_results[ordered_name]) > 1:
+                    if len(store.processes[ordered_name]) > 1:
                         html_file.write('<td><a href=\'#{}\'>{}</a></td>\n'.format(ordered_name,
                             ordered_name))
                         html_file.write('<td><a href=\'graphs/{}-{}.png\'>{}</a></td>\n'.format(
@@ -795,19 +1058,13 @@ def generate_summary_html(directory, version_string, appliance_results, process_
                     html_file.write('<td>{}</td>\n'.format(start.replace(microsecond=0)))
                     html_file.write('<td>{}</td>\n'.format(end.replace(microsecond=0)))
                     html_file.write('<td>{}</td>\n'.format(unicode(timediff).partition('.')[0]))
-                    rss_change = process_results[ordered_name][pid][end]['rss'] - \
-                        process_results[ordered_name][pid][start]['rss']
-                    html_file.write('<td>{}</td>\n'.format(
-                        round(process_results[ordered_name][pid][start]['rss'], 2)))
-                    html_file.write('<td>{}</td>\n'.format(
-                        round(process_results[ordered_name][pid][end]['rss'], 2)))
+                    rss_change = series.last('rss') - series.first('rss')
+                    html_file.write('<td>{}</td>\n'.format(round(series.first('rss'), 2)))
+                    html_file.write('<td>{}</td>\n'.format(round(series.last('rss'), 2)))
                     html_file.write('<td>{}</td>\n'.format(round(rss_change, 2)))
-                    pss_change = process_results[ordered_name][pid][end]['pss'] - \
-                        process_results[ordered_name][pid][start]['pss']
-                    html_file.write('<td>{}</td>\n'.format(
-                        round(process_results[ordered_name][pid][start]['pss'], 2)))
-                    html_file.write('<td>{}</td>\n'.format(
-                        round(process_results[ordered_name][pid][end]['pss'], 2)))
+                    pss_change = series.last('pss') - series.first('pss')
+                    html_file.write('<td>{}</td>\n'.format(round(series.first('pss'), 2)))
+                    html_file.write('<td>{}</td>\n'.format(round(series.last('pss'), 2)))
                     html_file.write('<td>{}</td>\n'.format(round(pss_change, 2)))
                     html_file.write('<td><a href=\'rawdata/{}-{}.csv\'>csv</a></td>\n'.format(
                         pid, ordered_name))
@@ -819,16 +1076,16 @@ def generate_summary_html(directory, version_string, appliance_results, process_
 
         # Worker Graphs
         for ordered_name in process_order:
-            if ordered_name in process_results:
+            if ordered_name in store.processes:
                 html_file.write('<tr><td>\n')
                 html_file.write('<div id=\'{}\'>Process name: {}</div><br>\n'.format(
                     ordered_name, ordered_name))
-                if len(process_results[ordered_name]) > 1:
+                if len(store.processes[ordered_name]) > 1:
                     file_name = '{}-all.png'.format(ordered_name)
                     html_file.write('<img id=\'{}\' src=\'graphs/{}\'><br>\n'.format(file_name,
                         file_name))
                 else:
-                    for pid in sorted(process_results[ordered_name]):
+                    for pid in sorted(store.processes[ordered_name]):
                         file_name = '{}-{}.png'.format(ordered_name, pid)
                         html_file.write('<img id=\'{}\' src=\'graphs/{}\'><br>\n'.format(
                             file_name, file_name))
@@ -989,25 +1246,33 @@ def create_dict(attr_dict):
     return main_dict
 
 
-def graph_appliance_measurements(graphs_path, ver, appliance_results, use_slab, provider_names):
+def annotate_ends(ax, dates, samples):
+    """Annotate the first and last sample of a plotted line"""
+    if len(samples):
+        ax.annotate(str(round(samples[0], 2)), xy=(dates[0], samples[0]), xytext=(4, 4),
+            textcoords='offset points')
+        ax.annotate(str(round(samples[-1], 2)), xy=(dates[-1], samples[-1]), xytext=(4, -4),
+            textcoords='offset points')
+
+
+def measurement_arrays(columns):
+    """numpy views of the measurement arrays, without copying them"""
+    import numpy
+    return OrderedDict((measurement, numpy.frombuffer(column, dtype=numpy.float64))
+        for measurement, column in columns.items())
+
+
+def graph_appliance_measurements(graphs_path, ver, store, use_slab, provider_names):
     import matplotlib as mpl
     mpl.use('Agg')
     import matplotlib.dates as mdates
     import matplotlib.pyplot as plt
+    import numpy
 
     starttime = time.time()
 
-    dates = appliance_results.keys()
-    total_memory_list = list(appliance_results[ts]['total'] for ts in appliance_results.keys())
-    free_memory_list = list(appliance_results[ts]['free'] for ts in appliance_results.keys())
-    used_memory_list = list(appliance_results[ts]['used'] for ts in appliance_results.keys())
-    buffers_memory_list = list(
-        appliance_results[ts]['buffers'] for ts in appliance_results.keys())
-    cache_memory_list = list(appliance_results[ts]['cached'] for ts in appliance_results.keys())
-    slab_memory_list = list(appliance_results[ts]['slab'] for ts in appliance_results.keys())
-    swap_total_list = list(appliance_results[ts]['swap_total'] for ts in
-        appliance_results.keys())
-    swap_free_list = list(appliance_results[ts]['swap_free'] for ts in appliance_results.keys())
+    dates = to_datenums(store.times)
+    memory = measurement_arrays(store.appliance)
 
     # Stack Plot Memory Usage
     file_name = graphs_path.join('{}-appliance_memory.png'.format(ver))
@@ -1018,42 +1283,21 @@ def graph_appliance_measurements(graphs_path, ver, appliance_results, use_slab,
     plt.xlabel('Date / Time')
     plt.ylabel('Memory (MiB)')
     if use_slab:
-        y = [used_memory_list, slab_memory_list, cache_memory_list, free_memory_list]
-    else:
-        y = [used_memory_list, buffers_memory_list, cache_memory_list, free_memory_list]
-    plt.stackplot(dates, *y, baseline='zero')
-    ax.annotate(str(round(total_memory_list[0], 2)), xy=(dates[0], total_memory_list[0]),
-                xytext=(4, 4), textcoords='offset points')
-    ax.annotate(str(round(total_memory_list[-1], 2)), xy=(dates[-1], total_memory_list[-1]),
-                xytext=(4, -4), textcoords='offset points')
-    if use_slab:
-        ax.annotate(str(round(slab_memory_list[0], 2)), xy=(dates[0], used_memory_list[0] +
-                    slab_memory_list[0]), xytext=(4, 4), textcoords='offset points')
-        ax.annotate(str(round(slab_memory_list[-1], 2)), xy=(dates[-1], used_memory_list[-1] +
-                    slab_memory_list[-1]), xytext=(4, -4), textcoords='offset points')
-        ax.annotate(str(round(cache_memory_list[0], 2)), xy=(dates[0], used_memory_list[0] +
-                    slab_memory_list[0] + cache_memory_list[0]), xytext=(4, 4),
-                    textcoords='offset points')
-        ax.annotate(str(round(cache_memory_list[-1], 2)), xy=(
-            dates[-1], used_memory_list[-1] + slab_memory_list[-1] + cache_memory_list[-1]),
-            xytext=(4, -4), textcoords='offset points')
+        labels = ['Used', 'Slab', 'Cached', 'Free']
+        y = numpy.vstack([memory['used'], memory['slab'], memory['cached'], memory['free']])
     else:
-        ax.annotate(str(round(buffers_memory_list[0], 2)), xy=(
-            dates[0], used_memory_list[0] + buffers_memory_list[0]), xytext=(4, 4),
+        labels = ['Used', 'Buffers', 'Cached', 'Free']
+        y = numpy.vstack([memory['used'], memory['buffers'], memory['cached'], memory['free']])
+    plt.stackplot(dates, y, baseline='zero')
+    annotate_ends(ax, dates, memory['total'])
+    # Used, Slab/Buffers and Cached are annotated at the top of their layer of the stack
+    stacked = numpy.cumsum(y[:3], axis=0)
+    for layer, top in zip(y[:3][::-1], stacked[::-1]):
+        ax.annotate(str(round(layer[0], 2)), xy=(dates[0], top[0]), xytext=(4, 4),
+            textcoords='offset points')
+        ax.annotate(str(round(layer[-1], 2)), xy=(dates[-1], top[-1]), xytext=(4, -4),
             textcoords='offset points')
-        ax.annotate(str(round(buffers_memory_list[-1], 2)), xy=(dates[-1],
-                    used_memory_list[-1] + buffers_memory_list[-1]), xytext=(4, -4),
-                    textcoords='offset points')
-        ax.annotate(str(round(cache_memory_list[0], 2)), xy=(dates[0], used_memory_list[0] +
-                    buffers_memory_list[0] + cache_memory_list[0]), xytext=(4, 4),
-                    textcoords='offset points')
-        ax.annotate(str(round(cache_memory_list[-1], 2)), xy=(
-            dates[-1], used_memory_list[-1] + buffers_memory_list[-1] + cache_memory_list[-1]),
-            xytext=(4, -4), textcoords='offset points')
-    ax.annotate(str(round(used_memory_list[0], 2)), xy=(dates[0], used_memory_list[0]),
-        xytext=(4, 4), textcoords='offset points')
-    ax.annotate(str(round(used_memory_list[-1], 2)), xy=(dates[-1], used_memory_list[-1]),
-        xytext=(4, -4), textcoords='offset points')
+    ax.xaxis_date()
     datefmt = mdates.DateFormatter('%m-%d %H-%M')
     ax.xaxis.set_major_formatter(datefmt)
     ax.grid(True)
@@ -1061,12 +1305,7 @@ def graph_appliance_measurements(graphs_path, ver, appliance_results, use_slab,
     p2 = plt.Rectangle((0, 0), 1, 1, fc='coral')
     p3 = plt.Rectangle((0, 0), 1, 1, fc='steelblue')
     p4 = plt.Rectangle((0, 0), 1, 1, fc='forestgreen')
-    if use_slab:
-        ax.legend([p1, p2, p3, p4], ['Used', 'Slab', 'Cached', 'Free'],
-            bbox_to_anchor=(1.45, 0.22), fancybox=True)
-    else:
-        ax.legend([p1, p2, p3, p4], ['Used', 'Buffers', 'Cached', 'Free'],
-            bbox_to_anchor=(1.45, 0.22), fancybox=True)
+    ax.legend([p1, p2, p3, p4], labels, bbox_to_anchor=(1.45, 0.22), fancybox=True)
     fig.autofmt_xdate()
     plt.savefig(str(file_name), bbox_inches='tight')
     plt.close()
@@ -1079,17 +1318,11 @@ def graph_appliance_measurements(graphs_path, ver, appliance_results, use_slab,
     plt.xlabel('Date / Time')
     plt.ylabel('Swap (MiB)')
 
-    swap_used_list = [t - f for f, t in zip(swap_free_list, swap_total_list)]
-    y = [swap_used_list, swap_free_list]
-    plt.stackplot(dates, *y, baseline='zero')
-    ax.annotate(str(round(swap_total_list[0], 2)), xy=(dates[0], swap_total_list[0]),
-        xytext=(4, 4), textcoords='offset points')
-    ax.annotate(str(round(swap_total_list[-1], 2)), xy=(dates[-1], swap_total_list[-1]),
-        xytext=(4, -4), textcoords='offset points')
-    ax.annotate(str(round(swap_used_list[0], 2)), xy=(dates[0], swap_used_list[0]),
-        xytext=(4, 4), textcoords='offset points')
-    ax.annotate(str(round(swap_used_list[-1], 2)), xy=(dates[-1], swap_used_list[-1]),
-        xytext=(4, -4), textcoords='offset points')
+    swap_used = memory['swap_total'] - memory['swap_free']
+    plt.stackplot(dates, swap_used, memory['swap_free'], baseline='zero')
+    annotate_ends(ax, dates, memory['swap_total'])
+    annotate_ends(ax, dates, swap_used)
+    ax.xaxis_date()
     datefmt = mdates.DateFormatter('%m-%d %H-%M')
     ax.xaxis.set_major_formatter(datefmt)
     ax.grid(True)
@@ -1107,7 +1340,7 @@ def graph_appliance_measurements(graphs_path, ver, appliance_results, use_slab,
     logger.info('Plotted Appliance Memory in: {}'.format(timediff))
 
 
-def graph_all_miq_workers(graph_file_path, process_results, provider_names):
+def graph_all_miq_workers(graph_file_path, store, provider_names):
     import matplotlib as mpl
     mpl.use('Agg')
     import matplotlib.dates as mdates
@@ -1120,20 +1353,17 @@ def graph_all_miq_workers(graph_file_path, process_results, provider_names):
     plt.title('Provider(s): {}\nAll Workers/Monitored Processes'.format(provider_names))
     plt.xlabel('Date / Time')
     plt.ylabel('Memory (MiB)')
-    for process_name in process_results:
+    for process_name in store.processes:
         if 'Worker' in process_name or 'Handler' in process_name or 'Catcher' in process_name:
-            for process_pid in process_results[process_name]:
-                dates = process_results[process_name][process_pid].keys()
-
-                rss_samples = list(process_results[process_name][process_pid][ts]['rss']
-                        for ts in process_results[process_name][process_pid].keys())
-                vss_samples = list(process_results[process_name][process_pid][ts]['vss']
-                        for ts in process_results[process_name][process_pid].keys())
-                plt.plot(dates, rss_samples, linewidth=1, label='{} {} RSS'.format(process_pid,
-                    process_name))
-                plt.plot(dates, vss_samples, linewidth=1, label='{} {} VSS'.format(
+            for process_pid, series in store.processes[process_name].items():
+                dates = to_datenums(series.times)
+                samples = measurement_arrays(series.columns)
+                plt.plot(dates, samples['rss'], linewidth=1, label='{} {} RSS'.format(
+                    process_pid, process_name))
+                plt.plot(dates, samples['vss'], linewidth=1, label='{} {} VSS'.format(
                     process_pid, process_name))
 
+    ax.xaxis_date()
     datefmt = mdates.DateFormatter('%m-%d %H-%M')
     ax.xaxis.set_major_formatter(datefmt)
     ax.grid(True)
@@ -1146,146 +1376,75 @@ def graph_all_miq_workers(graph_file_path, process_results, provider_names):
     logger.info('Plotted All Type/Process Memory in: {}'.format(timediff))
 
 
-def graph_individual_process_measurements(graph_file_path, process_results, provider_names):
+def graph_individual_process_measurements(graph_file_path, store, provider_names):
     import matplotlib as mpl
     mpl.use('Agg')
     import matplotlib.dates as mdates
     import matplotlib.pyplot as plt
 
     starttime = time.time()
-    for process_name in process_results:
-        for process_pid in process_results[process_name]:
-
-            file_name = graph_file_path.join('{}-{}.png'.format(process_name, process_pid))
-
-            dates = process_results[process_name][process_pid].keys()
-            rss_samples = list(process_results[process_name][process_pid][ts]['rss']
-                    for ts in process_results[process_name][process_pid].keys())
-            pss_samples = list(process_results[process_name][process_pid][ts]['pss']
-                    for ts in process_results[process_name][process_pid].keys())
-            uss_samples = list(process_results[process_name][process_pid][ts]['uss']
-                    for ts in process_results[process_name][process_pid].keys())
-            vss_samples = list(process_results[process_name][process_pid][ts]['vss']
-                    for ts in process_results[process_name][process_pid].keys())
-            swap_samples = list(process_results[process_name][process_pid][ts]['swap']
-                    for ts in process_results[process_name][process_pid].keys())
-
-            fig, ax = plt.subplots()
-            plt.title('Provider(s)/Size: {}\nProcess/Worker: {}\nPID: {}'.format(provider_names,
-                process_name, process_pid))
-            plt.xlabel('Date / Time')
-            plt.ylabel('Memory (MiB)')
-            plt.plot(dates, rss_samples, linewidth=1, label='RSS')
-            plt.plot(dates, pss_samples, linewidth=1, label='PSS')
-            plt.plot(dates, uss_samples, linewidth=1, label='USS')
-            plt.plot(dates, vss_samples, linewidth=1, label='VSS')
-            plt.plot(dates, swap_samples, linewidth=1, label='Swap')
-
-            if rss_samples:
-                ax.annotate(str(round(rss_samples[0], 2)), xy=(dates[0], rss_samples[0]),
-                    xytext=(4, 4), textcoords='offset points')
-                ax.annotate(str(round(rss_samples[-1], 2)), xy=(dates[-1], rss_samples[-1]),
-                    xytext=(4, -4), textcoords='offset points')
-            if pss_samples:
-                ax.annotate(str(round(pss_samples[0], 2)), xy=(dates[0], pss_samples[0]),
-                    xytext=(4, 4), textcoords='offset points')
-                ax.annotate(str(round(pss_samples[-1], 2)), xy=(dates[-1], pss_samples[-1]),
-                    xytext=(4, -4), textcoords='offset points')
-            if uss_samples:
-                ax.annotate(str(round(uss_samples[0], 2)), xy=(dates[0], uss_samples[0]),
-                    xytext=(4, 4), textcoords='offset points')
-                ax.annotate(str(round(uss_samples[-1], 2)), xy=(dates[-1], uss_samples[-1]),
-                    xytext=(4, -4), textcoords='offset points')
-            if vss_samples:
-                ax.annotate(str(round(vss_samples[0], 2)), xy=(dates[0], vss_samples[0]),
-                    xytext=(4, 4), textcoords='offset points')
-                ax.annotate(str(round(vss_samples[-1], 2)), xy=(dates[-1], vss_samples[-1]),
-                    xytext=(4, -4), textcoords='offset points')
-            if swap_samples:
-                ax.annotate(str(round(swap_samples[0], 2)), xy=(dates[0], swap_samples[0]),
-                    xytext=(4, 4), textcoords='offset points')
-                ax.annotate(str(round(swap_samples[-1], 2)), xy=(dates[-1], swap_samples[-1]),
-                    xytext=(4, -4), textcoords='offset points')
-
-            datefmt = mdates.DateFormatter('%m-%d %H-%M')
-            ax.xaxis.set_major_formatter(datefmt)
-            ax.grid(True)
-            plt.legend(loc='upper center', bbox_to_anchor=(1.2, 0.1), fancybox=True)
-            fig.autofmt_xdate()
-            plt.savefig(str(file_name), bbox_inches='tight')
-            plt.close()
+    for series in store.all_series():
+        file_name = graph_file_path.join('{}-{}.png'.format(series.name, series.pid))
+
+        dates = to_datenums(series.times)
+        samples = measurement_arrays(series.columns)
+
+        fig, ax = plt.subplots()
+        plt.title('Provider(s)/Size: {}\nProcess/Worker: {}\nPID: {}'.format(provider_names,
+            series.name, series.pid))
+        plt.xlabel('Date / Time')
+        plt.ylabel('Memory (MiB)')
+        for measurement, label in zip(PROCESS_MEASUREMENTS, ('RSS', 'PSS', 'USS', 'VSS', 'Swap')):
+            plt.plot(dates, samples[measurement], linewidth=1, label=label)
+        for measurement in PROCESS_MEASUREMENTS:
+            annotate_ends(ax, dates, samples[measurement])
+
+        ax.xaxis_date()
+        datefmt = mdates.DateFormatter('%m-%d %H-%M')
+        ax.xaxis.set_major_formatter(datefmt)
+        ax.grid(True)
+        plt.legend(loc='upper center', bbox_to_anchor=(1.2, 0.1), fancybox=True)
+        fig.autofmt_xdate()
+        plt.savefig(str(file_name), bbox_inches='tight')
+        plt.close()
 
     timediff = time.time() - starttime
     logger.info('Plotted Individual Process Memory in: {}'.format(timediff))
 
 
-def graph_same_miq_workers(graph_file_path, process_results, provider_names):
+def graph_same_miq_workers(graph_file_path, store, provider_names):
     import matplotlib as mpl
     mpl.use('Agg')
     import matplotlib.dates as mdates
     import matplotlib.pyplot as plt
 
     starttime = time.time()
-    for process_name in process_results:
-        if len(process_results[process_name]) > 1:
+    for process_name, pids in store.processes.items():
+        if len(pids) > 1:
             logger.debug('Plotting {} {} processes on single graph.'.format(
-                len(process_results[process_name]), process_name))
+                len(pids), process_name))
             file_name = graph_file_path.join('{}-all.png'.format(process_name))
 
             fig, ax = plt.subplots()
-            pids = 'PIDs: '
-            for i, pid in enumerate(process_results[process_name], 1):
-                pids = '{}{}'.format(pids, '{},{}'.format(pid, [' ', '\n'][i % 6 == 0]))
-            pids = pids[0:-2]
+            pids_title = 'PIDs: '
+            for i, pid in enumerate(pids, 1):
+                pids_title = '{}{}'.format(pids_title, '{},{}'.format(pid, [' ', '\n'][i % 6 == 0]))
+            pids_title = pids_title[0:-2]
             plt.title('Provider: {}\nProcess/Worker: {}\n{}'.format(provider_names,
-                process_name, pids))
+                process_name, pids_title))
             plt.xlabel('Date / Time')
             plt.ylabel('Memory (MiB)')
 
-            for process_pid in process_results[process_name]:
-                dates = process_results[process_name][process_pid].keys()
-
-                rss_samples = list(process_results[process_name][process_pid][ts]['rss']
-                        for ts in process_results[process_name][process_pid].keys())
-                pss_samples = list(process_results[process_name][process_pid][ts]['pss']
-                        for ts in process_results[process_name][process_pid].keys())
-                uss_samples = list(process_results[process_name][process_pid][ts]['uss']
-                        for ts in process_results[process_name][process_pid].keys())
-                vss_samples = list(process_results[process_name][process_pid][ts]['vss']
-                        for ts in process_results[process_name][process_pid].keys())
-                swap_samples = list(process_results[process_name][process_pid][ts]['swap']
-                        for ts in process_results[process_name][process_pid].keys())
-                plt.plot(dates, rss_samples, linewidth=1, label='{} RSS'.format(process_pid))
-                plt.plot(dates, pss_samples, linewidth=1, label='{} PSS'.format(process_pid))
-                plt.plot(dates, uss_samples, linewidth=1, label='{} USS'.format(process_pid))
-                plt.plot(dates, vss_samples, linewidth=1, label='{} VSS'.format(process_pid))
-                plt.plot(dates, swap_samples, linewidth=1, label='{} SWAP'.format(process_pid))
-                if rss_samples:
-                    ax.annotate(str(round(rss_samples[0], 2)), xy=(dates[0], rss_samples[0]),
-                        xytext=(4, 4), textcoords='offset points')
-                    ax.annotate(str(round(rss_samples[-1], 2)), xy=(dates[-1],
-                        rss_samples[-1]), xytext=(4, -4), textcoords='offset points')
-                if pss_samples:
-                    ax.annotate(str(round(pss_samples[0], 2)), xy=(dates[0],
-                        pss_samples[0]), xytext=(4, 4), textcoords='offset points')
-                    ax.annotate(str(round(pss_samples[-1], 2)), xy=(dates[-1],
-                        pss_samples[-1]), xytext=(4, -4), textcoords='offset points')
-                if uss_samples:
-                    ax.annotate(str(round(uss_samples[0], 2)), xy=(dates[0],
-                        uss_samples[0]), xytext=(4, 4), textcoords='offset points')
-                    ax.annotate(str(round(uss_samples[-1], 2)), xy=(dates[-1],
-                        uss_samples[-1]), xytext=(4, -4), textcoords='offset points')
-                if vss_samples:
-                    ax.annotate(str(round(vss_samples[0], 2)), xy=(dates[0],
-                        vss_samples[0]), xytext=(4, 4), textcoords='offset points')
-                    ax.annotate(str(round(vss_samples[-1], 2)), xy=(dates[-1],
-                        vss_samples[-1]), xytext=(4, -4), textcoords='offset points')
-                if swap_samples:
-                    ax.annotate(str(round(swap_samples[0], 2)), xy=(dates[0],
-                        swap_samples[0]), xytext=(4, 4), textcoords='offset points')
-                    ax.annotate(str(round(swap_samples[-1], 2)), xy=(dates[-1],
-                        swap_samples[-1]), xytext=(4, -4), textcoords='offset points')
+            for process_pid, series in pids.items():
+                dates = to_datenums(series.times)
+                samples = measurement_arrays(series.columns)
+                for measurement in PROCESS_MEASUREMENTS:
+                    plt.plot(dates, samples[measurement], linewidth=1, label='{} {}'.format(
+                        process_pid, measurement.upper()))
+                for measurement in PROCESS_MEASUREMENTS:
+                    annotate_ends(ax, dates, samples[measurement])
 
+            ax.xaxis_date()
             datefmt = mdates.DateFormatter('%m-%d %H-%M')
             ax.xaxis.set_major_formatter(datefmt)
             ax.grid(True)
@@ -1298,16 +1457,14 @@ def graph_same_miq_workers(graph_file_path, process_results, provider_names):
     logger.info('Plotted Same Type/Process Memory in: {}'.format(timediff))
 
 
-def summary_csv_measurement_dump(csv_file, process_results, measurement):
+def summary_csv_measurement_dump(csv_file, store, measurement):
     csv_file.write('---------------------------------------------\n')
     csv_file.write('Per Process {} Memory Usage\n'.format(measurement.upper()))
     csv_file.write('---------------------------------------------\n')
     csv_file.write('Process/Worker Type,PID,Start of test,End of test\n')
     for ordered_name in process_order:
-        if ordered_name in process_results:
-            for process_pid in sorted(process_results[ordered_name]):
-                start = process_results[ordered_name][process_pid].keys()[0]
-                end = process_results[ordered_name][process_pid].keys()[-1]
+        if ordered_name in store.processes:
+            for process_pid in sorted(store.processes[ordered_name]):
+                series = store.processes[ordered_name][process_pid]
                 csv_file.write('{},{},{},{}\n'.format(ordered_name, process_pid,
-                    round(process_results[ordered_name][process_pid][start][measurement], 2),
-                    round(process_results[ordered_name][process_pid][end][measurement], 2)))
+                    round(series.first(measurement), 2), round(series.last(measurement), 2)))
@@ -1,6 +1,11 @@
 # -*- coding: utf-8 -*-
+import codecs
+import select
 import socket
 import sys
+import threading
+from collections import deque
+from contextlib import contextmanager
 from subprocess import check_call
 
 import attr
@@ -9,6 +14,7 @@ import fauxfactory
 import iso8601
 import paramiko
 import re
+import six
 from cached_property import cached_property
 from os import path as os_path
 from scp import SCPClient
@@ -25,6 +31,26 @@ from cfme.fixtures.pytest_store import store
 # Default blocking time before giving up on an ssh command execution,
 # in seconds (float)
 RUNCMD_TIMEOUT = 1200.0
+# How much output to read from a channel at once, in bytes
+READ_CHUNK_SIZE = 32768
+# Longest wait for channel activity before checking the exit status again, in seconds
+CHANNEL_WAIT_INTERVAL = 1.0
+# Most commands run at once over one connection, sshd's MaxSessions defaults to 10
+MAX_CHANNELS = 10
+# SSHTail reads new data in chunks of this size, this many bytes at a time
+TAIL_READ_CHUNK_SIZE = 1024 * 1024
+TAIL_READ_WINDOW = 8 * TAIL_READ_CHUNK_SIZE
+
+
+def _output_decoder():
+    """Return a function turning received chunks of bytes into output strings
+
+    On python 3 multibyte characters split between two chunks are decoded correctly,
+    on python 2 the chunks already are the str the output is made of.
+    """
+    if six.PY2:
+        return lambda chunk, final=False: chunk
+    return codecs.getincrementaldecoder('utf-8')(errors='replace').decode
 
 
 @attr.s(frozen=True)
@@ -95,6 +121,79 @@ _ssh_pubkey_file = project_path.join('.generated_ssh_key.pub')
 _client_session = []
 
 
+@attr.s
+class PooledTransport(object):
+    transport = attr.ib()
+    channel_slots = attr.ib(default=attr.Factory(lambda: threading.BoundedSemaphore(MAX_CHANNELS)))
+    clients = attr.ib(default=0)
+
+
+class SSHConnectionPool(object):
+    """Shares SSH connections between :py:class:`SSHClient` instances
+
+    Clients connecting to the same host with the same credentials use one paramiko transport and
+    run their commands as separate channels on it. A transport is closed when the last client
+    using it is closed.
+    """
+    KEY_ARGS = ('hostname', 'port', 'username', 'password', 'key_filename')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connect_locks = {}
+        self._transports = {}
+
+    @classmethod
+    def key(cls, connect_kwargs):
+        return tuple(connect_kwargs.get(arg) for arg in cls.KEY_ARGS)
+
+    @contextmanager
+    def connecting(self, key):
+        """Serialize connecting to one host, so that concurrent clients end up sharing"""
+        with self._lock:
+            connect_lock = self._connect_locks.setdefault(key, threading.Lock())
+        with connect_lock:
+            yield
+
+    def acquire(self, key):
+        """Return the :py:class:`PooledTransport` for key if it is still usable, else ``None``"""
+        with self._lock:
+            pooled = self._transports.get(key)
+            if pooled is None:
+                return None
+            if not pooled.transport.is_active():
+                del self._transports[key]
+                return None
+            pooled.clients += 1
+            return pooled
+
+    def register(self, key, transport):
+        with self._lock:
+            pooled = self._transports[key] = PooledTransport(transport, clients=1)
+            return pooled
+
+    def release(self, key, transport):
+        """Drop one client of a transport and close it if it was the last one"""
+        with self._lock:
+            pooled = self._transports.get(key)
+            if pooled is not None and pooled.transport is transport:
+                pooled.clients -= 1
+                if pooled.clients > 0:
+                    return
+                del self._transports[key]
+        transport.close()
+
+    def close_all(self):
+        with self._lock:
+            transports = [pooled.transport for pooled in self._transports.values()]
+            self._transports.clear()
+        for transport in transports:
+            with diaper:
+                transport.close()
+
+
+connection_pool = SSHConnectionPool()
+
+
 class SSHClient(paramiko.SSHClient):
     """paramiko.SSHClient wrapper
 
@@ -109,6 +208,8 @@ class SSHClient(paramiko.SSHClient):
             app and ``container`` then specifies the name of the pod to interact with.
         stdout: If specified, overrides the system stdout file for streaming output.
         stderr: If specified, overrides the system stderr file for streaming output.
+        pooled: Share the connection with other clients of the same host and credentials through
+            :py:data:`connection_pool`, defaults to True.
     """
     def __init__(self, stream_output=False, **connect_kwargs):
         super(SSHClient, self).__init__()
@@ -124,6 +225,9 @@ class SSHClient(paramiko.SSHClient):
         self.oc_password = connect_kwargs.pop('oc_password', False)
         self.f_stdout = connect_kwargs.pop('stdout', sys.stdout)
         self.f_stderr = connect_kwargs.pop('stderr', sys.stderr)
+        self._pooled = connect_kwargs.pop('pooled', True)
+        self._pool_key = None
+        self._channel_slots = threading.BoundedSemaphore(MAX_CHANNELS)
 
         # load the defaults for ssh
         default_connect_kwargs = {
@@ -202,8 +306,17 @@ class SSHClient(paramiko.SSHClient):
     def close(self):
         with diaper:
             _client_session.remove(self)
+        self._release_pooled()
         super(SSHClient, self).close()
 
+    def _release_pooled(self):
+        if self._pool_key is None:
+            return
+        transport, self._transport = self._transport, None
+        connection_pool.release(self._pool_key, transport)
+        self._pool_key = None
+        self._channel_slots = threading.BoundedSemaphore(MAX_CHANNELS)
+
     @property
     def connected(self):
         return self._transport and self._transport.active
@@ -218,15 +331,37 @@ class SSHClient(paramiko.SSHClient):
 
         if not self.connected:
             self._connect_kwargs.update(kwargs)
-            self._check_port()
-            # Only install ssh keys if they aren't installed (or currently being installed)
-            conn = super(SSHClient, self).connect(**self._connect_kwargs)
+            if self._pooled:
+                conn = self._connect_pooled()
+            else:
+                conn = self._connect()
         else:
             conn = None
 
         self._after_connect()
         return conn
 
+    def _connect(self):
+        self._check_port()
+        # Only install ssh keys if they aren't installed (or currently being installed)
+        return super(SSHClient, self).connect(**self._connect_kwargs)
+
+    def _connect_pooled(self):
+        # a dead pooled transport is dropped here, the pool won't hand it out again
+        self._release_pooled()
+        key = connection_pool.key(self._connect_kwargs)
+        with connection_pool.connecting(key):
+            pooled = connection_pool.acquire(key)
+            if pooled is None:
+                conn = self._connect()
+                pooled = connection_pool.register(key, self._transport)
+            else:
+                conn = None
+                self._transport = pooled.transport
+        self._pool_key = key
+        self._channel_slots = pooled.channel_slots
+        return conn
+
     def _after_connect(self):
         if self.is_pod:
             # checking whether already logged into openshift
@@ -275,6 +410,118 @@ class SSHClient(paramiko.SSHClient):
         Returns:
             A :py:class:`SSHResult` instance.
         """
+        command, uses_sudo = self._prepare_command(command, ensure_host, ensure_user, container)
+        output = []
+        with self._command_errors(command, output, reraise):
+            with self._channel_slots:
+                session = self._exec_command(command, uses_sudo, timeout)
+                return self._command_result(session, command, output, timeout)
+
+        # Returning two things so tuple unpacking the return works even if the ssh client fails
+        # Return whatever we have in the output
+        return SSHResult(rc=1, output=''.join(output), command=command)
+
+    def run_commands(
+            self, commands, timeout=RUNCMD_TIMEOUT, reraise=False, ensure_host=False,
+            ensure_user=False, container=None):
+        """Run several independent commands over SSH at once.
+
+        Every command gets its own channel on the connection, up to :py:data:`MAX_CHANNELS` of
+        them run at the same time, so a batch of short commands costs about one round trip
+        instead of one per command. The commands must not depend on each other, there is no
+        guarantee on the order they run in; chain dependent commands in a single shell command.
+
+        Args:
+            commands: Iterable of commands, see :py:meth:`run_command`.
+            Other args as in :py:meth:`run_command`, applied to every command.
+        Returns:
+            A list of :py:class:`SSHResult` instances in the order of ``commands``.
+        """
+        prepared = [
+            self._prepare_command(command, ensure_host, ensure_user, container)
+            for command in commands]
+        results = [None] * len(prepared)
+        pending = deque(enumerate(prepared))
+        running = deque()
+        try:
+            while pending or running:
+                # start as many commands as there are free channels, but always at least one
+                while pending and self._channel_slots.acquire(not running):
+                    index, (command, uses_sudo) = pending.popleft()
+                    session = None
+                    try:
+                        with self._command_errors(command, [], reraise):
+                            session = self._exec_command(command, uses_sudo, timeout)
+                    finally:
+                        if session is None:
+                            self._channel_slots.release()
+                    if session is None:
+                        results[index] = SSHResult(rc=1, output='', command=command)
+                    else:
+                        running.append((index, command, session))
+                if running:
+                    index, command, session = running.popleft()
+                    output = []
+                    try:
+                        with self._command_errors(command, output, reraise):
+                            results[index] = self._command_result(
+                                session, command, output, timeout)
+                    finally:
+                        self._channel_slots.release()
+                    if results[index] is None:
+                        results[index] = SSHResult(rc=1, output=''.join(output), command=command)
+        finally:
+            for _, _, session in running:
+                with diaper:
+                    session.close()
+                self._channel_slots.release()
+        return results
+
+    def stream_command(
+            self, command, idle_interval=CHANNEL_WAIT_INTERVAL, ensure_host=False,
+            ensure_user=False, container=None):
+        """Run a long-lived command over SSH and yield its output line by line.
+
+        The command keeps a single channel open for as long as it runs. ``None`` is yielded
+        whenever no output arrived for ``idle_interval`` seconds so the caller gets a chance to
+        stop; closing the generator closes the channel, which stops the remote command.
+
+        Args:
+            command: The command. Supports taking dicts as version picking.
+            idle_interval: Seconds to wait for output before yielding ``None``.
+            Other args as in :py:meth:`run_command`.
+        """
+        command, uses_sudo = self._prepare_command(command, ensure_host, ensure_user, container)
+        with self._channel_slots:
+            session = self._exec_command(command, uses_sudo, idle_interval)
+            try:
+                decode = _output_decoder()
+                pending = ''
+                while True:
+                    try:
+                        data = session.recv(READ_CHUNK_SIZE)
+                    except socket.timeout:
+                        yield None
+                        continue
+                    if not data:
+                        break
+                    lines = (pending + decode(data)).split('\n')
+                    pending = lines.pop()
+                    for line in lines:
+                        # a pseudo-tty for sudo ends lines with \r\n
+                        yield line.rstrip('\r')
+                if pending:
+                    yield pending.rstrip('\r')
+                while session.recv_stderr_ready():
+                    logger.warning('%r: %s', command, session.recv_stderr(READ_CHUNK_SIZE))
+                rc = session.recv_exit_status()
+                if rc:
+                    logger.warning('Streamed command %r exited with %s', command, rc)
+            finally:
+                session.close()
+
+    def _prepare_command(self, command, ensure_host, ensure_user, container):
+        """Return the command to execute and whether it needs a pseudo-tty for sudo"""
         if isinstance(command, dict):
             command = version.pick(command, active_version=self.vmdb_version)
         original_command = command
@@ -300,64 +547,12 @@ class SSHClient(paramiko.SSHClient):
         if command != original_command:
             logger.info("> Actually running command %r", command)
         command += '\n'
+        return command, uses_sudo
 
-        output = []
+    @contextmanager
+    def _command_errors(self, command, output, reraise):
         try:
-            session = self.get_transport().open_session()
-            if uses_sudo:
-                # We need a pseudo-tty for sudo
-                session.get_pty()
-            if timeout:
-                session.settimeout(float(timeout))
-
-            session.exec_command(command)
-            stdout = session.makefile()
-            stderr = session.makefile_stderr()
-
-            def write_output(line, file):
-                output.append(line)
-                if self._streaming:
-                    file.write(line)
-
-            while True:
-                if session.exit_status_ready():
-                    break
-
-                # While the program is running loop through collecting line by line so that we don't
-                # fill the buffers up without a newline.
-                # Also, note that for long running programs if we try to read output when there
-                # is none (and in the case of stderr may never be any)
-                # we risk blocking so long that the write buffer on the remote side will fill
-                # and the remote program will block on a write.
-                # The blocking on our side occurs in paramiko's buffered_pipe.py's read() call,
-                # which will block if its internal buffer is empty.
-                if session.recv_ready():
-                    try:
-                        line = stdout.next()
-                        write_output(line, self.f_stdout)
-                    except StopIteration:
-                        pass
-
-                if session.recv_stderr_ready():
-                    try:
-                        line = stderr.next()
-                        write_output(line, self.f_stderr)
-                    except StopIteration:
-                        pass
-
-            # When the program finishes, we need to grab the rest of the output that is left.
-            # Also, we don't have the issue of blocking reads because since the command is
-            # finished, any pending reads of SSH encrypted data will finish shortly and put in
-            # the buffer or for an empty file EOF will be reached as it will be closed.
-            for line in stdout:
-                write_output(line, self.f_stdout)
-            for line in stderr:
-                write_output(line, self.f_stderr)
-
-            exit_status = session.recv_exit_status()
-            if exit_status != 0:
-                logger.warning('Exit code %d!', exit_status)
-            return SSHResult(rc=exit_status, output=''.join(output), command=command)
+            yield
         except paramiko.SSHException:
             if reraise:
                 raise
@@ -370,9 +565,66 @@ class SSHClient(paramiko.SSHClient):
                 ''.join(output))
             raise
 
-        # Returning two things so tuple unpacking the return works even if the ssh client fails
-        # Return whatever we have in the output
-        return SSHResult(rc=1, output=''.join(output), command=command)
+    def _exec_command(self, command, uses_sudo, timeout):
+        session = self.get_transport().open_session()
+        if uses_sudo:
+            # We need a pseudo-tty for sudo
+            session.get_pty()
+        if timeout:
+            session.settimeout(float(timeout))
+        session.exec_command(command)
+        return session
+
+    def _command_result(self, session, command, output, timeout):
+        """Collect the output of a command started on session and return its SSHResult"""
+        decode_stdout = _output_decoder()
+        decode_stderr = _output_decoder()
+
+        def write_output(data, file):
+            output.append(data)
+            if self._streaming:
+                file.write(data)
+
+        def read_ready():
+            # read whatever the channel has buffered right now, in large chunks
+            got_data = False
+            while session.recv_ready():
+                write_output(decode_stdout(session.recv(READ_CHUNK_SIZE)), self.f_stdout)
+                got_data = True
+            while session.recv_stderr_ready():
+                write_output(
+                    decode_stderr(session.recv_stderr(READ_CHUNK_SIZE)), self.f_stderr)
+                got_data = True
+            return got_data
+
+        while True:
+            # Keep the remote side's write buffers drained while the program runs so it never
+            # blocks on a write, but don't spin: the channel's fileno becomes readable when
+            # stdout or stderr data arrives or the channel closes, so sleep in select until
+            # then. The interval only bounds how late we notice a bare exit status. As before,
+            # the timeout applies to the reads of the channel, a silent command is waited for.
+            if not read_ready() and session.exit_status_ready():
+                break
+            select.select([session], [], [], CHANNEL_WAIT_INTERVAL)
+
+        # When the program finishes, we need to grab the rest of the output that is left.
+        # Also, we don't have the issue of blocking reads because since the command is
+        # finished, any pending reads of SSH encrypted data will finish shortly and put in
+        # the buffer or for an empty file EOF will be reached as it will be closed.
+        for receive, decode, file in ((session.recv, decode_stdout, self.f_stdout),
+                                      (session.recv_stderr, decode_stderr, self.f_stderr)):
+            while True:
+                chunk = receive(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                write_output(decode(chunk), file)
+            write_output(decode(b'', final=True), file)
+
+        exit_status = session.recv_exit_status()
+        session.close()
+        if exit_status != 0:
+            logger.warning('Exit code %d!', exit_status)
+        return SSHResult(rc=exit_status, output=''.join(output), command=command)
 
     def cpu_spike(self, seconds=60, cpus=2, **kwargs):
         """Creates a CPU spike of specific length and processes.
@@ -667,44 +919,132 @@ class SSHClient(paramiko.SSHClient):
 
 
 class SSHTail(SSHClient):
+    """Follows a remote file, yielding the lines appended to it since the last iteration
+
+    The SFTP session and the remote file stay open between iterations, until :py:meth:`close` or
+    the end of a ``with`` block, and new data is read in large pipelined chunks. The session takes
+    one of the :py:data:`MAX_CHANNELS` channel slots of the connection while it is open. Rotation
+    (the file being moved away and recreated) and truncation are detected; the rest of a rotated
+    file is read before starting on the new one.
+
+    Only complete lines are yielded, a partially written last line is held back until its newline
+    arrives. Without :py:meth:`set_initial_file_end` the first iteration yields nothing and only
+    marks the current end of the file.
+    """
 
     def __init__(self, remote_filename, **connect_kwargs):
         super(SSHTail, self).__init__(stream_output=False, **connect_kwargs)
         self._remote_filename = remote_filename
         self._sftp_client = None
+        self._sftp_slot = None
+        self._remote_file = None
         self._remote_file_size = None
+        self._decode = _output_decoder()
+        self._partial_line = ''
 
     def __iter__(self):
         for line in self.raw_lines():
             yield line.rstrip()
 
+    def _open(self):
+        if self._sftp_client is not None and self._sftp_client.sock.closed:
+            self._close_sftp()
+        if self._sftp_client is None:
+            self.connect()
+            # The session is a channel of the shared connection just like a command
+            self._channel_slots.acquire()
+            self._sftp_slot = self._channel_slots
+            try:
+                self._sftp_client = self.open_sftp()
+            except Exception:
+                self._close_sftp()
+                raise
+        if self._remote_file is None:
+            self._remote_file = self._sftp_client.open(self._remote_filename, 'rb')
+
+    def _reopen(self):
+        with diaper:
+            self._remote_file.close()
+        self._remote_file = None
+        self._open()
+
+    def _read(self, start, end):
+        """Yield the data of the open remote file between the offsets, in chunks"""
+        while start < end:
+            window = min(end - start, TAIL_READ_WINDOW)
+            chunks = [(offset, min(TAIL_READ_CHUNK_SIZE, start + window - offset))
+                      for offset in range(start, start + window, TAIL_READ_CHUNK_SIZE)]
+            for data in self._remote_file.readv(chunks):
+                yield data
+            start += window
+
+    def _lines(self, data):
+        lines = (self._partial_line + self._decode(data)).split('\n')
+        self._partial_line = lines.pop()
+        for line in lines:
+            yield line + '\n'
+
     def raw_lines(self):
-        with self as sshtail:
-            fstat = sshtail._sftp_client.stat(self._remote_filename)
-            if self._remote_file_size is not None:
-                if self._remote_file_size < fstat.st_size:
-                    remote_file = self._sftp_client.open(self._remote_filename, 'r')
-                    remote_file.seek(self._remote_file_size, 0)
-                    while (remote_file.tell() < fstat.st_size):
-                        line = remote_file.readline()  # Note the  missing rstrip() here!
-                        yield line
-            self._remote_file_size = fstat.st_size
+        self._open()
+        file_size = self._sftp_client.stat(self._remote_filename).st_size
+        if self._remote_file_size is None:
+            self._remote_file_size = file_size
+            return
+        # The path is stat-ed before the open file, if it is the same file its size can only
+        # have grown since. The open file being smaller, or it still being as large as we read
+        # while the path got smaller, means the path is a new file now.
+        open_size = self._remote_file.stat().st_size
+        rotated = open_size < file_size or file_size < self._remote_file_size <= open_size
+        if rotated:
+            for data in self._read(self._remote_file_size, open_size):
+                for line in self._lines(data):
+                    yield line
+            if self._partial_line:
+                yield self._partial_line + '\n'
+            self._reopen()
+        if rotated or file_size < self._remote_file_size:
+            logger.info('%s was rotated or truncated, reading it from the start',
+                        self._remote_filename)
+            self._remote_file_size = 0
+            self._partial_line = ''
+            self._decode = _output_decoder()
+        # record the progress as we go, a consumer may stop iterating early
+        for data in self._read(self._remote_file_size, file_size):
+            self._remote_file_size += len(data)
+            for line in self._lines(data):
+                yield line
 
     def raw_string(self):
         return ''.join(self)
 
     def __enter__(self):
         self.connect(**self._connect_kwargs)
-        self._sftp_client = self.open_sftp()
+        self._open()
         return self
 
     def __exit__(self, *args, **kwargs):
-        self._sftp_client.close()
+        # The position in the file is kept, the next iteration opens a new session
+        self._close_sftp()
+
+    def _close_sftp(self):
+        if self._sftp_client is not None:
+            with diaper:
+                self._sftp_client.close()
+        self._sftp_client = None
+        self._remote_file = None
+        if self._sftp_slot is not None:
+            self._sftp_slot.release()
+            self._sftp_slot = None
+
+    def close(self):
+        self._close_sftp()
+        super(SSHTail, self).close()
 
     def set_initial_file_end(self):
-        with self as sshtail:
-            fstat = sshtail._sftp_client.stat(self._remote_filename)
-            self._remote_file_size = fstat.st_size  # Seed initial size of file
+        self._open()
+        # Seed initial size of file
+        self._remote_file_size = self._sftp_client.stat(self._remote_filename).st_size
+        self._partial_line = ''
 
     def lines_as_list(self):
         """Return lines as list"""
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Clustering of similar tracebacks, for the most common failures of a run.
+
+Tracebacks are normalized first, so that the parts that change between two occurrences of the
+same failure (addresses, ids, numbers) do not keep them apart, and the identical ones are merged.
+The distinct ones are then compared by MinHash signatures of their token shingles, only to those
+ending with the same exception. Only the tracebacks that share a band of their signature with a
+cluster are compared to it (locality-sensitive hashing), so the time grows about linearly with
+the number of tracebacks instead of comparing every one with every cluster.
+"""
+import random
+import re
+import zlib
+
+# The order matters, eg. the uuids have to go before the numbers they contain
+_NORMALIZERS = [
+    (re.compile(r'0x[0-9a-fA-F]+'), '<addr>'),
+    (re.compile(r'\b[0-9a-fA-F]{8}-(?:[0-9a-fA-F]{4}-){3}[0-9a-fA-F]{12}\b'), '<uuid>'),
+    (re.compile(r'\b(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{12,}\b'), '<hex>'),
+    (re.compile(r'\d+'), '<n>'),
+]
+_TOKEN = re.compile(r'<\w+>|\w+|[^\w\s]')
+# The exception on the last line of a traceback, maybe after the E of pytest
+_EXCEPTION = re.compile(r'(?:E\s+)?([\w.]+)(?::|$)')
+# A Mersenne prime larger than any shingle hash, for the permutations
+_PRIME = (1 << 61) - 1
+
+
+def normalize(traceback):
+    """Replaces the parts of a traceback that vary between occurrences of the same failure"""
+    for pattern, replacement in _NORMALIZERS:
+        traceback = pattern.sub(replacement, traceback)
+    return '\n'.join(' '.join(line.split()) for line in traceback.splitlines() if line.strip())
+
+
+def exception_type(traceback):
+    """The type of the exception a normalized traceback ends with, or its last line"""
+    last_line = traceback.rsplit('\n', 1)[-1]
+    match = _EXCEPTION.match(last_line)
+    return match.group(1) if match else last_line
+
+
+def _hash(text):
+    if not isinstance(text, bytes):
+        text = text.encode('utf-8')
+    return zlib.crc32(text) & 0xffffffff
+
+
+def shingles(text, size=3):
+    """The hashes of the runs of ``size`` tokens of the text"""
+    tokens = _TOKEN.findall(text)
+    if len(tokens) < size:
+        tokens = tokens + [''] * (size - len(tokens))
+    return {_hash(' '.join(tokens[i:i + size])) for i in range(len(tokens) - size + 1)}
+
+
+class MinHasher(object):
+    """Computes MinHash signatures, the share of equal values of two signatures estimates the
+    Jaccard similarity of the two sets
+
+    This is one permutation hashing: every hash is mixed once and lands in one of ``num_perm``
+    bins, each bin keeps its smallest value. Empty bins take the value of the next filled one
+    and the distance to it (densification), so small sets still get full signatures. That is one
+    pass over the hashes instead of one per value of the signature.
+    """
+    def __init__(self, num_perm=32, seed=1):
+        self.num_perm = num_perm
+        rand = random.Random(seed)
+        self.a = rand.randrange(1, _PRIME)
+        self.b = rand.randrange(0, _PRIME)
+
+    def signature(self, hashes):
+        bins = [None] * self.num_perm
+        for h in hashes:
+            mixed = (self.a * h + self.b) % _PRIME
+            index, value = mixed % self.num_perm, mixed // self.num_perm
+            if bins[index] is None or value < bins[index]:
+                bins[index] = value
+        if all(value is None for value in bins):
+            return tuple(bins)
+        signature = list(bins)
+        for index, value in enumerate(bins):
+            if value is None:
+                distance = 1
+                while bins[(index + distance) % self.num_perm] is None:
+                    distance += 1
+                # Values are below _PRIME, so the borrowed ones can't equal the own ones
+                signature[index] = bins[(index + distance) % self.num_perm] + distance * _PRIME
+        return tuple(signature)
+
+    @staticmethod
+    def similarity(first, second):
+        return sum(1 for x, y in zip(first, second) if x == y) / float(len(first))
+
+
+class Cluster(object):
+    """Similar tracebacks with the items they came with
+
+    ``examples`` holds the first ``max_examples`` of the (traceback, item) pairs, or all of them
+    when it is None, the first one being the representative of the cluster. ``count`` is the
+    number of all of them.
+    """
+    def __init__(self, max_examples=5):
+        self.max_examples = max_examples
+        self.examples = []
+        self.count = 0
+
+    def add(self, traceback, item):
+        self.count += 1
+        if self.max_examples is None or len(self.examples) < self.max_examples:
+            self.examples.append((traceback, item))
+
+    def merge(self, other):
+        self.count += other.count
+        if self.max_examples is None:
+            self.examples.extend(other.examples)
+        else:
+            self.examples.extend(other.examples[:self.max_examples - len(self.examples)])
+
+    @property
+    def representative(self):
+        return self.examples[0]
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        return '<Cluster of {} like {!r}>'.format(self.count, self.representative[0][:60])
+
+
+class TracebackClusterer(object):
+    """Groups tracebacks of the same exception whose normalized forms are at least ``threshold``
+    similar
+
+    Tracebacks are added with :py:meth:`add` along with an item, eg. the name of the failed test,
+    and :py:meth:`clusters` then groups them. The signature of ``bands * rows`` values is split
+    into ``bands`` bands, two tracebacks are compared when they have a band equal. The defaults
+    find pairs with a similarity of 0.6 with a probability of about 0.67, 0.8 with about 0.98.
+    """
+    def __init__(self, threshold=0.6, bands=8, rows=4, shingle_size=3, max_examples=5):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.shingle_size = shingle_size
+        self.max_examples = max_examples
+        self.hasher = MinHasher(bands * rows)
+        # normalized traceback: cluster of the tracebacks with that form
+        self.exact = {}
+
+    def add(self, traceback, item=None):
+        key = normalize(traceback)
+        if key not in self.exact:
+            self.exact[key] = Cluster(self.max_examples)
+        self.exact[key].add(traceback, item)
+
+    def clusters(self):
+        """The clusters, largest first"""
+        keys = list(self.exact)
+        exceptions = [exception_type(key) for key in keys]
+        signatures = [self.hasher.signature(shingles(key, self.shingle_size)) for key in keys]
+        parents = list(range(len(keys)))
+
+        def find(i):
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+
+        buckets = {}
+        for i, signature in enumerate(signatures):
+            for band in range(self.bands):
+                bucket = (exceptions[i], band, signature[band * self.rows:(band + 1) * self.rows])
+                # Only the first traceback of the bucket is compared, keeping it linear
+                first = buckets.setdefault(bucket, i)
+                if first != i and find(first) != find(i) and MinHasher.similarity(
+                        signature, signatures[first]) >= self.threshold:
+                    parents[find(i)] = find(first)
+
+        roots = {}
+        # The most common form of a cluster gives its representative
+        for i in sorted(range(len(keys)), key=lambda i: -self.exact[keys[i]].count):
+            root = find(i)
+            if root not in roots:
+                roots[root] = Cluster(self.max_examples)
+            roots[root].merge(self.exact[keys[i]])
+        return sorted(roots.values(), key=len, reverse=True)
+
+    def top(self, n=10):
+        return self.clusters()[:n]
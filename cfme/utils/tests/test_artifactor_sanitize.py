@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+import pytest
+from six import StringIO
+
+from artifactor.plugins.filedump import replacement_pattern, sanitize_stream
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 1024])
+def test_sanitize_stream_masks_words_across_chunks(chunk_size):
+    pattern, overlap = replacement_pattern(['secret', 'secret-longer', 42, ''])
+    target = StringIO()
+    sanitize_stream(
+        StringIO('a secret-longer and secret, 42 times secre'), target, pattern, overlap,
+        chunk_size=chunk_size)
+    assert target.getvalue() == 'a ************* and ******, ** times secre'
+
+
+def test_replacement_pattern_without_words():
+    assert replacement_pattern(['', '']) == (None, 0)
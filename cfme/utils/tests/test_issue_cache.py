@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+
+from cfme.utils.issue_cache import IssueCache
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+def test_issue_cache_is_shared_per_tracker(tmpdir):
+    path = tmpdir.join('issues.sqlite')
+    IssueCache(path).set_many('bz', {1: {'status': 'NEW'}, 2: {'status': 'CLOSED'}})
+    cache = IssueCache(path)
+    assert cache.get_many('bz', [1, 2, 3]) == {1: {'status': 'NEW'}, 2: {'status': 'CLOSED'}}
+    assert cache.get('gh', 1) is None
+
+
+def test_issue_cache_expires(tmpdir, monkeypatch):
+    cache = IssueCache(tmpdir.join('issues.sqlite'), ttl=60)
+    cache.set('jira', 'FOO-42', 'Done')
+    assert cache.get('jira', 'FOO-42') == 'Done'
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 61)
+    assert cache.get('jira', 'FOO-42') is None
+    assert IssueCache(tmpdir.join('disabled.sqlite'), ttl=0).get('jira', 'FOO-42') is None
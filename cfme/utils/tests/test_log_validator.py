@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from cfme.utils.log_validator import PatternSet
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+@pytest.mark.parametrize('patterns', [
+    ['.*ERROR.*', 'FATAL', '.*Errno::ECONNREFUSED.*'],
+    ['.*ERROR.*', 'FATAL', '.*Errno::[A-Z]+.*'],
+    ['.*ERROR.*', 'FATAL', '(?i).*errno::econnrefused.*'],
+], ids=['literals', 'regexes', 'uncombinable'])
+def test_pattern_set_matches_like_re_match(patterns):
+    pattern_set = PatternSet(patterns)
+    assert pattern_set.first_match('[----] I, INFO -- : all good') is None
+    assert pattern_set.first_match('[----] E, ERROR -- : Errno::ECONNREFUSED') == '.*ERROR.*'
+    assert pattern_set.all_matches('[----] E, ERROR -- : Errno::ECONNREFUSED') == [
+        '.*ERROR.*', patterns[2]]
+    # patterns are anchored at the start of the line
+    assert pattern_set.first_match('not FATAL') is None
+    assert pattern_set.first_match('FATAL error') == 'FATAL'
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from cfme.fixtures.parallelizer.allocator import ProviderAllocator, ProviderSetupCosts
+from cfme.fixtures.parallelizer.scheduler import (
+    DurationRecorder, DurationScheduler, ScheduledGroup, simulate, split_by_param_id)
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+class FakeCache(dict):
+    def set(self, key, value):
+        self[key] = value
+
+
+def test_split_by_param_id():
+    groups = split_by_param_id([
+        'test_a.py::test_one[rhv]',
+        'test_a.py::test_one[ec2]',
+        'test_a.py::test_two[rhv]',
+        'test_a.py::test_three',
+    ])
+    assert list(groups.items()) == [
+        ('rhv', ['test_a.py::test_one[rhv]', 'test_a.py::test_two[rhv]']),
+        ('ec2', ['test_a.py::test_one[ec2]']),
+        ('no params', ['test_a.py::test_three']),
+    ]
+
+
+def test_duration_recorder_roundtrip():
+    cache = FakeCache()
+    recorder = DurationRecorder(cache)
+    recorder.record('test_a.py::test_one', 1.0)
+    recorder.record('test_a.py::test_one', 3.0)
+    recorder.save()
+
+    recorder = DurationRecorder(cache)
+    assert recorder.estimate('test_a.py::test_one') == 4.0
+    # unknown tests are estimated with the median of the known ones
+    assert recorder.estimate('test_a.py::test_unknown') == 4.0
+    assert recorder.estimate_group(['test_a.py::test_one', 'test_a.py::test_two']) == 8.0
+
+
+def test_scheduler_packs_longest_first_and_steals():
+    groups = [ScheduledGroup(tests=[str(i)], duration=duration)
+              for i, duration in enumerate([1, 1, 1, 1, 10])]
+    scheduler = DurationScheduler(groups, ['slave00', 'slave01'])
+    assert scheduler.next_group('slave00').duration == 10
+    sent = [scheduler.next_group('slave01') for _ in range(4)]
+    assert all(group is not None for group in sent)
+    assert scheduler.next_group('slave00') is None
+    # a slave that was not part of the plan steals from the others
+    scheduler = DurationScheduler(groups, ['slave00'])
+    assert scheduler.next_group('slave01') is not None
+    assert scheduler.stolen == 1
+
+
+def test_scheduler_keeps_provider_affinity():
+    groups = [ScheduledGroup(tests=[str(i)], provider=provider, duration=10)
+              for i, provider in enumerate(['rhv', 'ec2', 'rhv', 'ec2'])]
+    scheduler = DurationScheduler(groups, ['slave00', 'slave01'], provider_switch_cost=100)
+    for slave_id in ('slave00', 'slave01'):
+        providers = {scheduler.next_group(slave_id).provider for _ in range(2)}
+        assert len(providers) == 1
+
+
+def test_queued_providers():
+    groups = [ScheduledGroup(tests=[str(i)], provider=provider, duration=10)
+              for i, provider in enumerate(['rhv', 'ec2', 'rhv', 'ec2'])]
+    scheduler = DurationScheduler(groups, ['slave00'])
+    allocator = ProviderAllocator(groups, ['slave00'], ProviderSetupCosts(default=10))
+    for planner in (scheduler, allocator):
+        assert planner.queued_providers('slave00') == {'rhv', 'ec2'}
+        while planner.next_group('slave00') is not None:
+            pass
+        assert planner.queued_providers('slave00') == set()
+        assert planner.queued_providers('slave01') == set()
+
+
+def test_simulation_improves_makespan():
+    groups = [ScheduledGroup(tests=[str(i)], duration=1) for i in range(20)]
+    groups.append(ScheduledGroup(tests=['long'], duration=20))
+    assert simulate(groups, 2, 'duration') < simulate(groups, 2, 'module')
+
+
+def test_allocator_keeps_providers_together():
+    groups = [ScheduledGroup(tests=[str(i)], provider=provider, duration=10)
+              for i, provider in enumerate(['rhv', 'ec2', 'rhv', 'ec2', None, None])]
+    costs = ProviderSetupCosts(provider_types={'rhv': 'rhevm'}, default=100)
+    allocator = ProviderAllocator(groups, ['slave00', 'slave01'], costs)
+    assert allocator.setups == 2
+    assert allocator.evictions == 0
+    assert {len(slave.planned_providers) for slave in allocator.slaves.values()} == {1}
+    assert 'provider setups' in allocator.report()[1]
+
+
+def test_allocator_spreads_big_provider_and_steals_when_worth_it():
+    groups = [ScheduledGroup(tests=[str(i)], provider='rhv', duration=100) for i in range(8)]
+    allocator = ProviderAllocator(groups, ['slave00', 'slave01'], ProviderSetupCosts(default=10))
+    assert allocator.copies['rhv'] == 2
+
+    groups.extend(ScheduledGroup(tests=[str(i)], provider='ec2', duration=100) for i in range(8))
+    allocator = ProviderAllocator(groups, ['slave00', 'slave01'], ProviderSetupCosts(default=1000))
+    assert allocator.copies == {'rhv': 1, 'ec2': 1}
+    first = allocator.next_group('slave00').provider
+    for _ in range(7):
+        assert allocator.next_group('slave00').provider == first
+    # setting the other provider up costs more than the work left to steal
+    assert allocator.next_group('slave00') is None
+
+
+def test_provider_setup_costs_roundtrip():
+    cache = FakeCache()
+    costs = ProviderSetupCosts(cache, provider_types={'rhv41': 'rhevm'})
+    costs.record('rhevm', 100)
+    costs.record('rhevm', 200)
+    costs.save()
+    assert ProviderSetupCosts(cache, provider_types={'rhv42': 'rhevm'}).cost('rhv42') == 150
+
+
+def test_scheduler_rebalances_on_slave_changes():
+    groups = [ScheduledGroup(tests=[str(i)], duration=10) for i in range(8)]
+    scheduler = DurationScheduler(groups, ['slave00'])
+    scheduler.add_slave('slave01')
+    assert len(scheduler.queues['slave00']) == len(scheduler.queues['slave01']) == 4
+    assert scheduler.remove_slave('slave00') == 4
+    assert scheduler.slave_ids == ['slave01']
+    assert len(scheduler.queues['slave01']) == 8
+
+
+def test_allocator_rebalances_on_slave_changes():
+    groups = [ScheduledGroup(tests=[str(i)], provider='rhv', duration=100) for i in range(8)]
+    allocator = ProviderAllocator(groups, ['slave00'], ProviderSetupCosts(default=10))
+    allocator.add_slave('slave01')
+    assert allocator.slaves['slave01'].queue
+    assert allocator.remove_slave('slave01')
+    assert len(allocator.slaves['slave00'].queue) == 8
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from cfme.utils import perf_message_stats
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+STAMP = '[----] I, [2018-03-01T10:00:{:02d}.000000 #{}:2b0c1e8]  INFO -- : '
+EVM_LOG = [
+    STAMP.format(0, 100) + 'MIQ(MiqServer.status_update) Complete',
+    STAMP.format(1, 100) + 'MIQ(MiqQueue.put) Message id: [1], Command: [EmsRefresh.refresh], '
+                           'Args: [[["EmsVmware", 1]]]',
+    STAMP.format(2, 100) + 'MIQ(MiqQueue.put) Message id: [2], Command: [Metric.rollup], Args: []',
+    STAMP.format(3, 200) + 'MIQ(MiqQueue.get_via_drb) Message id: [1], Dequeued in: [2.5] seconds',
+    STAMP.format(4, 200) + 'MIQ(MiqQueue.delivered) Message id: [1], Delivered in [1.5] seconds',
+    STAMP.format(5, 300) + 'MIQ(MiqQueue.get_via_drb) Message id: [2], Dequeued in: [4.0] seconds',
+    STAMP.format(6, 300) + 'MIQ(MiqQueue.delivered) Message id: [2], Delivered in [1.0] seconds',
+]
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_evm_to_messages_merges_chunks(tmpdir, monkeypatch, processes):
+    evm_file = tmpdir.join('evm.log')
+    evm_file.write('\n'.join(EVM_LOG * 50))
+    # one chunk per few lines, so messages are put and delivered in different chunks
+    monkeypatch.setattr(perf_message_stats, 'evm_chunk_min_size', 1)
+    filters = {'-EmsVmware': perf_message_stats.re.compile(r'EmsVmware')}
+    messages, msg_cmds, test_start, test_end, line_count = perf_message_stats.evm_to_messages(
+        evm_file.strpath, filters, processes=processes)
+
+    assert line_count == len(EVM_LOG) * 50
+    assert test_start == '2018-03-01 10:00:00.000000'
+    assert test_end == '2018-03-01 10:00:06.000000'
+    assert sorted(messages) == ['1', '2']
+    assert messages['1'].msg_cmd == 'EmsRefresh.refresh-EmsVmware'
+    assert (messages['1'].pid_put, messages['1'].pid_get) == ('100', '200')
+    assert messages['1'].total_time == 4.0
+    assert msg_cmds['Metric.rollup']['total'] == [5.0]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from cfme.infrastructure.provider import InfraProvider
+from cfme.utils.providers import ProviderFilter, filters_signature
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+def test_filters_signature_ignores_order_and_instances():
+    classes = ProviderFilter(classes=[InfraProvider])
+    tags = ProviderFilter(required_tags=['disabled'], inverted=True)
+    assert filters_signature([classes, tags]) == filters_signature(
+        [tags.copy(), ProviderFilter(classes=[InfraProvider])])
+    assert filters_signature([classes]) != filters_signature([classes, tags])
+
+
+def test_filters_signature_tells_required_field_values_from_paths():
+    value = ProviderFilter(required_fields=[('provisioning', 'template')])
+    path = ProviderFilter(required_fields=[['provisioning', 'template']])
+    assert filters_signature([value]) != filters_signature([path])
+    assert filters_signature([value, lambda provider: True]) is None
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+
+import pytest
+
+from cfme.utils.smem_memory_monitor import (
+    APPLIANCE_MEASUREMENTS, MemoryStore, PROCESS_MEASUREMENTS, SmemMemoryMonitor,
+    compile_per_process_results)
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+def fill_store(store, samples):
+    start = datetime(2018, 3, 1, 10, 0, 0, 123456)
+    for i in range(samples):
+        timestamp = start + timedelta(seconds=10 * i)
+        store.add_appliance_sample(timestamp, {m: float(i) for m in APPLIANCE_MEASUREMENTS})
+        store.add_process_sample('MiqGenericWorker', '100', timestamp,
+            {m: 10.0 + i for m in PROCESS_MEASUREMENTS})
+        # recycled halfway through the test
+        if i < samples // 2:
+            store.add_process_sample('MiqGenericWorker', '101', timestamp,
+                {m: 20.0 for m in PROCESS_MEASUREMENTS})
+        store.end_sample()
+    return start
+
+
+def test_memory_store_spills_and_loads(tmpdir):
+    spill_path = str(tmpdir.join('spill'))
+    store = MemoryStore(spill_path, spill_samples=3)
+    start = fill_store(store, 10)
+    assert store.start == start
+    store.spill()
+
+    loaded = MemoryStore.load(spill_path)
+    assert list(loaded.times) == list(store.times)
+    assert loaded.last('used') == 9.0
+    assert list(loaded.processes['MiqGenericWorker']) == ['100', '101']
+    series = loaded.processes['MiqGenericWorker']['100']
+    assert len(series) == 10
+    assert (series.first('rss'), series.last('rss')) == (10.0, 19.0)
+
+
+def test_compile_per_process_results():
+    store = MemoryStore()
+    fill_store(store, 10)
+    alive, recycled, rss, pss, uss, vss, swap = compile_per_process_results(
+        ['MiqGenericWorker'], store, store.end)
+    assert (alive, recycled, rss) == (1, 1, 19.0)
+
+
+def test_add_sampler_sample():
+    monitor = SmemMemoryMonitor(None, {})
+    store = MemoryStore()
+    monitor.add_sample(store, {
+        'timestamp': 1519898400.5,
+        'lag': 0.01,
+        'duration': 0.2,
+        'cpu': 0.1,
+        'meminfo': {'MemTotal': 8192, 'MemFree': 1024, 'MemAvailable': 4096, 'Buffers': 0,
+                    'Cached': 1024, 'Slab': 1024, 'SwapTotal': 0, 'SwapFree': 0},
+        'workers': {'100': 'MiqGenericWorker'},
+        'processes': {
+            '100': ['ruby', 'MiqGenericWorker id: 1', 2048, 1024, 1024, 4096, 0],
+            '200': ['ruby', 'MIQ Server', 2048, 1024, 1024, 4096, 0],
+            '300': ['httpd', '/usr/sbin/httpd -DFOREGROUND', 1024, 512, 512, 2048, 0],
+            '400': ['bash', '-bash', 1024, 512, 512, 2048, 0],
+        },
+    })
+    assert store.last('used') == 5.0
+    assert list(store.processes) == ['MiqGenericWorker', 'MIQ Server (evm_server.rb)', 'httpd']
+    assert store.processes['httpd']['300'].last('rss') == 1.0
+    assert list(store.sampling['lag']) == [0.01]
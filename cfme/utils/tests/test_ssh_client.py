@@ -32,3 +32,22 @@ def test_scp_client_can_put_a_file(appliance, tmpdir):
     assert "content" in tmpfile.read()
     # Clean up the server
     appliance.ssh_client.run_command("rm -f /tmp/{}".format(tmpfile.basename))
+
+
+def test_ssh_client_run_commands(appliance):
+    # Results come back in the order of the commands, whatever order they finish in
+    results = appliance.ssh_client.run_commands(
+        ['sleep 0.{}; echo {}; exit {}'.format(9 - i, i, i % 2) for i in range(15)])
+    assert [result.output.strip() for result in results] == [str(i) for i in range(15)]
+    assert [result.rc for result in results] == [i % 2 for i in range(15)]
+
+
+def test_ssh_clients_share_connection(appliance):
+    ssh_client = appliance.ssh_client(stream_output=False)
+    try:
+        assert ssh_client.run_command('true').success
+        assert ssh_client.get_transport() is appliance.ssh_client.get_transport()
+    finally:
+        ssh_client.close()
+    # closing one client keeps the connection open for the others
+    assert appliance.ssh_client.get_transport().is_active()
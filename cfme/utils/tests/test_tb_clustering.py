@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from cfme.utils.tb_clustering import TracebackClusterer, normalize
+
+pytestmark = [
+    pytest.mark.nondestructive,
+    pytest.mark.skip_selenium,
+]
+
+
+def test_normalize_strips_varying_parts():
+    assert normalize(
+        'cfme/utils/wait.py:342: in wait_for\n  E   TimedOutError: object at 0x7f3a2c after '
+        '600s, id 8f14e45f-ceea-467f-a0e6-c05a7e2d3b41') == (
+        'cfme/utils/wait.py:<n>: in wait_for\n'
+        'E TimedOutError: object at <addr> after <n>s, id <uuid>')
+
+
+def test_clusters_similar_tracebacks_by_exception():
+    clusterer = TracebackClusterer()
+    for i in range(30):
+        clusterer.add(
+            'cfme/tests/infrastructure/test_provisioning.py:{}: in test_provision\n'
+            'E   TimedOutError: Could not do provision of vm test-vm-{} in time'.format(i, i),
+            'test_provision[{}]'.format(i))
+    for i in range(10):
+        clusterer.add(
+            'cfme/tests/infrastructure/test_provisioning.py:{}: in test_provision\n'
+            'E   KeyError: vm test-vm-{}'.format(i, i), 'test_provision[key{}]'.format(i))
+    top = clusterer.top(10)
+    assert [cluster.count for cluster in top] == [30, 10]
+    assert top[0].representative == (
+        'cfme/tests/infrastructure/test_provisioning.py:0: in test_provision\n'
+        'E   TimedOutError: Could not do provision of vm test-vm-0 in time', 'test_provision[0]')
+    assert len(top[0].examples) == 5
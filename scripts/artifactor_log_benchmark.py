@@ -0,0 +1,95 @@
+#!/usr/bin/env python2
+"""Benchmark the cost of logging in the test process with the artifactor log shipping
+
+e.g.
+    artifactor_log_benchmark.py --records 50000
+
+Logs the records through the old handler, that fires a ``log_message`` hook per record, and
+through :py:class:`cfme.utils.log.ArtifactorHandler`, that sends batches from a background thread.
+Both talk to a stand-in artifactor server in another process, that only counts the records, so the
+numbers are the overhead of the shipping itself.
+"""
+import argparse
+import logging
+import multiprocessing
+import time
+
+import zmq
+
+from artifactor import ArtifactorClient
+from cfme.utils.log import ArtifactorHandler
+from cfme.utils.net import random_port
+
+
+class SynchronousArtifactorHandler(logging.Handler):
+    """The handler as it was, one hook per record"""
+    artifactor = slaveid = None
+
+    def emit(self, record):
+        self.artifactor.fire_hook('log_message', log_record=record.__dict__, slaveid=self.slaveid)
+
+
+def parse_cmd_line():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=50000, help='Number of records to log')
+    return parser.parse_args()
+
+
+def serve(port, received):
+    """Answers like the artifactor server does and counts the received records"""
+    socket = zmq.Context.instance().socket(zmq.REP)
+    socket.bind('tcp://127.0.0.1:{}'.format(port))
+    while True:
+        request = socket.recv_json()
+        if request['event_name'] == 'ping':
+            socket.send_json({'message': 'PONG'})
+            continue
+        elif request['event_name'] == 'fire_hook':
+            data = request['data']
+            with received.get_lock():
+                received.value += len(data.get('log_records', [data.get('log_record')]))
+        socket.send_json({'message': 'OK', 'tid': None})
+
+
+def measure(name, handler, records, received):
+    logger = logging.getLogger('artifactor-benchmark-{}'.format(name))
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    with received.get_lock():
+        received.value = 0
+    start = time.time()
+    for i in range(records):
+        logger.debug('Record %d of the %s benchmark, %s', i, name, 'some more text' * 4)
+    logged = time.time() - start
+    handler.flush()
+    shipped = time.time() - start
+    # The last batch may still be on its way through the server
+    time.sleep(0.5)
+    print('{:>12}: {:6.1f} us per record in the test thread, {:6.2f}s until shipped, '
+          '{} of {} records received'.format(
+              name, logged * 1e6 / records, shipped, received.value, records))
+
+
+def main():
+    args = parse_cmd_line()
+    port = random_port()
+    received = multiprocessing.Value('i', 0)
+    server = multiprocessing.Process(target=serve, args=(port, received))
+    server.daemon = True
+    server.start()
+    client = ArtifactorClient('127.0.0.1', port)
+    client.ready = True
+
+    synchronous = SynchronousArtifactorHandler()
+    synchronous.artifactor = client
+    measure('synchronous', synchronous, args.records, received)
+    batched = ArtifactorHandler()
+    batched.artifactor = client
+    measure('batched', batched, args.records, received)
+    server.terminate()
+
+
+if __name__ == '__main__':
+    main()
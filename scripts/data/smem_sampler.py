@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+"""Sample appliance and per process memory, printing one JSON document per line
+
+Uploaded to the appliance and started over a single SSH channel by
+cfme.utils.smem_memory_monitor, it replaces running cat /proc/meminfo, psql and smem for every
+sample. Memory is read from /proc/<pid>/smaps_rollup (falling back to /proc/<pid>/smaps on older
+kernels) and /proc/meminfo, the miq_workers table is queried once per sample with a local psql.
+
+Every sample is a JSON object with:
+    timestamp: time the sample was started
+    lag: seconds the sample started after it was scheduled
+    duration: seconds the sample took
+    cpu: CPU seconds this script and its psql used for the sample
+    meminfo: /proc/meminfo in kB
+    workers: miq_workers pid to type
+    processes: pid to [name, command, rss, pss, uss, vss, swap], memory in kB
+
+Samples are scheduled at a fixed interval from the start, a sample that runs late does not delay
+the ones after it. The script exits when the channel it writes to is closed.
+
+e.g. smem_sampler.py --interval 10 --server-id 1
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# smaps fields summed up per process, and the measurement each one is added to
+SMAPS_FIELDS = {
+    'Rss': 'rss',
+    'Pss': 'pss',
+    'Private_Clean': 'uss',
+    'Private_Dirty': 'uss',
+    'Swap': 'swap',
+}
+PAGE_KB = os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+def parse_cmd_line():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--interval', type=float, default=10.0, help='Seconds between samples')
+    parser.add_argument('--server-id', default=None,
+                        help='miq_servers id to list the workers of, none are listed if unset')
+    parser.add_argument('--count', type=int, default=0,
+                        help='Number of samples to take, 0 to sample until the channel closes')
+    return parser.parse_args()
+
+
+def read_meminfo():
+    meminfo = {}
+    with open('/proc/meminfo') as meminfo_file:
+        for line in meminfo_file:
+            key, _, value = line.partition(':')
+            meminfo[key] = int(value.split()[0])
+    return meminfo
+
+
+def read_workers(server_id):
+    if server_id is None:
+        return {}
+    try:
+        output = subprocess.check_output([
+            'psql', '-t', '-q', '-A', '-F', '|', '-d', 'vmdb_production', '-c',
+            "select pid,type from miq_workers where miq_server_id = '{}'".format(server_id)])
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+    workers = {}
+    for line in output.decode('utf-8', 'replace').splitlines():
+        pid, _, worker_type = line.partition('|')
+        if worker_type:
+            workers[pid.strip()] = worker_type.strip()
+    return workers
+
+
+def read_smaps(pid):
+    memory = {'rss': 0, 'pss': 0, 'uss': 0, 'swap': 0}
+    try:
+        smaps_file = open('/proc/{}/smaps_rollup'.format(pid))
+    except IOError:
+        smaps_file = open('/proc/{}/smaps'.format(pid))
+    with smaps_file:
+        for line in smaps_file:
+            key, _, value = line.partition(':')
+            measurement = SMAPS_FIELDS.get(key)
+            if measurement is not None:
+                memory[measurement] += int(value.split()[0])
+    return memory
+
+
+def read_process(pid):
+    """Return [name, command, rss, pss, uss, vss, swap] of a process, None for kernel threads"""
+    with open('/proc/{}/cmdline'.format(pid), 'rb') as cmdline_file:
+        args = [arg for arg in cmdline_file.read().decode('utf-8', 'replace').split('\0') if arg]
+    if not args:
+        return None
+    with open('/proc/{}/statm'.format(pid)) as statm_file:
+        vss = int(statm_file.read().split()[0]) * PAGE_KB
+    memory = read_smaps(pid)
+    # named like smem does, after the first word of the command line
+    name = os.path.basename(args[0].split(' ')[0])
+    return [name, ' '.join(args), memory['rss'], memory['pss'], memory['uss'], vss,
+            memory['swap']]
+
+
+def read_processes():
+    processes = {}
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            process = read_process(pid)
+        except (IOError, OSError, ValueError, IndexError):
+            # exited while it was read or not readable
+            continue
+        if process is not None:
+            processes[pid] = process
+    return processes
+
+
+def cpu_time():
+    times = os.times()
+    return times[0] + times[1] + times[2] + times[3]
+
+
+def sample(server_id):
+    return {
+        'meminfo': read_meminfo(),
+        'workers': read_workers(server_id),
+        'processes': read_processes(),
+    }
+
+
+def main(args):
+    start = time.time()
+    taken = 0
+    scheduled = start
+    while not args.count or taken < args.count:
+        now = time.time()
+        if now < scheduled:
+            time.sleep(scheduled - now)
+        started = time.time()
+        cpu_started = cpu_time()
+        data = sample(args.server_id)
+        data['timestamp'] = started
+        data['lag'] = started - scheduled
+        data['duration'] = time.time() - started
+        data['cpu'] = cpu_time() - cpu_started
+        try:
+            sys.stdout.write(json.dumps(data, separators=(',', ':')) + '\n')
+            sys.stdout.flush()
+        except IOError:
+            # the monitor closed the channel
+            return
+        taken += 1
+        # skip the slots a slow sample ran into instead of sampling in a burst to catch up
+        missed = int((time.time() - scheduled) // args.interval)
+        scheduled += max(missed, 1) * args.interval
+
+
+if __name__ == '__main__':
+    main(parse_cmd_line())
@@ -0,0 +1,149 @@
+#!/usr/bin/env python2
+"""Benchmark matching the expected events of the event listener against a flood of db events
+
+e.g.
+    event_matching_benchmark.py --events 100000 --expected 5
+
+Fills a synthetic ``event_streams`` table in a SQLite database with events like the ones of a
+provider refresh, with a few among them that the expected events match. Then lets a
+:py:class:`cfme.utils.events_db.DbEventListener` process them, once fetching every new event and
+matching it in python and once with ``match_in_db``, that only fetches the candidate events.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, Text, create_engine
+
+from cfme.utils.db import Db
+from cfme.utils.events_db import DbEventListener
+
+EVENT_TYPES = ['VmPowerOnEvent', 'VmReconfiguredEvent', 'TaskEvent', 'AlarmStatusChangedEvent',
+               'VmMigratedEvent', 'UserLoginSessionEvent', 'networkSecurityGroups_write_EndRequest']
+
+
+class StandInAppliance(object):
+    """Just the database of an appliance"""
+    def __init__(self, db):
+        self.db = self
+        self.client = db
+
+
+def parse_cmd_line():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=100000,
+                        help='Number of events in the event_streams table')
+    parser.add_argument('--expected', type=int, default=5, help='Number of expected events')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the generated events')
+    return parser.parse_args()
+
+
+def create_tables(url):
+    metadata = MetaData()
+    event_streams = Table(
+        'event_streams', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('type', String(255)),
+        Column('event_type', String(255), index=True),
+        Column('message', Text),
+        Column('timestamp', DateTime),
+        Column('source', String(255)),
+        Column('target_type', String(255)),
+        Column('target_id', Integer),
+        Column('ems_id', Integer),
+        Column('vm_name', String(255)),
+        Column('host_name', String(255)),
+        Column('full_data', Text),
+        Column('created_on', DateTime))
+    Table('miq_event_definitions', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('name', String(255)))
+    engine = create_engine(url)
+    metadata.create_all(engine)
+    return engine, event_streams
+
+
+def fill(engine, event_streams, count, rand):
+    rows = []
+    for _ in range(count):
+        target_id = rand.randint(1, 5000)
+        rows.append({
+            'type': 'EmsEvent',
+            'event_type': rand.choice(EVENT_TYPES),
+            'message': 'Event of vm {} during the refresh'.format(target_id),
+            'timestamp': datetime.utcnow(),
+            'source': rand.choice(['VC', 'RHEVM', 'AZURE']),
+            'target_type': 'VmOrTemplate',
+            'target_id': target_id,
+            'ems_id': rand.randint(1, 4),
+            'vm_name': 'vm-{}'.format(target_id),
+            'host_name': 'host-{}'.format(rand.randint(1, 40)),
+            'full_data': 'resourceId: /vms/vm-{}\nstatus: Succeeded\n{}'.format(
+                target_id, 'x' * 2000),
+            'created_on': datetime.utcnow()})
+        if len(rows) == 5000:
+            engine.execute(event_streams.insert(), rows)
+            rows = []
+    if rows:
+        engine.execute(event_streams.insert(), rows)
+
+
+def register(listener, expected, rand):
+    for i in range(expected):
+        target_id = rand.randint(1, 5000)
+        if i % 2:
+            # like the azure tests, comparing the full data with a function
+            listener(source='AZURE', event_type='networkSecurityGroups_write_EndRequest',
+                     first_event=False,
+                     *[{'full_data': 'will be ignored',
+                        'cmp_func': lambda _, data, vm='/vms/vm-{}\n'.format(target_id):
+                            vm in data}])
+        else:
+            listener(target_type='VmOrTemplate', target_id=target_id,
+                     event_type='VmReconfiguredEvent', first_event=False)
+
+
+def measure(name, appliance, match_in_db, args, engine, event_streams):
+    listener = DbEventListener(appliance, match_in_db=match_in_db)
+    listener.set_last_record()
+    register(listener, args.expected, random.Random(args.seed))
+    # The same storm of events for both, after the listener is started
+    fill(engine, event_streams, args.events, random.Random(args.seed))
+    start = time.time()
+    if match_in_db:
+        listener.process_candidate_events()
+    else:
+        listener.process_new_events()
+    elapsed = time.time() - start
+    matched = [len(event['matched_events']) for event in listener.got_events]
+    print('{:>12}: {:8.2f}s for {} events, matched {}'.format(
+        name, elapsed, args.events, matched))
+    return matched
+
+
+def main():
+    args = parse_cmd_line()
+    fd, path = tempfile.mkstemp(suffix='.sqlite')
+    os.close(fd)
+    try:
+        url = 'sqlite:///{}'.format(path)
+        engine, event_streams = create_tables(url)
+        db = Db(hostname='localhost', credentials={'username': None, 'password': None}, port=5432)
+        db.db_url = url
+        appliance = StandInAppliance(db)
+        python = measure('python', appliance, False, args, engine, event_streams)
+        db_side = measure('match_in_db', appliance, True, args, engine, event_streams)
+        if python != db_side:
+            print('The matches differ!')
+            return 1
+        return 0
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    exit(main())
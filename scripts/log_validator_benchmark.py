@@ -0,0 +1,163 @@
+#!/usr/bin/env python2
+"""Benchmark LogValidator pattern matching and SSHTail against a synthetic evm.log
+
+e.g.
+    log_validator_benchmark.py generate /tmp/evm.log --size-mb 1024
+    log_validator_benchmark.py match /tmp/evm.log
+    log_validator_benchmark.py tail 10.0.0.12 --size-mb 1024
+
+``match`` compares the old one-regex-at-a-time matching with :py:class:`PatternSet` on a local
+file, ``tail`` appends the synthetic log to a file on an appliance and measures how long
+:py:class:`SSHTail` and :py:class:`LogValidator` take to get through it.
+"""
+import argparse
+import os
+import random
+import re
+import tempfile
+import time
+
+from cfme.utils.conf import credentials
+from cfme.utils.log_validator import LogValidator, PatternSet
+from cfme.utils.ssh import SSHClient, SSHTail
+
+LEVELS = ['INFO'] * 90 + ['WARN'] * 8 + ['ERROR'] * 2
+MESSAGES = [
+    'MIQ(MiqQueue.put) Message id: [{n}], id: [], Zone: [default], Role: [ems_inventory], '
+    'Server: [], Ident: [generic], Target id: [], Instance id: [], Task id: [], '
+    'Command: [MiqEvent.raise_evm_event], Timeout: [600], Priority: [100], State: [ready], '
+    'Deliver On: [], Data: [], Args: [["ManageIQ::Providers::Redhat::InfraManager", {n}]]',
+    'MIQ(MiqGenericWorker::Runner#get_message_via_drb) Message id: [{n}], MiqWorker id: [7], '
+    'Zone: [default], Role: [], Server: [], Ident: [generic], Target id: [], Instance id: [], '
+    'Task id: [], Command: [MiqServer.status_update], Timeout: [600], Priority: [90], '
+    'State: [dequeue], Deliver On: [], Data: [], Args: [], Dequeued in: [1.2] seconds',
+    'MIQ(ManageIQ::Providers::Vmware::InfraManager::Refresher#refresh) EMS: [vsphere], id: '
+    '[{n}] Refreshing targets for EMS...Complete',
+    'MIQ(MiqServer#heartbeat) Heartbeat [2018-03-01 10:00:00 UTC]...Complete',
+]
+# patterns like the ones the tests use, none of them matches the synthetic log
+SKIP_PATTERNS = ['.*MiqServer#heartbeat.*', '.*Dequeued in: \\[9\\d{3}\\].*']
+FAILURE_PATTERNS = ['.*FATAL.*', '.*undefined method.*', '.*Errno::ECONNREFUSED.*']
+MATCHED_PATTERNS = ['.*sso_enabled to true.*', '.*saml_enabled to true.*',
+                    '.*local_login_disabled to true.*']
+
+
+def parse_cmd_line():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='benchmark')
+    generate = subparsers.add_parser('generate', help='Write a synthetic evm.log')
+    generate.add_argument('path', help='Local file to write')
+    generate.add_argument('--size-mb', type=int, default=1024, help='Size of the log in MiB')
+    match = subparsers.add_parser('match', help='Match the patterns against a local log')
+    match.add_argument('path', help='Local log, see generate')
+    tail = subparsers.add_parser('tail', help='Tail a synthetic log on an appliance')
+    tail.add_argument('hostname', help='hostname or ip address of target appliance')
+    tail.add_argument('--username', default=credentials['ssh']['username'],
+                      help='SSH username for target appliance')
+    tail.add_argument('--password', default=credentials['ssh']['password'],
+                      help='SSH password for target appliance')
+    tail.add_argument('--size-mb', type=int, default=1024, help='Size of the log in MiB')
+    tail.add_argument('--remote-path', default='/tmp/evm_benchmark.log',
+                      help='File to create on the appliance, removed afterwards')
+    return parser.parse_args()
+
+
+def generate(path, size_mb):
+    pid = random.randint(1000, 30000)
+    size = size_mb * 1024 * 1024
+    n = written = 0
+    with open(path, 'w') as f:
+        while written < size:
+            level = random.choice(LEVELS)
+            line = '[----] {}, [2018-03-01T10:00:00.{:06d} #{}:2b0c1e8]  {} -- : {}\n'.format(
+                level[0], n % 1000000, pid, level, random.choice(MESSAGES).format(n=n))
+            f.write(line)
+            written += len(line)
+            n += 1
+
+
+def old_validate(lines):
+    """The matching LogValidator did before PatternSet, for comparison"""
+    matches = {}
+    for line in lines:
+        if any(re.match(pattern, line) for pattern in SKIP_PATTERNS):
+            continue
+        for pattern in FAILURE_PATTERNS:
+            if re.match(pattern, line):
+                raise AssertionError(line)
+        for pattern in MATCHED_PATTERNS:
+            if re.match(pattern, line):
+                matches[pattern] = True
+    return matches
+
+
+def new_validate(lines):
+    skip, failure = PatternSet(SKIP_PATTERNS), PatternSet(FAILURE_PATTERNS)
+    unmatched = PatternSet(MATCHED_PATTERNS)
+    for line in lines:
+        if skip.first_match(line) is not None:
+            continue
+        if failure.first_match(line) is not None:
+            raise AssertionError(line)
+        unmatched.all_matches(line)
+
+
+def bench_match(args):
+    size = os.path.getsize(args.path)
+    for name, validate in (('one regex at a time', old_validate), ('PatternSet', new_validate)):
+        start = time.time()
+        with open(args.path) as f:
+            validate(line.rstrip() for line in f)
+        duration = time.time() - start
+        print('{}: {:.1f}s, {:.1f} MiB/s'.format(
+            name, duration, size / 1024. / 1024. / duration))
+
+
+def bench_tail(args):
+    ssh_kwargs = {
+        'hostname': args.hostname,
+        'username': args.username,
+        'password': args.password,
+    }
+    sample = tempfile.NamedTemporaryFile(suffix='.log')
+    generate(sample.name, 1)
+    with SSHClient(**ssh_kwargs) as ssh_client:
+        ssh_client.put_file(sample.name, '/tmp/evm_benchmark_sample.log')
+        ssh_client.run_command('truncate -s 0 {}'.format(args.remote_path))
+        tail = SSHTail(args.remote_path, **ssh_kwargs)
+        tail.set_initial_file_end()
+        validator = LogValidator(args.remote_path, skip_patterns=SKIP_PATTERNS,
+                                 failure_patterns=FAILURE_PATTERNS, **ssh_kwargs)
+        validator.fix_before_start()
+        ssh_client.run_command(
+            'for i in $(seq {}); do cat /tmp/evm_benchmark_sample.log >> {}; done'.format(
+                args.size_mb, args.remote_path))
+        try:
+            start = time.time()
+            lines = sum(1 for _ in tail)
+            duration = time.time() - start
+            print('SSHTail: {} lines in {:.1f}s, {:.1f} MiB/s'.format(
+                lines, duration, args.size_mb / duration))
+            start = time.time()
+            validator.validate_logs()
+            duration = time.time() - start
+            print('LogValidator: {:.1f}s, {:.1f} MiB/s'.format(duration, args.size_mb / duration))
+        finally:
+            tail.close()
+            validator.close()
+            ssh_client.run_command('rm -f {} /tmp/evm_benchmark_sample.log'.format(
+                args.remote_path))
+
+
+def main(args):
+    if args.benchmark == 'generate':
+        generate(args.path, args.size_mb)
+    elif args.benchmark == 'match':
+        bench_match(args)
+    else:
+        bench_tail(args)
+
+
+if __name__ == '__main__':
+    main(parse_cmd_line())
@@ -0,0 +1,66 @@
+#!/usr/bin/env python2
+"""Add appliances to, or retire slaves from, a running parallelized test session
+
+The session has to be started with ``--parallel-control``. The master publishes its control
+socket in the pytest cache, so running this from the same project directory finds it.
+
+e.g.
+    parallelizer_ctl.py list
+    parallelizer_ctl.py add https://10.0.0.12
+    parallelizer_ctl.py retire slave03
+"""
+import argparse
+import json
+
+import zmq
+
+from cfme.utils.path import project_path
+
+CACHE_DIRS = ('.pytest_cache', '.cache')
+
+
+def parse_cmd_line():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoint', default=None,
+                        help='Control socket of the master, read from the pytest cache if not set')
+    parser.add_argument('--timeout', type=int, default=30,
+                        help='Seconds to wait for the master to answer')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('list', help='List the slaves of the session')
+    add = subparsers.add_parser('add', help='Add a slave for an appliance')
+    add.add_argument('appliance', help='Appliance URL, like the --appliance option')
+    retire = subparsers.add_parser('retire', help='Retire a slave after its current tests')
+    retire.add_argument('slave', help='Slave id, e.g. slave03')
+    return parser.parse_args()
+
+
+def find_endpoint():
+    for cache_dir in CACHE_DIRS:
+        endpoint_file = project_path.join(cache_dir, 'v', 'parallelizer', 'control_endpoint')
+        if endpoint_file.check():
+            return json.loads(endpoint_file.read())
+    raise SystemExit('No control endpoint found, was the session started with --parallel-control?')
+
+
+def main(args):
+    command = {'command': args.command}
+    if args.command == 'add':
+        command['appliance'] = args.appliance
+    elif args.command == 'retire':
+        command['slave'] = args.slave
+
+    sock = zmq.Context.instance().socket(zmq.REQ)
+    sock.setsockopt(zmq.LINGER, 0)
+    sock.connect(args.endpoint or find_endpoint())
+    sock.send_json(command)
+    if not sock.poll(args.timeout * 1000):
+        raise SystemExit('The master did not answer within {} seconds'.format(args.timeout))
+    reply = sock.recv_json()
+    if 'error' in reply:
+        raise SystemExit(reply['error'])
+    print(json.dumps(reply, indent=2))
+
+
+if __name__ == '__main__':
+    main(parse_cmd_line())
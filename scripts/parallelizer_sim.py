@@ -0,0 +1,103 @@
+#!/usr/bin/env python2
+"""Simulate parallelizer scheduling strategies against recorded test durations
+
+The durations are recorded by the parallelizer master in the pytest cache, usually in
+``.cache/v/parallelizer/durations`` (or ``.pytest_cache/v/parallelizer/durations``).
+
+e.g. parallelizer_sim.py .cache/v/parallelizer/durations --slaves 8 --slaves 16
+
+With ``--plan`` the provider allocation plan of ``--parallel-scheduler provider`` is printed as
+well, showing how many provider setups a run would do before it starts.
+"""
+import argparse
+import json
+from itertools import groupby
+
+from cfme.fixtures.parallelizer.allocator import ProviderAllocator, ProviderSetupCosts
+from cfme.fixtures.parallelizer.scheduler import (
+    DEFAULT_PROVIDER_SWITCH_COST, ScheduledGroup, providers_of_tests, simulate,
+    split_by_param_id)
+
+
+def parse_cmd_line():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('durations', help='JSON file mapping test node ids to durations')
+    parser.add_argument('--collection', default=None,
+                        help='File with one node id per line in collection order, '
+                             'the sorted recorded node ids are used when not given')
+    parser.add_argument('--slaves', type=int, action='append', default=[],
+                        help='Number of slaves to simulate, can be given multiple times')
+    parser.add_argument('--provider-switch-cost', type=float,
+                        default=DEFAULT_PROVIDER_SWITCH_COST,
+                        help='Seconds it takes to set up a provider on a slave')
+    parser.add_argument('--provider', dest='providers', action='append', default=None,
+                        help='Provider keys to detect in node ids, defaults to the '
+                             'management_systems from cfme_data')
+    parser.add_argument('--setup-costs', default=None,
+                        help='JSON file mapping provider types to setup durations, usually '
+                             '.cache/v/parallelizer/provider_setup')
+    parser.add_argument('--provider-limit', type=int, default=1,
+                        help='Number of providers allowed to coexist on an appliance')
+    parser.add_argument('--plan', action='store_true', default=False,
+                        help='Print the provider allocation plan for every slave count')
+    return parser.parse_args()
+
+
+def build_groups(collection, durations, provider_keys):
+    groups = []
+    for fspath, moditems in groupby(collection, key=lambda nodeid: nodeid.split('::')[0]):
+        for tests in split_by_param_id(moditems).values():
+            provs = providers_of_tests(tests, provider_keys)
+            groups.append(ScheduledGroup(
+                tests=tests,
+                provider=provs[0] if provs else None,
+                duration=sum(durations.get(nodeid, 0.0) for nodeid in tests)))
+    return groups
+
+
+def main(args):
+    with open(args.durations) as f:
+        durations = json.load(f)
+    if args.collection:
+        with open(args.collection) as f:
+            collection = [line.strip() for line in f if line.strip()]
+    else:
+        collection = sorted(durations)
+    provider_types = {}
+    if args.providers is None:
+        from cfme.utils.conf import cfme_data
+        systems = cfme_data.get('management_systems', {})
+        args.providers = list(systems.keys())
+        provider_types = {key: data.get('type') for key, data in systems.items()}
+    provider_keys = sorted(set(args.providers), key=len, reverse=True)
+    setup_costs = ProviderSetupCosts(provider_types=provider_types,
+                                     default=args.provider_switch_cost)
+    if args.setup_costs:
+        with open(args.setup_costs) as f:
+            setup_costs.known = json.load(f)
+
+    groups = build_groups(collection, durations, provider_keys)
+    print('{} tests in {} groups, {:.0f}s of serial test time'.format(
+        len(collection), len(groups), sum(group.duration for group in groups)))
+    for slaves in args.slaves or [4, 8, 16]:
+        results = []
+        for mode in ('module', 'duration', 'provider'):
+            stats = {}
+            makespan = simulate(groups, slaves, mode, args.provider_switch_cost, stats=stats)
+            results.append((mode, makespan, stats['setups']))
+        baseline = results[0][1]
+        print('{:>3} slaves: {}'.format(slaves, ', '.join(
+            '{} {:.0f}s ({:+.1f}%, {} provider setups)'.format(
+                mode, makespan, (makespan - baseline) * 100. / baseline if baseline else 0.0,
+                setups)
+            for mode, makespan, setups in results)))
+        if args.plan:
+            allocator = ProviderAllocator(
+                groups, ['slave{:02d}'.format(i) for i in range(slaves)], setup_costs,
+                provider_limit=args.provider_limit)
+            print('\n'.join(allocator.report()))
+
+
+if __name__ == '__main__':
+    main(parse_cmd_line())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python2
+"""Benchmark parsing queue messages out of evm.log with perf_message_stats
+
+e.g.
+    perf_message_stats_benchmark.py generate /tmp/evm.log --size-mb 4096
+    perf_message_stats_benchmark.py parse /tmp/evm.log --processes 1 --processes 8
+"""
+import argparse
+import random
+import re
+import time
+
+from cfme.utils.perf_message_stats import evm_to_messages
+
+STAMP = ('[----] {level}, [2018-03-01T{hour:02d}:{minute:02d}:{second:02d}.{usec:06d} '
+         '#{pid}:2b0c1e8]  ')
+PUT = (STAMP + 'INFO -- : MIQ(MiqQueue.put) Message id: [{msg_id}], id: [], Zone: [default], '
+       'Role: [ems_metrics_processor], Server: [], Ident: [generic], Target id: [], '
+       'Instance id: [{n}], Task id: [], Command: [{cmd}], Timeout: [600], Priority: [100], '
+       'State: [ready], Deliver On: [], Data: [], Args: [{args}]\n')
+GET = (STAMP + 'INFO -- : MIQ(MiqQueue.get_via_drb) Message id: [{msg_id}], MiqWorker id: [7], '
+       'Zone: [default], Role: [ems_metrics_processor], Server: [], Ident: [generic], '
+       'Target id: [], Instance id: [{n}], Task id: [], Command: [{cmd}], Timeout: [600], '
+       'Priority: [100], State: [dequeue], Deliver On: [], Data: [], Args: [{args}], '
+       'Dequeued in: [{deq:.6f}] seconds\n')
+DELIVERED = (STAMP + 'INFO -- : MIQ(MiqQueue.delivered) Message id: [{msg_id}], State: [ok], '
+             'Delivered in [{del_:.6f}] seconds\n')
+NOISE = [
+    STAMP + 'INFO -- : MIQ(MiqServer#heartbeat) Heartbeat [2018-03-01 10:00:00 UTC]...Complete\n',
+    STAMP + 'INFO -- : MIQ(ManageIQ::Providers::Vmware::InfraManager::Refresher#refresh) EMS: '
+            '[vsphere], id: [{n}] Refreshing targets for EMS...Complete\n',
+    STAMP + 'WARN -- : MIQ(MiqGenericWorker::Runner#do_work) Worker is running [{n}] messages\n',
+]
+COMMANDS = [
+    ('Metric::Rollup.rollup_hourly', '"2018-03-01T{hour:02d}:00:00Z", "hourly"'),
+    ('Metric::Rollup.rollup_daily', '"2018-03-01T00:00:00Z", "daily"'),
+    ('EmsRefresh.refresh', '[["EmsVmware", {n}]]'),
+    ('EmsRefresh.refresh', '[["EmsRedhat", {n}]]'),
+    ('MiqEvent.raise_evm_event', '["VmOrTemplate", {n}], "vm_start"'),
+]
+FILTERS = {
+    '-hourly': re.compile(r'\"[0-9\-]*T[0-9\:]*Z\",\s\"hourly\"'),
+    '-daily': re.compile(r'\"[0-9\-]*T[0-9\:]*Z\",\s\"daily\"'),
+    '-EmsRedhat': re.compile(r'\[\[\"EmsRedhat\"\,\s[0-9]*\]\]'),
+    '-EmsVmware': re.compile(r'\[\[\"EmsVmware\"\,\s[0-9]*\]\]'),
+}
+
+
+def parse_cmd_line():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='benchmark')
+    generate = subparsers.add_parser('generate', help='Write a synthetic evm.log with messages')
+    generate.add_argument('path', help='Local file to write')
+    generate.add_argument('--size-mb', type=int, default=1024, help='Size of the log in MiB')
+    parse = subparsers.add_parser('parse', help='Parse the messages out of a log')
+    parse.add_argument('path', help='evm.log to parse, see generate')
+    parse.add_argument('--processes', type=int, action='append', default=[],
+                       help='Number of processes to parse with, can be given multiple times')
+    return parser.parse_args()
+
+
+def generate(path, size_mb):
+    size = size_mb * 1024 * 1024
+    written = n = 0
+    # messages put on the queue but not delivered yet, with the next step to log for each
+    in_flight = []
+    with open(path, 'w') as f:
+        while written < size:
+            seconds = n // 100
+            stamp = {'level': 'I', 'hour': seconds // 3600 % 24, 'minute': seconds // 60 % 60,
+                     'second': seconds % 60, 'usec': n % 1000000, 'pid': random.randint(1000, 1010),
+                     'n': n}
+            choice = random.random()
+            if choice < 0.05:
+                cmd, args = random.choice(COMMANDS)
+                in_flight.append([GET, n, cmd, args.format(**stamp)])
+                line = PUT.format(msg_id=n, cmd=cmd, args=in_flight[-1][3], **stamp)
+            elif choice < 0.15 and in_flight:
+                message = in_flight.pop(random.randrange(len(in_flight)))
+                step, msg_id, cmd, args = message
+                line = step.format(msg_id=msg_id, cmd=cmd, args=args, deq=random.random() * 10,
+                                   del_=random.random() * 30, **stamp)
+                if step is GET:
+                    message[0] = DELIVERED
+                    in_flight.append(message)
+            else:
+                line = random.choice(NOISE).format(**stamp)
+            f.write(line)
+            written += len(line)
+            n += 1
+
+
+def parse(path, processes):
+    for count in processes or [1, 4]:
+        start = time.time()
+        messages, msg_cmds, test_start, test_end, line_count = evm_to_messages(
+            path, FILTERS, processes=count)
+        duration = time.time() - start
+        print('{} process(es): {} lines, {} messages in {:.1f}s, {:.0f} lines/s'.format(
+            count, line_count, len(messages), duration, line_count / duration))
+
+
+def main(args):
+    if args.benchmark == 'generate':
+        generate(args.path, args.size_mb)
+    else:
+        parse(args.path, args.processes)
+
+
+if __name__ == '__main__':
+    main(parse_cmd_line())
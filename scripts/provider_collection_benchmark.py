@@ -0,0 +1,84 @@
+#!/usr/bin/env python2
+"""Benchmark listing the providers for test generation the way the collection does
+
+e.g.
+    provider_collection_benchmark.py --functions 9000 --replicate 20
+
+Lists the providers of the yamls once per simulated test function with the filters the test
+generation uses, first by building and filtering the provider crud objects every time as
+list_providers used to, then with the :py:class:`cfme.utils.providers.ProviderRegistry`.
+``--replicate`` copies every provider of the yamls under new keys to get a bigger provider set.
+"""
+import argparse
+import time
+from copy import copy
+
+from cfme.cloud.provider import CloudProvider
+from cfme.common.provider import BaseProvider
+from cfme.containers.provider import ContainersProvider
+from cfme.infrastructure.provider import InfraProvider
+from cfme.infrastructure.provider.rhevm import RHEVMProvider
+from cfme.infrastructure.provider.virtualcenter import VMwareProvider
+from cfme.utils import providers
+from cfme.utils.providers import ProviderFilter, get_crud, global_filters, list_providers
+
+# Filters of typical test functions, used round robin
+FILTER_SETS = [
+    [ProviderFilter(classes=[InfraProvider])],
+    [ProviderFilter(classes=[CloudProvider], required_fields=['provisioning'])],
+    [ProviderFilter(classes=[VMwareProvider, RHEVMProvider])],
+    [ProviderFilter(classes=[ContainersProvider])],
+    [ProviderFilter(classes=[BaseProvider]), ProviderFilter(required_flags=['provision'])],
+    [ProviderFilter(classes=[InfraProvider], required_fields=[['provisioning', 'template']])],
+]
+
+
+def parse_cmd_line():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--functions', type=int, default=9000,
+                        help='Number of test functions to list the providers for')
+    parser.add_argument('--replicate', type=int, default=1,
+                        help='Number of copies of every provider of the yamls')
+    return parser.parse_args()
+
+
+def replicate_providers(copies):
+    for key, data in list(providers.providers_data.items()):
+        for i in range(1, copies):
+            providers.providers_data['{}-copy{}'.format(key, i)] = data
+
+
+def uncached_list_providers(filters):
+    filters = filters + list(global_filters.values())
+    provs = [get_crud(prov_key) for prov_key in providers.providers_data]
+    for prov_filter in filters:
+        provs = filter(prov_filter, provs)
+    return provs
+
+
+def measure(name, list_function, functions):
+    start = time.time()
+    listed = 0
+    for i in range(functions):
+        listed += len(list_function([copy(f) for f in FILTER_SETS[i % len(FILTER_SETS)]]))
+    elapsed = time.time() - start
+    print('{:>10}: {:8.2f}s, {:8.2f} ms per test function, {} providers listed'.format(
+        name, elapsed, elapsed * 1000 / functions, listed))
+    return listed
+
+
+def main():
+    args = parse_cmd_line()
+    replicate_providers(args.replicate)
+    print('{} providers, {} test functions'.format(len(providers.providers_data), args.functions))
+    uncached = measure('uncached', uncached_list_providers, args.functions)
+    registry = measure('registry', list_providers, args.functions)
+    if uncached != registry:
+        print('The listings differ!')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python2
+"""Measure how much local CPU time the SSH client burns while running commands on an appliance
+
+By default, it will use the appliance named in conf.env, but can be explicitly aimed at another
+appliance if needed.
+
+e.g.
+    ssh_benchmark.py run-command
+    ssh_benchmark.py run-command --command 'journalctl -n 100000' 10.0.0.12
+    ssh_benchmark.py run-commands --count 100
+"""
+import argparse
+import os
+import time
+
+from cfme.utils.conf import credentials
+from cfme.utils.ssh import SSHClient
+
+
+def parse_cmd_line():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('hostname', nargs='?', default=None,
+                        help='hostname or ip address of target appliance')
+    parser.add_argument('--username', default=credentials['ssh']['username'],
+                        help='SSH username for target appliance')
+    parser.add_argument('--password', default=credentials['ssh']['password'],
+                        help='SSH password for target appliance')
+    subparsers = parser.add_subparsers(dest='benchmark')
+    run_command = subparsers.add_parser(
+        'run-command', help='CPU time used by SSHClient.run_command while waiting for a command')
+    run_command.add_argument('--command', default='sleep 30',
+                             help='Command to run on the appliance')
+    run_command.add_argument('--repeat', type=int, default=1,
+                             help='Number of times to run the command')
+    run_commands = subparsers.add_parser(
+        'run-commands', help='Sequential run_command calls against one run_commands batch')
+    run_commands.add_argument('--command', default='true',
+                              help='Command to run on the appliance')
+    run_commands.add_argument('--count', type=int, default=100,
+                              help='Number of times to run the command')
+    return parser.parse_args()
+
+
+def cpu_time():
+    """Return the user and system CPU time of this process so far, in seconds"""
+    times = os.times()
+    return times[0] + times[1]
+
+
+def measure(func, *args, **kwargs):
+    """Call func and return its result along with the wall and CPU time it took"""
+    wall_start, cpu_start = time.time(), cpu_time()
+    result = func(*args, **kwargs)
+    return result, time.time() - wall_start, cpu_time() - cpu_start
+
+
+def bench_run_command(ssh_client, args):
+    for _ in range(args.repeat):
+        result, wall, cpu = measure(ssh_client.run_command, args.command)
+        print('{!r}: rc {}, {} bytes of output, wall {:.2f}s, cpu {:.3f}s ({:.1f}%)'.format(
+            args.command, result.rc, len(result.output), wall, cpu,
+            cpu * 100. / wall if wall else 0.0))
+
+
+def bench_run_commands(ssh_client, args):
+    commands = [args.command] * args.count
+    _, seq_wall, seq_cpu = measure(lambda: [ssh_client.run_command(cmd) for cmd in commands])
+    _, batch_wall, batch_cpu = measure(ssh_client.run_commands, commands)
+    print('{} x {!r}: sequential wall {:.2f}s cpu {:.2f}s, batched wall {:.2f}s cpu {:.2f}s'.format(
+        args.count, args.command, seq_wall, seq_cpu, batch_wall, batch_cpu))
+
+
+BENCHMARKS = {
+    'run-command': bench_run_command,
+    'run-commands': bench_run_commands,
+}
+
+
+def main(args):
+    ssh_kwargs = {
+        'username': args.username,
+        'password': args.password
+    }
+    if args.hostname is not None:
+        ssh_kwargs['hostname'] = args.hostname
+
+    with SSHClient(**ssh_kwargs) as ssh_client:
+        # connect before measuring, the handshake is not what we are after
+        ssh_client.run_command('true')
+        BENCHMARKS[args.benchmark](ssh_client, args)
+
+
+if __name__ == '__main__':
+    main(parse_cmd_line())
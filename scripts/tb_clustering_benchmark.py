@@ -0,0 +1,132 @@
+#!/usr/bin/env python2
+"""Benchmark the clustering of tracebacks for the top failures of the test report
+
+e.g.
+    tb_clustering_benchmark.py --tracebacks 20000 --baseline 2000
+
+Generates synthetic short tracebacks of a number of failure kinds, with varying line numbers,
+addresses, ids and names, and clusters them with the
+:py:class:`cfme.utils.tb_clustering.TracebackClusterer`. The first ``--baseline`` of them are
+also clustered by comparing prefixes with difflib, as the reporter used to, which takes quadratic
+time. Purity is the share of the tracebacks that are in a cluster with the kind most of the
+cluster has, completeness the share of the tracebacks that are in the largest cluster of their
+kind.
+"""
+import argparse
+import difflib
+import random
+import time
+from collections import Counter
+
+from cfme.utils.tb_clustering import TracebackClusterer
+
+FRAMES = [
+    'cfme/tests/{area}/test_{name}.py:{line}: in test_{name}\n    {call}()',
+    'cfme/utils/appliance/__init__.py:{line}: in ssh_client\n    {call}()',
+    'cfme/utils/wait.py:{line}: in wait_for\n    raise TimedOutError(msg)',
+]
+KINDS = [
+    'TimedOutError: Could not do {call} at {name} in time',
+    'AssertionError: VM {vm} was not found on provider {provider}',
+    "NoSuchElementException: Message: Unable to locate element: //div[@id='{name}_{line}']",
+    'ConnectionError: HTTPSConnectionPool(host={ip}, port=443): Max retries exceeded',
+    'KeyError: {vm}',
+    'APIException: Api::ClientError: Service id {uuid} not found',
+    'CandidateNotFound: Could not find {name} in the tree at {address}',
+    'AttributeError: \'NoneType\' object has no attribute \'{call}\'',
+    'ItemNotFound: No matching row found for {{\'name\': \'{vm}\'}}',
+    'SSHException: Error reading SSH protocol banner from {ip}',
+    'ValueError: invalid literal for int() with base 10: \'{vm}\'',
+    'TypeError: __init__() takes exactly {line} arguments ({address} given)',
+]
+
+
+def parse_cmd_line():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tracebacks', type=int, default=20000,
+                        help='Number of tracebacks to cluster')
+    parser.add_argument('--baseline', type=int, default=2000,
+                        help='Number of the tracebacks to cluster the old way as well')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the generated tracebacks')
+    return parser.parse_args()
+
+
+def generate(count, seed):
+    """Returns (traceback, kind) pairs, a few kinds being much more common than the others"""
+    rand = random.Random(seed)
+    tracebacks = []
+    for _ in range(count):
+        kind = min(int(rand.paretovariate(0.8)) - 1, len(KINDS) - 1)
+        values = {
+            'area': rand.choice(['infrastructure', 'cloud', 'services', 'control']),
+            'name': rand.choice(['provision', 'power_control', 'retirement', 'tagging']),
+            'line': rand.randint(1, 2000),
+            'call': rand.choice(['refresh', 'delete', 'create', 'wait_for_state']),
+            'vm': 'test-vm-{}'.format(''.join(rand.choice('abcdefghij') for _ in range(5))),
+            'provider': rand.choice(['vsphere65', 'rhv41', 'ec2west', 'azure']),
+            'ip': '10.{}.{}.{}'.format(rand.randint(0, 255), rand.randint(0, 255),
+                                       rand.randint(0, 255)),
+            'uuid': '{:08x}-{:04x}-{:04x}-{:04x}-{:012x}'.format(
+                rand.getrandbits(32), rand.getrandbits(16), rand.getrandbits(16),
+                rand.getrandbits(16), rand.getrandbits(48)),
+            'address': '0x{:x}'.format(rand.getrandbits(48)),
+        }
+        # The same failure mostly comes from the same place
+        frames = [FRAMES[kind % len(FRAMES)]]
+        if rand.random() < 0.3:
+            frames.insert(0, rand.choice(FRAMES))
+        lines = [frame.format(**values) for frame in frames] + [KINDS[kind].format(**values)]
+        tracebacks.append(('\n'.join(lines), kind))
+    return tracebacks
+
+
+def difflib_clusters(tracebacks):
+    """The clustering the reporter did before"""
+    sets = []
+    for entry in tracebacks:
+        for tset in sets:
+            if difflib.SequenceMatcher(a=entry[0][:10], b=tset[0][0][:10]).ratio() > .8:
+                if difflib.SequenceMatcher(a=entry[0][:20], b=tset[0][0][:20]).ratio() > .75:
+                    if difflib.SequenceMatcher(a=entry[0][:30], b=tset[0][0][:30]).ratio() > .7:
+                        tset.append(entry)
+                        break
+        else:
+            sets.append([entry])
+    return [[kind for _, kind in tset] for tset in sets]
+
+
+def clusterer_clusters(tracebacks):
+    clusterer = TracebackClusterer(max_examples=None)
+    for traceback, kind in tracebacks:
+        clusterer.add(traceback, kind)
+    return [[kind for _, kind in cluster.examples] for cluster in clusterer.clusters()]
+
+
+def measure(name, cluster_function, tracebacks):
+    start = time.time()
+    clusters = cluster_function(tracebacks)
+    elapsed = time.time() - start
+    pure = sum(Counter(kinds).most_common(1)[0][1] for kinds in clusters)
+    largest = {}
+    for kinds in clusters:
+        for kind, count in Counter(kinds).items():
+            largest[kind] = max(largest.get(kind, 0), count)
+    print('{:>10}: {:6} tracebacks of {:2} kinds in {:8.2f}s, {:5} clusters, purity {:.3f}, '
+          'completeness {:.3f}, top 10 sizes {}'.format(
+              name, len(tracebacks), len(largest), elapsed, len(clusters),
+              pure / float(len(tracebacks)), sum(largest.values()) / float(len(tracebacks)),
+              sorted(map(len, clusters), reverse=True)[:10]))
+
+
+def main():
+    args = parse_cmd_line()
+    tracebacks = generate(args.tracebacks, args.seed)
+    if args.baseline:
+        measure('difflib', difflib_clusters, tracebacks[:args.baseline])
+        measure('minhash', clusterer_clusters, tracebacks[:args.baseline])
+    measure('minhash', clusterer_clusters, tracebacks)
+
+
+if __name__ == '__main__':
+    main()
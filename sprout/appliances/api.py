@@ -2,6 +2,7 @@
 import inspect
 import json
 import re
+import time
 from celery import chain
 from celery.result import AsyncResult
 from datetime import datetime
@@ -11,11 +12,13 @@ from django.http import HttpResponse
 from django.shortcuts import render
 from ipware.ip import get_ip
 
+from appliances import shepherd
 from appliances.models import (
     Appliance, AppliancePool, Provider, Group, Template, User, GroupShepherd)
 from appliances.tasks import (
     appliance_power_on, appliance_power_off, appliance_suspend, appliance_rename,
     connect_direct_lun, disconnect_direct_lun, mark_appliance_ready, wait_appliance_ready)
+from sprout import settings
 from sprout.log import create_logger
 
 
@@ -23,30 +26,42 @@ def json_response(data):
     return HttpResponse(json.dumps(data), content_type="application/json")
 
 
-def json_exception(e):
-    return json_response({
+def exception_result(e):
+    return {
         "status": "exception",
         "result": {
             "class": type(e).__name__,
             "message": str(e)
         }
-    })
+    }
 
 
-def json_autherror(message):
-    return json_response({
+def autherror_result(message):
+    return {
         "status": "autherror",
         "result": {
             "message": str(message)
         }
-    })
+    }
 
 
-def json_success(result):
-    return json_response({
+def success_result(result):
+    return {
         "status": "success",
         "result": result
-    })
+    }
+
+
+def json_exception(e):
+    return json_response(exception_result(e))
+
+
+def json_autherror(message):
+    return json_response(autherror_result(message))
+
+
+def json_success(result):
+    return json_response(success_result(result))
 
 
 class JSONMethod(object):
@@ -109,6 +124,28 @@ class JSONApi(object):
             })
         try:
             data = json.loads(request.body)
+        except Exception as e:
+            create_logger(self).error(
+                "Exception raised during call: {}: {}".format(type(e).__name__, str(e)))
+            return json_exception(e)
+        ipaddr = get_ip(request)
+        if isinstance(data, list):
+            # A batch of calls, answered in order. Authenticate every user only once.
+            users = {}
+            return json_response([self.call(call, ipaddr, users) for call in data])
+        else:
+            return json_response(self.call(data, ipaddr, {}))
+
+    def call(self, data, ipaddr, users):
+        """Run one method call and return its result as sent to the client
+
+        Args:
+            data: the call, a dict with ``method``, ``args``, ``kwargs`` and ``auth``
+            ipaddr: address of the caller, for logging
+            users: users already authenticated in this request, by their credentials
+        """
+        method = None
+        try:
             method_name = data["method"]
             args = data["args"]
             kwargs = data["kwargs"]
@@ -116,31 +153,31 @@ class JSONApi(object):
                 method = self._methods[method_name]
             except KeyError:
                 raise NameError("Method {} not found!".format(method_name))
-            ipaddr = get_ip(request)
             create_logger(method).info(
                 "Calling with parameters {!r}{!r} from {!r}".format(tuple(args), kwargs, ipaddr))
             if method.auth:
                 if "auth" in data:
                     username, password = data["auth"]
-                    try:
-                        user = User.objects.get(username=username)
-                    except ObjectDoesNotExist:
-                        return json_autherror("User {} does not exist!".format(username))
-                    if not user.check_password(password):
-                        return json_autherror("Wrong password for user {}!".format(username))
+                    user = users.get((username, password))
+                    if user is None:
+                        try:
+                            user = User.objects.get(username=username)
+                        except ObjectDoesNotExist:
+                            return autherror_result("User {} does not exist!".format(username))
+                        if not user.check_password(password):
+                            return autherror_result("Wrong password for user {}!".format(username))
+                        users[username, password] = user
                     create_logger(method).info(
                         "Called by user {}/{}".format(user.id, user.username))
-                    return json_success(method(user, *args, **kwargs))
+                    return success_result(method(user, *args, **kwargs))
                 else:
-                    return json_autherror("Method {} needs authentication!".format(method_name))
+                    return autherror_result("Method {} needs authentication!".format(method_name))
             else:
-                return json_success(method(*args, **kwargs))
+                return success_result(method(*args, **kwargs))
         except Exception as e:
-            create_logger(method).error(
+            create_logger(method or self).error(
                 "Exception raised during call: {}: {}".format(type(e).__name__, str(e)))
-            return json_exception(e)
-        else:
-            create_logger(method).info("Call finished")
+            return exception_result(e)
 
 
 jsonapi = JSONApi()
@@ -242,26 +279,67 @@ def request_appliances(
         ram, cpu, provider_type, template_type).id
 
 
-@jsonapi.authenticated_method
-def request_check(user, request_id):
-    """Return status of the appliance pool"""
+def get_pool(user, request_id):
     request = AppliancePool.objects.get(id=request_id)
     if user != request.owner and not user.is_staff:
         raise Exception("This pool belongs to a different user!")
+    return request
+
+
+def pool_status(request, version=None):
     return {
+        "version": version or request.state_version,
         "fulfilled": request.fulfilled,
         "finished": request.finished,
         "preconfigured": request.preconfigured,
         "yum_update": request.yum_update,
         "progress": int(round(request.percent_finished * 100)),
-        "appliances": [
-            appliance.serialized
-            for appliance
-            in request.appliances
-        ],
+        "appliances": [appliance.serialized for appliance in request.appliances],
     }
 
 
+@jsonapi.authenticated_method
+def request_check(user, request_id):
+    """Return status of the appliance pool"""
+    return pool_status(get_pool(user, request_id))
+
+
+@jsonapi.authenticated_method
+def wait_pool_change(user, request_id, version=None, timeout=settings.POOL_WAIT_TIMEOUT):
+    """Wait until the appliance pool changes from the version seen last and return its status
+
+    ``version`` is the version of the status seen last, none to return the status right away.
+    Waits ``timeout`` seconds at most, capped by the server to a few seconds, clients call it
+    again until the pool changes. Returns ``{"version": ..., "changed": false}`` if the pool did
+    not change in the meantime, otherwise ``changed`` is true and ``pool`` holds the status as
+    returned by ``request_check``.
+    """
+    request = get_pool(user, request_id)
+    deadline = time.time() + min(float(timeout), settings.POOL_WAIT_TIMEOUT)
+    current = request.state_version
+    while current == version and time.time() < deadline:
+        time.sleep(settings.POOL_WAIT_INTERVAL)
+        # The pool's own fields of the version are changed by other processes
+        request.refresh_from_db(fields=AppliancePool.STATE_POOL_FIELDS)
+        current = request.state_version
+    if current == version:
+        return {"version": current, "changed": False}
+    # Reload what the version was computed from
+    request.refresh_from_db()
+    return {"version": current, "changed": True, "pool": pool_status(request, current)}
+
+
+@jsonapi.method
+def shepherd_demands():
+    """Return the spare appliances wanted and present for every group shepherd
+
+    Lists what the shepherd counted last, the group, user group, whether preconfigured, how many
+    appliances are ``wanted`` and ``present``, the ``deficit`` and ``surplus``, whether any
+    template can be ``provisionable`` from and when it was ``counted``.
+    """
+    return shepherd.shepherd_demands()
+
+
 @jsonapi.authenticated_method
 def prolong_appliance_lease(user, id, minutes=60):
     """Prolongs the appliance's lease time by specified amount of minutes from current time."""
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""Inventory of the templates and VMs of the providers, shared among the tasks
+
+Listing templates and VMs is what most of the periodic tasks start with and what takes them the
+longest. The inventory of a provider is listed once, kept in the cache for
+``PROVIDER_INVENTORY_TTL`` seconds and used by the appliance refresh, the template check, the
+untracked VM synchronization and the obsolete template deletion alike. The appliance refresh
+lists the inventories of all providers at once with ``PROVIDER_INVENTORY_CONCURRENCY`` threads,
+the other tasks mostly find it in the cache then.
+"""
+from __future__ import absolute_import
+
+import time
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+
+from django.core.cache import cache
+
+from sprout import settings
+from sprout.log import create_logger
+
+#: What the appliance refresh uses of a VM listed by the provider's ``all_vms``
+VMInfo = namedtuple('VMInfo', ['name', 'uuid', 'ip', 'power_state'])
+
+
+def cache_key(provider_id):
+    return 'provider-inventory-{}'.format(provider_id)
+
+
+class ProviderInventory(object):
+    """Templates and VMs listed from a provider
+
+    Attributes:
+        provider_id: Key of the provider.
+        templates: Names of the templates.
+        vms: :py:class:`VMInfo` of the VMs, ``None`` if the provider cannot list them in detail.
+        vm_names: Names of the VMs, ``None`` if the provider does not have VMs.
+        fetched: When the inventory was listed, in seconds since the epoch.
+    """
+    def __init__(self, provider_id, templates, vms, vm_names, fetched=None):
+        self.provider_id = provider_id
+        self.templates = templates
+        self.vms = vms
+        self.vm_names = vm_names
+        self.fetched = time.time() if fetched is None else fetched
+
+    @property
+    def age(self):
+        return time.time() - self.fetched
+
+    @classmethod
+    def fetch(cls, provider):
+        """List the inventory of a :py:class:`appliances.models.Provider` from its API"""
+        api = provider.api
+        templates = sorted(set(map(str, api.list_template())))
+        vms = None
+        vm_names = None
+        if hasattr(api, 'all_vms'):
+            vms = [VMInfo(vm.name, vm.uuid, vm.ip, vm.power_state) for vm in api.all_vms()]
+            vm_names = sorted(str(vm.name) for vm in vms)
+        elif hasattr(api, 'list_vm'):
+            vm_names = sorted(map(str, api.list_vm()))
+        return cls(provider.id, templates, vms, vm_names)
+
+    def __getstate__(self):
+        # Tuples pickle smaller than the namedtuples, the cache limits the size of values
+        state = dict(self.__dict__)
+        if self.vms is not None:
+            state['vms'] = [tuple(vm) for vm in self.vms]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.vms is not None:
+            self.vms = [VMInfo(*vm) for vm in self.vms]
+
+    def __repr__(self):
+        return '<{} {}: {} templates, {} VMs, {:.0f}s old>'.format(
+            type(self).__name__, self.provider_id, len(self.templates),
+            len(self.vm_names) if self.vm_names is not None else None, self.age)
+
+
+def cached_inventory(provider_id, max_age=None):
+    """The cached inventory of a provider, ``None`` if there is none at most ``max_age`` old"""
+    inventory = cache.get(cache_key(provider_id))
+    if inventory is None or (max_age is not None and inventory.age > max_age):
+        return None
+    return inventory
+
+
+def get_inventory(provider, max_age=None):
+    """The inventory of a provider, from the cache unless it is older than ``max_age`` seconds.
+
+    Args:
+        provider: :py:class:`appliances.models.Provider`
+        max_age: Seconds the inventory may be old, ``None`` for anything still cached.
+    """
+    inventory = cached_inventory(provider.id, max_age)
+    if inventory is None:
+        inventory = ProviderInventory.fetch(provider)
+        cache.set(cache_key(provider.id), inventory, settings.PROVIDER_INVENTORY_TTL)
+    return inventory
+
+
+def fetch_inventories(providers, max_age=None):
+    """List the inventories of the providers concurrently and cache them.
+
+    Args:
+        providers: :py:class:`appliances.models.Provider` s
+        max_age: Seconds a cached inventory may be old to not list it again, ``None`` for anything
+            still cached.
+    Returns:
+        A :py:class:`dict` of provider id to :py:class:`ProviderInventory`, providers failing to
+        list theirs are left out.
+    """
+    logger = create_logger(__name__)
+
+    def fetch(provider):
+        try:
+            return provider.id, get_inventory(provider, max_age)
+        except Exception as e:
+            logger.warning("Could not list the inventory of {}: {}: {}".format(
+                provider.id, type(e).__name__, str(e)))
+            return provider.id, None
+
+    providers = list(providers)
+    if not providers:
+        return {}
+    pool = ThreadPool(min(settings.PROVIDER_INVENTORY_CONCURRENCY, len(providers)))
+    try:
+        results = pool.map(fetch, providers)
+    finally:
+        pool.close()
+        pool.join()
+    return {provider_id: inventory for provider_id, inventory in results if inventory is not None}
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Benchmark reading and writing object metadata
+
+Compares the YAML metadata blobs Sprout used to store with the JSON metadata and its parsed value
+cache, and the template list kept in provider metadata with the indexed template names. Works on
+a throwaway provider that is rolled back afterwards.
+
+e.g. ./manage.py benchmark_metadata --templates 2000 --repeat 1000
+"""
+from __future__ import absolute_import, print_function
+
+import time
+
+import yaml
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from appliances.models import Provider, dump_metadata, load_metadata
+
+BENCHMARK_PROVIDER = 'sprout-metadata-benchmark'
+
+
+def measure(label, repeat, function):
+    start = time.time()
+    for _ in range(repeat):
+        function()
+    duration = time.time() - start
+    print('{:<32} {:10.0f}/s'.format(label, repeat / duration if duration else float('inf')))
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument('--templates', type=int, default=2000,
+                            help='Number of templates the provider lists')
+        parser.add_argument('--repeat', type=int, default=1000, help='Repetitions of each step')
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        templates = ['template-{}'.format(i) for i in range(options['templates'])]
+        metadata = {'provider_data': {'type': 'openstack', 'ipaddress': '10.0.0.1'},
+                    'template_name_length': 64, 'templates': templates}
+        yaml_data = yaml.dump(metadata)
+        json_data = dump_metadata(metadata)
+
+        print('In memory, {} templates'.format(len(templates)))
+        measure('yaml read', max(repeat // 100, 1), lambda: yaml.load(yaml_data))
+        measure('json read', repeat, lambda: load_metadata(json_data))
+        measure('yaml write', max(repeat // 100, 1), lambda: yaml.dump(metadata))
+        measure('json write', repeat, lambda: dump_metadata(metadata))
+
+        with transaction.atomic():
+            provider = Provider.objects.create(id=BENCHMARK_PROVIDER)
+            print('Database')
+            provider.object_meta_data = yaml_data
+            measure('yaml metadata read', max(repeat // 100, 1),
+                    lambda: yaml.load(provider.object_meta_data).get('template_name_length'))
+            measure('metadata read (cached)', repeat,
+                    lambda: provider.metadata.get('template_name_length'))
+            provider.metadata = {'provider_data': metadata['provider_data']}
+            provider.save()
+
+            def edit():
+                with provider.edit_metadata as edited:
+                    edited['template_name_length'] = 64
+            measure('edit_metadata', max(repeat // 10, 1), edit)
+
+            measure('template in yaml list', max(repeat // 100, 1),
+                    lambda: templates[-1] in yaml.load(yaml_data)['templates'])
+            provider.templates = templates
+            measure('has_template', repeat, lambda: provider.has_template(templates[-1]))
+            measure('templates update (unchanged)', max(repeat // 100, 1),
+                    lambda: setattr(provider, 'templates', templates))
+            transaction.set_rollback(True)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the appliance refresh against a fake provider API
+
+Creates a throwaway provider with appliances in the database, lists them from a fake provider API
+with a part of them drifted (IP address or power state changed) or gone, and compares refreshing
+them row by row, as ``refresh_appliances_provider`` used to, with the reconciliation. Everything
+is rolled back afterwards.
+
+e.g. ./manage.py benchmark_refresh --vms 5000 --drifted 0.02 --gone 0.01
+"""
+from __future__ import absolute_import, print_function
+
+import random
+import time
+from collections import namedtuple
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from appliances.models import Appliance, Group, Provider, Template
+from appliances.reconcile import reconcile_provider
+
+BENCHMARK_PROVIDER = 'sprout-refresh-benchmark'
+
+FakeVM = namedtuple('FakeVM', ['name', 'uuid', 'ip', 'power_state'])
+
+
+class FakeProviderAPI(object):
+    """Lists VMs like a provider's ``all_vms`` without talking to anything"""
+    def __init__(self, vms):
+        self.vms = vms
+
+    def all_vms(self):
+        return list(self.vms)
+
+
+def refresh_per_row(provider, vms):
+    """The refresh as it was done before the reconciliation, saving every appliance"""
+    dict_vms = {}
+    uuid_vms = {}
+    for vm in vms:
+        dict_vms[vm.name] = vm
+        if vm.uuid:
+            uuid_vms[vm.uuid] = vm
+    for appliance in Appliance.objects.filter(template__provider=provider):
+        if appliance.uuid is not None and appliance.uuid in uuid_vms:
+            vm = uuid_vms[appliance.uuid]
+            appliance.name = vm.name
+            appliance.ip_address = vm.ip
+            appliance.set_power_state(Appliance.POWER_STATES_MAPPING.get(
+                vm.power_state, Appliance.Power.UNKNOWN))
+            appliance.save()
+        elif appliance.name in dict_vms:
+            vm = dict_vms[appliance.name]
+            appliance.uuid = vm.uuid
+            appliance.ip_address = vm.ip
+            appliance.set_power_state(Appliance.POWER_STATES_MAPPING.get(
+                vm.power_state, Appliance.Power.UNKNOWN))
+            appliance.save()
+        else:
+            appliance.set_power_state(Appliance.Power.ORPHANED)
+            appliance.save()
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vms', type=int, default=5000, help='Number of appliances and VMs')
+        parser.add_argument('--drifted', type=float, default=0.02,
+                            help='Fraction of VMs with a different IP address or power state')
+        parser.add_argument('--gone', type=float, default=0.01,
+                            help='Fraction of appliances whose VM is gone')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random drift')
+
+    def create_appliances(self, count):
+        group = Group.objects.create(id=BENCHMARK_PROVIDER)
+        provider = Provider.objects.create(id=BENCHMARK_PROVIDER, working=True)
+        template = Template.objects.create(
+            provider=provider, template_group=group, date=date.today(),
+            original_name=BENCHMARK_PROVIDER, name=BENCHMARK_PROVIDER)
+        Appliance.objects.bulk_create(
+            Appliance(
+                template=template, name='benchmark-{}'.format(i),
+                uuid='00000000-0000-0000-0000-{:012d}'.format(i),
+                ip_address='10.{}.{}.{}'.format(i // 65536, i // 256 % 256, i % 256),
+                power_state=Appliance.Power.ON)
+            for i in range(count))
+        return provider
+
+    def fake_vms(self, provider, drifted, gone, rng):
+        vms = []
+        for name, uuid, ip in Appliance.objects.filter(template__provider=provider).values_list(
+                'name', 'uuid', 'ip_address'):
+            roll = rng.random()
+            if roll < gone:
+                continue
+            elif roll < gone + drifted / 2:
+                vms.append(FakeVM(name, uuid, None, 'poweredOff'))
+            elif roll < gone + drifted:
+                vms.append(FakeVM(name, uuid, ip + '0', 'poweredOn'))
+            else:
+                vms.append(FakeVM(name, uuid, ip, 'poweredOn'))
+        return FakeProviderAPI(vms)
+
+    def measure(self, label, refresh, provider, api):
+        sid = transaction.savepoint()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                start = time.time()
+                result = refresh(provider, api.all_vms())
+                duration = time.time() - start
+        finally:
+            transaction.savepoint_rollback(sid)
+        print('{:<14} {:8.3f}s {:6} queries{}'.format(
+            label, duration, len(queries), '  ({})'.format(result) if result else ''))
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            provider = self.create_appliances(options['vms'])
+            for scenario, drifted, gone in [
+                    ('steady', 0.0, 0.0), ('drifted', options['drifted'], options['gone'])]:
+                api = self.fake_vms(provider, drifted, gone, rng)
+                print('{} appliances, {} VMs listed, {} scenario'.format(
+                    options['vms'], len(api.vms), scenario))
+                self.measure('per row save', refresh_per_row, provider, api)
+                self.measure('reconcile', reconcile_provider, provider, api)
+            transaction.set_rollback(True)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import json
+
+import django.db.models.deletion
+import yaml
+from django.db import migrations, models
+
+METADATA_MODELS = [
+    'DelayedProvisionTask', 'Provider', 'Group', 'GroupShepherd', 'Template', 'Appliance',
+    'AppliancePool']
+
+
+# Need to replicate the functionality from the model here
+def _metadata_default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+
+def dump_metadata(value):
+    return json.dumps(
+        value, separators=(',', ':'), sort_keys=True, default=_metadata_default)
+
+
+def metadata_to_json(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    ProviderTemplateName = apps.get_model("appliances", "ProviderTemplateName")  # noqa
+    ManagedProvider = apps.get_model("appliances", "ManagedProvider")  # noqa
+    for model_name in METADATA_MODELS:
+        model = apps.get_model("appliances", model_name)
+        for obj in model.objects.using(db_alias).all():
+            metadata = yaml.load(obj.object_meta_data) or {}
+            if model_name == 'Provider':
+                ProviderTemplateName.objects.using(db_alias).bulk_create(
+                    ProviderTemplateName(provider=obj, name=name)
+                    for name in set(metadata.pop('templates', None) or []))
+                # Derived from ManagedProvider now
+                metadata.pop('appliances_manage_this_provider', None)
+            elif model_name == 'Appliance':
+                ManagedProvider.objects.using(db_alias).bulk_create(
+                    ManagedProvider(appliance=obj, provider_key=key)
+                    for key in set(metadata.pop('managed_providers', None) or []))
+            model.objects.using(db_alias).filter(pk=obj.pk).update(
+                object_meta_data=dump_metadata(metadata))
+
+
+def metadata_to_yaml(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    for model_name in METADATA_MODELS:
+        model = apps.get_model("appliances", model_name)
+        for obj in model.objects.using(db_alias).all():
+            metadata = json.loads(obj.object_meta_data)
+            if model_name == 'Provider':
+                metadata['templates'] = list(
+                    obj.template_names.values_list('name', flat=True))
+            elif model_name == 'Appliance':
+                metadata['managed_providers'] = list(
+                    obj.managed_provider_keys.values_list('provider_key', flat=True))
+            model.objects.using(db_alias).filter(pk=obj.pk).update(
+                object_meta_data=yaml.dump(metadata))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appliances', '0048_openshift_project_made_bigger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ManagedProvider',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider_key', models.CharField(db_index=True, max_length=64)),
+                ('appliance', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='managed_provider_keys', to='appliances.Appliance')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProviderTemplateName',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('provider', models.ForeignKey(
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='template_names', to='appliances.Provider')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='managedprovider',
+            unique_together=set([('appliance', 'provider_key')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='providertemplatename',
+            unique_together=set([('provider', 'name')]),
+        ),
+    ] + [
+        migrations.AlterField(
+            model_name=model_name.lower(),
+            name='object_meta_data',
+            field=models.TextField(default=b'{}'),
+        )
+        for model_name in METADATA_MODELS
+    ] + [
+        migrations.RunPython(metadata_to_json, metadata_to_yaml),
+    ]
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 import base64
+import copy
+import hashlib
+import json
 import re
 import yaml
 
@@ -17,13 +20,13 @@ from datetime import timedelta, date
 from django.contrib.auth.models import User, Group as DjangoGroup
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models, transaction
-from django.db.models import Q
-from django.db.models.signals import pre_save
+from django.db.models import Case, Count, F, Q, When
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from json_field import JSONField
 
-from sprout import critical_section, redis
+from sprout import critical_section, redis, redis_client
 from sprout.log import create_logger
 
 from cfme.utils.appliance import Appliance as CFMEAppliance, IPAppliance
@@ -58,10 +61,32 @@ def apply_if_not_none(o, meth, *args, **kwargs):
     return getattr(o, meth)(*args, **kwargs)
 
 
+def load_metadata(data):
+    """Parse stored metadata, JSON or the YAML older Sprout versions stored."""
+    try:
+        return json.loads(data)
+    except ValueError:
+        return yaml.load(data)
+
+
+def _metadata_default(value):
+    """Makes JSON of what YAML metadata could hold but JSON can't, eg. dates"""
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+
+def dump_metadata(value):
+    return json.dumps(
+        value, separators=(',', ':'), sort_keys=True, default=_metadata_default)
+
+
 class MetadataMixin(models.Model):
     class Meta:
         abstract = True
-    object_meta_data = models.TextField(default=yaml.dump({}))
+    object_meta_data = models.TextField(default=dump_metadata({}))
     created_on = models.DateTimeField(default=timezone.now, editable=False)
     modified_on = models.DateTimeField(default=timezone.now)
 
@@ -88,13 +113,19 @@ class MetadataMixin(models.Model):
 
     @property
     def metadata(self):
-        return yaml.load(self.object_meta_data)
+        """Parsed metadata, cached until ``object_meta_data`` changes. Do not modify it in place,
+        assign it or use :py:attr:`edit_metadata`."""
+        cached = self.__dict__.get('_metadata_cache')
+        if cached is None or cached[0] is not self.object_meta_data:
+            cached = (self.object_meta_data, load_metadata(self.object_meta_data))
+            self.__dict__['_metadata_cache'] = cached
+        return cached[1]
 
     @metadata.setter
     def metadata(self, value):
         if not isinstance(value, dict):
             raise TypeError("You can store only dict in metadata!")
-        self.object_meta_data = yaml.dump(value)
+        self.object_meta_data = dump_metadata(value)
 
     @property
     @contextmanager
@@ -102,11 +133,12 @@ class MetadataMixin(models.Model):
         with transaction.atomic():
             with self.metadata_lock:
                 o = type(self).objects.get(pk=self.pk)
-                metadata = o.metadata
+                metadata = copy.deepcopy(o.metadata)
                 yield metadata
                 o.metadata = metadata
-                o.save()
-        self.reload()
+                o.save(update_fields=['object_meta_data', 'modified_on'])
+        self.object_meta_data = o.object_meta_data
+        self.modified_on = o.modified_on
 
     @property
     def logger(self):
@@ -129,7 +161,95 @@ class DelayedProvisionTask(MetadataMixin):
             self.provider_to_avoid.id if self.provider_to_avoid is not None else "---")
 
 
-class Provider(MetadataMixin):
+class ProviderSlotsMixin(object):
+    """Slots and load of a provider derived from its limits and appliance and template counts.
+
+    Requires ``num_simultaneous_provisioning``, ``num_simultaneous_configuring``,
+    ``appliance_limit``, ``num_currently_provisioning``, ``num_currently_managing`` and
+    ``num_templates_preparing``.
+    """
+    @property
+    def remaining_configuring_slots(self):
+        result = self.num_simultaneous_configuring - self.num_templates_preparing
+        if result < 0:
+            return 0
+        return result
+
+    @property
+    def remaining_appliance_slots(self):
+        if self.appliance_limit is None:
+            return 1
+        result = self.appliance_limit - self.num_currently_managing
+        if result < 0:
+            return 0
+        return result
+
+    @property
+    def remaining_provisioning_slots(self):
+        result = self.num_simultaneous_provisioning - self.num_currently_provisioning
+        if result < 0:
+            return 0
+        # Take the appliance limit into account
+        if self.appliance_limit is None:
+            return result
+        else:
+            free_appl_slots = self.appliance_limit - self.num_currently_managing
+            if free_appl_slots < 0:
+                free_appl_slots = 0
+            return min(free_appl_slots, result)
+
+    @property
+    def free(self):
+        return self.remaining_provisioning_slots > 0
+
+    @property
+    def provisioning_load(self):
+        if self.num_simultaneous_provisioning == 0:
+            return 1.0  # prevent division by zero
+        return float(self.num_currently_provisioning) / float(self.num_simultaneous_provisioning)
+
+    @property
+    def appliance_load(self):
+        if self.appliance_limit is None or self.appliance_limit == 0:
+            return 0.0
+        return float(self.num_currently_managing) / float(self.appliance_limit)
+
+    @property
+    def load(self):
+        """Load for sorting"""
+        if self.appliance_limit is None:
+            return self.provisioning_load
+        else:
+            return self.appliance_load
+
+
+class ProviderLoad(ProviderSlotsMixin):
+    """Appliance and template counts of a provider at one point of a scheduling run.
+
+    Created by :py:meth:`Provider.load_snapshot`. Whatever the scheduling run provisions has to be
+    recorded with :py:meth:`appliance_added` so the following decisions see it.
+    """
+    def __init__(self, provider, num_currently_provisioning, num_currently_managing,
+                 num_templates_preparing):
+        self.provider = provider
+        self.num_simultaneous_provisioning = provider.num_simultaneous_provisioning
+        self.num_simultaneous_configuring = provider.num_simultaneous_configuring
+        self.appliance_limit = provider.appliance_limit
+        self.num_currently_provisioning = num_currently_provisioning
+        self.num_currently_managing = num_currently_managing
+        self.num_templates_preparing = num_templates_preparing
+
+    def appliance_added(self):
+        self.num_currently_provisioning += 1
+        self.num_currently_managing += 1
+
+    def __repr__(self):
+        return '{}({!r}, provisioning={}, managing={}, preparing={})'.format(
+            type(self).__name__, self.provider.id, self.num_currently_provisioning,
+            self.num_currently_managing, self.num_templates_preparing)
+
+
+class Provider(MetadataMixin, ProviderSlotsMixin):
     id = models.CharField(max_length=32, primary_key=True, help_text="Provider's key in YAML.")
     working = models.BooleanField(default=False, help_text="Whether provider is available.")
     num_simultaneous_provisioning = models.IntegerField(default=5,
@@ -199,75 +319,53 @@ class Provider(MetadataMixin):
 
     @property
     def num_currently_provisioning(self):
-        return len(
-            Appliance.objects.filter(
-                ready=False, marked_for_deletion=False, template__provider=self, ip_address=None))
+        return Appliance.objects.filter(
+            ready=False, marked_for_deletion=False, template__provider=self,
+            ip_address=None).count()
 
     @property
     def num_templates_preparing(self):
-        return len(Template.objects.filter(provider=self, ready=False))
-
-    @property
-    def remaining_configuring_slots(self):
-        result = self.num_simultaneous_configuring - self.num_templates_preparing
-        if result < 0:
-            return 0
-        return result
-
-    @property
-    def remaining_appliance_slots(self):
-        if self.appliance_limit is None:
-            return 1
-        result = self.appliance_limit - self.num_currently_managing
-        if result < 0:
-            return 0
-        return result
+        return Template.objects.filter(provider=self, ready=False).count()
 
     @property
     def num_currently_managing(self):
-        return len(Appliance.objects.filter(template__provider=self))
+        return Appliance.objects.filter(template__provider=self).count()
 
     @property
     def currently_managed_appliances(self):
         return Appliance.objects.filter(template__provider=self)
 
-    @property
-    def remaining_provisioning_slots(self):
-        result = self.num_simultaneous_provisioning - self.num_currently_provisioning
-        if result < 0:
-            return 0
-        # Take the appliance limit into account
-        if self.appliance_limit is None:
-            return result
-        else:
-            free_appl_slots = self.appliance_limit - self.num_currently_managing
-            if free_appl_slots < 0:
-                free_appl_slots = 0
-            return min(free_appl_slots, result)
-
-    @property
-    def free(self):
-        return self.remaining_provisioning_slots > 0
-
-    @property
-    def provisioning_load(self):
-        if self.num_simultaneous_provisioning == 0:
-            return 1.0  # prevent division by zero
-        return float(self.num_currently_provisioning) / float(self.num_simultaneous_provisioning)
+    @classmethod
+    def load_snapshot(cls, **filters):
+        """Count the appliances and templates of all providers at once.
 
-    @property
-    def appliance_load(self):
-        if self.appliance_limit is None or self.appliance_limit == 0:
-            return 0.0
-        return float(self.num_currently_managing) / float(self.appliance_limit)
+        Scheduling compares the load of many providers many times in a row, the snapshot counts
+        everything in one aggregate query instead of three queries per provider and comparison.
 
-    @property
-    def load(self):
-        """Load for sorting"""
-        if self.appliance_limit is None:
-            return self.provisioning_load
-        else:
-            return self.appliance_load
+        Returns:
+            A :py:class:`dict` of provider id to :py:class:`ProviderLoad`
+        """
+        appliance = 'provider_templates__appliance'
+        providers = cls.objects.filter(**filters).annotate(
+            snapshot_managing=Count(appliance, distinct=True),
+            snapshot_provisioning=Count(
+                Case(When(
+                    then=F('{}__id'.format(appliance)),
+                    **{
+                        '{}__ready'.format(appliance): False,
+                        '{}__marked_for_deletion'.format(appliance): False,
+                        '{}__ip_address'.format(appliance): None})),
+                distinct=True),
+            snapshot_preparing=Count(
+                Case(When(provider_templates__ready=False, then=F('provider_templates__id'))),
+                distinct=True))
+        return {
+            provider.id: ProviderLoad(
+                provider,
+                num_currently_provisioning=provider.snapshot_provisioning,
+                num_currently_managing=provider.snapshot_managing,
+                num_templates_preparing=provider.snapshot_preparing)
+            for provider in providers}
 
     @classmethod
     def get_available_provider_keys(cls):
@@ -305,12 +403,20 @@ class Provider(MetadataMixin):
 
     @property
     def templates(self):
-        return self.metadata.get("templates", [])
+        return list(self.template_names.order_by('id').values_list('name', flat=True))
 
     @templates.setter
     def templates(self, value):
-        with self.edit_metadata as metadata:
-            metadata["templates"] = value
+        value = set(value)
+        with transaction.atomic():
+            existing = set(self.template_names.values_list('name', flat=True))
+            self.template_names.filter(name__in=existing - value).delete()
+            ProviderTemplateName.objects.bulk_create(
+                ProviderTemplateName(provider=self, name=name) for name in value - existing)
+
+    def has_template(self, name):
+        """Whether the provider listed a template called ``name`` last time it was checked."""
+        return self.template_names.filter(name=name).exists()
 
     @property
     def template_name_length(self):
@@ -323,20 +429,15 @@ class Provider(MetadataMixin):
 
     @property
     def appliances_manage_this_provider(self):
-        return self.metadata.get("appliances_manage_this_provider", [])
-
-    @appliances_manage_this_provider.setter
-    def appliances_manage_this_provider(self, value):
-        with self.edit_metadata as metadata:
-            metadata["appliances_manage_this_provider"] = value
+        return list(
+            ManagedProvider.objects.filter(provider_key=self.id).order_by('appliance')
+            .values_list('appliance', flat=True))
 
     @property
     def g_appliances_manage_this_provider(self):
-        for appl_id in self.appliances_manage_this_provider:
-            try:
-                yield Appliance.objects.get(id=appl_id)
-            except ObjectDoesNotExist:
-                continue
+        return Appliance.objects.filter(managed_provider_keys__provider_key=self.id)\
+            .select_related('template__provider', 'appliance_pool__owner')\
+            .order_by('id')
 
     @property
     def user_usage(self):
@@ -1102,12 +1203,18 @@ class Appliance(MetadataMixin):
 
     @property
     def managed_providers(self):
-        return self.metadata.get("managed_providers", [])
+        return list(
+            self.managed_provider_keys.order_by('provider_key')
+            .values_list('provider_key', flat=True))
 
     @managed_providers.setter
     def managed_providers(self, value):
-        with self.edit_metadata as metadata:
-            metadata["managed_providers"] = value
+        value = set(value)
+        with transaction.atomic():
+            existing = set(self.managed_provider_keys.values_list('provider_key', flat=True))
+            self.managed_provider_keys.filter(provider_key__in=existing - value).delete()
+            ManagedProvider.objects.bulk_create(
+                ManagedProvider(appliance=self, provider_key=key) for key in value - existing)
 
     @property
     def vnc_link(self):
@@ -1325,10 +1432,22 @@ class AppliancePool(MetadataMixin):
 
     @property
     def possible_provisioning_templates(self):
+        return self.provisioning_templates()
+
+    def provisioning_templates(self, loads=None):
+        """Templates on providers with a free provisioning slot, the best match first.
+
+        Args:
+            loads: provider load snapshot from :py:meth:`Provider.load_snapshot`, taken for the
+                providers of the possible templates if not passed
+        """
+        templates = self.possible_templates
+        if loads is None:
+            loads = Provider.load_snapshot(id__in={tpl.provider_id for tpl in templates})
         return sorted(
-            filter(lambda tpl: tpl.provider.free, self.possible_templates),
+            [tpl for tpl in templates if loads[tpl.provider_id].free],
             # Sort by date and load to pick the best match (least loaded provider)
-            key=lambda tpl: (tpl.date, 1.0 - tpl.provider.appliance_load), reverse=True)
+            key=lambda tpl: (tpl.date, 1.0 - loads[tpl.provider_id].appliance_load), reverse=True)
 
     @property
     def possible_providers(self):
@@ -1373,6 +1492,26 @@ class AppliancePool(MetadataMixin):
     def appliance_ips(self):
         return [ap.ip_address for ap in filter(lambda a: a.ip_address is not None, self.appliances)]
 
+    #: Pool fields that make up the state of a pool seen by its users
+    STATE_POOL_FIELDS = ('total_count', 'finished', 'description')
+    #: Appliance fields that make up the state of a pool seen by its users
+    STATE_FIELDS = (
+        'id', 'name', 'ready', 'ip_address', 'power_state', 'status', 'marked_for_deletion',
+        'leased_until', 'description', 'openshift_project', 'openshift_ext_ip')
+
+    @property
+    def state_version(self):
+        """Digest of the pool and its appliances that changes whenever their state does.
+
+        It is computed from a single query, so checking whether a pool changed is cheap compared
+        to serializing it.
+        """
+        digest = hashlib.sha1(repr((
+            [getattr(self, field) for field in self.STATE_POOL_FIELDS],
+            list(Appliance.objects.filter(appliance_pool=self).order_by('id')
+                 .values_list(*self.STATE_FIELDS)))))
+        return digest.hexdigest()
+
     @property
     def fulfilled(self):
         try:
@@ -1472,23 +1611,15 @@ class AppliancePool(MetadataMixin):
 
     @property
     def num_possible_provisioning_slots(self):
-        providers = set([])
-        for template in self.possible_provisioning_templates:
-            providers.add(template.provider)
-        slots = 0
-        for provider in providers:
-            slots += provider.remaining_provisioning_slots
-        return slots
+        loads = Provider.load_snapshot(
+            id__in={tpl.provider_id for tpl in self.possible_templates})
+        return sum(load.remaining_provisioning_slots for load in loads.values())
 
     @property
     def num_possible_appliance_slots(self):
-        providers = set([])
-        for template in self.possible_templates:
-            providers.add(template.provider)
-        slots = 0
-        for provider in providers:
-            slots += provider.remaining_appliance_slots
-        return slots
+        loads = Provider.load_snapshot(
+            id__in={tpl.provider_id for tpl in self.possible_templates})
+        return sum(load.remaining_appliance_slots for load in loads.values())
 
     @property
     def num_shepherd_appliances(self):
@@ -1505,6 +1636,60 @@ class AppliancePool(MetadataMixin):
             self.id, self.group.id, self.total_count)
 
 
+class ProviderTemplateName(models.Model):
+    """Name of a template as listed by the provider."""
+    provider = models.ForeignKey(
+        Provider, on_delete=models.CASCADE, related_name="template_names")
+    name = models.CharField(max_length=255)
+
+    class Meta:
+        unique_together = [('provider', 'name')]
+
+    def __unicode__(self):
+        return u"{} @ {}".format(self.name, self.provider_id)
+
+
+class ManagedProvider(models.Model):
+    """Provider (its key in YAML) that an appliance manages."""
+    appliance = models.ForeignKey(
+        Appliance, on_delete=models.CASCADE, related_name="managed_provider_keys")
+    provider_key = models.CharField(max_length=64, db_index=True)
+
+    class Meta:
+        unique_together = [('appliance', 'provider_key')]
+
+    def __unicode__(self):
+        return u"{} manages {}".format(self.appliance_id, self.provider_key)
+
+
+#: Templates whose appliances or which themselves changed since the shepherd ran last
+CHANGED_TEMPLATES_KEY = 'shepherd-changed-templates'
+
+
+def mark_templates_changed(*template_ids):
+    redis_client.sadd(CHANGED_TEMPLATES_KEY, *template_ids)
+
+
+def pop_changed_templates():
+    pipeline = redis_client.pipeline()
+    pipeline.smembers(CHANGED_TEMPLATES_KEY)
+    pipeline.delete(CHANGED_TEMPLATES_KEY)
+    template_ids, _ = pipeline.execute()
+    return {int(template_id) for template_id in template_ids}
+
+
+@receiver(post_save, sender=Appliance)
+@receiver(post_delete, sender=Appliance)
+def mark_appliance_template_changed(sender, instance, **kwargs):
+    mark_templates_changed(instance.template_id)
+
+
+@receiver(post_save, sender=Template)
+@receiver(post_delete, sender=Template)
+def mark_template_changed(sender, instance, **kwargs):
+    mark_templates_changed(instance.id)
+
+
 class MismatchVersionMailer(models.Model):
     provider = models.ForeignKey(Provider, on_delete=models.CASCADE)
     template_name = models.CharField(max_length=64)
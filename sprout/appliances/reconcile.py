@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Reconciliation of the appliances in the database with the VMs of their provider
+
+The appliances of a provider are read as plain rows, matched with the VM listing of the provider
+in memory and only the fields that actually differ are written back. Appliances that get the same
+new values are updated together by a single UPDATE, all of it in one transaction per provider.
+"""
+from __future__ import absolute_import
+
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from appliances.models import Appliance, mark_templates_changed
+
+#: Appliance fields compared with the VM listing
+APPLIANCE_FIELDS = ('id', 'name', 'uuid', 'ip_address', 'power_state')
+ApplianceRow = namedtuple('ApplianceRow', APPLIANCE_FIELDS + ('template_id', ))
+#: Maximum number of appliance ids per UPDATE, SQLite limits the number of query parameters
+UPDATE_CHUNK_SIZE = 500
+
+
+def chunks(ids):
+    for start in range(0, len(ids), UPDATE_CHUNK_SIZE):
+        yield ids[start:start + UPDATE_CHUNK_SIZE]
+
+
+class Reconciliation(object):
+    """Differences between the appliances of a provider and its VMs
+
+    Attributes:
+        field_changes: maps a tuple of ``(field, new value)`` pairs to the appliance ids to set
+            them on
+        power_changes: maps ``(old power state, new power state)`` to the appliance ids changing
+        retrieved_uuids: ``(appliance id, name, uuid)`` of appliances matched by name
+        changed_templates: ids of the templates of the appliances with any difference
+        changed: number of appliances with any difference
+        orphaned: number of appliances without a VM
+        unchanged: number of appliances that are up to date
+    """
+    def __init__(self):
+        self.field_changes = defaultdict(list)
+        self.power_changes = defaultdict(list)
+        self.retrieved_uuids = []
+        self.changed_templates = set()
+        self.changed = 0
+        self.orphaned = 0
+        self.unchanged = 0
+
+    def add(self, row, fields, power_state):
+        changes = tuple(sorted(
+            (field, value) for field, value in fields.items() if getattr(row, field) != value))
+        if changes:
+            self.field_changes[changes].append(row.id)
+        if power_state != row.power_state:
+            self.power_changes[row.power_state, power_state].append(row.id)
+        if changes or power_state != row.power_state:
+            self.changed_templates.add(row.template_id)
+        if power_state == Appliance.Power.ORPHANED:
+            self.orphaned += 1
+        elif changes or power_state != row.power_state:
+            self.changed += 1
+        else:
+            self.unchanged += 1
+
+    @property
+    def updates(self):
+        """Number of UPDATE statements :py:meth:`apply` executes"""
+        return sum(
+            len(list(chunks(ids)))
+            for changes in (self.field_changes, self.power_changes) for ids in changes.values())
+
+    def apply(self, now=None):
+        """Write the differences in one transaction, return the number of updated rows
+
+        Power states only change on appliances whose power state didn't change since they were
+        read, anything else changing them in the meantime knows better than the VM listing.
+        """
+        now = now or timezone.now()
+        updated = 0
+        with transaction.atomic():
+            for changes, ids in self.field_changes.items():
+                for chunk in chunks(ids):
+                    updated += Appliance.objects.filter(id__in=chunk).update(
+                        modified_on=now, **dict(changes))
+            for (old_state, new_state), ids in self.power_changes.items():
+                fields = dict(power_state=new_state, power_state_changed=now, modified_on=now)
+                if new_state in Appliance.RESET_SWAP_STATES:
+                    fields.update(swap=0, ssh_failed=False)
+                for chunk in chunks(ids):
+                    updated += Appliance.objects.filter(
+                        id__in=chunk, power_state=old_state).update(**fields)
+        # update() does not send post_save, let the shepherd know on its own
+        if self.changed_templates:
+            mark_templates_changed(*self.changed_templates)
+        return updated
+
+    def __str__(self):
+        return '{} changed, {} orphaned, {} unchanged'.format(
+            self.changed, self.orphaned, self.unchanged)
+
+
+def diff_appliances(rows, vms):
+    """Match appliance rows with VMs by UUID or name and collect the differences
+
+    Args:
+        rows: iterable of :py:class:`ApplianceRow`
+        vms: VMs as listed by the provider's ``all_vms``
+    Returns:
+        A :py:class:`Reconciliation`
+    """
+    dict_vms = {}
+    uuid_vms = {}
+    for vm in vms:
+        dict_vms[vm.name] = vm
+        if vm.uuid:
+            uuid_vms[vm.uuid] = vm
+    reconciliation = Reconciliation()
+    for row in rows:
+        if row.uuid is not None and row.uuid in uuid_vms:
+            vm = uuid_vms[row.uuid]
+            # Using the UUID and change the name if it changed
+            fields = {'name': vm.name, 'ip_address': vm.ip}
+        elif row.name in dict_vms:
+            vm = dict_vms[row.name]
+            # Using the name, and then retrieve uuid
+            fields = {'uuid': vm.uuid, 'ip_address': vm.ip}
+            if vm.uuid != row.uuid:
+                reconciliation.retrieved_uuids.append((row.id, row.name, vm.uuid))
+        else:
+            # Orphaned :(
+            reconciliation.add(row, {}, Appliance.Power.ORPHANED)
+            continue
+        reconciliation.add(row, fields, Appliance.POWER_STATES_MAPPING.get(
+            vm.power_state, Appliance.Power.UNKNOWN))
+    return reconciliation
+
+
+def reconcile_provider(provider, vms):
+    """Bring the appliances of ``provider`` in line with ``vms`` and return the reconciliation"""
+    rows = [
+        ApplianceRow(*values)
+        for values in Appliance.objects.filter(template__provider=provider).values_list(
+            *(APPLIANCE_FIELDS + ('template', )))]
+    reconciliation = diff_appliances(rows, vms)
+    reconciliation.apply()
+    return reconciliation
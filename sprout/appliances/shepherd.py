@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""Shepherd keeping spare appliances spun up for the template groups
+
+Every group shepherd wants a number of preconfigured and of unconfigured appliances of the latest
+template of its group, a :py:class:`Demand` each. What was counted for the demands is kept in
+redis between the runs. Saving or deleting an appliance or a template marks its template as
+changed, so a run only recounts the demands of groups whose templates changed, the demands that
+were not met last time and, every ``SHEPHERD_FULL_RECOUNT`` seconds, all of them.
+
+Missing appliances are then provisioned from a priority queue, the least fulfilled demand first,
+for as long as the providers have free provisioning slots.
+"""
+from __future__ import absolute_import
+
+import heapq
+import time
+
+import fauxfactory
+from django.db import transaction
+
+from appliances.models import (
+    Appliance, GroupShepherd, Template, pop_changed_templates)
+from sprout import redis, settings
+
+DEMANDS_KEY = 'shepherd-demands'
+LAST_FULL_RECOUNT_KEY = 'shepherd-last-full-recount'
+
+
+class Demand(object):
+    """Spare appliances a group shepherd wants of the latest template of its group
+
+    Args:
+        shepherd: the :py:class:`appliances.models.GroupShepherd`
+        preconfigured: whether the appliances are preconfigured or not
+    """
+    def __init__(self, shepherd, preconfigured):
+        self.shepherd = shepherd
+        self.preconfigured = preconfigured
+        if preconfigured:
+            self.wanted = shepherd.template_pool_size
+        else:
+            self.wanted = shepherd.unconfigured_template_pool_size
+        # Existing templates to provision from
+        self.templates = []
+        # Spare appliances of the latest template, the eldest first
+        self.appliances = []
+        # Filters of the templates whose appliances are obsolete
+        self.kill_filters = []
+
+    @property
+    def key(self):
+        return '{}-{}'.format(
+            self.shepherd.id, 'preconfigured' if self.preconfigured else 'unconfigured')
+
+    @property
+    def present(self):
+        return len(self.appliances)
+
+    @property
+    def deficit(self):
+        return max(self.wanted - self.present, 0)
+
+    @property
+    def surplus(self):
+        return max(self.present - self.wanted, 0)
+
+    @property
+    def fulfillment(self):
+        if self.wanted == 0:
+            return 1.0
+        return float(self.present) / float(self.wanted)
+
+    def count(self):
+        """Look up the latest templates of the group and the spare appliances of them.
+
+        Returns:
+            Whether the group has any templates yet.
+        """
+        gs = self.shepherd
+        prov_filter = {'provider__user_groups': gs.user_group}
+        filters = dict(
+            template_group=gs.template_group, ready=True, usable=True,
+            preconfigured=self.preconfigured, container=None, **prov_filter)
+        group_versions = Template.get_versions(**filters)
+        if group_versions:
+            # Downstream - by version (downstream releases)
+            version = group_versions[0]
+            # Find the latest date (one version can have new build)
+            dates = Template.get_dates(version=version, **filters)
+            if not dates:
+                # No template yet?
+                return False
+            filter_keep = {"version": version, "date": dates[0], 'container': None}
+            filters_kill = [{"version": version, "date": kill_date} for kill_date in dates[1:]]
+            filters_kill.extend({"version": kill_version} for kill_version in group_versions[1:])
+        else:
+            group_dates = Template.get_dates(**filters)
+            if not group_dates:
+                return False  # Ignore this group, no templates detected yet
+            # Upstream - by date (upstream nightlies)
+            filter_keep = {"date": group_dates[0], 'container': None}
+            filters_kill = [{"date": kill_date} for kill_date in group_dates[1:]]
+        filter_keep.update(prov_filter)
+        for filt in filters_kill:
+            filt.update(prov_filter)
+        self.kill_filters = filters_kill
+        possible_templates = list(
+            Template.objects.filter(
+                usable=True, ready=True, template_group=gs.template_group,
+                preconfigured=self.preconfigured, **filter_keep).distinct())
+        # If it can be deployed, it must exist
+        self.templates = [tpl for tpl in possible_templates if tpl.exists]
+        # If we then want to delete some templates, better kill the eldest. status_changed
+        # says which one was provisioned when, because nothing else then touches that field.
+        self.appliances = list(
+            Appliance.objects.filter(
+                template__in=possible_templates, appliance_pool=None, marked_for_deletion=False)
+            .order_by('status_changed'))
+        return True
+
+    @property
+    def serialized(self):
+        return dict(
+            group=self.shepherd.template_group_id,
+            user_group=self.shepherd.user_group.name,
+            preconfigured=self.preconfigured,
+            wanted=self.wanted,
+            present=self.present,
+            deficit=self.deficit,
+            surplus=self.surplus,
+            provisionable=bool(self.templates),
+            counted=time.time(),
+        )
+
+
+def provision(demands, loads, logger):
+    """Provision the missing appliances, the least fulfilled demand first, while providers have
+    free provisioning slots.
+
+    Args:
+        demands: the counted :py:class:`Demand` s
+        loads: provider load snapshot from
+            :py:meth:`appliances.models.Provider.load_snapshot`, updated with the provisioned
+            appliances
+        logger: logger to report the provisioned appliances to
+    Returns:
+        Number of appliances provisioned
+    """
+    from appliances.tasks import clone_template_to_appliance
+    queue = [
+        (demand.fulfillment, i, demand)
+        for i, demand in enumerate(demands) if demand.deficit and demand.templates]
+    heapq.heapify(queue)
+    provisioned = 0
+    while queue:
+        _, i, demand = heapq.heappop(queue)
+        templates = [tpl for tpl in demand.templates if loads[tpl.provider_id].free]
+        if not templates:
+            # No provider of this group can take more now
+            continue
+        # Least loaded provider
+        template = min(templates, key=lambda tpl: loads[tpl.provider_id].appliance_load)
+        with transaction.atomic():
+            appliance = Appliance(
+                template=template,
+                name=settings.APPLIANCE_FORMAT.format(
+                    group=template.template_group_id,
+                    date=template.date.strftime("%y%m%d"),
+                    rnd=fauxfactory.gen_alphanumeric(8)))
+            appliance.save()
+        loads[template.provider_id].appliance_added()
+        demand.appliances.append(appliance)
+        provisioned += 1
+        logger.info(
+            "Adding an appliance to shepherd: {}/{}".format(appliance.id, appliance.name))
+        clone_template_to_appliance.delay(appliance.id, None)
+        if demand.deficit:
+            heapq.heappush(queue, (demand.fulfillment, i, demand))
+    return provisioned
+
+
+def kill_surplus(demand, logger):
+    """Kill the spare appliances over the demand and the ones of obsolete templates"""
+    gs = demand.shepherd
+    # Only kill those that are visible only for one group. This is necessary so the groups
+    # don't "fight"
+    for appliance in demand.appliances[:demand.surplus]:
+        if appliance.is_visible_only_in_group(gs.user_group):
+            logger.info("Killing an extra appliance {}/{} in shepherd".format(
+                appliance.id, appliance.name))
+            Appliance.kill(appliance)
+    for filter_kill in demand.kill_filters:
+        obsolete = Appliance.objects.filter(
+            template__ready=True, template__usable=True,
+            template__template_group=gs.template_group,
+            template__preconfigured=demand.preconfigured, template__container=None,
+            appliance_pool=None, marked_for_deletion=False,
+            **{'template__{}'.format(key): value for key, value in filter_kill.items()})
+        for appliance in obsolete.distinct():
+            logger.info(
+                "Killing appliance {}/{} in shepherd because it is obsolete now".format(
+                    appliance.id, appliance.name))
+            Appliance.kill(appliance)
+
+
+def run_shepherd(loads, logger):
+    """Recount the demands that may have changed, provision what is missing and kill the surplus.
+
+    Args:
+        loads: provider load snapshot from :py:meth:`appliances.models.Provider.load_snapshot`
+        logger: logger of the calling task
+    """
+    changed_templates = pop_changed_templates()
+    if changed_templates:
+        changed_groups = set(
+            Template.objects.filter(id__in=changed_templates)
+            .values_list('template_group', flat=True).distinct())
+    else:
+        changed_groups = set()
+    now = time.time()
+    full_recount = now - (redis.get(LAST_FULL_RECOUNT_KEY) or 0) >= settings.SHEPHERD_FULL_RECOUNT
+    counted = redis.get(DEMANDS_KEY) or {}
+    states = {}
+    demands = []
+    for gs in GroupShepherd.objects.select_related('user_group'):
+        for preconfigured in (True, False):
+            demand = Demand(gs, preconfigured)
+            state = counted.get(demand.key)
+            if (
+                    not full_recount and
+                    state is not None and
+                    state['wanted'] == demand.wanted and
+                    not state['deficit'] and
+                    not state['surplus'] and
+                    gs.template_group_id not in changed_groups):
+                # Met the last time and nothing changed since
+                states[demand.key] = state
+                continue
+            if demand.count():
+                demands.append(demand)
+            states[demand.key] = demand
+    provisioned = provision(demands, loads, logger)
+    for demand in demands:
+        kill_surplus(demand, logger)
+    for key, state in states.items():
+        if isinstance(state, Demand):
+            states[key] = state.serialized
+    redis.set(DEMANDS_KEY, states)
+    if full_recount:
+        redis.set(LAST_FULL_RECOUNT_KEY, now)
+    logger.info(
+        "Shepherd recounted {} of {} demands{}, provisioned {} appliances".format(
+            len(demands), len(states), ' (full recount)' if full_recount else '', provisioned))
+
+
+def shepherd_demands():
+    """What the shepherd counted last for every group shepherd, see :py:attr:`Demand.serialized`"""
+    return sorted(
+        (redis.get(DEMANDS_KEY) or {}).values(),
+        key=lambda state: (state['group'], state['user_group'], not state['preconfigured']))
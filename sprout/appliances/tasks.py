@@ -28,7 +28,10 @@ import socket
 
 from appliances.models import (
     Provider, Group, Template, Appliance, AppliancePool, DelayedProvisionTask,
-    MismatchVersionMailer, User, GroupShepherd)
+    MismatchVersionMailer, User, ManagedProvider, mark_templates_changed)
+from appliances.inventory import fetch_inventories, get_inventory
+from appliances.reconcile import chunks, reconcile_provider
+from appliances.shepherd import run_shepherd
 from sprout import settings, redis
 from sprout.irc_bot import send_message
 from sprout.log import create_logger
@@ -298,7 +301,7 @@ def poke_trackerbot(self):
                                                       'container',
                                                       'template_type'])
         except ObjectDoesNotExist:
-            if template_name in provider.templates:
+            if provider.has_template(template_name):
                 date = parse_template(template_name).datestamp
                 if date is None:
                     self.logger.warning(
@@ -335,7 +338,7 @@ def poke_trackerbot(self):
                     preconfigured_template.ga_released = ga_released
                     preconfigured_template.save(update_fields=['ga_released'])
             except ObjectDoesNotExist:
-                if template_name in provider.templates:
+                if provider.has_template(template_name):
                     original_id = original_template.id if original_template is not None else None
                     create_appliance_template.delay(
                         provider.id, group.id, template_name, source_template_id=original_id)
@@ -623,11 +626,12 @@ def request_appliance_pool(self, appliance_pool_id, time_minutes):
         "Appliance pool {} requested for {} minutes.".format(appliance_pool_id, time_minutes))
     pool = AppliancePool.objects.get(id=appliance_pool_id)
     n = Appliance.give_to_pool(pool)
+    loads = Provider.load_snapshot()
     for i in range(pool.total_count - n):
-        tpls = pool.possible_provisioning_templates
+        tpls = pool.provisioning_templates(loads)
         if tpls:
-            template_id = tpls[0].id
-            clone_template_to_pool(template_id, pool.id, time_minutes)
+            clone_template_to_pool(tpls[0].id, pool.id, time_minutes)
+            loads[tpls[0].provider_id].appliance_added()
         else:
             with transaction.atomic():
                 task = DelayedProvisionTask(pool=pool, lease_time=time_minutes)
@@ -672,6 +676,7 @@ def process_delayed_provision_tasks(self):
     Goes one task by one and when some of them can be provisioned, it starts the provisioning and
     then deletes the task.
     """
+    loads = Provider.load_snapshot()
     for task in DelayedProvisionTask.objects.order_by("id"):
         if task.pool.not_needed_anymore:
             task.delete()
@@ -680,7 +685,7 @@ def process_delayed_provision_tasks(self):
         appliances_given = Appliance.give_to_pool(task.pool, 1)
         if appliances_given == 0:
             # No free appliance in shepherd, so do it on our own
-            tpls = task.pool.possible_provisioning_templates
+            tpls = task.pool.provisioning_templates(loads)
             if task.provider_to_avoid is not None:
                 filtered_tpls = filter(lambda tpl: tpl.provider != task.provider_to_avoid, tpls)
                 if filtered_tpls:
@@ -690,6 +695,7 @@ def process_delayed_provision_tasks(self):
                 # This will cause additional rejects until the provider quota is met
             if tpls:
                 clone_template_to_pool(tpls[0].id, task.pool.id, task.lease_time)
+                loads[tpls[0].provider_id].appliance_added()
                 task.delete()
             else:
                 # Try freeing up some space in provider
@@ -1105,56 +1111,47 @@ def retrieve_appliance_ip(self, appliance_id):
 def refresh_appliances(self):
     """Dispatches the appliance refresh process among the providers"""
     self.logger.info("Initiating regular appliance provider refresh")
-    for provider in Provider.objects.filter(working=True, disabled=False):
-        refresh_appliances_provider.delay(provider.id)
+    # List all the providers at once, the other periodic tasks then use the cached inventories
+    inventories = fetch_inventories(
+        Provider.objects.filter(working=True, disabled=False), max_age=0)
+    for provider_id in inventories:
+        refresh_appliances_provider.delay(provider_id, max_age=settings.PROVIDER_INVENTORY_TTL)
 
 
 @singleton_task(soft_time_limit=180)
-def refresh_appliances_provider(self, provider_id):
+def refresh_appliances_provider(self, provider_id, max_age=0):
     """Downloads the list of VMs from the provider, then matches them by name or UUID with
     appliances stored in database.
+
+    Args:
+        provider_id: Provider to refresh.
+        max_age: Seconds the cached inventory of the provider may be old to be used instead.
     """
     self.logger.info("Refreshing appliances in {}".format(provider_id))
     provider = Provider.objects.get(id=provider_id, working=True, disabled=False)
-    if not hasattr(provider.api, "all_vms"):
+    inventory = get_inventory(provider, max_age)
+    if inventory.vms is None:
         # Ignore this provider
         return
-    vms = provider.api.all_vms()
-    dict_vms = {}
-    uuid_vms = {}
-    for vm in vms:
-        dict_vms[vm.name] = vm
-        if vm.uuid:
-            uuid_vms[vm.uuid] = vm
-    for appliance in Appliance.objects.filter(template__provider=provider):
-        if appliance.uuid is not None and appliance.uuid in uuid_vms:
-            vm = uuid_vms[appliance.uuid]
-            # Using the UUID and change the name if it changed
-            appliance.name = vm.name
-            appliance.ip_address = vm.ip
-            appliance.set_power_state(Appliance.POWER_STATES_MAPPING.get(
-                vm.power_state, Appliance.Power.UNKNOWN))
-            appliance.save()
-        elif appliance.name in dict_vms:
-            vm = dict_vms[appliance.name]
-            # Using the name, and then retrieve uuid
-            appliance.uuid = vm.uuid
-            appliance.ip_address = vm.ip
-            appliance.set_power_state(Appliance.POWER_STATES_MAPPING.get(
-                vm.power_state, Appliance.Power.UNKNOWN))
-            appliance.save()
-            self.logger.info("Retrieved UUID for appliance {}/{}: {}".format(
-                appliance.id, appliance.name, appliance.uuid))
-        else:
-            # Orphaned :(
-            appliance.set_power_state(Appliance.Power.ORPHANED)
-            appliance.save()
+    reconciliation = reconcile_provider(provider, inventory.vms)
+    for appliance_id, name, uuid in reconciliation.retrieved_uuids:
+        self.logger.info("Retrieved UUID for appliance {}/{}: {}".format(appliance_id, name, uuid))
+    for (old_state, new_state), ids in reconciliation.power_changes.items():
+        self.logger.info("Changed power state from {} to {} for appliances {}".format(
+            old_state, new_state, ", ".join(map(str, ids))))
+    self.logger.info("Refreshed appliances in {}: {}, {} updates".format(
+        provider_id, reconciliation, reconciliation.updates))
 
 
 @singleton_task()
 def check_templates(self):
     self.logger.info("Initiated a periodic template check")
-    for provider in Provider.objects.filter(disabled=False):
+    providers = list(Provider.objects.filter(disabled=False))
+    # Not working providers are listed again by check_templates_in_provider to find out whether
+    # they work again. The others are listed now, templates may have been made since the cached
+    # listings.
+    fetch_inventories((provider for provider in providers if provider.working), max_age=0)
+    for provider in providers:
         check_templates_in_provider.delay(provider.id)
 
 
@@ -1164,7 +1161,8 @@ def check_templates_in_provider(self, provider_id):
     provider = Provider.objects.get(id=provider_id, disabled=False)
     # Get templates and update metadata
     try:
-        templates = map(str, provider.api.list_template())
+        inventory = get_inventory(provider, max_age=settings.TEMPLATE_CHECK_INVENTORY_AGE)
+        templates = inventory.templates
     except Exception as err:
         self.logger.warning("Provider will be marked as not working because of %s", err)
         provider.working = False
@@ -1173,25 +1171,53 @@ def check_templates_in_provider(self, provider_id):
     else:
         provider.working = True
         provider.save(update_fields=['working'])
-        with provider.edit_metadata as metadata:
-            metadata["templates"] = templates
+        provider.templates = templates
     if not provider.working:
         return
     # Check Sprout template existence
     # expiration_time = (timezone.now() - timedelta(**settings.BROKEN_APPLIANCE_GRACE_TIME))
-    for template in Template.objects.filter(provider=provider):
-        with transaction.atomic():
-            tpl = Template.objects.get(pk=template.pk)
-            exists = tpl.name in templates
-            tpl.exists = exists
-            tpl.save(update_fields=['exists'])
-        # if not exists:
-        #     if len(Appliance.objects.filter(template=template).all()) == 0\
-        #             and template.status_changed < expiration_time:
-        #         # No other appliance is made from this template so no need to keep it
-        #         with transaction.atomic():
-        #             tpl = Template.objects.get(pk=template.pk)
-        #             tpl.delete()
+    update_template_existence(provider, inventory, self.logger)
+    # if not exists:
+    #     if len(Appliance.objects.filter(template=template).all()) == 0\
+    #             and template.status_changed < expiration_time:
+    #         # No other appliance is made from this template so no need to keep it
+    #         with transaction.atomic():
+    #             tpl = Template.objects.get(pk=template.pk)
+    #             tpl.delete()
+
+
+def listed_after_change(inventory, status_changed):
+    """Whether the inventory was listed after the status of a template changed last, a template
+    missing from an older listing may have been made since.
+    """
+    return status_changed is None or status_changed < datetime.fromtimestamp(
+        inventory.fetched, timezone.utc)
+
+
+def update_template_existence(provider, inventory, logger):
+    """Sets :py:attr:`appliances.models.Template.exists` of the provider's templates by whether
+    they are among the templates of the ``inventory``, only on those that changed.
+    """
+    templates = set(inventory.templates)
+    changes = {True: [], False: []}
+    for template_id, name, exists, status_changed in Template.objects.filter(
+            provider=provider).values_list('id', 'name', 'exists', 'status_changed'):
+        if name in templates:
+            if not exists:
+                changes[True].append(template_id)
+        elif exists and listed_after_change(inventory, status_changed):
+            changes[False].append(template_id)
+    with transaction.atomic():
+        for exists, template_ids in changes.items():
+            for ids in chunks(template_ids):
+                Template.objects.filter(id__in=ids).update(exists=exists)
+    for exists, template_ids in changes.items():
+        if template_ids:
+            # update() does not send post_save, let the shepherd know on its own
+            mark_templates_changed(*template_ids)
+            logger.info("Templates {} in {} {}".format(
+                ", ".join(map(str, template_ids)), provider.id,
+                "appeared" if exists else "disappeared"))
 
 
 @singleton_task()
@@ -1233,116 +1259,11 @@ def delete_nonexistent_appliances(self):
         Appliance.kill(appliance, force_delete=True)
 
 
-def generic_shepherd(self, preconfigured):
-    """This task takes care of having the required templates spinned into required number of
-    appliances. For each template group, it keeps the last template's appliances spinned up in
-    required quantity. If new template comes out of the door, it automatically kills the older
-    running template's appliances and spins up new ones. Sorts the groups by the fulfillment."""
-    for gs in sorted(
-            GroupShepherd.objects.all(), key=lambda g: g.get_fulfillment_percentage(preconfigured)):
-        prov_filter = {'provider__user_groups': gs.user_group}
-        group_versions = Template.get_versions(
-            template_group=gs.template_group, ready=True, usable=True, preconfigured=preconfigured,
-            container=None, **prov_filter)
-        group_dates = Template.get_dates(
-            template_group=gs.template_group, ready=True, usable=True, preconfigured=preconfigured,
-            container=None, **prov_filter)
-        if group_versions:
-            # Downstream - by version (downstream releases)
-            version = group_versions[0]
-            # Find the latest date (one version can have new build)
-            dates = Template.get_dates(
-                template_group=gs.template_group, ready=True, usable=True,
-                version=group_versions[0], preconfigured=preconfigured, container=None,
-                **prov_filter)
-            if not dates:
-                # No template yet?
-                continue
-            date = dates[0]
-            filter_keep = {"version": version, "date": date, 'container': None}
-            filters_kill = []
-            for kill_date in dates[1:]:
-                filters_kill.append({"version": version, "date": kill_date})
-            for kill_version in group_versions[1:]:
-                filters_kill.append({"version": kill_version})
-        elif group_dates:
-            # Upstream - by date (upstream nightlies)
-            filter_keep = {"date": group_dates[0], 'container': None}
-            filters_kill = [{"date": v} for v in group_dates[1:]]
-        else:
-            continue  # Ignore this group, no templates detected yet
-
-        filter_keep.update(prov_filter)
-        for filt in filters_kill:
-            filt.update(prov_filter)
-        # Keeping current appliances
-        # Retrieve list of all templates for given group
-        # I know joins might be a bit better solution but I'll leave that for later.
-        possible_templates = list(
-            Template.objects.filter(
-                usable=True, ready=True, template_group=gs.template_group,
-                preconfigured=preconfigured, **filter_keep).all())
-        # If it can be deployed, it must exist
-        possible_templates_for_provision = filter(lambda tpl: tpl.exists, possible_templates)
-        appliances = []
-        for template in possible_templates:
-            appliances.extend(
-                Appliance.objects.filter(
-                    template=template, appliance_pool=None, marked_for_deletion=False))
-        # If we then want to delete some templates, better kill the eldest. status_changed
-        # says which one was provisioned when, because nothing else then touches that field.
-        appliances.sort(key=lambda appliance: appliance.status_changed)
-        pool_size = gs.template_pool_size if preconfigured else gs.unconfigured_template_pool_size
-        if len(appliances) < pool_size and possible_templates_for_provision:
-            # There must be some templates in order to run the provisioning
-            # Provision ONE appliance at time for each group, that way it is possible to maintain
-            # reasonable balancing
-            new_appliance_name = settings.APPLIANCE_FORMAT.format(
-                group=template.template_group.id,
-                date=template.date.strftime("%y%m%d"),
-                rnd=fauxfactory.gen_alphanumeric(8))
-            with transaction.atomic():
-                # Now look for templates that are on non-busy providers
-                tpl_free = filter(
-                    lambda t: t.provider.free,
-                    possible_templates_for_provision)
-                if tpl_free:
-                    appliance = Appliance(
-                        template=sorted(tpl_free, key=lambda t: t.provider.appliance_load)[0],
-                        name=new_appliance_name)
-                    appliance.save()
-            if tpl_free:
-                self.logger.info(
-                    "Adding an appliance to shepherd: {}/{}".format(appliance.id, appliance.name))
-                clone_template_to_appliance.delay(appliance.id, None)
-        elif len(appliances) > pool_size:
-            # Too many appliances, kill the surplus
-            # Only kill those that are visible only for one group. This is necessary so the groups
-            # don't "fight"
-            for appliance in appliances[:len(appliances) - pool_size]:
-                if appliance.is_visible_only_in_group(gs.user_group):
-                    self.logger.info("Killing an extra appliance {}/{} in shepherd".format(
-                        appliance.id, appliance.name))
-                    Appliance.kill(appliance)
-
-        # Killing old appliances
-        for filter_kill in filters_kill:
-            for template in Template.objects.filter(
-                    ready=True, usable=True, template_group=gs.template_group,
-                    preconfigured=preconfigured, container=None, **filter_kill):
-
-                for a in Appliance.objects.filter(
-                        template=template, appliance_pool=None, marked_for_deletion=False):
-                    self.logger.info(
-                        "Killing appliance {}/{} in shepherd because it is obsolete now".format(
-                            a.id, a.name))
-                    Appliance.kill(a)
-
-
 @singleton_task()
 def free_appliance_shepherd(self):
-    generic_shepherd(self, True)
-    generic_shepherd(self, False)
+    """Keeps the latest templates of every group spun into the appliances its group shepherds
+    want, see :py:mod:`appliances.shepherd`."""
+    run_shepherd(Provider.load_snapshot(), self.logger)
 
 
 @singleton_task()
@@ -1509,19 +1430,12 @@ def scavenge_managed_providers_from_appliance(self, appliance_id):
 
 @singleton_task()
 def calculate_provider_management_usage(self, appliance_ids):
-    results = {}
-    for appliance_id in filter(lambda id: id is not None, appliance_ids):
-        try:
-            appliance = Appliance.objects.get(id=appliance_id)
-        except ObjectDoesNotExist:
-            # Deleted in meanwhile
-            continue
-        for provider_key in appliance.managed_providers:
-            if provider_key not in results:
-                results[provider_key] = []
-            results[provider_key].append(appliance.id)
-    for provider in Provider.objects.filter(working=True, disabled=False):
-        provider.appliances_manage_this_provider = results.get(provider.id, [])
+    # Each appliance stored its managed providers, which is where the providers look them up.
+    # Only the appliances that left a pool since are left to forget.
+    with transaction.atomic():
+        ManagedProvider.objects.filter(appliance__appliance_pool=None).delete()
+    self.logger.info("Scavenged managed providers of {} appliances".format(
+        len(filter(lambda id: id is not None, appliance_ids))))
 
 
 @singleton_task()
@@ -1569,12 +1483,21 @@ Sprout template version mismatch spammer™
 
 @singleton_task()
 def obsolete_template_deleter(self):
+    inventories = fetch_inventories(Provider.objects.filter(working=True, disabled=False))
     for group in Group.objects.all():
         if group.template_obsolete_days_delete:
             # We can delete based on the template age
             obsolete_templates = group.obsolete_templates
             if obsolete_templates is not None:
                 for template in obsolete_templates:
+                    inventory = inventories.get(template.provider_id)
+                    if inventory is not None and template.name not in inventory.templates:
+                        # Already gone from the provider, no need to ask it to delete it
+                        if template.exists and listed_after_change(
+                                inventory, template.status_changed):
+                            Template.objects.filter(id=template.id).update(exists=False)
+                            mark_templates_changed(template.id)
+                        continue
                     if template.can_be_deleted:
                         delete_template_from_provider.delay(template.id)
 
@@ -1787,8 +1710,9 @@ def appliances_synchronize_metadata(self):
 
 @singleton_task()
 def synchronize_untracked_vms(self):
-    for provider in Provider.objects.filter(working=True, disabled=False):
-        synchronize_untracked_vms_in_provider.delay(provider.id)
+    inventories = fetch_inventories(Provider.objects.filter(working=True, disabled=False))
+    for provider_id in inventories:
+        synchronize_untracked_vms_in_provider.delay(provider_id)
 
 
 def parsedate(d):
@@ -1803,11 +1727,14 @@ def synchronize_untracked_vms_in_provider(self, provider_id):
     """'re'-synchronizes any vms that might be lost during outages."""
     provider = Provider.objects.get(id=provider_id, working=True, disabled=False)
     provider_api = provider.api
-    if not hasattr(provider_api, 'list_vm'):
+    vm_names = get_inventory(provider).vm_names
+    if vm_names is None:
         # This provider does not have VMs (eg. Hawkular or Openshift)
         return
-    for vm_name in sorted(map(str, provider_api.list_vm())):
-        if Appliance.objects.filter(name=vm_name, template__provider=provider).count() != 0:
+    known_names = set(
+        Appliance.objects.filter(template__provider=provider).values_list('name', flat=True))
+    for vm_name in vm_names:
+        if vm_name in known_names:
             continue
         # We have an untracked VM. Let's investigate
         try:
@@ -328,6 +328,7 @@ def providers_for_date_group_and_version(request):
                     for provider
                     in providers
                     if provider.provider_type == provider_type]
+            loads = Provider.load_snapshot(id__in=[provider.id for provider in providers])
             for provider in providers:
                 appl_filter = dict(
                     appliance_pool=None, ready=True, template__provider=provider,
@@ -343,8 +344,8 @@ def providers_for_date_group_and_version(request):
                 shepherd_appliances[provider.id] = len(
                     Appliance.objects.filter(**appl_filter))
                 total_shepherd_slots += shepherd_appliances[provider.id]
-                total_appliance_slots += provider.remaining_appliance_slots
-                total_provisioning_slots += provider.remaining_provisioning_slots
+                total_appliance_slots += loads[provider.id].remaining_appliance_slots
+                total_provisioning_slots += loads[provider.id].remaining_provisioning_slots
 
             render_providers = {}
             for provider in providers:
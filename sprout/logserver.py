@@ -1,19 +1,27 @@
 #!/usr/bin/env python2
 # -*- coding: utf-8 -*-
 # Based on: https://docs.python.org/2.4/lib/network-logging.html
+import argparse
 import atexit
 try:
     import six.moves.cPickle as pickle
 except ImportError:
     import pickle
+import errno
+import json
 import logging
 import logging.handlers
+import os
+import select
 import six.moves.socketserver
 import signal
+import socket
 import struct
+import time
 from threading import Lock
 
 from sprout import sprout_path
+from sprout.log import DEFAULT_JSON_LOGGING_PORT
 
 
 logs_path = sprout_path.join("log")
@@ -50,17 +58,37 @@ def close_logs():
         logger_cache = {}
 
 
+LOG_FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+
+
 def create_logger(name, filename, max_file_size, max_backups):
     logger = logging.getLogger(name)
     handler = logging.handlers.RotatingFileHandler(
         filename, mode='a', maxBytes=max_file_size, backupCount=max_backups)
-    formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
+    formatter = logging.Formatter(LOG_FORMAT)
     handler.setFormatter(formatter)
     logger.addHandler(handler)
     logger.setLevel(logging.DEBUG)
     return logger
 
 
+def log_filename(name):
+    """Log file of a logger, its dotted name becomes a directory structure under the logs"""
+    if not name:
+        filename = logs_path.join("sprout.log")
+    else:
+        fields = name.split(".")
+        fields[-1] += ".log"
+        filename = logs_path
+        for field in fields:
+            filename = filename.join(field)
+            if not field.endswith(".log"):
+                with global_fs_lock:
+                    if not filename.exists():
+                        filename.mkdir()
+    return filename.strpath
+
+
 class LogRecordStreamHandler(six.moves.socketserver.StreamRequestHandler):
     """Handler for a streaming logging request.
 
@@ -91,19 +119,7 @@ class LogRecordStreamHandler(six.moves.socketserver.StreamRequestHandler):
                 name = self.server.logname
             else:
                 name = record.name
-            if not name:
-                filename = logs_path.join("sprout.log")
-            else:
-                fields = name.split(".")
-                fields[-1] += ".log"
-                filename = logs_path
-                for field in fields:
-                    filename = filename.join(field)
-                    if not field.endswith(".log"):
-                        with global_fs_lock:
-                            if not filename.exists():
-                                filename.mkdir()
-            filename = filename.strpath
+            filename = log_filename(name)
             with logger_cache_lock:
                 if filename in logger_cache:
                     logger, lock = logger_cache[filename]
@@ -144,8 +160,191 @@ class LogRecordSocketReceiver(six.moves.socketserver.ThreadingTCPServer):
             abort = self.abort
 
 
+class BufferedRotatingFile(object):
+    """Log file that buffers the written lines and rotates like RotatingFileHandler.
+
+    Not thread safe, it is written by the single thread of :py:class:`JSONLogReceiver`.
+    """
+    def __init__(self, filename, max_file_size, max_backups, buffer_size=64 * 1024):
+        self.filename = filename
+        self.max_file_size = max_file_size
+        self.max_backups = max_backups
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.buffered = 0
+        # Binary, the lines are encoded in flush, so the size is counted in bytes
+        self.stream = open(filename, 'ab')
+        self.stream.seek(0, os.SEEK_END)
+        self.size = self.stream.tell()
+
+    def write(self, line):
+        """Buffers a unicode line"""
+        self.buffer.append(line)
+        self.buffered += len(line)
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        data = u''.join(self.buffer).encode('utf-8')
+        self.buffer = []
+        self.buffered = 0
+        if self.max_file_size and self.size and self.size + len(data) > self.max_file_size:
+            self.rotate()
+        self.stream.write(data)
+        self.stream.flush()
+        self.size += len(data)
+
+    def rotate(self):
+        self.stream.close()
+        for i in range(self.max_backups - 1, 0, -1):
+            source = "{}.{}".format(self.filename, i)
+            if os.path.exists(source):
+                os.rename(source, "{}.{}".format(self.filename, i + 1))
+        if self.max_backups > 0:
+            os.rename(self.filename, "{}.1".format(self.filename))
+        self.stream = open(self.filename, 'wb')
+        self.size = 0
+
+    def close(self):
+        self.flush()
+        self.stream.close()
+
+
+class JSONLogReceiver(object):
+    """Receives log records sent as JSON lines by sprout.log.BatchingJSONHandler.
+
+    A single thread multiplexes all connections with select, decodes the lines and writes them to
+    :py:class:`BufferedRotatingFile` s, which get flushed every ``flush_interval`` seconds. Unlike
+    the pickled records of :py:class:`LogRecordSocketReceiver`, decoding the records cannot run
+    any code.
+    """
+    RECV_SIZE = 256 * 1024
+
+    def __init__(self, host='localhost', port=DEFAULT_JSON_LOGGING_PORT, flush_interval=1.0,
+                 max_file_size=MAX_FILE_SIZE, max_backups=MAX_BACKUPS):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.socket.listen(128)
+        self.socket.setblocking(False)
+        self.flush_interval = flush_interval
+        self.max_file_size = max_file_size
+        self.max_backups = max_backups
+        self.formatter = logging.Formatter(LOG_FORMAT)
+        self.logname = None
+        self.abort = 0
+        # socket -> received data not ending with a newline yet
+        self.connections = {}
+        self.files = {}
+        self.records = 0
+
+    @property
+    def address(self):
+        return self.socket.getsockname()
+
+    def file_for(self, name):
+        filename = log_filename(name)
+        log_file = self.files.get(filename)
+        if log_file is None:
+            log_file = BufferedRotatingFile(filename, self.max_file_size, self.max_backups)
+            self.files[filename] = log_file
+        return log_file
+
+    def handle_line(self, line):
+        try:
+            record = logging.makeLogRecord(json.loads(line))
+        except ValueError:
+            print("Ignoring a malformed record: {!r}".format(line[:100]))
+            return
+        name = self.logname if self.logname is not None else record.name
+        self.file_for(name).write(self.formatter.format(record) + '\n')
+        self.records += 1
+
+    def accept(self):
+        while True:
+            try:
+                connection, _ = self.socket.accept()
+            except socket.error as e:
+                if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
+                raise
+            connection.setblocking(False)
+            self.connections[connection] = b''
+
+    def receive(self, connection):
+        try:
+            data = connection.recv(self.RECV_SIZE)
+        except socket.error as e:
+            if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            data = b''
+        if not data:
+            # Closed, a line without the newline at the end was cut off
+            connection.close()
+            del self.connections[connection]
+            return
+        lines = (self.connections[connection] + data).split(b'\n')
+        self.connections[connection] = lines.pop()
+        for line in lines:
+            if not line:
+                continue
+            # One bad record must not stop the only thread of the server
+            try:
+                self.handle_line(line.decode('utf-8', 'replace'))
+            except Exception as e:
+                print("Could not log a record: {}: {}".format(type(e).__name__, e))
+
+    def flush(self):
+        for log_file in self.files.values():
+            log_file.flush()
+
+    def close(self):
+        for connection in self.connections:
+            connection.close()
+        self.connections = {}
+        self.socket.close()
+        for log_file in self.files.values():
+            log_file.close()
+        self.files = {}
+
+    def serve_until_stopped(self):
+        next_flush = time.time() + self.flush_interval
+        try:
+            while not self.abort:
+                timeout = max(next_flush - time.time(), 0)
+                readable, _, _ = select.select(
+                    [self.socket] + list(self.connections), [], [], timeout)
+                for sock in readable:
+                    if sock is self.socket:
+                        self.accept()
+                    else:
+                        self.receive(sock)
+                if time.time() >= next_flush:
+                    self.flush()
+                    next_flush = time.time() + self.flush_interval
+        finally:
+            self.close()
+
+
+def parse_cmd_line():
+    parser = argparse.ArgumentParser(description="Sprout log server")
+    parser.add_argument(
+        '--json', action='store_true',
+        help='Receive JSON lines from sprout.log.BatchingJSONHandler (SPROUT_LOG_TRANSPORT=json) '
+             'instead of pickled records')
+    parser.add_argument('--port', type=int, default=None, help='Port to listen on')
+    return parser.parse_args()
+
+
 def main():
-    tcpserver = LogRecordSocketReceiver()
+    args = parse_cmd_line()
+    if args.json:
+        tcpserver = JSONLogReceiver(port=args.port or DEFAULT_JSON_LOGGING_PORT)
+    else:
+        tcpserver = LogRecordSocketReceiver(
+            port=args.port or logging.handlers.DEFAULT_TCP_LOGGING_PORT)
     print("About to start TCP server...")
     try:
         tcpserver.serve_until_stopped()
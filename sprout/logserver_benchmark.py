@@ -0,0 +1,114 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""Benchmark the ingestion modes of the logserver
+
+Runs a logserver writing into a temporary directory and has ``--producers`` processes log
+``--records`` records each, like celery workers do, through the handler of the mode. Reports the
+records per second from the start of the producers until all records are written to the files.
+
+e.g. ./logserver_benchmark.py --producers 50 --records 2000 --mode json
+"""
+from __future__ import print_function
+
+import argparse
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from threading import Thread
+
+import py
+
+import logserver
+from sprout.log import BatchingJSONHandler
+
+
+def parse_cmd_line():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--producers', type=int, default=50, help='Number of logging processes')
+    parser.add_argument('--records', type=int, default=2000, help='Records per process')
+    parser.add_argument('--mode', choices=['pickle', 'json', 'both'], default='both',
+                        help='Ingestion mode to benchmark')
+    parser.add_argument('--timeout', type=float, default=600,
+                        help='Seconds to wait for the records to be written')
+    return parser.parse_args()
+
+
+def produce(mode, port, producer, records):
+    if mode == 'json':
+        handler = BatchingJSONHandler('localhost', port)
+    else:
+        handler = logging.handlers.SocketHandler('localhost', port)
+    logger = logging.getLogger('benchmark.producer{}'.format(producer))
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    for i in range(records):
+        logger.info('[%d] Record %d of the benchmark producer', producer, i)
+    handler.close()
+
+
+def written_records(directory):
+    count = 0
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in filenames:
+            with open(os.path.join(dirpath, filename)) as log_file:
+                count += sum(1 for _ in log_file)
+    return count
+
+
+def benchmark(mode, producers, records, timeout):
+    directory = tempfile.mkdtemp(prefix='logserver-benchmark-')
+    logserver.logs_path = py.path.local(directory)
+    if mode == 'json':
+        server = logserver.JSONLogReceiver(port=0, flush_interval=0.1)
+        port = server.address[1]
+    else:
+        server = logserver.LogRecordSocketReceiver(port=0)
+        server.timeout = 0.1
+        port = server.server_address[1]
+    server_thread = Thread(target=server.serve_until_stopped)
+    server_thread.start()
+    try:
+        start = time.time()
+        processes = [
+            multiprocessing.Process(target=produce, args=(mode, port, producer, records))
+            for producer in range(producers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        logged = time.time() - start
+        expected = producers * records
+        written = 0
+        while time.time() - start < timeout:
+            written = written_records(directory)
+            if written >= expected:
+                break
+            time.sleep(0.1)
+        duration = time.time() - start
+        print('{:<6} {} producers x {} records: logged in {:.2f}s, {} of {} written in {:.2f}s, '
+              '{:.0f} records/s'.format(
+                  mode, producers, records, logged, written, expected, duration,
+                  written / duration))
+    finally:
+        server.abort = 1
+        server_thread.join()
+        if mode != 'json':
+            server.server_close()
+            logserver.close_logs()
+        shutil.rmtree(directory)
+
+
+def main(args):
+    modes = ['pickle', 'json'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        benchmark(mode, args.producers, args.records, args.timeout)
+
+
+if __name__ == '__main__':
+    main(parse_cmd_line())
@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 import atexit
+import json
 import logging
 import logging.handlers
-from threading import Lock
+import os
+import socket
+from collections import deque
+from threading import Event, Lock, Thread
 
 import inspect
 import sys
@@ -12,6 +16,11 @@ from types import ModuleType
 logger_cache = {}
 logger_cache_lock = Lock()
 
+#: How the records get to the logserver, ``pickle`` (SocketHandler) or ``json``
+#: (:py:class:`BatchingJSONHandler`), which has to match the mode the logserver runs in
+LOG_TRANSPORT = os.environ.get("SPROUT_LOG_TRANSPORT", "pickle")
+DEFAULT_JSON_LOGGING_PORT = int(os.environ.get("SPROUT_JSON_LOGGING_PORT", 9024))
+
 logging.getLogger("requests").setLevel(logging.WARNING)
 logging.getLogger("urllib3").setLevel(logging.WARNING)
 
@@ -47,6 +56,124 @@ class LogWrapperForObject(object):
         return _log
 
 
+def record_to_json(record):
+    """Serialize a log record to a JSON line with what the logserver needs to write it."""
+    data = {
+        "name": record.name,
+        "levelno": record.levelno,
+        "levelname": record.levelname,
+        "msg": record.getMessage(),
+        "created": record.created,
+        "msecs": record.msecs,
+        "process": record.process,
+        "thread": record.thread,
+        "pathname": record.pathname,
+        "lineno": record.lineno,
+        "funcName": record.funcName,
+    }
+    if record.exc_info and not record.exc_text:
+        record.exc_text = logging.Formatter().formatException(record.exc_info)
+    if record.exc_text:
+        data["exc_text"] = record.exc_text
+    return json.dumps(data, default=str) + "\n"
+
+
+class BatchingJSONHandler(logging.Handler):
+    """Ships log records to the logserver as JSON lines, in batches from a background thread.
+
+    Emitting only queues the serialized record, the network is never waited for. If the logserver
+    cannot keep up or is not reachable, at most ``max_queue`` records stay queued and the ones
+    that do not fit are dropped.
+
+    Args:
+        host: Host the logserver runs on.
+        port: Port the logserver listens for JSON lines on.
+        batch_size: Records sent at once, reaching that many queued records sends them right away.
+        flush_interval: Seconds to send the queued records after at the latest.
+        max_queue: Number of records to keep queued at most.
+    """
+    RECONNECT_DELAY = 2.0
+
+    def __init__(self, host, port, batch_size=500, flush_interval=0.5, max_queue=100000):
+        logging.Handler.__init__(self)
+        self.address = (host, port)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = deque(maxlen=max_queue)
+        self.dropped = 0
+        self.sock = None
+        self._wakeup = Event()
+        self._closed = False
+        self._thread = Thread(target=self._run, name="BatchingJSONHandler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def emit(self, record):
+        try:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(record_to_json(record))
+            if len(self.queue) >= self.batch_size:
+                self._wakeup.set()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self._wakeup.set()
+
+    def _connect(self):
+        self.sock = socket.create_connection(self.address, timeout=10)
+
+    def _disconnect(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except socket.error:
+                pass
+        self.sock = None
+
+    def _send_queued(self):
+        """Send what is queued, return False if the logserver could not be reached"""
+        while self.queue:
+            batch = []
+            while self.queue and len(batch) < self.batch_size:
+                batch.append(self.queue.popleft())
+            try:
+                if self.sock is None:
+                    self._connect()
+                self.sock.sendall("".join(batch).encode("utf-8"))
+            except (socket.error, IOError):
+                self._disconnect()
+                # Keep the batch for the next attempt, in front of what came in meanwhile
+                self.queue.extendleft(reversed(batch))
+                return False
+        return True
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if not self._send_queued() and not self._closed:
+                self._wakeup.wait(self.RECONNECT_DELAY)
+        self._send_queued()
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join(5)
+        self._disconnect()
+        logging.Handler.close(self)
+
+
+def create_log_handler():
+    """Handler sending the records to the logserver as configured by ``SPROUT_LOG_TRANSPORT``"""
+    if LOG_TRANSPORT == "json":
+        return BatchingJSONHandler("localhost", DEFAULT_JSON_LOGGING_PORT)
+    else:
+        return logging.handlers.SocketHandler(
+            "localhost", logging.handlers.DEFAULT_TCP_LOGGING_PORT)
+
+
 def create_logger(o, additional_id=None):
     """Creates a logger that has its filename derived from the passed object's properties.
 
@@ -82,10 +209,9 @@ def create_logger(o, additional_id=None):
         if None not in logger_cache:
             logger = logging.getLogger()
             logger.setLevel(logging.INFO)
-            socket_handler = logging.handlers.SocketHandler(
-                "localhost", logging.handlers.DEFAULT_TCP_LOGGING_PORT)
-            atexit.register(socket_handler.close)
-            logger.addHandler(socket_handler)
+            log_handler = create_log_handler()
+            atexit.register(log_handler.close)
+            logger.addHandler(log_handler)
             logger_cache[None] = logger
         if logger_name not in logger_cache:
             logger_cache[logger_name] = logging.getLogger(logger_name)
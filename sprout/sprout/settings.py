@@ -166,6 +166,23 @@ ORPHANED_APPLIANCE_GRACE_TIME = dict(
     minutes=45,
 )
 
+# How long at most wait_pool_change waits for a pool to change and how often it checks, in seconds
+# The wait holds a sync gunicorn worker, so it is kept short, well under the worker timeout, and
+# the clients poll again
+POOL_WAIT_TIMEOUT = 5
+POOL_WAIT_INTERVAL = 1
+
+# Seconds after which the shepherd recounts all group shepherds, not only the changed ones
+SHEPHERD_FULL_RECOUNT = 600
+
+# How long the inventories of the providers (templates and VMs) are cached, in seconds, and how
+# many providers are listed at once
+PROVIDER_INVENTORY_TTL = 600
+PROVIDER_INVENTORY_CONCURRENCY = 8
+# How old the listing the template check uses may be, in seconds, so it uses the one
+# check_templates just made but lists the provider again when it runs later, e.g. on a retry
+TEMPLATE_CHECK_INVENTORY_AGE = 60
+
 # Celery beat
 CELERYBEAT_SCHEDULE = {
     'check-templates': {